@@ -1,7 +1,13 @@
 import asyncio
 
+from docparser.isolation import IsolatedWorkerPool
+from integretion.events.fanout import FanOutCoordinator
 from integretion.events.kafka_listener import KafkaListener
+from integretion.events.retry import RetryPolicy
+from integretion.events.stages import StageConfig
+from integretion.minio.idempotency import MinioMarkerStore
 from integretion.minio.minio_service import get_client
+from integretion.scratch import ScratchSpace
 
 
 async def main():
@@ -11,16 +17,38 @@ async def main():
     # 1. Setup dependencies (Mocking Minio for this example)
     minio = get_client()
 
-    # 2. Instantiate the Listener
+    # 2. Isolated worker processes: a pathological document cannot hang or OOM the listener
+    worker_pool = IsolatedWorkerPool(
+        workers=1,
+        timeout_s=600,
+        max_rss_mb=6000,
+        max_tasks_per_worker=20,
+    )
+
+    # 3. Instantiate the Listener
     listener = KafkaListener(
         bootstrap_servers="localhost:9092",
         group_id="my-group-v1",
-        minio_client=minio
+        minio_client=minio,
+        worker_pool=worker_pool,
+        # Skip redelivered events whose artifacts are already uploaded
+        marker_store=MinioMarkerStore(minio),
+        # Failed documents: retry topics with 30s/2m/8m backoff, then the dead-letter topic
+        retry_policy=RetryPolicy(max_attempts=4, base_delay_s=30, multiplier=4),
+        # PDFs of 200+ pages are split into 50-page shards converted across the consumer group
+        fan_out=FanOutCoordinator(minio, pages_per_shard=50, min_pages=200),
+        # Download and upload overlap the conversion running in the worker pool
+        stages=StageConfig(convert_workers=1, postprocess_workers=1),
+        # Per-job working dirs: removed after upload, kept 24h on failure, 10GB quota
+        scratch=ScratchSpace(root="/tmp/docparser", quota_mb=10 * 1024, failed_ttl_s=24 * 3600),
     )
 
-    # 3. Start the listener
+    # 4. Start the listener
     # This will block execution here as long as the listener is running
-    await listener.start()
+    try:
+        await listener.start()
+    finally:
+        worker_pool.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+"""
+Benchmark conversione uno alla volta vs batch (docparser.batching, convert_all).
+
+Esempio:
+    python benchmarks/batch_bench.py dataset/ --profile balanced --batch-sizes 4,8,16 --repeat 2
+
+Considera solo gli input piccoli di dataset/ (immagini, PDF di 1-2 pagine) e misura:
+- "single":  convert_to_document per file, in sequenza (il percorso storico)
+- "batch-N": convert_batch a gruppi di N documenti compatibili
+
+Per ogni modalità: documenti/s e pagine/s della sola conversione (pre-pass OCR compresi),
+documenti ricaduti sulla conversione singola e quanti markdown coincidono con "single".
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from docparser.batching import BatchItem, convert_batch, is_small_input  # noqa: E402
+from docparser.pipeline import convert_to_document  # noqa: E402
+from docparser.utils import is_supported_file  # noqa: E402
+
+
+def _pages(document) -> int:
+    return max(1, len(document.pages) if getattr(document, "pages", None) else 1)
+
+
+def _run_single(files: List[Path], profile: str) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    documents = [
+        convert_to_document(str(f), file_label=f.name, profile=profile).document
+        for f in files
+    ]
+    return {"elapsed_s": time.perf_counter() - t0, "documents": documents, "fallback": 0}
+
+
+def _run_batch(files: List[Path], profile: str, batch_size: int) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    converted = convert_batch(
+        [BatchItem(source=str(f), file_label=f.name) for f in files],
+        profile=profile,
+        batch_size=batch_size,
+    )
+    documents = []
+    fallback = 0
+    for f, result in zip(files, converted):
+        if result is None:
+            # stessa ricaduta di process_batch_or_file: conversione singola
+            fallback += 1
+            result = convert_to_document(str(f), file_label=f.name, profile=profile)
+        documents.append(result.document)
+    return {"elapsed_s": time.perf_counter() - t0, "documents": documents, "fallback": fallback}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark conversione singola vs batch (convert_all)")
+    parser.add_argument("input", help="Cartella con gli input (es. dataset/)")
+    parser.add_argument("--profile", default="balanced", help="Profilo di conversione (default: balanced)")
+    parser.add_argument("--batch-sizes", default="4,8,16", help="Batch size da provare, separati da virgola")
+    parser.add_argument("--repeat", type=int, default=1, help="Ripetizioni per modalità (si tiene la mediana)")
+    parser.add_argument("--output", default="benchmarks/results/batch_bench.json", help="Report JSON")
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    files = [
+        f for f in sorted(input_path.iterdir())
+        if f.is_file() and is_supported_file(f) and is_small_input(f, f.name)
+    ]
+    if len(files) < 2:
+        print("Need at least two small inputs (images, 1-2 page PDFs).")
+        return
+    print(f"{len(files)} small inputs")
+
+    modes = {"single": lambda: _run_single(files, args.profile)}
+    for size in (int(s) for s in args.batch_sizes.split(",") if s.strip()):
+        modes[f"batch-{size}"] = lambda size=size: _run_batch(files, args.profile, size)
+
+    # warm-up: caricamento modelli (e converter in cache) fuori dalle misure
+    for run_mode in modes.values():
+        run_mode()
+
+    summary: Dict[str, Dict[str, Any]] = {}
+    reference: List[str] = []
+    for mode, run_mode in modes.items():
+        runs = [run_mode() for _ in range(max(1, args.repeat))]
+        runs.sort(key=lambda r: r["elapsed_s"])
+        run = runs[len(runs) // 2]
+        markdown = [doc.export_to_markdown() for doc in run["documents"]]
+        if mode == "single":
+            reference = markdown
+        pages = sum(_pages(doc) for doc in run["documents"])
+        elapsed = run["elapsed_s"]
+        summary[mode] = {
+            "documents": len(files),
+            "pages": pages,
+            "elapsed_s": round(elapsed, 3),
+            "docs_per_s": round(len(files) / elapsed, 3) if elapsed > 0 else None,
+            "pages_per_s": round(pages / elapsed, 3) if elapsed > 0 else None,
+            "fallback": run["fallback"],
+            "identical_markdown": sum(a == b for a, b in zip(markdown, reference)),
+        }
+
+    base = summary["single"]["elapsed_s"]
+    print("\n==================== BATCH CONVERSION BENCHMARK ====================")
+    print(f"{'mode':<10} {'docs/s':>8} {'pages/s':>8} {'speedup':>8} {'fallback':>9} {'same md':>8}")
+    for mode, s in summary.items():
+        s["speedup"] = round(base / s["elapsed_s"], 3) if s["elapsed_s"] > 0 else None
+        print(f"{mode:<10} {s['docs_per_s'] or 0:>8.2f} {s['pages_per_s'] or 0:>8.2f} {s['speedup'] or 0:>8.2f} "
+              f"{s['fallback']:>9} {s['identical_markdown']:>5}/{s['documents']}")
+    print("=====================================================================")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "files": [f.name for f in files], "summary": summary}, f, indent=2)
+    print(f"Report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
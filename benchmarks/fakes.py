@@ -0,0 +1,283 @@
+"""
+Stand-in in-process per Kafka e MinIO, usati dai benchmark (kafka_load.py).
+
+Implementano solo la parte di API usata da KafkaListener e da integretion.minio:
+- FakeKafka / FakeConsumer / FakeProducer: topic partizionati, offset committati
+  per gruppo, pause/resume/seek, getmany con timeout.
+- FakeMinio: oggetti in memoria, con latenza e banda simulate per richiesta.
+"""
+
+import asyncio
+import hashlib
+import time
+import zlib
+from collections import namedtuple
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+TopicPartition = namedtuple("TopicPartition", "topic partition")
+
+
+@dataclass
+class FakeRecord:
+    topic: str
+    partition: int
+    offset: int
+    key: Optional[bytes]
+    value: bytes
+    headers: Tuple[Tuple[str, bytes], ...]
+    timestamp: float  # epoch seconds di pubblicazione
+
+
+class FakeKafka:
+    """Broker in memoria: log append-only per partizione e offset committati per gruppo."""
+
+    def __init__(self, partitions: int = 3):
+        self.partitions = partitions
+        self.logs: Dict[TopicPartition, List[FakeRecord]] = {}
+        self.committed: Dict[Tuple[str, TopicPartition], int] = {}
+        self._new_data: Optional[asyncio.Event] = None
+
+    def _event(self) -> asyncio.Event:
+        if self._new_data is None:
+            self._new_data = asyncio.Event()
+        return self._new_data
+
+    def topic_partitions(self, topic: str) -> List[TopicPartition]:
+        tps = [TopicPartition(topic, p) for p in range(self.partitions)]
+        for tp in tps:
+            self.logs.setdefault(tp, [])
+        return tps
+
+    def produce(self, topic: str, value: bytes, key: Optional[bytes] = None,
+                headers: Sequence[Tuple[str, bytes]] = ()) -> FakeRecord:
+        if key is not None:
+            partition = zlib.crc32(key) % self.partitions
+        else:
+            partition = sum(len(self.logs.get(tp, ())) for tp in self.topic_partitions(topic)) % self.partitions
+        tp = TopicPartition(topic, partition)
+        log = self.logs.setdefault(tp, [])
+        record = FakeRecord(topic, partition, len(log), key, value, tuple(headers or ()), time.time())
+        log.append(record)
+        self._event().set()
+        return record
+
+    def end_offset(self, tp: TopicPartition) -> int:
+        return len(self.logs.get(tp, ()))
+
+    def lag(self, group_id: str, topic: str) -> int:
+        """Messaggi pubblicati e non ancora committati dal gruppo."""
+        return sum(
+            self.end_offset(tp) - self.committed.get((group_id, tp), 0)
+            for tp in self.topic_partitions(topic)
+        )
+
+
+class FakeConsumer:
+    """Un solo membro del gruppo: riceve tutte le partizioni dei topic sottoscritti."""
+
+    def __init__(self, broker: FakeKafka, group_id: str):
+        self.broker = broker
+        self.group_id = group_id
+        self._assignment: Set[TopicPartition] = set()
+        self._paused: Set[TopicPartition] = set()
+        self._position: Dict[TopicPartition, int] = {}
+        self._listener = None
+
+    def subscribe(self, topics: Sequence[str], listener=None) -> None:
+        self._assignment = {tp for topic in topics for tp in self.broker.topic_partitions(topic)}
+        self._listener = listener
+
+    async def start(self) -> None:
+        for tp in self._assignment:
+            self._position[tp] = self.broker.committed.get((self.group_id, tp), 0)
+        if self._listener is not None:
+            await self._listener.on_partitions_assigned(set(self._assignment))
+
+    async def stop(self) -> None:
+        pass
+
+    def assignment(self) -> Set[TopicPartition]:
+        return set(self._assignment)
+
+    def pause(self, *tps: TopicPartition) -> None:
+        self._paused |= set(tps)
+
+    def paused(self) -> Set[TopicPartition]:
+        return set(self._paused)
+
+    def resume(self, *tps: TopicPartition) -> None:
+        self._paused -= set(tps)
+
+    def seek(self, tp: TopicPartition, offset: int) -> None:
+        self._position[tp] = offset
+
+    def _take(self, max_records: int) -> Dict[TopicPartition, List[FakeRecord]]:
+        out: Dict[TopicPartition, List[FakeRecord]] = {}
+        budget = max_records
+        for tp in sorted(self._assignment - self._paused):
+            if budget <= 0:
+                break
+            position = self._position.get(tp, 0)
+            records = self.broker.logs[tp][position:position + budget]
+            if records:
+                out[tp] = records
+                self._position[tp] = position + len(records)
+                budget -= len(records)
+        return out
+
+    async def getmany(self, timeout_ms: int = 0, max_records: Optional[int] = None):
+        max_records = max_records or 500
+        deadline = time.monotonic() + timeout_ms / 1000.0
+        while True:
+            out = self._take(max_records)
+            remaining = deadline - time.monotonic()
+            if out or remaining <= 0:
+                return out
+            event = self.broker._event()
+            event.clear()
+            try:
+                await asyncio.wait_for(event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def commit(self, offsets: Dict[TopicPartition, int]) -> None:
+        for tp, offset in offsets.items():
+            self.broker.committed[(self.group_id, tp)] = offset
+
+
+class FakeProducer:
+    def __init__(self, broker: FakeKafka):
+        self.broker = broker
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def send_and_wait(self, topic: str, value: bytes = None, key: bytes = None, headers=None):
+        return self.broker.produce(topic, value, key=key, headers=headers or ())
+
+
+# =========================================================
+#  MinIO
+# =========================================================
+
+try:
+    # i chiamanti (marker store, shard store) fanno except S3Error
+    from minio.error import S3Error as _S3ErrorBase
+except ImportError:  # pragma: no cover - benchmark senza minio installato
+    _S3ErrorBase = Exception
+
+
+class FakeS3Error(_S3ErrorBase):
+    def __init__(self, code: str, message: str = ""):
+        Exception.__init__(self, f"{code}: {message}")
+        self._code = code
+
+    @property
+    def code(self) -> str:
+        return self._code
+
+
+ObjectStat = namedtuple("ObjectStat", "object_name size etag content_type")
+ListedObject = namedtuple("ListedObject", "object_name size")
+
+
+class _Response:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+    def close(self) -> None:
+        pass
+
+    def release_conn(self) -> None:
+        pass
+
+
+class FakeMinio:
+    """
+    Client MinIO in memoria (thread-safe per gli usi del pool I/O: un dict per chiave).
+    latency_ms e bandwidth_mb_s simulano la rete: ogni chiamata dorme
+    latency + size / bandwidth nel thread che la esegue, come farebbe il client vero.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, bandwidth_mb_s: float = 0.0):
+        self.latency_s = latency_ms / 1000.0
+        self.bandwidth = bandwidth_mb_s * 1024 * 1024
+        self.buckets: Set[str] = set()
+        self.objects: Dict[Tuple[str, str], Tuple[bytes, str]] = {}
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _network(self, size: int = 0) -> None:
+        self.requests += 1
+        delay = self.latency_s + (size / self.bandwidth if self.bandwidth else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _get(self, bucket: str, name: str) -> Tuple[bytes, str]:
+        if bucket not in self.buckets:
+            raise FakeS3Error("NoSuchBucket", bucket)
+        try:
+            return self.objects[(bucket, name)]
+        except KeyError:
+            raise FakeS3Error("NoSuchKey", f"{bucket}/{name}") from None
+
+    def bucket_exists(self, bucket: str) -> bool:
+        self._network()
+        return bucket in self.buckets
+
+    def make_bucket(self, bucket: str) -> None:
+        self._network()
+        self.buckets.add(bucket)
+
+    def put_object(self, bucket_name: str, object_name: str, data, length: int,
+                   content_type: str = "application/octet-stream", part_size: int = 0, **kwargs) -> None:
+        payload = data.read(length) if length >= 0 else data.read()
+        self._network(len(payload))
+        if bucket_name not in self.buckets:
+            raise FakeS3Error("NoSuchBucket", bucket_name)
+        self.bytes_in += len(payload)
+        self.objects[(bucket_name, object_name)] = (payload, content_type)
+
+    def fput_object(self, bucket_name: str, object_name: str, file_path: str,
+                    content_type: str = "application/octet-stream", part_size: int = 0, **kwargs) -> None:
+        data = Path(file_path).read_bytes()
+        self.put_object(bucket_name, object_name, BytesIO(data), len(data), content_type=content_type)
+
+    def get_object(self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0, **kwargs):
+        data, _ = self._get(bucket_name, object_name)
+        data = data[offset:offset + length] if length else data[offset:]
+        self._network(len(data))
+        self.bytes_out += len(data)
+        return _Response(data)
+
+    def fget_object(self, bucket_name: str, object_name: str, file_path: str, **kwargs) -> None:
+        data = self.get_object(bucket_name, object_name).read()
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(file_path).write_bytes(data)
+
+    def stat_object(self, bucket_name: str, object_name: str, **kwargs) -> ObjectStat:
+        self._network()
+        data, content_type = self._get(bucket_name, object_name)
+        return ObjectStat(object_name, len(data), hashlib.md5(data).hexdigest(), content_type)
+
+    def list_objects(self, bucket_name: str, prefix: str = "", recursive: bool = True, **kwargs):
+        self._network()
+        return [
+            ListedObject(name, len(data))
+            for (bucket, name), (data, _) in sorted(self.objects.items())
+            if bucket == bucket_name and name.startswith(prefix)
+        ]
+
+    def remove_object(self, bucket_name: str, object_name: str, **kwargs) -> None:
+        self._network()
+        self.objects.pop((bucket_name, object_name), None)
@@ -0,0 +1,208 @@
+"""
+Benchmark dell'indice BM25 dei chunk (docparser.indexing).
+
+Esempi:
+    python benchmarks/index_bench.py --chunks 1000000 --runs-size 200 --queries 500
+    python benchmarks/index_bench.py --from-runs output/ --tokenizer chunker --queries 200
+
+1. indicizza il corpus un batch di run alla volta (come l'aggiornamento incrementale
+   durante un batch), misurando chunk/s, numero di segmenti e merge
+2. fonde i segmenti e misura la dimensione su disco
+3. esegue query casuali (1-4 parole dal vocabolario del corpus) e riporta i percentili
+   di latenza, a indice appena aperto (cold) e dopo il warm-up della page cache (warm)
+
+Il corpus sintetico ha un vocabolario con distribuzione di Zipf, così le posting
+dei termini frequenti sono lunghe come in un corpus reale.
+"""
+
+import argparse
+import json
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from docparser.indexing import TOKENIZERS, ChunkIndex  # noqa: E402
+from docparser.rerender import find_run_dirs  # noqa: E402
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def _vocabulary(size: int, rng: random.Random) -> List[str]:
+    letters = "abcdefghilmnoprstuvz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+
+def synthetic_runs(chunks: int, runs_size: int, chunk_tokens: int, vocab_size: int, seed: int):
+    """Genera (run_key, file_name, chunks) con testo Zipf, runs_size chunk per run."""
+    rng = random.Random(seed)
+    vocab = _vocabulary(vocab_size, rng)
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    cumulative = []
+    total = 0.0
+    for w in weights:
+        total += w
+        cumulative.append(total)
+
+    produced = 0
+    run_number = 0
+    while produced < chunks:
+        n = min(runs_size, chunks - produced)
+        run_chunks = []
+        for i in range(n):
+            words = rng.choices(vocab, cum_weights=cumulative, k=chunk_tokens)
+            run_chunks.append({
+                "id": i,
+                "prev": "",
+                "focus": " ".join(words),
+                "next": "",
+                "metadata": {"page_numbers": [i // 4 + 1]},
+            })
+        yield f"synthetic/run_{run_number:06d}", f"doc_{run_number:06d}.pdf", run_chunks
+        produced += n
+        run_number += 1
+
+
+def _run_queries(index: ChunkIndex, queries: List[str], k: int) -> Dict[str, Any]:
+    latencies = []
+    hits = 0
+    for query in queries:
+        t0 = time.perf_counter()
+        hits += len(index.search(query, k=k))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return {
+        "queries": len(queries),
+        "avg_hits": round(hits / len(queries), 2) if queries else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 3) if latencies else None,
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indicizzazione e query dell'indice BM25 dei chunk")
+    parser.add_argument("--index", default=None, help="Cartella dell'indice (default: temporanea, rimossa alla fine)")
+    parser.add_argument("--from-runs", default=None, help="Indicizza le run dir reali sotto questa cartella")
+    parser.add_argument("--tokenizer", choices=list(TOKENIZERS), default="regex",
+                        help="regex per il corpus sintetico, chunker = tokenizer del chunking")
+    parser.add_argument("--chunks", type=int, default=200_000, help="Chunk sintetici")
+    parser.add_argument("--runs-size", type=int, default=200, help="Chunk per run sintetica")
+    parser.add_argument("--batch-runs", type=int, default=20, help="Run per commit (un segmento per commit)")
+    parser.add_argument("--chunk-tokens", type=int, default=300, help="Parole per chunk sintetico")
+    parser.add_argument("--vocab", type=int, default=50_000, help="Dimensione del vocabolario sintetico")
+    parser.add_argument("--queries", type=int, default=300, help="Query per fase (cold / warm)")
+    parser.add_argument("-k", type=int, default=10, help="Risultati per query")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmarks/results/index_bench.json", help="Report JSON")
+    args = parser.parse_args()
+
+    index_dir = Path(args.index) if args.index else Path(tempfile.mkdtemp(prefix="chunk_index_"))
+    if index_dir.exists() and args.index is None:
+        shutil.rmtree(index_dir)
+
+    index = ChunkIndex(index_dir, tokenizer=args.tokenizer)
+    rng = random.Random(args.seed + 1)
+    query_words: List[str] = []
+
+    # 1. Indicizzazione incrementale
+    t0 = time.perf_counter()
+    indexed = 0
+    commits = 0
+    if args.from_runs:
+        run_dirs = find_run_dirs(args.from_runs)
+        for start in range(0, len(run_dirs), args.batch_runs):
+            indexed += index.add_runs(run_dirs[start:start + args.batch_runs])
+            commits += 1
+        for hit in index.search("a", k=1):
+            query_words.extend(hit.focus.split()[:50])
+    else:
+        batch: Dict[str, Any] = {}
+        for run_key, file_name, chunks in synthetic_runs(args.chunks, args.runs_size, args.chunk_tokens,
+                                                          args.vocab, args.seed):
+            batch[run_key] = (file_name, chunks)
+            if len(query_words) < 5000:
+                query_words.extend(chunks[0]["focus"].split()[:50])
+            if len(batch) >= args.batch_runs:
+                indexed += index.add_chunks(batch)
+                commits += 1
+                batch = {}
+                print(f"  indexed {indexed} chunks, {len(index.manifest['segments'])} segments, "
+                      f"{indexed / (time.perf_counter() - t0):,.0f} chunks/s")
+        if batch:
+            indexed += index.add_chunks(batch)
+            commits += 1
+    index_s = time.perf_counter() - t0
+    segments_before_merge = len(index.manifest["segments"])
+
+    t0 = time.perf_counter()
+    index.merge()
+    merge_s = time.perf_counter() - t0
+    stats = index.stats()
+    index.close()
+
+    # 2. Query: indice riaperto (cold), poi stesse query a cache calda (warm)
+    queries = [" ".join(rng.sample(query_words, rng.randint(1, 4))) for _ in range(args.queries)] \
+        if query_words else []
+    t0 = time.perf_counter()
+    reader = ChunkIndex(index_dir)
+    open_ms = (time.perf_counter() - t0) * 1000
+    cold = _run_queries(reader, queries, args.k)
+    warm = _run_queries(reader, queries, args.k)
+    reader.close()
+
+    report = {
+        "config": vars(args),
+        "indexing": {
+            "chunks": indexed,
+            "commits": commits,
+            "segments_before_merge": segments_before_merge,
+            "elapsed_s": round(index_s, 2),
+            "chunks_per_s": round(indexed / index_s, 1) if index_s > 0 else None,
+            "final_merge_s": round(merge_s, 2),
+        },
+        "index": stats,
+        "open_ms": round(open_ms, 2),
+        "query_cold": cold,
+        "query_warm": warm,
+    }
+
+    print("\n================ CHUNK INDEX BENCHMARK ================")
+    print(f"Indexed {indexed:,} chunks in {index_s:.1f}s ({report['indexing']['chunks_per_s']:,} chunks/s), "
+          f"{commits} commits, final merge {merge_s:.1f}s, {stats['size_mb']} MB on disk")
+    for phase, result in (("cold", cold), ("warm", warm)):
+        lat = result["latency_ms"]
+        print(f"Query {phase:<4}: p50 {lat['p50']:.2f} ms  p95 {lat['p95']:.2f} ms  p99 {lat['p99']:.2f} ms  "
+              f"max {lat['max']:.2f} ms  ({result['queries']} queries, k={args.k})")
+    print("=======================================================")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {output}")
+
+    if args.index is None:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Load test end-to-end del percorso Kafka -> Docling -> MinIO (app.py / KafkaListener).
+
+Esempio:
+    python benchmarks/kafka_load.py benchmarks/kafka_load.json
+
+Per ogni run del file di config:
+1. carica il corpus in un FakeMinio (latenza/banda simulate)
+2. pubblica su un FakeKafka eventi ExtractionRequested sintetici (burst o Poisson, con seed)
+3. esegue il KafkaListener vero con le impostazioni di concorrenza della run
+4. misura documenti/minuto, latenza end-to-end (pubblicazione -> upload completato),
+   lag del consumer nel tempo e picco di memoria (processo + eventuali worker isolati)
+
+Il report JSON completo (serie temporali incluse) viene scritto in "output".
+Con "converter": "synthetic" la conversione Docling è sostituita da un'attesa
+proporzionale alla dimensione del file: misura solo Kafka, MinIO e concorrenza.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.fakes import FakeConsumer, FakeKafka, FakeMinio, FakeProducer  # noqa: E402
+from docparser.isolation import IsolatedWorkerPool, _rss_mb  # noqa: E402
+from docparser.pipeline import InMemoryParseResult  # noqa: E402
+from integretion.events import kafka_listener  # noqa: E402
+from integretion.events.kafka_listener import KafkaListener, KafkaTopics  # noqa: E402
+from integretion.events.retry import RetryPolicy  # noqa: E402
+from integretion.events.stages import StageConfig, StageJob  # noqa: E402
+from integretion.minio import minio_service  # noqa: E402
+from integretion.minio.minio_service import download_document_bytes_from_minio  # noqa: E402
+from integretion.models import ExtractionRequested  # noqa: E402
+
+SUPPORTED_EXTENSIONS = {".pdf", ".jpg", ".jpeg", ".png"}
+CORPUS_BUCKET = "corpus"
+GROUP_ID = "load-test"
+
+DEFAULTS: Dict[str, Any] = {
+    "corpus": "dataset",
+    "seed": 42,
+    "events": 20,
+    # {"mode": "burst"} oppure {"mode": "poisson", "rate_per_s": 0.5}
+    "arrival": {"mode": "burst"},
+    "partitions": 3,
+    "converter": "docling",       # "docling" | "synthetic"
+    "synthetic_base_s": 0.5,
+    "synthetic_s_per_mb": 2.0,
+    "profile": "fast",
+    "minio_latency_ms": 5.0,
+    "minio_bandwidth_mb_s": 200.0,
+    "sample_interval_s": 1.0,
+    "timeout_s": 3600.0,
+    "log_level": "WARNING",
+    "output": "benchmarks/results/kafka_load.json",
+    "runs": [{"name": "default"}],
+}
+
+
+# =========================================================
+#  Listener instrumentato
+# =========================================================
+
+class BenchListener(KafkaListener):
+    """KafkaListener collegato ai fake, che registra la fine di ogni job."""
+
+    def __init__(self, broker: FakeKafka, on_done, synthetic: Optional[Dict[str, float]] = None, **kwargs):
+        super().__init__(bootstrap_servers="in-process", group_id=GROUP_ID, **kwargs)
+        self.broker = broker
+        self.on_done = on_done
+        self.synthetic = synthetic
+
+    def _create_consumer(self):
+        return FakeConsumer(self.broker, GROUP_ID)
+
+    def _create_producer(self):
+        return FakeProducer(self.broker)
+
+    async def process_event(self, event: ExtractionRequested):
+        try:
+            await super().process_event(event)
+        except Exception:
+            self.on_done(event.job_id, ok=False)
+            raise
+        self.on_done(event.job_id, ok=True)
+
+    # --- converter sintetico -------------------------------------------
+
+    def _synthetic_result(self, event: ExtractionRequested, data: bytes) -> InMemoryParseResult:
+        cost = self.synthetic["base_s"] + self.synthetic["s_per_mb"] * len(data) / (1024 * 1024)
+        time.sleep(cost)
+        markdown = f"# {event.file_name}\n\nsynthetic output ({len(data)} bytes)\n"
+        return InMemoryParseResult(
+            ocr_enabled=False,
+            ocr_engine_name="synthetic",
+            file_name=event.file_name,
+            markdown=markdown,
+            markdown_body=markdown,
+            chunks=[{"chunk_id": 0, "text": markdown}],
+            images={},
+            stats={"timings": {"convert_s": cost}},
+        )
+
+    async def _convert_and_upload(self, event: ExtractionRequested, profile: str):
+        if self.synthetic is None or self.pipeline is not None:
+            await super()._convert_and_upload(event, profile)
+            return
+        data = await download_document_bytes_from_minio(event, self.minio_client)
+        result = await asyncio.to_thread(self._synthetic_result, event, data)
+        await self._upload(result, event)
+
+    async def _stage_convert(self, job: StageJob):
+        if self.synthetic is None:
+            return await super()._stage_convert(job)
+        return await asyncio.to_thread(self._synthetic_result, job.event, job.payload)
+
+    async def _stage_convert_batch(self, jobs: List[StageJob]) -> List[Any]:
+        if self.synthetic is None:
+            return await super()._stage_convert_batch(jobs)
+        # il converter sintetico non ha un percorso batch: un documento alla volta
+        return [await self._stage_convert(job) for job in jobs]
+
+
+# =========================================================
+#  Run
+# =========================================================
+
+def _collect_corpus(path: Path) -> List[Path]:
+    if path.is_file():
+        return [path]
+    return sorted(p for p in path.iterdir() if p.suffix.lower() in SUPPORTED_EXTENSIONS)
+
+
+def _arrival_offsets(config: Dict[str, Any], rng: random.Random) -> List[float]:
+    arrival = config["arrival"]
+    if arrival.get("mode", "burst") == "burst":
+        return [0.0] * config["events"]
+    rate = float(arrival["rate_per_s"])
+    t, offsets = 0.0, []
+    for _ in range(config["events"]):
+        offsets.append(t)
+        t += rng.expovariate(rate)
+    return offsets
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _memory_mb(worker_pool: Optional[IsolatedWorkerPool]) -> float:
+    total = _rss_mb(os.getpid()) or 0.0
+    if worker_pool is not None:
+        for pid in worker_pool.live_pids():
+            total += _rss_mb(pid) or 0.0
+    return total
+
+
+async def run_once(config: Dict[str, Any], run: Dict[str, Any], corpus: List[Path]) -> Dict[str, Any]:
+    rng = random.Random(config["seed"])
+    # la cache dei bucket è per processo: ogni run parte da un FakeMinio vuoto
+    minio_service._known_buckets.clear()
+    broker = FakeKafka(partitions=config["partitions"])
+    minio = FakeMinio(latency_ms=config["minio_latency_ms"], bandwidth_mb_s=config["minio_bandwidth_mb_s"])
+    minio.make_bucket(CORPUS_BUCKET)
+    for path in corpus:
+        data = path.read_bytes()
+        minio.objects[(CORPUS_BUCKET, path.name)] = (data, "application/octet-stream")
+
+    worker_pool = None
+    if run.get("isolated_workers"):
+        worker_pool = IsolatedWorkerPool(workers=run["isolated_workers"], timeout_s=config["timeout_s"])
+
+    synthetic = None
+    if config["converter"] == "synthetic":
+        if worker_pool is not None:
+            raise ValueError("isolated_workers is not supported with the synthetic converter")
+        synthetic = {"base_s": config["synthetic_base_s"], "s_per_mb": config["synthetic_s_per_mb"]}
+
+    produced_at: Dict[str, float] = {}
+    latencies: List[float] = []
+    outcome = {"ok": 0, "failed": 0}
+    all_done = asyncio.Event()
+
+    def on_done(job_id: str, ok: bool) -> None:
+        outcome["ok" if ok else "failed"] += 1
+        if ok:
+            latencies.append(time.time() - produced_at[job_id])
+        if outcome["ok"] + outcome["failed"] >= config["events"]:
+            all_done.set()
+
+    listener = BenchListener(
+        broker,
+        on_done,
+        synthetic=synthetic,
+        minio_client=minio,
+        worker_pool=worker_pool,
+        in_memory=run.get("in_memory", False),
+        default_profile=run.get("profile", config["profile"]),
+        max_in_flight=run.get("max_in_flight"),
+        poll_timeout_ms=200,
+        bundle_uploads=run.get("bundle_uploads", False),
+        retry_policy=RetryPolicy(**run["retry"]) if run.get("retry") else None,
+        stages=StageConfig(**run["stages"]) if run.get("stages") is not None else None,
+    )
+
+    topic = KafkaTopics.EXTRACTION_REQUESTED
+    offsets = _arrival_offsets(config, rng)
+    documents = [rng.choice(corpus) for _ in offsets]
+
+    async def produce():
+        t0 = time.monotonic()
+        for i, (offset, path) in enumerate(zip(offsets, documents)):
+            delay = offset - (time.monotonic() - t0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            event = ExtractionRequested(
+                job_id=f"job-{i:05d}",
+                collection_id=1,
+                file_id=f"file-{i:05d}",
+                bucket=CORPUS_BUCKET,
+                object_key=path.name,
+                file_name=path.name,
+            )
+            produced_at[event.job_id] = time.time()
+            broker.produce(topic, json.dumps(asdict(event)).encode("utf-8"), key=event.job_id.encode("utf-8"))
+
+    timeline: List[Dict[str, float]] = []
+    peak_mb = 0.0
+    t_start = time.monotonic()
+
+    async def sample():
+        nonlocal peak_mb
+        while True:
+            memory = _memory_mb(worker_pool)
+            peak_mb = max(peak_mb, memory)
+            timeline.append({
+                "t_s": round(time.monotonic() - t_start, 2),
+                "lag": broker.lag(GROUP_ID, topic),
+                "published": sum(broker.end_offset(tp) for tp in broker.topic_partitions(topic)),
+                "completed": outcome["ok"] + outcome["failed"],
+                "in_flight": len(listener._tasks),
+                "rss_mb": round(memory, 1),
+            })
+            await asyncio.sleep(config["sample_interval_s"])
+
+    listener_task = asyncio.create_task(listener.start())
+    producer_task = asyncio.create_task(produce())
+    sampler_task = asyncio.create_task(sample())
+    timed_out = False
+    try:
+        await asyncio.wait_for(all_done.wait(), timeout=config["timeout_s"])
+    except asyncio.TimeoutError:
+        timed_out = True
+    wall = time.monotonic() - t_start
+
+    await listener.stop()
+    await listener_task
+    producer_task.cancel()
+    sampler_task.cancel()
+    await asyncio.gather(producer_task, sampler_task, return_exceptions=True)
+    if worker_pool is not None:
+        worker_pool.close()
+
+    ok = outcome["ok"]
+    return {
+        "name": run.get("name", "run"),
+        "settings": run,
+        "events": config["events"],
+        "completed": ok,
+        "failed": outcome["failed"],
+        "timed_out": timed_out,
+        "wall_s": round(wall, 2),
+        "docs_per_min": round(ok / wall * 60, 2) if wall > 0 else 0.0,
+        "latency_s": {
+            "mean": round(statistics.mean(latencies), 3) if latencies else None,
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else None,
+        },
+        "max_lag": max((s["lag"] for s in timeline), default=0),
+        "peak_rss_mb": round(peak_mb, 1),
+        "minio": {"requests": minio.requests, "bytes_in": minio.bytes_in, "bytes_out": minio.bytes_out},
+        "pipeline": listener.pipeline.metrics() if listener.pipeline is not None else None,
+        "timeline": timeline,
+    }
+
+
+def load_config(path: Optional[str]) -> Dict[str, Any]:
+    config = dict(DEFAULTS)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test end-to-end Kafka -> MinIO con stand-in in-process")
+    parser.add_argument("config", nargs="?", help="File JSON di configurazione (vedi benchmarks/kafka_load.json)")
+    parser.add_argument("--only", help="Esegue solo la run con questo nome")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    logging.getLogger().setLevel(config["log_level"])
+    for name in ("integretion", kafka_listener.__name__):
+        logging.getLogger(name).setLevel(config["log_level"])
+
+    corpus = _collect_corpus(Path(config["corpus"]))
+    if not corpus:
+        print("Nessun file supportato trovato nel corpus.")
+        return
+
+    runs = [r for r in config["runs"] if not args.only or r.get("name") == args.only]
+    results = []
+    for run in runs:
+        print(f"\n>>> Run '{run.get('name', 'run')}': {config['events']} events, settings={run}")
+        results.append(asyncio.run(run_once(config, run, corpus)))
+
+    print("\n================ KAFKA -> MINIO LOAD TEST ================")
+    print(f"{'run':<20} {'docs/min':>9} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max lag':>8} {'peak MB':>9} {'failed':>7}")
+    for r in results:
+        lat = r["latency_s"]
+        print(f"{r['name']:<20} {r['docs_per_min']:>9.2f} {lat['p50']:>8.2f} {lat['p95']:>8.2f} "
+              f"{lat['p99']:>8.2f} {r['max_lag']:>8} {r['peak_rss_mb']:>9.1f} {r['failed']:>7}"
+              + ("  (timed out)" if r["timed_out"] else ""))
+    print(f"Process peak RSS (ru_maxrss): {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    print("===========================================================")
+
+    output = Path(config["output"])
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"config": config, "results": results}, f, indent=2, default=str)
+    print(f"Report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
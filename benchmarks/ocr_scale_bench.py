@@ -0,0 +1,174 @@
+"""
+Benchmark scala OCR fissa vs adattiva (docparser.ocr_scale).
+
+Esempio:
+    python benchmarks/ocr_scale_bench.py dataset/ --profile balanced --repeat 2
+    python benchmarks/ocr_scale_bench.py dataset/ --ground-truth dataset/gt/
+
+Per ogni file di dataset/ con OCR attivo converte il documento:
+- "fixed":    scala di Docling (3x) su tutte le pagine
+- "adaptive": scala per pagina stimata dall'altezza del testo
+- "reference" (solo senza --ground-truth): scala massima, usata come riferimento
+
+e riporta pagine/s e accuratezza contro il riferimento (o contro <stem>.txt in
+--ground-truth): similarità a livello di carattere (difflib) e recall delle parole.
+"""
+
+import argparse
+import difflib
+import json
+import re
+import sys
+import time
+from collections import Counter
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from docparser.ocr_scale import SCALE_BUCKETS  # noqa: E402
+from docparser.pipeline import convert_to_document, get_docling_converter  # noqa: E402
+from docparser.profiles import PROFILES, get_profile  # noqa: E402
+from docparser.utils import should_enable_ocr_for_file  # noqa: E402
+
+SUPPORTED_EXTENSIONS = {".pdf", ".jpg", ".jpeg", ".png", ".tif", ".tiff"}
+
+
+def _collect_files(input_path: Path) -> List[Path]:
+    if input_path.is_file():
+        return [input_path]
+    return sorted(p for p in input_path.iterdir() if p.suffix.lower() in SUPPORTED_EXTENSIONS)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _accuracy(text: str, reference: str) -> Dict[str, float]:
+    hyp, ref = _normalize(text), _normalize(reference)
+    similarity = difflib.SequenceMatcher(None, hyp, ref, autojunk=False).ratio() if (hyp or ref) else 1.0
+    ref_words = Counter(ref.split())
+    hyp_words = Counter(hyp.split())
+    matched = sum((ref_words & hyp_words).values())
+    return {
+        "char_similarity": round(similarity, 4),
+        "word_recall": round(matched / sum(ref_words.values()), 4) if ref_words else 1.0,
+    }
+
+
+def _register_variant(base: str, mode: str) -> str:
+    name = f"{base}-{mode}"
+    PROFILES[name] = replace(get_profile(base), name=name, ocr_scale_mode=mode)
+    return name
+
+
+def _convert(file_path: Path, profile: str) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    converted = convert_to_document(str(file_path), file_label=file_path.name, ocr_enabled=True, profile=profile)
+    elapsed = time.perf_counter() - t0
+    document = converted.document
+    return {
+        "elapsed_s": elapsed,
+        "pages": max(1, len(document.pages) if getattr(document, "pages", None) else 1),
+        "text": document.export_to_text(),
+        "ocr_scales": converted.ocr_scales,
+        "ocr_languages": converted.ocr_languages,
+    }
+
+
+def _convert_reference(file_path: Path, profile: str, ocr_languages: List[str]) -> str:
+    """Riferimento: tutte le pagine alla scala massima, con le lingue OCR delle run misurate."""
+    converter, _ = get_docling_converter(
+        ocr_enabled=True,
+        use_rapidocr=False,
+        profile=profile,
+        ocr_languages=tuple(ocr_languages) or None,
+        ocr_scale=SCALE_BUCKETS[-1],
+    )
+    return converter.convert(str(file_path)).document.export_to_text()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scala OCR fissa vs adattiva")
+    parser.add_argument("input", help="File o cartella (es. dataset/)")
+    parser.add_argument("--profile", default="balanced", help="Profilo base (default: balanced)")
+    parser.add_argument("--repeat", type=int, default=1, help="Conversioni per file e modalità (si tiene la mediana)")
+    parser.add_argument("--ground-truth", default=None, help="Cartella con <stem>.txt di riferimento")
+    parser.add_argument("--output", default="benchmarks/results/ocr_scale_bench.json", help="Report JSON")
+    args = parser.parse_args()
+
+    files = [f for f in _collect_files(Path(args.input)) if should_enable_ocr_for_file(f)]
+    if not files:
+        print("No OCR input found.")
+        return
+
+    modes = {mode: _register_variant(args.profile, mode) for mode in ("fixed", "adaptive")}
+
+    # warm-up: caricamento modelli fuori dalle misure
+    for profile in modes.values():
+        _convert(files[0], profile)
+
+    rows: List[Dict[str, Any]] = []
+    totals = {mode: {"pages": 0, "elapsed_s": 0.0} for mode in modes}
+    for file_path in files:
+        measured: Dict[str, Dict[str, Any]] = {}
+        for mode, profile in modes.items():
+            runs = [_convert(file_path, profile) for _ in range(max(1, args.repeat))]
+            runs.sort(key=lambda r: r["elapsed_s"])
+            measured[mode] = runs[len(runs) // 2]
+
+        reference: Optional[str] = None
+        if args.ground_truth:
+            gt_path = Path(args.ground_truth) / f"{file_path.stem}.txt"
+            if gt_path.is_file():
+                reference = gt_path.read_text(encoding="utf-8")
+        else:
+            # stesse lingue delle run misurate: si confronta solo la scala
+            reference = _convert_reference(file_path, modes["fixed"], measured["fixed"]["ocr_languages"])
+
+        row: Dict[str, Any] = {"file": file_path.name, "ocr_languages": measured["fixed"]["ocr_languages"]}
+        for mode, run in measured.items():
+            totals[mode]["pages"] += run["pages"]
+            totals[mode]["elapsed_s"] += run["elapsed_s"]
+            row[mode] = {
+                "pages": run["pages"],
+                "elapsed_s": round(run["elapsed_s"], 3),
+                "pages_per_s": round(run["pages"] / run["elapsed_s"], 3) if run["elapsed_s"] > 0 else None,
+                "ocr_scales": run["ocr_scales"],
+                **(_accuracy(run["text"], reference) if reference is not None else {}),
+            }
+        rows.append(row)
+
+    print("\n==================== OCR SCALE BENCHMARK ====================")
+    print(f"{'file':<32} {'mode':<9} {'pages/s':>8} {'sim':>7} {'recall':>7}  scales")
+    for row in rows:
+        for mode in modes:
+            r = row[mode]
+            scales = ", ".join(f"x{s['scale']}" for s in r["ocr_scales"]) or "x3.0 (fixed)"
+            print(f"{row['file'][:32]:<32} {mode:<9} {r['pages_per_s'] or 0:>8.2f} "
+                  f"{r.get('char_similarity', float('nan')):>7.3f} {r.get('word_recall', float('nan')):>7.3f}  {scales}")
+    summary = {}
+    for mode in modes:
+        t = totals[mode]
+        scored = [row[mode] for row in rows if "char_similarity" in row[mode]]
+        summary[mode] = {
+            "pages": t["pages"],
+            "elapsed_s": round(t["elapsed_s"], 2),
+            "pages_per_s": round(t["pages"] / t["elapsed_s"], 3) if t["elapsed_s"] > 0 else None,
+            "mean_char_similarity": round(sum(r["char_similarity"] for r in scored) / len(scored), 4) if scored else None,
+            "mean_word_recall": round(sum(r["word_recall"] for r in scored) / len(scored), 4) if scored else None,
+        }
+        print(f"TOTAL {mode:<9}: {summary[mode]['pages_per_s']} pages/s, "
+              f"similarity {summary[mode]['mean_char_similarity']}, word recall {summary[mode]['mean_word_recall']}")
+    print("=============================================================")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "summary": summary, "files": rows}, f, indent=2)
+    print(f"Report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Load test per `python cli.py serve`.
+
+Esempio:
+    python benchmarks/server_load.py dataset/ --url http://127.0.0.1:8080 --requests 40 --concurrency 4
+
+Invia i file (multipart o path locale) a /convert con N client concorrenti e
+riporta throughput, percentili di latenza e numero di risposte 429/504.
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+SUPPORTED_EXTENSIONS = {".pdf", ".jpg"}
+
+
+def _collect_files(input_path: Path) -> List[Path]:
+    if input_path.is_file():
+        return [input_path]
+    return sorted(p for p in input_path.iterdir() if p.suffix.lower() in SUPPORTED_EXTENSIONS)
+
+
+def _multipart_body(file_path: Path) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{file_path.name}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return head + file_path.read_bytes() + tail, f"multipart/form-data; boundary={boundary}"
+
+
+def _send(url: str, file_path: Path, mode: str, timeout: float) -> Tuple[int, float]:
+    if mode == "upload":
+        body, content_type = _multipart_body(file_path)
+    else:
+        body = json.dumps({"path": str(file_path.resolve())}).encode("utf-8")
+        content_type = "application/json"
+
+    request = urllib.request.Request(
+        f"{url}/convert?include=stats&timeout={timeout}",
+        data=body,
+        headers={"Content-Type": content_type},
+        method="POST",
+    )
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout + 30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = -1
+    return status, time.perf_counter() - t0
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test per il server DocParser")
+    parser.add_argument("input_path", help="File o cartella con i documenti da inviare")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--requests", type=int, default=20, help="Numero totale di richieste")
+    parser.add_argument("--concurrency", type=int, default=2, help="Client concorrenti")
+    parser.add_argument("--mode", choices=["upload", "path"], default="upload")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Timeout per richiesta (secondi)")
+    args = parser.parse_args()
+
+    files = _collect_files(Path(args.input_path))
+    if not files:
+        print("Nessun file supportato trovato.")
+        return
+
+    jobs = [files[i % len(files)] for i in range(args.requests)]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+
+    def worker(file_path: Path) -> None:
+        status, elapsed = _send(args.url, file_path, args.mode, args.timeout)
+        with lock:
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(elapsed)
+
+    print(f"Sending {len(jobs)} requests with concurrency={args.concurrency} to {args.url}...")
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, jobs))
+    wall = time.perf_counter() - t_start
+
+    ok = statuses.get(200, 0)
+    print("\n================ LOAD TEST ================")
+    print(f"Wall time      : {wall:.2f}s")
+    print(f"Status codes   : {dict(statuses)}")
+    print(f"Throughput     : {ok / wall:.3f} doc/s ({ok / wall * 60:.1f} doc/min)")
+    if latencies:
+        print(f"Latency mean   : {statistics.mean(latencies):.2f}s")
+        print(f"Latency p50    : {_percentile(latencies, 50):.2f}s")
+        print(f"Latency p95    : {_percentile(latencies, 95):.2f}s")
+        print(f"Latency p99    : {_percentile(latencies, 99):.2f}s")
+    print("===========================================")
+
+
+if __name__ == "__main__":
+    main()
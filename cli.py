@@ -1,10 +1,143 @@
 import argparse
 import sys
+import time
 
 from docparser.core import process_batch_or_file
+from docparser.dedup import DEFAULT_MAX_DISTANCE, DedupConfig
+from docparser.isolation import IsolatedWorkerPool
+from docparser.profiles import DEFAULT_PROFILE, PROFILES
+from docparser.scheduling import CostModel
+
+
+def serve_main(argv):
+    """`python cli.py serve ...`: avvia il servizio HTTP con modelli caldi."""
+    from docparser.server import serve
+
+    parser = argparse.ArgumentParser(prog="docparser serve", description="Servizio HTTP di conversione DocParser")
+    parser.add_argument("--host", default="127.0.0.1", help="Indirizzo di ascolto")
+    parser.add_argument("--port", type=int, default=8080, help="Porta di ascolto")
+    parser.add_argument("--output", default="output", help="Cartella di destinazione")
+    parser.add_argument("--workers", type=int, default=1, help="Conversioni in parallelo")
+    parser.add_argument("--queue", type=int, default=4, help="Richieste in attesa oltre i worker (poi 429)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Timeout di default per richiesta (secondi)")
+    parser.add_argument("--max-upload-mb", type=int, default=100, help="Dimensione massima upload")
+    parser.add_argument("--rapidocr", action="store_true", help="Usa RapidOCR invece di EasyOCR")
+    parser.add_argument("--no-warmup", action="store_true", help="Non pre-caricare i modelli all'avvio")
+    parser.add_argument("--profile", choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help="Profilo velocità/accuratezza di default (sovrascrivibile per richiesta)")
+
+    args = parser.parse_args(argv)
+    serve(
+        host=args.host,
+        port=args.port,
+        output_root=args.output,
+        max_workers=args.workers,
+        max_queue=args.queue,
+        default_timeout_s=args.timeout,
+        use_rapidocr=args.rapidocr,
+        max_upload_mb=args.max_upload_mb,
+        warmup=not args.no_warmup,
+        profile=args.profile,
+    )
+
+
+def rerender_main(argv):
+    """`python cli.py rerender ...`: rigenera markdown/tabelle/chunk dalle output.json esistenti."""
+    import json
+
+    from docparser.chunking import CHUNK_OVERLAP_TOKENS, CHUNK_SIZE_TOKENS
+    from docparser.rerender import parse_sweep_settings, print_sweep_summary, rerender_all, sweep_all
+
+    parser = argparse.ArgumentParser(prog="docparser rerender",
+                                     description="Re-render e re-chunk delle run dir da output.json, senza riconvertire")
+    parser.add_argument("path", help="Run dir o cartella che contiene run dir (es. output/)")
+    parser.add_argument("--workers", type=int, default=1, help="Run dir elaborate in parallelo (processi)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE_TOKENS, help="Dimensione chunk in token")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP_TOKENS, help="Overlap tra chunk in token")
+    parser.add_argument("--sweep", default=None,
+                        help="Solo statistiche, nessuna scrittura: lista size:overlap, es. 512:50,1024:100,2048:200")
+    parser.add_argument("--report", default=None, help="File JSON in cui salvare il report")
+
+    args = parser.parse_args(argv)
+    if args.sweep:
+        report = sweep_all(args.path, parse_sweep_settings(args.sweep), workers=args.workers)
+        print_sweep_summary(report["settings"])
+    else:
+        report = rerender_all(args.path, workers=args.workers,
+                              chunk_size_tokens=args.chunk_size, chunk_overlap_tokens=args.chunk_overlap)
+        print(f"\n[DONE] Re-rendered {len(report['runs'])} run dirs in {report['elapsed_s']:.1f}s.")
+
+    if report["failures"]:
+        print(f"[WARNING] {len(report['failures'])} run dirs failed.")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report saved to {args.report}")
+    sys.exit(1 if report["failures"] else 0)
+
+
+def index_main(argv):
+    """`python cli.py index add|query|merge|stats ...`: indice BM25 locale sui chunk delle run."""
+    import json
+
+    from docparser.indexing import TOKENIZERS, ChunkIndex
+    from docparser.rerender import find_run_dirs
+
+    parser = argparse.ArgumentParser(prog="docparser index", description="Indice BM25 sui chunk delle run")
+    parser.add_argument("--index", default="output/_index", help="Cartella dell'indice")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Indicizza (o reindicizza) run dir")
+    add.add_argument("paths", nargs="+", help="Run dir o cartelle che contengono run dir")
+    add.add_argument("--tokenizer", choices=list(TOKENIZERS), default=None,
+                     help="Solo per un indice nuovo (default: il tokenizer del chunking)")
+
+    query = commands.add_parser("query", help="Cerca nei chunk")
+    query.add_argument("text", help="Testo della query")
+    query.add_argument("-k", type=int, default=10, help="Numero di risultati")
+    query.add_argument("--json", action="store_true", help="Output JSON (prev/focus/next completi)")
+
+    commands.add_parser("merge", help="Fonde tutti i segmenti in uno")
+    commands.add_parser("stats", help="Statistiche dell'indice")
+
+    args = parser.parse_args(argv)
+    index = ChunkIndex(args.index, tokenizer=getattr(args, "tokenizer", None))
+
+    if args.command == "add":
+        run_dirs = [run_dir for path in args.paths for run_dir in find_run_dirs(path)]
+        t0 = time.perf_counter()
+        count = index.add_runs(run_dirs)
+        print(f"Indexed {count} chunks from {len(run_dirs)} run dirs in {time.perf_counter() - t0:.2f}s")
+    elif args.command == "query":
+        t0 = time.perf_counter()
+        hits = index.search(args.text, k=args.k)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        if args.json:
+            print(json.dumps([hit.to_dict() for hit in hits], ensure_ascii=False, indent=2))
+        else:
+            for rank, hit in enumerate(hits, start=1):
+                pages = ",".join(str(p) for p in hit.pages) or "-"
+                print(f"{rank:>2}. {hit.score:6.2f}  {hit.file_name} #{hit.chunk_id} (pages {pages})")
+                print(f"    {hit.focus[:200].replace(chr(10), ' ')}")
+            print(f"{len(hits)} results in {elapsed_ms:.1f} ms")
+    elif args.command == "merge":
+        index.merge()
+
+    print(json.dumps(index.stats(), indent=2))
+    index.close()
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "rerender":
+        rerender_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "index":
+        index_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="CLI Client per DocParser Library")
 
     # Aggiorniamo l'help per dire che accetta anche cartelle
@@ -12,16 +145,53 @@ def main():
     parser.add_argument("--rapidocr", action="store_true", help="Usa RapidOCR invece di EasyOCR")
     parser.add_argument("--openai", action="store_true", help="Usa OpenAI per report extra")
     parser.add_argument("--output", default="output", help="Cartella di destinazione")
+    parser.add_argument("--profile", choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help="Profilo velocità/accuratezza: fast, balanced, accurate")
+    parser.add_argument("--workers", type=int, default=1, help="Documenti processati in parallelo")
+    parser.add_argument("--schedule", choices=["lpt", "spt", "name"], default="lpt",
+                        help="Ordine di elaborazione: più pesanti prima (lpt), più leggeri prima (spt), alfabetico (name)")
+    parser.add_argument("--cost-model", default=None, help="JSON con i coefficienti calibrati del cost model")
+    parser.add_argument("--isolate", action="store_true",
+                        help="Processa ogni documento in un processo worker isolato e riciclabile")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Timeout per documento in secondi (con --isolate)")
+    parser.add_argument("--max-rss-mb", type=float, default=None, help="Tetto di memoria per worker in MB (con --isolate)")
+    parser.add_argument("--max-tasks-per-worker", type=int, default=20,
+                        help="Documenti dopo i quali il worker viene riavviato (con --isolate)")
+    parser.add_argument("--index", default=None,
+                        help="Indice BM25 dei chunk aggiornato a ogni run completata (es. output/_index)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Converte immagini e PDF di 1-2 pagine a gruppi con convert_all (1 = uno alla volta)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Non riconverte i quasi-duplicati (stessa pagina come jpg/pdf, ri-scansioni): alias del canonico")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_MAX_DISTANCE,
+                        help="Frazione massima di bit diversi del dHash per pagina (con --dedup)")
 
     args = parser.parse_args()
 
+    worker_pool = None
+    if args.isolate:
+        worker_pool = IsolatedWorkerPool(
+            workers=args.workers,
+            timeout_s=args.timeout,
+            max_rss_mb=args.max_rss_mb,
+            max_tasks_per_worker=args.max_tasks_per_worker,
+        )
+
     try:
         # Chiamiamo la funzione che gestisce sia file singolo che cartella
         results = process_batch_or_file(
             input_path=args.input_path,
             output_root=args.output,
             use_rapidocr=args.rapidocr,
-            use_openai=args.openai
+            use_openai=args.openai,
+            workers=args.workers,
+            schedule=args.schedule,
+            cost_model=CostModel.load(args.cost_model) if args.cost_model else None,
+            worker_pool=worker_pool,
+            profile=args.profile,
+            index_dir=args.index,
+            batch_size=args.batch_size,
+            dedup=DedupConfig(max_distance=args.dedup_threshold) if args.dedup else None,
         )
 
         if results:
@@ -37,6 +207,9 @@ def main():
     except Exception as e:
         print(f"\n[FATAL ERROR] Errore imprevisto nel client: {e}")
         sys.exit(1)
+    finally:
+        if worker_pool is not None:
+            worker_pool.close()
 
 
 if __name__ == "__main__":
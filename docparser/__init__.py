@@ -1,3 +1,4 @@
-from .core import process_document
+from .core import process_document, parse_bytes, parse_stream, save_parse_result, convert_bytes
+from .pipeline import render_converted
 
-__all__ = ["process_document"]
\ No newline at end of file
+__all__ = ["process_document", "parse_bytes", "parse_stream", "save_parse_result", "convert_bytes", "render_converted"]
\ No newline at end of file
@@ -0,0 +1,196 @@
+# batching.py
+
+"""
+Conversione batch di documenti piccoli con DocumentConverter.convert_all.
+
+Cartelle come dataset/ sono fatte quasi solo di JPG e PDF di una pagina: convertendoli uno
+alla volta l'overhead per chiamata (setup della conversione, pre-pass, pipeline) pesa quanto
+la conversione e i modelli layout/OCR vedono batch di una sola pagina.
+
+convert_batch raggruppa gli input con le stesse impostazioni OCR (OCR sì/no, lingue, scala:
+cioè lo stesso converter in cache), li converte insieme con convert_all e batch size dei
+modelli più grandi, e restituisce un ConvertedDocument per input: il post-processing
+(render_converted) resta per documento.
+
+Gli input non batchabili (più intervalli di scala) o falliti nel batch tornano None:
+il chiamante li converte uno alla volta come prima, con gli stessi errori.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from docling.datamodel.base_models import ConversionStatus, DocumentStream
+from docling.datamodel.settings import settings
+
+from docparser.pipeline import ConvertedDocument, OcrPlan, _fresh_source, build_converted_document, \
+    get_docling_converter, plan_converters, plan_ocr
+from docparser.profiles import DEFAULT_PROFILE
+from docparser.sharding import count_pdf_pages
+from docparser.utils import should_enable_ocr_for_file
+
+# Documenti per chiamata a convert_all
+DEFAULT_BATCH_SIZE = 8
+# Documenti di un batch convertiti in parallelo da Docling (settings.perf.doc_batch_concurrency)
+BATCH_DOC_CONCURRENCY = 4
+# Batch size dei modelli layout/OCR/tabelle nei converter batch (pagine per chiamata)
+MODEL_BATCH_SIZE = 16
+
+# Input "piccoli": poche pagine e pochi MB (oltre conviene la conversione singola)
+SMALL_INPUT_MAX_PAGES = 2
+SMALL_INPUT_MAX_MB = 20.0
+
+SUCCESS_STATUSES = (ConversionStatus.SUCCESS, ConversionStatus.PARTIAL_SUCCESS)
+
+_settings_lock = threading.Lock()
+
+
+@dataclass
+class BatchItem:
+    source: Union[str, Path, DocumentStream]
+    file_label: str
+    # None = decisione dal file (solo per i path), come in convert_source
+    ocr_enabled: Optional[bool] = None
+
+
+@dataclass
+class _PlannedItem:
+    index: int
+    item: BatchItem
+    ocr_enabled: bool
+    plan: Optional[OcrPlan]
+    plan_s: float
+
+
+def is_small_input(source: Union[str, Path, bytes], file_name: str,
+                   max_pages: int = SMALL_INPUT_MAX_PAGES, max_mb: float = SMALL_INPUT_MAX_MB) -> bool:
+    """Immagini e PDF fino a max_pages pagine, entro max_mb: candidati alla conversione batch."""
+    mime, _ = guess_type(file_name)
+    if mime is None or not (mime == "application/pdf" or mime.startswith("image/")):
+        return False
+    size = len(source) if isinstance(source, bytes) else Path(source).stat().st_size
+    if size > max_mb * 1024 * 1024:
+        return False
+    if mime != "application/pdf":
+        return True
+    data = source if isinstance(source, bytes) else Path(source).read_bytes()
+    try:
+        return count_pdf_pages(data) <= max_pages
+    except Exception:
+        return False
+
+
+@contextmanager
+def docling_batch_settings(doc_batch_size: int, doc_concurrency: int):
+    """
+    settings.perf di Docling è globale: lo impostiamo per la durata di un convert_all e lo
+    ripristiniamo. Il lock serializza i batch; le conversioni singole (un documento per
+    chiamata) non dipendono da questi valori.
+    """
+    with _settings_lock:
+        previous = (settings.perf.doc_batch_size, settings.perf.doc_batch_concurrency)
+        settings.perf.doc_batch_size = doc_batch_size
+        settings.perf.doc_batch_concurrency = doc_concurrency
+        try:
+            yield
+        finally:
+            settings.perf.doc_batch_size, settings.perf.doc_batch_concurrency = previous
+
+
+def _plan_item(index: int, item: BatchItem, profile: str) -> _PlannedItem:
+    t_start = time.perf_counter()
+    ocr_enabled = item.ocr_enabled
+    if ocr_enabled is None:
+        ocr_enabled = should_enable_ocr_for_file(str(item.source))
+    plan = plan_ocr(item.source, profile) if ocr_enabled else None
+    return _PlannedItem(index, item, ocr_enabled, plan, time.perf_counter() - t_start)
+
+
+def group_compatible(
+        planned: Sequence[_PlannedItem],
+        profile: str = DEFAULT_PROFILE,
+) -> Dict[Tuple, List[_PlannedItem]]:
+    """
+    Raggruppa gli input per converter: (ocr_enabled, lingue, scala OCR).
+    Gli input con più intervalli di scala restano fuori (conversione singola).
+    """
+    groups: Dict[Tuple, List[_PlannedItem]] = {}
+    for entry in planned:
+        languages_key, ranges = plan_converters(entry.plan, profile)
+        if len(ranges) > 1:
+            continue
+        key = (entry.ocr_enabled, languages_key, ranges[0][1])
+        groups.setdefault(key, []).append(entry)
+    return groups
+
+
+def convert_batch(
+        items: Sequence[BatchItem],
+        use_rapidocr: bool = False,
+        profile: str = DEFAULT_PROFILE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        doc_concurrency: int = BATCH_DOC_CONCURRENCY,
+) -> List[Optional[ConvertedDocument]]:
+    """
+    Converte items a gruppi compatibili di al più batch_size documenti con convert_all.
+    Ritorna una lista allineata a items: None per gli input da convertire singolarmente.
+
+    Il tempo di conversione del batch è ripartito in parti uguali tra i documenti
+    (timings["convert_s"], più i pre-pass del documento); timings["batch_convert_s"]
+    è il tempo dell'intero convert_all.
+    """
+    results: List[Optional[ConvertedDocument]] = [None] * len(items)
+
+    planned: List[_PlannedItem] = []
+    for index, item in enumerate(items):
+        try:
+            planned.append(_plan_item(index, item, profile))
+        except Exception as e:
+            print(f"Batch: OCR planning failed for {item.file_label}, converting it alone: {e}")
+
+    for (ocr_enabled, languages_key, ocr_scale), group in group_compatible(planned, profile).items():
+        converter, ocr_engine_name = get_docling_converter(
+            ocr_enabled=ocr_enabled,
+            use_rapidocr=use_rapidocr,
+            profile=profile,
+            ocr_languages=languages_key,
+            ocr_scale=ocr_scale,
+            model_batch_size=max(MODEL_BATCH_SIZE, batch_size),
+        )
+        for start in range(0, len(group), batch_size):
+            chunk = group[start:start + batch_size]
+            print(f"Batch: converting {len(chunk)} document(s) with convert_all "
+                  f"(OCR {'on' if ocr_enabled else 'off'}, languages {languages_key or 'profile'}, "
+                  f"scale {ocr_scale or 'default'})")
+            t_start = time.perf_counter()
+            try:
+                with docling_batch_settings(len(chunk), min(doc_concurrency, len(chunk))):
+                    conv_results = list(converter.convert_all(
+                        [_fresh_source(entry.item.source) for entry in chunk],
+                        raises_on_error=False,
+                    ))
+            except Exception as e:
+                print(f"Batch conversion failed, converting its {len(chunk)} documents one by one: {e}")
+                continue
+            elapsed = time.perf_counter() - t_start
+
+            for entry, conv_result in zip(chunk, conv_results):
+                if conv_result.status not in SUCCESS_STATUSES or conv_result.document is None:
+                    errors = "; ".join(str(getattr(err, "error_message", err)) for err in conv_result.errors)
+                    print(f"Batch: {entry.item.file_label} not converted ({conv_result.status}), "
+                          f"retrying alone: {errors}")
+                    continue
+                timings = {
+                    "convert_s": entry.plan_s + elapsed / len(chunk),
+                    "batch_convert_s": elapsed,
+                }
+                results[entry.index] = build_converted_document(
+                    conv_result.document, entry.item.file_label, ocr_enabled, ocr_engine_name,
+                    profile, timings, entry.plan, batch_size=len(chunk),
+                )
+
+    return results
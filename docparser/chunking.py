@@ -1,40 +1,127 @@
 
-from typing import List, Dict, Any, Union
+from bisect import bisect_right
+from typing import List, Dict, Any, Union, Optional, Sequence, Tuple
+from functools import lru_cache
 from pathlib import Path
 import json
+import os
 
 import langchain_text_splitters
 from docling_core.transforms.chunker import HybridChunker
 from langchain_text_splitters import MarkdownHeaderTextSplitter
 from transformers import AutoTokenizer
 
+# Tokenizer del chunking: nome su HuggingFace Hub o cartella locale, sovrascrivibile con
+# DOCPARSER_TOKENIZER (es. il tokenizer offline dei test golden)
+TOKENIZER_NAME = os.environ.get("DOCPARSER_TOKENIZER") or "sentence-transformers/all-MiniLM-L6-v2"
+
+# Parametri di chunking di default (in token)
+CHUNK_SIZE_TOKENS = 2048
+CHUNK_OVERLAP_TOKENS = 200
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(name: str = TOKENIZER_NAME, model_max_length: Optional[int] = None):
+    """
+    Carica (una volta sola per processo) il tokenizer HuggingFace usato dal chunking.
+    """
+    if model_max_length is not None:
+        return AutoTokenizer.from_pretrained(name, model_max_length=model_max_length)
+    return AutoTokenizer.from_pretrained(name)
+
+
 #TODO devo passare tutto il testo al chunker e non un pezzo alla volta
 def generate_markdown_chunks_from_string(
         markdown_text: str,
         output_path: Union[str, Path],
         source_name: str = "docling_clean_smart"
-):
+) -> Optional[List[Dict[str, Any]]]:
     """
-    Esegue il chunking semantico/strutturale su una stringa Markdown già pulita.
+    Esegue il chunking semantico/strutturale su una stringa Markdown già pulita
+    (vedi build_markdown_chunks) e salva il risultato in output_path.
+
+    Ritorna anche la lista dei chunk scritti (None se il tokenizer non è disponibile).
+    """
+    chunks_data = build_markdown_chunks(markdown_text, source_name=source_name)
+    if chunks_data is None:
+        return None
+    write_chunks(chunks_data, output_path)
+    return chunks_data
+
+
+def write_chunks(chunks_data: List[Dict[str, Any]], output_path: Union[str, Path]) -> None:
+    """Salva i chunk (formato prev/focus/next) su file JSON."""
+    out_path_obj = Path(output_path)
+    out_path_obj.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(out_path_obj, "w", encoding="utf-8") as f:
+        json.dump(chunks_data, f, ensure_ascii=False, indent=2)
+
+    print(f"Generati {len(chunks_data)} chunk (con prev/focus/next) salvati in {output_path}")
+
+
+def locate_page_anchors(
+        markdown_text: str,
+        parts: Sequence[str],
+        pages: Sequence[Optional[int]],
+) -> List[Tuple[int, int]]:
+    """
+    Posizione nel markdown finale di ogni parte generata (in ordine) con la sua pagina:
+    [(offset, page_no), ...] crescente. Le parti che non si trovano più (tabelle sostituite
+    dal merge, placeholder delle immagini) vengono saltate.
+    """
+    anchors: List[Tuple[int, int]] = []
+    cursor = 0
+    for part, page in zip(parts, pages):
+        snippet = part[:200]
+        if page is None or not snippet.strip():
+            continue
+        offset = markdown_text.find(snippet, cursor)
+        if offset < 0:
+            continue
+        if not anchors or anchors[-1][1] != page:
+            anchors.append((offset, page))
+        cursor = offset + len(snippet)
+    return anchors
+
+
+def pages_for_span(anchors: Sequence[Tuple[int, int]], start: int, end: int) -> List[int]:
+    """Pagine coperte dal testo [start, end) del markdown, dati gli anchor di locate_page_anchors."""
+    if not anchors:
+        return []
+    offsets = [offset for offset, _ in anchors]
+    first = max(0, bisect_right(offsets, start) - 1)
+    last = bisect_right(offsets, max(start, end - 1))
+    return sorted({page for _, page in anchors[first:last]})
+
+
+def build_markdown_chunks(
+        markdown_text: str,
+        source_name: str = "docling_clean_smart",
+        chunk_size_tokens: int = CHUNK_SIZE_TOKENS,
+        chunk_overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        page_anchors: Optional[Sequence[Tuple[int, int]]] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Esegue il chunking semantico/strutturale su una stringa Markdown già pulita, in memoria.
     Usa LangChain e HuggingFace Tokenizer per rispettare i limiti di token e la struttura del documento.
 
-    In output genera JSON con:
+    Ritorna una lista di chunk con:
       - prev: porzione iniziale del chunk usata come overlap col precedente
       - focus: parte centrale (senza overlap) da usare per l'estrazione
       - next: porzione finale del chunk usata come overlap col successivo
+    Con page_anchors (vedi locate_page_anchors) i metadata riportano anche le pagine
+    di provenienza del chunk (page_numbers).
+    (None se il tokenizer non è disponibile).
     """
     print("Starting smart chunking with LangChain/Transformers (focus/prev/next)...")
 
-    # Parametri di chunking in token
-    chunk_size_tokens = 2048
-    chunk_overlap_tokens = 200
-
     # 1. Setup Tokenizer
     try:
-        tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+        tokenizer = get_tokenizer()
     except Exception as e:
         print(f"Error loading tokenizer: {e}")
-        return
+        return None
 
     # 2. Setup Splitter specifico per Markdown
     text_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
@@ -42,6 +129,8 @@ def generate_markdown_chunks_from_string(
         chunk_size=chunk_size_tokens,
         chunk_overlap=chunk_overlap_tokens,
         separators=["\n\n", "\n", " ", ""],
+        # posizione di ogni chunk nel markdown (metadata["start_index"]), per le pagine
+        add_start_index=True,
     )
 
     # 3. Creazione del Documento LangChain basato sulla stringa pulita
@@ -119,19 +208,19 @@ def generate_markdown_chunks_from_string(
                 "source": source_name,
                 # Grandezza del chunk originale (non splittato in prev/focus/next)
                 "chunk_size_chars": len(full_text),
+                "chunk_size_tokens": num_tokens,
             },
         }
+        if page_anchors is not None:
+            start = chunk.metadata.get("start_index", -1)
+            if start is not None and start >= 0:
+                chunk_record["metadata"]["page_numbers"] = pages_for_span(
+                    page_anchors, start, start + len(chunk.page_content or "")
+                )
 
         chunks_data.append(chunk_record)
 
-    # 6. Salvataggio su file
-    out_path_obj = Path(output_path)
-    out_path_obj.parent.mkdir(parents=True, exist_ok=True)
-
-    with open(out_path_obj, "w", encoding="utf-8") as f:
-        json.dump(chunks_data, f, ensure_ascii=False, indent=2)
-
-    print(f"Generati {len(chunks_data)} chunk (con prev/focus/next) salvati in {output_path}")
+    return chunks_data
 
 
 def generate_docling_chunks(doc, output_path: Union[str, Path]):
@@ -142,7 +231,7 @@ def generate_docling_chunks(doc, output_path: Union[str, Path]):
     print("Generating structural chunks with HybridChunker...")
 
     #model to count the number of tokens
-    tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2", model_max_length=2048)
+    tokenizer = get_tokenizer(model_max_length=2048)
 
     # Configura il chunker
     chunker = HybridChunker(
@@ -200,7 +289,7 @@ def generate_langchain_chunks(doc, output_path: Union[str, Path]):
     print("Generating merged chunks...")
 
     # 1. Setup Tokenizer e Splitter
-    tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+    tokenizer = get_tokenizer()
 
     text_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
         tokenizer,
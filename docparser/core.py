@@ -1,15 +1,35 @@
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List
+from io import BytesIO
+from typing import List, Optional, Dict, BinaryIO, Sequence, Tuple
 
 import torch
 import traceback
+from docling.datamodel.base_models import DocumentStream
 
-from .pipeline import run_docling_parsing, DoclingParseResult
-from .reports.easyocr_report import run_easyocr_report_if_needed
-from .utils import is_supported_file
+from .batching import DEFAULT_BATCH_SIZE, BatchItem, convert_batch, is_small_input
+from .dedup import DedupConfig, DedupIndex, DedupPlan, resolve_aliases, write_dedup_report
+from .pipeline import (
+    run_docling_parsing,
+    DoclingParseResult,
+    InMemoryParseResult,
+    ConvertedDocument,
+    convert_to_document,
+    render_converted,
+    update_run_stats,
+    write_parse_result,
+)
+from .profiles import DEFAULT_PROFILE, get_profile
+from .indexing import ChunkIndex
+from .isolation import IsolatedWorkerPool, DocumentFailure
+from .reports.background import ComparisonReports
+from .scheduling import CostModel, CostEstimate, estimate_cost, order_by_cost, write_schedule_report
+from .utils import is_supported_file, should_enable_ocr_for_bytes, should_enable_ocr_for_file
 
 
 def process_document(
@@ -17,66 +37,282 @@ def process_document(
         output_root: str = "output",
         use_rapidocr: bool = False,
         use_openai: bool = False,
+        profile: str = DEFAULT_PROFILE,
 ) -> DoclingParseResult:
     """
     Funzione principale della libreria per un singolo documento.
+    profile sceglie il compromesso velocità/accuratezza (fast / balanced / accurate).
     Restituisce un DoclingParseResult (con path e metadata).
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Error: {file_path} not found.")
+    get_profile(profile)  # profilo sconosciuto -> ValueError prima di caricare i modelli
 
     print("CUDA is available" if torch.cuda.is_available() else "CUDA is NOT available")
 
-    output_root_path = Path(output_root)
-    output_root_path.mkdir(parents=True, exist_ok=True)
+    run_dir = _new_run_dir(file_path, output_root)
 
-    run_id = f"{Path(file_path).stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    run_dir = output_root_path / run_id
-    print(f"Run output directory: {run_dir}")
+    # 1) Report OCR Esterni (Opzionale): dipendono solo dal file sorgente, partono subito
+    #    in background e girano in parallelo alla conversione Docling
+    reports = _start_reports(file_path, run_dir, use_rapidocr, use_openai, profile)
 
     try:
-        # 1) Docling Pipeline
+        # 2) Docling Pipeline
         parse_result: DoclingParseResult = run_docling_parsing(
             file_path=file_path,
             run_dir=run_dir,
             use_rapidocr=use_rapidocr,
+            profile=profile,
         )
-
-        # 2) Report OCR Esterni (Opzionale)
-        if use_openai:
-            # Qui dovresti importare e chiamare la tua funzione openai
-            pass
-        elif use_rapidocr:
-            print("RAPIDOCR enabled (Report skipped)")
-        else:
-            run_easyocr_report_if_needed(
-                file_path=file_path,
-                ocr_enabled=parse_result.ocr_enabled,
-                ocr_engine_name=parse_result.ocr_engine_name,
-                run_dir=parse_result.run_dir,
-            )
-
-        # Ritorniamo il risultato completo, non solo la cartella
-        return parse_result
-
     except Exception as e:
+        reports.cancel()
         print(f"An error occurred inside the library: {e}")
         traceback.print_exc()
         raise e
 
+    # 3) Join dei report: errori e timeout finiscono nelle stats, non nel risultato
+    _join_reports(reports, parse_result)
+
+    # Ritorniamo il risultato completo, non solo la cartella
+    return parse_result
+
+
+def _new_run_dir(file_path: str, output_root: str) -> Path:
+    run_dir = _reserve_run_dir(Path(file_path).stem, Path(output_root))
+    print(f"Run output directory: {run_dir}")
+    return run_dir
+
+
+def _reserve_run_dir(stem: str, output_root: Path) -> Path:
+    """
+    Crea output_root/<stem>_<timestamp>/ e la riserva per questa run. Due input con lo stesso
+    stem nello stesso secondo (lollo-image-1.jpg e .pdf con --workers > 1, un batch) non
+    condividono la cartella: mkdir senza exist_ok, e in caso di conflitto suffisso _2, _3, ...
+    """
+    output_root.mkdir(parents=True, exist_ok=True)
+    run_id = f"{stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    attempt = 1
+    while True:
+        run_dir = output_root / (run_id if attempt == 1 else f"{run_id}_{attempt}")
+        try:
+            run_dir.mkdir()
+            return run_dir
+        except FileExistsError:
+            attempt += 1
+
+
+def _start_reports(file_path: str, run_dir: Path, use_rapidocr: bool, use_openai: bool,
+                   profile: str) -> ComparisonReports:
+    reports = ComparisonReports(file_path, run_dir, ocr_enabled=should_enable_ocr_for_file(file_path))
+    if use_openai:
+        reports.start_openai()
+    elif use_rapidocr:
+        print("RAPIDOCR enabled (Report skipped)")
+    else:
+        # lingue del profilo: quelle scelte da Docling sul documento si conoscono solo a conversione finita
+        reports.start_easyocr(languages=list(get_profile(profile).ocr_languages))
+    return reports
+
+
+def _join_reports(reports: ComparisonReports, parse_result: DoclingParseResult) -> None:
+    outcomes = [o for o in reports.join(parse_result.ocr_engine_name) if o.status != "skipped"]
+    if outcomes:
+        parse_result.stats["reports"] = [outcome.to_dict() for outcome in outcomes]
+        # run.json è già stato scritto dal sink: gli esiti vanno aggiunti lì (rerender li rilegge)
+        update_run_stats(parse_result)
+
+
+def process_document_batch(
+        file_paths: Sequence[str],
+        output_root: str = "output",
+        use_rapidocr: bool = False,
+        use_openai: bool = False,
+        profile: str = DEFAULT_PROFILE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Optional[DoclingParseResult]]:
+    """
+    Come process_document per più documenti piccoli: la conversione Docling è fatta
+    a batch con convert_all (docparser.batching), post-processing e scrittura restano
+    per documento (una run dir ciascuno, stessi artifact della conversione singola).
+
+    Ritorna una lista allineata a file_paths: None per i documenti che non sono stati
+    convertiti nel batch (da processare singolarmente con process_document).
+    """
+    get_profile(profile)
+    runs: List[Tuple[Path, ComparisonReports]] = []
+    for file_path in file_paths:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Error: {file_path} not found.")
+        run_dir = _new_run_dir(file_path, output_root)
+        runs.append((run_dir, _start_reports(file_path, run_dir, use_rapidocr, use_openai, profile)))
+
+    try:
+        converted = convert_batch(
+            [BatchItem(source=file_path, file_label=file_path) for file_path in file_paths],
+            use_rapidocr=use_rapidocr,
+            profile=profile,
+            batch_size=batch_size,
+        )
+    except Exception:
+        for _, reports in runs:
+            reports.cancel()
+        raise
+
+    results: List[Optional[DoclingParseResult]] = []
+    for file_path, document, (run_dir, reports) in zip(file_paths, converted, runs):
+        if document is None:
+            reports.cancel()
+            # il documento avrà la sua run dir da process_document: via quella riservata (vuota)
+            try:
+                run_dir.rmdir()
+            except OSError:
+                pass
+            results.append(None)
+            continue
+        try:
+            parse_result = write_parse_result(render_converted(document), run_dir)
+        except Exception as e:
+            reports.cancel()
+            print(f"[ERROR] Failed post-processing {Path(file_path).name}: {e}")
+            results.append(None)
+            continue
+        _join_reports(reports, parse_result)
+        results.append(parse_result)
+    return results
+
+
+def parse_bytes(
+        data: bytes,
+        file_name: str,
+        use_rapidocr: bool = False,
+        profile: str = DEFAULT_PROFILE,
+) -> InMemoryParseResult:
+    """
+    Converte un documento già in memoria (bytes) senza scrivere nulla su disco.
+    file_name serve a Docling per riconoscere il formato (estensione).
+
+    Ritorna un InMemoryParseResult con markdown, chunk, bytes delle immagini e stats.
+    Per salvarlo usare save_parse_result() (disco) o il sink MinIO.
+    """
+    converted = convert_bytes(data, file_name, use_rapidocr=use_rapidocr, profile=profile)
+    return render_converted(converted)
+
+
+def convert_bytes(
+        data: bytes,
+        file_name: str,
+        use_rapidocr: bool = False,
+        profile: str = DEFAULT_PROFILE,
+) -> ConvertedDocument:
+    """
+    Prima metà di parse_bytes: solo la conversione Docling.
+    Il post-processing si fa con render_converted(), anche in un altro thread/stage.
+    """
+    if not is_supported_file(file_name):
+        raise ValueError(f"Unsupported file type: {file_name}")
+
+    ocr_enabled = should_enable_ocr_for_bytes(file_name, data)
+    print(f"Automatic OCR decision: {'ENABLED' if ocr_enabled else 'DISABLED'} for {file_name}.")
+
+    source = DocumentStream(name=Path(file_name).name, stream=BytesIO(data))
+    return convert_to_document(
+        source,
+        file_label=file_name,
+        use_rapidocr=use_rapidocr,
+        ocr_enabled=ocr_enabled,
+        profile=profile,
+    )
+
+
+def convert_bytes_batch(
+        documents: Sequence[Tuple[bytes, str]],
+        use_rapidocr: bool = False,
+        profile: str = DEFAULT_PROFILE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Optional[ConvertedDocument]]:
+    """
+    convert_bytes per più documenti (bytes, file_name) in un colpo solo: gli input piccoli
+    compatibili sono convertiti a batch (docparser.batching.convert_batch).
+    Ritorna una lista allineata a documents: None per quelli da convertire con convert_bytes.
+    """
+    items: List[BatchItem] = []
+    positions: List[int] = []
+    for position, (data, file_name) in enumerate(documents):
+        if not is_supported_file(file_name) or not is_small_input(data, file_name):
+            continue
+        ocr_enabled = should_enable_ocr_for_bytes(file_name, data)
+        items.append(BatchItem(
+            source=DocumentStream(name=Path(file_name).name, stream=BytesIO(data)),
+            file_label=file_name,
+            ocr_enabled=ocr_enabled,
+        ))
+        positions.append(position)
+
+    results: List[Optional[ConvertedDocument]] = [None] * len(documents)
+    if len(items) > 1:
+        for position, converted in zip(positions, convert_batch(items, use_rapidocr, profile, batch_size)):
+            results[position] = converted
+    return results
+
+
+def parse_stream(
+        stream: BinaryIO,
+        file_name: str,
+        use_rapidocr: bool = False,
+        profile: str = DEFAULT_PROFILE,
+) -> InMemoryParseResult:
+    """Come parse_bytes, per un file-like aperto in lettura binaria (es. risposta HTTP/MinIO)."""
+    return parse_bytes(stream.read(), file_name=file_name, use_rapidocr=use_rapidocr, profile=profile)
+
+
+def save_parse_result(
+        parsed: InMemoryParseResult,
+        output_root: str = "output",
+) -> DoclingParseResult:
+    """Sink opzionale su disco: scrive il risultato in output_root/<stem>_<timestamp>/."""
+    return write_parse_result(parsed, _reserve_run_dir(Path(parsed.file_name).stem, Path(output_root)))
+
 
 def process_batch_or_file(
         input_path: str,
         output_root: str = "output",
         use_rapidocr: bool = False,
         use_openai: bool = False,
+        workers: int = 1,
+        schedule: str = "lpt",
+        cost_model: Optional[CostModel] = None,
+        worker_pool: Optional[IsolatedWorkerPool] = None,
+        profile: str = DEFAULT_PROFILE,
+        index_dir: Optional[str] = None,
+        batch_size: int = 1,
+        dedup: Optional[DedupConfig] = None,
 ) -> List[DoclingParseResult]:
     """
     Entry point "intelligente":
     - Se input_path è un file: processa il file.
     - Se input_path è una cartella: processa tutti i file supportati all'interno.
 
-    Ritorna una lista di DoclingParseResult.
+    I file vengono ordinati in base al costo stimato (vedi docparser.scheduling):
+    con schedule="lpt" i più pesanti partono per primi, così con workers > 1
+    una scansione enorme non finisce in coda a dominare la latenza.
+    Per le cartelle viene scritto uno schedule_report_*.json con stime vs tempi reali.
+
+    Con worker_pool ogni documento gira in un processo isolato (timeout, tetto RSS,
+    riciclo dei worker): un file patologico diventa un DocumentFailure nel report
+    invece di bloccare tutta la run.
+
+    Con index_dir i chunk di ogni run completata vengono aggiunti all'indice BM25
+    (docparser.indexing) appena la run finisce.
+
+    Con batch_size > 1 (e senza worker_pool) gli input piccoli (immagini, PDF di 1-2 pagine)
+    sono convertiti a gruppi di batch_size con convert_all (vedi process_document_batch);
+    quelli che il batch non riesce a convertire tornano alla conversione singola.
+
+    Con dedup i quasi-duplicati (docparser.dedup: stesso contenuto come jpg e pdf, ri-scansioni)
+    non vengono convertiti: ricevono un DoclingParseResult alias della run del canonico, anche
+    di una run precedente nella stessa output_root. I gruppi finiscono in dedup_report_*.json.
+
+    Ritorna una lista di DoclingParseResult (in ordine alfabetico dei file).
     """
     path_obj = Path(input_path)
     successful_runs: List[DoclingParseResult] = []
@@ -106,20 +342,191 @@ def process_batch_or_file(
         print(f"Error: {input_path} non esiste o non è valido.")
         return []
 
-    # 2. Ciclo di elaborazione
-    for i, file_p in enumerate(files_to_process, start=1):
-        print(f"\n--- Processing {i}/{len(files_to_process)}: {file_p.name} ---")
+    # 2. Deduplica: si convertono solo i canonici, i duplicati diventano alias a fine run
+    dedup_index: Optional[DedupIndex] = None
+    dedup_plan: Optional[DedupPlan] = None
+    files_to_convert = files_to_process
+    if dedup is not None:
+        dedup_index = DedupIndex(output_root, dedup)
+        dedup_plan = dedup_index.plan(files_to_process, profile)
+        files_to_convert = [p for p in files_to_process if str(p) not in dedup_plan.matches]
+
+    # 3. Stima dei costi e ordinamento
+    cost_model = cost_model or CostModel()
+    estimates: List[CostEstimate] = [estimate_cost(p, cost_model) for p in files_to_convert]
+    ordered = order_by_cost(estimates, schedule)
+    results_by_file: Dict[str, DoclingParseResult] = {}
+    chunk_index = ChunkIndex(index_dir) if index_dir else None
+
+    def _index_run(file_name: str, parse_result: DoclingParseResult) -> None:
+        if chunk_index is None:
+            return
+        try:
+            chunk_index.add_run(parse_result.run_dir)
+        except Exception as e:
+            # la run resta valida: si può reindicizzare con `cli.py index add`
+            print(f"[WARNING] Could not index {file_name}: {e}")
+
+    def _process(i: int, est: CostEstimate) -> None:
+        file_name = Path(est.file_path).name
+        print(f"\n--- Processing {i}/{len(ordered)}: {file_name} (estimated {est.estimated_s:.1f}s) ---")
+        t0 = time.perf_counter()
         try:
-            parse_result = process_document(
-                file_path=str(file_p),
+            if worker_pool is not None:
+                parse_result = worker_pool.run(
+                    est.file_path,
+                    output_root=output_root,
+                    use_rapidocr=use_rapidocr,
+                    use_openai=use_openai,
+                    profile=profile,
+                )
+                if isinstance(parse_result, DocumentFailure):
+                    print(f"[ERROR] Failed processing {file_name}: "
+                          f"{parse_result.reason} - {parse_result.message}")
+                    est.extra["failure"] = {
+                        "reason": parse_result.reason,
+                        "message": parse_result.message,
+                        "elapsed_s": parse_result.elapsed_s,
+                        "peak_rss_mb": parse_result.peak_rss_mb,
+                    }
+                    return
+            else:
+                parse_result = process_document(
+                    file_path=est.file_path,
+                    output_root=output_root,
+                    use_rapidocr=use_rapidocr,
+                    use_openai=use_openai,
+                    profile=profile,
+                )
+            results_by_file[est.file_path] = parse_result
+            _index_run(file_name, parse_result)
+
+        except Exception as e:
+            print(f"[ERROR] Failed processing {file_name}: {e}")
+            return
+
+        finally:
+            est.worker = threading.current_thread().name
+
+        est.actual_s = time.perf_counter() - t0
+
+    def _process_batch(i: int, batch: List[CostEstimate]) -> None:
+        names = ", ".join(Path(est.file_path).name for est in batch)
+        print(f"\n--- Processing {i}-{i + len(batch) - 1}/{len(ordered)} as one batch: {names} ---")
+        t0 = time.perf_counter()
+        try:
+            batch_results = process_document_batch(
+                [est.file_path for est in batch],
                 output_root=output_root,
                 use_rapidocr=use_rapidocr,
-                use_openai=use_openai
+                use_openai=use_openai,
+                profile=profile,
+                batch_size=batch_size,
             )
-            successful_runs.append(parse_result)
-
         except Exception as e:
-            print(f"[ERROR] Failed processing {file_p.name}: {e}")
-            continue
+            print(f"[ERROR] Batch failed, processing its documents one by one: {e}")
+            batch_results = [None] * len(batch)
+        batch_s = time.perf_counter() - t0
+
+        for offset, (est, parse_result) in enumerate(zip(batch, batch_results)):
+            if parse_result is None:
+                _process(i + offset, est)
+                continue
+            results_by_file[est.file_path] = parse_result
+            _index_run(Path(est.file_path).name, parse_result)
+            est.worker = threading.current_thread().name
+            est.actual_s = batch_s / len(batch)
+            est.extra["batch_size"] = len(batch)
+
+    # 4. Unità di lavoro: un documento, oppure un batch di documenti piccoli (nella posizione
+    #    del primo, così l'ordine dello schedule resta valido)
+    if batch_size > 1 and worker_pool is None:
+        units = _plan_batches(ordered, batch_size)
+    else:
+        units = [[est] for est in ordered]
+
+    def _run_unit(i: int, unit: List[CostEstimate]) -> None:
+        if len(unit) == 1:
+            _process(i, unit[0])
+        else:
+            _process_batch(i, unit)
+
+    # 5. Ciclo di elaborazione
+    t_batch = time.perf_counter()
+    starts = [1]
+    for unit in units[:-1]:
+        starts.append(starts[-1] + len(unit))
+    if workers <= 1:
+        for i, unit in zip(starts, units):
+            _run_unit(i, unit)
+    else:
+        # Sottomettendo in ordine LPT, ogni worker libero prende il prossimo lavoro più pesante
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="docparser-batch") as pool:
+            for i, unit in zip(starts, units):
+                pool.submit(_run_unit, i, unit)
+    wall_time_s = time.perf_counter() - t_batch
+
+    if len(estimates) > 1:
+        write_schedule_report(
+            estimates=ordered,
+            report_path=Path(output_root) / f"schedule_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            workers=workers,
+            strategy=schedule,
+            wall_time_s=wall_time_s,
+            model=cost_model,
+        )
+
+    if dedup_plan is not None:
+        for file_path, parse_result in results_by_file.items():
+            dedup_index.record(file_path, parse_result.run_dir, profile)
+        dedup_index.save()
+        aliases = resolve_aliases(dedup_plan, results_by_file)
+        results_by_file.update(aliases)
+        if dedup_plan.matches:
+            write_dedup_report(
+                dedup_plan,
+                Path(output_root) / f"dedup_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                dedup,
+                aliased=list(aliases),
+            )
+
+    for file_p in files_to_process:
+        if str(file_p) in results_by_file:
+            successful_runs.append(results_by_file[str(file_p)])
+
+    if chunk_index is not None:
+        print(f"Chunk index: {chunk_index.stats()}")
+        chunk_index.close()
 
     return successful_runs
+
+
+def _plan_batches(ordered: Sequence[CostEstimate], batch_size: int) -> List[List[CostEstimate]]:
+    """
+    Divide i lavori in unità: gli input piccoli sono raggruppati per tipo (così un batch ha
+    quasi sempre le stesse impostazioni OCR) a gruppi di batch_size, gli altri restano singoli.
+    Ogni unità sta nella posizione del suo primo documento in ordered.
+    """
+    by_kind: Dict[str, List[CostEstimate]] = {}
+    for est in ordered:
+        if is_small_input(est.file_path, Path(est.file_path).name):
+            by_kind.setdefault(est.kind, []).append(est)
+
+    batch_of: Dict[str, List[CostEstimate]] = {}
+    for group in by_kind.values():
+        for start in range(0, len(group), batch_size):
+            batch = group[start:start + batch_size]
+            if len(batch) > 1:
+                for est in batch:
+                    batch_of[est.file_path] = batch
+
+    units: List[List[CostEstimate]] = []
+    emitted = set()
+    for est in ordered:
+        batch = batch_of.get(est.file_path)
+        if batch is None:
+            units.append([est])
+        elif id(batch) not in emitted:
+            emitted.add(id(batch))
+            units.append(batch)
+    return units
@@ -0,0 +1,408 @@
+# dedup.py
+
+"""
+Rilevamento dei quasi-duplicati tra gli input, prima della conversione.
+
+Nelle cartelle di input lo stesso contenuto arriva spesso in più forme (lollo-image-1.jpg
+e lollo-image-1.pdf, ri-scansioni della stessa pagina) e ognuna verrebbe convertita da zero.
+Per ogni input calcoliamo un'impronta economica:
+
+- sha256 dei bytes (duplicati esatti)
+- dHash 16x16 (256 bit) di alcune pagine campione: render a 72 dpi per i PDF, immagine
+  ridotta per le foto, dopo aver tolto i margini uniformi (il bordo bianco di un PDF
+  creato da una foto, lo sfondo nero di una locandina)
+- text layer (PDF digitali): sha256 del testo normalizzato e simhash a 64 bit dei trigrammi
+  di parole
+
+Due input sono duplicati se hanno lo stesso numero di pagine e ogni pagina campione è entro
+max_distance (frazione dei bit del dHash). Se entrambi hanno un text layer il testo deve
+essere compatibile (simhash entro text_max_distance bit); testo identico basta da solo.
+Ogni gruppo ha un input canonico, l'unico convertito: gli altri ricevono un
+DoclingParseResult alias della sua run (alias_of).
+
+L'indice (output_root/_dedup/fingerprints.json) conserva le impronte dei canonici già
+convertiti: i batch successivi nella stessa cartella di output (una collezione) vengono
+confrontati anche con quelli, a parità di profilo.
+"""
+
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass, asdict, field, replace
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+from docparser.images import dhash, hamming_distance
+from docparser.pipeline import DoclingParseResult
+from docparser.profiles import DEFAULT_PROFILE
+
+try:
+    import pypdfium2 as pdfium  # dipendenza di docling
+except ImportError:  # pragma: no cover - fallback senza pypdfium2
+    pdfium = None
+
+# Lato del dHash: 16x16 = 256 bit, abbastanza fine da separare pagine con lo stesso layout
+DEDUP_HASH_SIZE = 16
+# Frazione massima di bit diversi per pagina (dataset/: coppie jpg/pdf <= 0.13, altri >= 0.26)
+DEFAULT_MAX_DISTANCE = 0.15
+# Bit diversi ammessi tra i simhash del text layer
+DEFAULT_TEXT_MAX_DISTANCE = 3
+# Pagine campionate per documento (distribuite sul documento)
+SAMPLE_PAGES = 8
+# Render dei PDF a 72 dpi e lato massimo delle immagini: il dHash lavora su una miniatura
+RENDER_SCALE = 1.0
+IMAGE_MAX_SIDE = 1024
+# Sotto questi caratteri il text layer non è un'impronta affidabile
+MIN_TEXT_CHARS = 200
+# Margini: righe/colonne con meno di MARGIN_INK pixel lontani più di MARGIN_TOLERANCE dalla mediana
+MARGIN_TOLERANCE = 32
+MARGIN_INK = 0.01
+
+DEDUP_DIR = "_dedup"
+INDEX_FILE = "fingerprints.json"
+
+
+@dataclass
+class DedupConfig:
+    max_distance: float = DEFAULT_MAX_DISTANCE
+    text_max_distance: int = DEFAULT_TEXT_MAX_DISTANCE
+    sample_pages: int = SAMPLE_PAGES
+    # confronta anche con le run già presenti nella cartella di output (indice persistente)
+    use_index: bool = True
+
+
+@dataclass
+class InputFingerprint:
+    file_path: str
+    sha256: str
+    size_bytes: int
+    pages: int
+    # dHash esadecimali delle pagine campione (vuoto se il render non è disponibile)
+    page_hashes: List[str] = field(default_factory=list)
+    text_chars: int = 0
+    text_hash: Optional[str] = None
+    text_simhash: Optional[str] = None
+    # solo nell'indice: run del canonico e profilo con cui è stato convertito
+    run_dir: Optional[str] = None
+    profile: Optional[str] = None
+
+    @property
+    def has_text(self) -> bool:
+        return self.text_hash is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "InputFingerprint":
+        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+
+
+@dataclass
+class DedupMatch:
+    file_path: str
+    canonical: str  # file_path dell'input canonico
+    method: str     # "exact" | "text" | "visual"
+    distance: float
+    # run già esistente del canonico (indice della collezione); None = canonico in questo batch
+    run_dir: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# =========================================================
+#  Impronte
+# =========================================================
+
+def trim_uniform_margins(gray: Image.Image) -> Image.Image:
+    """
+    Toglie da ogni lato le righe e colonne uniformi, di qualunque colore: il bordo bianco della
+    pagina e poi lo sfondo scuro dell'immagine, così foto e PDF che la contiene si allineano.
+    """
+    pixels = np.asarray(gray.filter(ImageFilter.MedianFilter(3)), dtype=np.int16)
+    rows = (np.abs(pixels - np.median(pixels, axis=1, keepdims=True)) > MARGIN_TOLERANCE).mean(axis=1) > MARGIN_INK
+    cols = (np.abs(pixels - np.median(pixels, axis=0, keepdims=True)) > MARGIN_TOLERANCE).mean(axis=0) > MARGIN_INK
+    row_idx, col_idx = np.flatnonzero(rows), np.flatnonzero(cols)
+    if len(row_idx) == 0 or len(col_idx) == 0:
+        return gray
+    return gray.crop((int(col_idx[0]), int(row_idx[0]), int(col_idx[-1]) + 1, int(row_idx[-1]) + 1))
+
+
+def page_hash(image: Image.Image) -> int:
+    return dhash(trim_uniform_margins(image.convert("L")), hash_size=DEDUP_HASH_SIZE)
+
+
+def normalize_text(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def simhash(words: Sequence[str], shingle: int = 3) -> int:
+    """Simhash a 64 bit dei trigrammi di parole: testi quasi uguali differiscono di pochi bit."""
+    grams = [" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))]
+    digests = b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+    # ogni trigramma vota +1/-1 su ciascuno dei 64 bit
+    weights = (2 * bits.astype(np.int64) - 1).sum(axis=0)
+    return int("".join("1" if w > 0 else "0" for w in weights), 2)
+
+
+def _sample_indices(num_pages: int, max_pages: int) -> List[int]:
+    if num_pages <= max_pages:
+        return list(range(num_pages))
+    return sorted({round(i * (num_pages - 1) / (max_pages - 1)) for i in range(max_pages)})
+
+
+def _pdf_pages(path: Path, data: bytes, sample_pages: int) -> Tuple[int, List[int], str]:
+    """(numero pagine, dHash delle pagine campione, testo delle pagine campione)."""
+    if pdfium is None:
+        from docparser.sharding import count_pdf_pages
+        return count_pdf_pages(data), [], ""
+    pdf = pdfium.PdfDocument(str(path))
+    try:
+        hashes: List[int] = []
+        texts: List[str] = []
+        for idx in _sample_indices(len(pdf), sample_pages):
+            page = pdf[idx]
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_range())
+            textpage.close()
+            hashes.append(page_hash(page.render(scale=RENDER_SCALE).to_pil()))
+            page.close()
+        return len(pdf), hashes, "\n".join(texts)
+    finally:
+        pdf.close()
+
+
+def _image_hash(path: Path) -> int:
+    with Image.open(path) as img:
+        img.draft("RGB", (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        return page_hash(img)
+
+
+def fingerprint_file(file_path: Union[str, Path], sample_pages: int = SAMPLE_PAGES) -> InputFingerprint:
+    path = Path(file_path)
+    data = path.read_bytes()
+    fingerprint = InputFingerprint(
+        file_path=str(path),
+        sha256=hashlib.sha256(data).hexdigest(),
+        size_bytes=len(data),
+        pages=1,
+    )
+    mime, _ = guess_type(path.name)
+    if mime == "application/pdf":
+        fingerprint.pages, hashes, text = _pdf_pages(path, data, sample_pages)
+        words = normalize_text(text)
+        fingerprint.text_chars = sum(len(w) for w in words)
+        if fingerprint.text_chars >= MIN_TEXT_CHARS:
+            fingerprint.text_hash = hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest()
+            fingerprint.text_simhash = f"{simhash(words):016x}"
+    elif mime and mime.startswith("image/"):
+        hashes = [_image_hash(path)]
+    else:
+        hashes = []
+    fingerprint.page_hashes = [f"{h:0{DEDUP_HASH_SIZE * DEDUP_HASH_SIZE // 4}x}" for h in hashes]
+    return fingerprint
+
+
+# =========================================================
+#  Confronto e raggruppamento
+# =========================================================
+
+def compare_fingerprints(a: InputFingerprint, b: InputFingerprint,
+                         config: Optional[DedupConfig] = None) -> Optional[Tuple[str, float]]:
+    """(metodo, distanza) se a e b sono duplicati, altrimenti None."""
+    config = config or DedupConfig()
+    if a.sha256 == b.sha256:
+        return "exact", 0.0
+    if a.pages != b.pages:
+        return None
+    if a.has_text and b.has_text:
+        if a.text_hash == b.text_hash:
+            return "text", 0.0
+        if hamming_distance(int(a.text_simhash, 16), int(b.text_simhash, 16)) > config.text_max_distance:
+            return None
+    if not a.page_hashes or len(a.page_hashes) != len(b.page_hashes):
+        return None
+
+    bits = DEDUP_HASH_SIZE * DEDUP_HASH_SIZE
+    distance = max(
+        hamming_distance(int(ha, 16), int(hb, 16)) / bits
+        for ha, hb in zip(a.page_hashes, b.page_hashes)
+    )
+    if distance > config.max_distance:
+        return None
+    return "visual", round(distance, 4)
+
+
+def _canonical_rank(fingerprint: InputFingerprint) -> Tuple:
+    """Prima chi ha un text layer (conversione migliore e più economica), poi il file più ricco."""
+    return (not fingerprint.has_text, -fingerprint.size_bytes, Path(fingerprint.file_path).name)
+
+
+@dataclass
+class DedupPlan:
+    # input da convertire (nell'ordine ricevuto) e alias per file_path
+    canonical: List[str]
+    matches: Dict[str, DedupMatch]
+    fingerprints: Dict[str, InputFingerprint]
+    elapsed_s: float = 0.0
+
+    def groups(self) -> List[Dict[str, Any]]:
+        by_canonical: Dict[str, List[DedupMatch]] = {}
+        for match in self.matches.values():
+            by_canonical.setdefault(match.canonical, []).append(match)
+        return [
+            {
+                "canonical": canonical,
+                "run_dir": members[0].run_dir,
+                "members": [m.to_dict() for m in sorted(members, key=lambda m: m.file_path)],
+            }
+            for canonical, members in sorted(by_canonical.items())
+        ]
+
+
+class DedupIndex:
+    """
+    Impronte dei canonici già convertiti in una cartella di output.
+
+        index = DedupIndex(output_root)
+        plan = index.plan(files, profile)   # prima della conversione
+        ... conversione di plan.canonical ...
+        index.record(file_path, run_dir, profile); index.save()
+    """
+
+    def __init__(self, output_root: Union[str, Path], config: Optional[DedupConfig] = None):
+        self.config = config or DedupConfig()
+        self.path = Path(output_root) / DEDUP_DIR / INDEX_FILE
+        self.entries: List[InputFingerprint] = []
+        self._pending: Dict[str, InputFingerprint] = {}
+        if self.config.use_index and self.path.is_file():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = [InputFingerprint.from_dict(e) for e in json.load(f)]
+
+    def plan(self, files: Sequence[Union[str, Path]], profile: str = DEFAULT_PROFILE) -> DedupPlan:
+        t_start = time.perf_counter()
+        fingerprints: Dict[str, InputFingerprint] = {}
+        for file_path in files:
+            try:
+                fingerprints[str(file_path)] = fingerprint_file(file_path, self.config.sample_pages)
+            except Exception as e:
+                # senza impronta l'input viene convertito come sempre
+                print(f"  Could not fingerprint {Path(file_path).name}: {e}")
+
+        # run esistenti (stesso profilo, run dir ancora presente), poi i canonici di questo batch
+        known: List[InputFingerprint] = [
+            e for e in self.entries
+            if e.profile == profile and e.run_dir and Path(e.run_dir).is_dir()
+        ] if self.config.use_index else []
+        batch_canonical: List[InputFingerprint] = []
+        matches: Dict[str, DedupMatch] = {}
+        for fingerprint in sorted(fingerprints.values(), key=_canonical_rank):
+            match = None
+            for other in known + batch_canonical:
+                found = compare_fingerprints(fingerprint, other, self.config)
+                if found is not None:
+                    match = DedupMatch(fingerprint.file_path, other.file_path, found[0], found[1], other.run_dir)
+                    break
+            if match is None:
+                batch_canonical.append(fingerprint)
+            else:
+                matches[fingerprint.file_path] = match
+
+        self._pending = {f.file_path: f for f in batch_canonical}
+        canonical = [str(f) for f in files if str(f) not in matches]
+        plan = DedupPlan(canonical=canonical, matches=matches, fingerprints=fingerprints,
+                         elapsed_s=time.perf_counter() - t_start)
+        print(f"Dedup: {len(fingerprints)} inputs fingerprinted in {plan.elapsed_s:.2f}s, "
+              f"{len(matches)} near-duplicates in {len(plan.groups())} groups")
+        for group in plan.groups():
+            members = ", ".join(f"{Path(m['file_path']).name} ({m['method']} {m['distance']})" for m in group["members"])
+            print(f"  {Path(group['canonical']).name} <- {members}")
+        return plan
+
+    def record(self, file_path: str, run_dir: Union[str, Path], profile: str = DEFAULT_PROFILE) -> None:
+        """Registra la run di un canonico convertito (da chiamare dopo la conversione)."""
+        fingerprint = self._pending.get(str(file_path))
+        if fingerprint is None:
+            return
+        entry = replace(fingerprint, run_dir=str(Path(run_dir).resolve()), profile=profile)
+        self.entries = [e for e in self.entries if not (e.sha256 == entry.sha256 and e.profile == profile)]
+        self.entries.append(entry)
+
+    def save(self) -> None:
+        if not self.config.use_index:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump([e.to_dict() for e in self.entries], f, indent=2, ensure_ascii=False)
+
+
+# =========================================================
+#  Alias e report
+# =========================================================
+
+def alias_result(canonical: DoclingParseResult, match: DedupMatch) -> DoclingParseResult:
+    """DoclingParseResult di un duplicato: stessi artifact (e run dir) del canonico."""
+    stats = dict(canonical.stats)
+    stats["dedup"] = {"canonical": match.canonical, "method": match.method, "distance": match.distance}
+    return replace(canonical, stats=stats, alias_of=match.canonical)
+
+
+def resolve_aliases(
+        plan: DedupPlan,
+        results_by_file: Dict[str, DoclingParseResult],
+) -> Dict[str, DoclingParseResult]:
+    """
+    Risultati alias per i duplicati: dal risultato del canonico in questo batch, oppure
+    ricaricato dalla sua run dir (indice della collezione). Duplicati di un canonico
+    fallito restano senza risultato.
+    """
+    from docparser.rerender import load_parse_result
+
+    aliases: Dict[str, DoclingParseResult] = {}
+    loaded: Dict[str, DoclingParseResult] = {}
+    for file_path, match in plan.matches.items():
+        canonical = results_by_file.get(match.canonical)
+        if canonical is None and match.run_dir is not None:
+            if match.run_dir not in loaded:
+                try:
+                    loaded[match.run_dir] = load_parse_result(Path(match.run_dir))
+                except Exception as e:
+                    print(f"  Could not load run {match.run_dir} for {Path(file_path).name}: {e}")
+                    continue
+            canonical = loaded[match.run_dir]
+        if canonical is not None:
+            aliases[file_path] = alias_result(canonical, match)
+    return aliases
+
+
+def write_dedup_report(
+        plan: DedupPlan,
+        report_path: Union[str, Path],
+        config: DedupConfig,
+        aliased: Sequence[str] = (),
+) -> Dict[str, Any]:
+    """Gruppi di duplicati (canonico, membri, metodo e distanza) e impronte calcolate."""
+    report = {
+        "config": asdict(config),
+        "elapsed_s": round(plan.elapsed_s, 3),
+        "inputs": len(plan.fingerprints),
+        "canonical": len(plan.canonical),
+        "aliased": len(aliased),
+        "groups": plan.groups(),
+        "fingerprints": [f.to_dict() for f in plan.fingerprints.values()],
+    }
+    report_path = Path(report_path)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Saved dedup report to {report_path}")
+    return report
@@ -0,0 +1,83 @@
+# images.py
+
+"""
+Nomi content-addressed e deduplica delle immagini estratte.
+
+- image_content_hash: sha256 dei pixel (modo, dimensioni, formato di output), quindi
+  lo stesso logo ha lo stesso nome in ogni documento e in ogni run, indipendentemente
+  dall'encoder PNG/JPEG.
+- dhash: difference hash a 64 bit per la deduplica "quasi uguale" (stesso timbro
+  ri-scansionato, leggere differenze di compressione).
+- ImageDeduper: tiene traccia delle immagini già salvate in un documento.
+"""
+
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+# primi 32 caratteri esadecimali (128 bit): collisioni trascurabili, nomi più corti
+HASH_CHARS = 32
+
+
+def image_content_hash(pil_image: Image.Image, image_format: str = "png") -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{pil_image.mode}|{pil_image.size[0]}x{pil_image.size[1]}|{image_format}|".encode("utf-8"))
+    digest.update(pil_image.tobytes())
+    return digest.hexdigest()[:HASH_CHARS]
+
+
+def dhash(pil_image: Image.Image, hash_size: int = 8) -> int:
+    """Difference hash: confronto tra pixel adiacenti di una miniatura in scala di grigi."""
+    small = pil_image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ImageDeduper:
+    """
+    Registro delle immagini salvate in un documento.
+
+    lookup() ritorna il path già assegnato a un'immagine identica (stesso hash di contenuto)
+    oppure, se near_dup_distance > 0, a un'immagine con dhash entro quella distanza di Hamming.
+    """
+
+    def __init__(self, near_dup_distance: int = 0):
+        self.near_dup_distance = near_dup_distance
+        self._by_hash: Dict[str, str] = {}
+        self._perceptual: List[Tuple[int, str]] = []
+        self.exact_hits = 0
+        self.near_hits = 0
+
+    def lookup(self, content_hash: str, pil_image: Image.Image) -> Tuple[Optional[str], Optional[int]]:
+        """Ritorna (rel_path già salvato o None, dhash calcolato o None)."""
+        rel_path = self._by_hash.get(content_hash)
+        if rel_path is not None:
+            self.exact_hits += 1
+            return rel_path, None
+
+        if self.near_dup_distance <= 0:
+            return None, None
+
+        perceptual = dhash(pil_image)
+        for known, known_path in self._perceptual:
+            if hamming_distance(perceptual, known) <= self.near_dup_distance:
+                self.near_hits += 1
+                # la prossima occorrenza identica viene trovata con l'hash esatto
+                self._by_hash[content_hash] = known_path
+                return known_path, perceptual
+        return None, perceptual
+
+    def add(self, content_hash: str, rel_path: str, perceptual: Optional[int] = None) -> None:
+        self._by_hash[content_hash] = rel_path
+        if perceptual is not None:
+            self._perceptual.append((perceptual, rel_path))
@@ -0,0 +1,595 @@
+# indexing.py
+
+"""
+Indice invertito BM25 su disco per i chunk prodotti dalle run (chunks.json).
+
+Struttura (una cartella per indice, segmenti immutabili come in Lucene):
+
+    <index_dir>/manifest.json            segmenti attivi, run -> segmento, tokenizer, parametri BM25
+    <index_dir>/seg-<id>/segment.json    numero di chunk, lunghezza totale, run del segmento
+    <index_dir>/seg-<id>/terms.npy       term id ordinati (int64)
+    <index_dir>/seg-<id>/offsets.npy     inizio delle posting di ogni termine (+ fine)
+    <index_dir>/seg-<id>/docs.npy        posting: chunk locale (int32), ordinato per termine
+    <index_dir>/seg-<id>/tfs.npy         posting: frequenza del termine nel chunk (uint16)
+    <index_dir>/seg-<id>/doclens.npy     token per chunk
+    <index_dir>/seg-<id>/doc_runs.npy    run (indice in segment.json) di ogni chunk
+    <index_dir>/seg-<id>/chunks.jsonl    campi restituiti: id, prev/focus/next, pagine, file
+    <index_dir>/seg-<id>/chunks.idx.npy  offset in byte di ogni riga di chunks.jsonl
+
+Gli array sono aperti con np.load(mmap_mode="r"): una query legge solo le posting dei
+suoi termini e le righe dei risultati, senza caricare l'indice in memoria.
+
+I termini sono gli id del tokenizer usato dal chunking (docparser.chunking.get_tokenizer),
+calcolati sul testo "focus" (prev/next sono overlap e verrebbero contati due volte).
+
+Aggiornamento incrementale: ogni add_run()/commit() scrive un nuovo segmento e sostituisce
+il manifest in modo atomico (os.replace). Reindicizzare una run la sposta nel nuovo
+segmento: i suoi chunk nel segmento vecchio non sono più "vivi" e spariscono al merge.
+Oltre max_segments i segmenti più piccoli vengono fusi.
+"""
+
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+INDEX_VERSION = 1
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+DEFAULT_MAX_SEGMENTS = 16
+DEFAULT_MERGE_FACTOR = 8
+
+TokenizeFn = Callable[[List[str]], List[List[int]]]
+
+
+# =========================================================
+#  Tokenizer
+# =========================================================
+
+def chunker_tokenize(texts: List[str]) -> List[List[int]]:
+    """Id dei token del tokenizer del chunking (HuggingFace fast, in batch)."""
+    from docparser.chunking import get_tokenizer
+
+    tokenizer = get_tokenizer()
+    encoded = tokenizer(
+        texts,
+        add_special_tokens=False,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )
+    return encoded["input_ids"]
+
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def regex_tokenize(texts: List[str]) -> List[List[int]]:
+    """
+    Tokenizer leggero (parole minuscole -> crc32), senza transformers.
+    Solo per benchmark e ambienti senza modelli: un indice va interrogato con lo stesso tokenizer.
+    """
+    return [[zlib.crc32(word.encode("utf-8")) for word in _WORD_RE.findall(text.lower())] for text in texts]
+
+
+TOKENIZERS: Dict[str, TokenizeFn] = {
+    "chunker": chunker_tokenize,
+    "regex": regex_tokenize,
+}
+
+
+# =========================================================
+#  Risultati
+# =========================================================
+
+@dataclass
+class SearchHit:
+    score: float
+    run: str            # chiave della run (path della run dir)
+    file_name: str
+    chunk_id: int
+    prev: str
+    focus: str
+    next: str
+    pages: List[int] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "score": round(self.score, 4),
+            "run": self.run,
+            "file_name": self.file_name,
+            "chunk_id": self.chunk_id,
+            "pages": self.pages,
+            "prev": self.prev,
+            "focus": self.focus,
+            "next": self.next,
+        }
+
+
+# =========================================================
+#  Segmenti
+# =========================================================
+
+def _write_array(path: Path, array: np.ndarray) -> None:
+    with open(path, "wb") as f:
+        np.save(f, array, allow_pickle=False)
+
+
+def _build_postings(doc_terms: Sequence[Sequence[int]]) -> Tuple[np.ndarray, ...]:
+    """
+    Da lista di term id per chunk a (terms, offsets, docs, tfs, doclens), tutto vettoriale:
+    coppie (termine, chunk) -> np.unique con conteggi -> posting ordinate per termine e chunk.
+    """
+    n_docs = len(doc_terms)
+    doclens = np.fromiter((len(t) for t in doc_terms), dtype=np.int32, count=n_docs)
+    if n_docs == 0 or doclens.sum() == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), \
+            np.zeros(0, dtype=np.uint16), doclens
+
+    all_terms = np.concatenate([np.asarray(t, dtype=np.int64) for t in doc_terms if len(t)])
+    all_docs = np.repeat(np.arange(n_docs, dtype=np.int64), doclens)
+    pairs, tfs = np.unique(all_terms * n_docs + all_docs, return_counts=True)
+    terms_per_posting = pairs // n_docs
+    docs = (pairs % n_docs).astype(np.int32)
+
+    terms, starts = np.unique(terms_per_posting, return_index=True)
+    offsets = np.append(starts, len(pairs)).astype(np.int64)
+    return terms, offsets, docs, np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16), doclens
+
+
+class Segment:
+    """Segmento immutabile aperto in sola lettura (array in mmap)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.name = path.name
+        with open(path / "segment.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.runs: List[str] = self.meta["runs"]
+
+        def load(name):
+            return np.load(path / name, mmap_mode="r", allow_pickle=False)
+
+        self.terms = load("terms.npy")
+        self.offsets = load("offsets.npy")
+        self.docs = load("docs.npy")
+        self.tfs = load("tfs.npy")
+        self.doclens = load("doclens.npy")
+        self.doc_runs = load("doc_runs.npy")
+        self.chunk_offsets = load("chunks.idx.npy")
+
+        self._chunks_file = open(path / "chunks.jsonl", "rb")
+        size = os.fstat(self._chunks_file.fileno()).st_size
+        self._chunks = mmap.mmap(self._chunks_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.live: np.ndarray = np.ones(len(self.doclens), dtype=bool)
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doclens)
+
+    def set_live_runs(self, run_segments: Dict[str, str]) -> None:
+        """Un chunk è vivo se la sua run punta ancora a questo segmento nel manifest."""
+        live_runs = np.array([run_segments.get(run) == self.name for run in self.runs] or [False], dtype=bool)
+        self.live = live_runs[np.asarray(self.doc_runs)] if self.n_docs else np.zeros(0, dtype=bool)
+
+    def postings(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        i = int(np.searchsorted(self.terms, term))
+        if i >= len(self.terms) or self.terms[i] != term:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.docs[start:end], self.tfs[start:end]
+
+    def stored(self, doc: int) -> Dict[str, Any]:
+        start, end = int(self.chunk_offsets[doc]), int(self.chunk_offsets[doc + 1])
+        return json.loads(self._chunks[start:end])
+
+    def close(self) -> None:
+        if isinstance(self._chunks, mmap.mmap):
+            self._chunks.close()
+        self._chunks_file.close()
+
+
+def _write_segment(index_dir: Path, runs: List[str], postings: Tuple[np.ndarray, ...],
+                   doc_runs: np.ndarray, stored: Iterable[bytes], chunk_offsets: np.ndarray) -> str:
+    """
+    Scrive un segmento in una cartella temporanea e la rinomina: un segmento esiste solo se completo.
+    postings = (terms, offsets, docs, tfs, doclens); stored sono i blocchi di chunks.jsonl,
+    chunk_offsets gli offset in byte di ogni riga (+ fine).
+    """
+    terms, offsets, docs, tfs, doclens = postings
+    name = f"seg-{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:6]}"
+    tmp = index_dir / f".{name}.tmp"
+    tmp.mkdir(parents=True)
+
+    _write_array(tmp / "terms.npy", terms.astype(np.int64))
+    _write_array(tmp / "offsets.npy", offsets.astype(np.int64))
+    _write_array(tmp / "docs.npy", docs.astype(np.int32))
+    _write_array(tmp / "tfs.npy", tfs.astype(np.uint16))
+    _write_array(tmp / "doclens.npy", doclens.astype(np.int32))
+    _write_array(tmp / "doc_runs.npy", doc_runs.astype(np.int32))
+    _write_array(tmp / "chunks.idx.npy", chunk_offsets.astype(np.int64))
+    with open(tmp / "chunks.jsonl", "wb") as f:
+        for block in stored:
+            f.write(block)
+
+    with open(tmp / "segment.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "n_docs": len(doclens),
+            "total_len": int(doclens.sum()),
+            "n_terms": len(terms),
+            "runs": runs,
+            "created_at": time.time(),
+        }, f, ensure_ascii=False)
+
+    tmp.rename(index_dir / name)
+    return name
+
+
+def _live_ranges(live: np.ndarray) -> List[Tuple[int, int]]:
+    """Intervalli [start, end) di chunk vivi consecutivi."""
+    padded = np.concatenate(([False], live, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+# =========================================================
+#  Indice
+# =========================================================
+
+class ChunkIndex:
+    """
+    Indice BM25 dei chunk di più run, aggiornabile mentre le run finiscono.
+
+        index = ChunkIndex("output/_index")
+        index.add_run("output/contratto_20240101_120000")   # scrive un segmento
+        hits = index.search("penale per ritardata consegna", k=10)
+
+    Thread-safe per un processo (scritture e query serializzate da un lock; una query dura
+    millisecondi). Le query usano l'ultimo manifest caricato: refresh() per vedere i commit
+    di altri processi.
+    """
+
+    def __init__(self, index_dir: Union[str, Path], tokenizer: Optional[str] = None,
+                 k1: float = DEFAULT_K1, b: float = DEFAULT_B,
+                 max_segments: int = DEFAULT_MAX_SEGMENTS, merge_factor: int = DEFAULT_MERGE_FACTOR):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.max_segments = max_segments
+        self.merge_factor = max(2, merge_factor)
+        self._lock = threading.RLock()
+        self._segments: Dict[str, Segment] = {}
+
+        # tokenizer None: quello dell'indice esistente, "chunker" per un indice nuovo
+        manifest = self._read_manifest()
+        if manifest is None:
+            manifest = {
+                "version": INDEX_VERSION,
+                "tokenizer": tokenizer or "chunker",
+                "k1": k1,
+                "b": b,
+                "segments": [],
+                "runs": {},
+            }
+            self._write_manifest(manifest)
+        elif tokenizer is not None and manifest["tokenizer"] != tokenizer:
+            raise ValueError(f"Index {self.index_dir} was built with tokenizer '{manifest['tokenizer']}', "
+                             f"not '{tokenizer}'")
+        if manifest["tokenizer"] not in TOKENIZERS:
+            raise ValueError(f"Unknown tokenizer '{manifest['tokenizer']}'. Available: {', '.join(TOKENIZERS)}")
+
+        self.tokenize: TokenizeFn = TOKENIZERS[manifest["tokenizer"]]
+        self._apply_manifest(manifest)
+
+    # --- manifest --------------------------------------------------------
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        path = self.index_dir / MANIFEST_FILE
+        if not path.is_file():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp = self.index_dir / f".{MANIFEST_FILE}.{uuid.uuid4().hex[:6]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.index_dir / MANIFEST_FILE)
+
+    def _apply_manifest(self, manifest: Dict[str, Any]) -> None:
+        """Apre i segmenti nuovi, chiude quelli usciti dal manifest, ricalcola N e avgdl."""
+        self.manifest = manifest
+        for name in list(self._segments):
+            if name not in manifest["segments"]:
+                self._segments.pop(name).close()
+        for name in manifest["segments"]:
+            if name not in self._segments:
+                self._segments[name] = Segment(self.index_dir / name)
+
+        self.n_docs = 0
+        total_len = 0
+        for segment in self._segments.values():
+            segment.set_live_runs(manifest["runs"])
+            self.n_docs += int(segment.live.sum())
+            total_len += int(np.asarray(segment.doclens)[segment.live].sum())
+        self.avgdl = total_len / self.n_docs if self.n_docs else 0.0
+
+    def refresh(self) -> None:
+        """Ricarica il manifest (commit fatti da altri processi)."""
+        with self._lock:
+            manifest = self._read_manifest()
+            if manifest is not None:
+                self._apply_manifest(manifest)
+
+    # --- scrittura -------------------------------------------------------
+
+    def add_chunks(self, runs: Dict[str, Tuple[str, List[Dict[str, Any]]]]) -> int:
+        """
+        Indicizza {run_key: (file_name, chunks)} in un nuovo segmento e fa commit.
+        Una run già presente viene sostituita. Ritorna il numero di chunk indicizzati.
+        """
+        run_keys = list(runs)
+        records: List[Tuple[int, Dict[str, Any], str]] = []
+        for run_ordinal, run_key in enumerate(run_keys):
+            file_name, chunks = runs[run_key]
+            for chunk in chunks:
+                records.append((run_ordinal, chunk, file_name))
+        if not run_keys:
+            return 0
+
+        doc_terms = self.tokenize([(chunk.get("focus") or chunk.get("text") or "") for _, chunk, _ in records])
+        stored = [
+            (json.dumps({
+                "run": run_keys[run_ordinal],
+                "file_name": file_name,
+                "chunk_id": chunk.get("id", i),
+                "prev": chunk.get("prev", ""),
+                "focus": chunk.get("focus") or chunk.get("text") or "",
+                "next": chunk.get("next", ""),
+                "pages": (chunk.get("metadata") or {}).get("page_numbers", []),
+            }, ensure_ascii=False) + "\n").encode("utf-8")
+            for i, (run_ordinal, chunk, file_name) in enumerate(records)
+        ]
+        chunk_offsets = np.concatenate(([0], np.cumsum([len(line) for line in stored], dtype=np.int64)))
+        doc_runs = np.asarray([run_ordinal for run_ordinal, _, _ in records], dtype=np.int32)
+
+        with self._lock:
+            name = _write_segment(self.index_dir, run_keys, _build_postings(doc_terms), doc_runs,
+                                  stored, chunk_offsets)
+            manifest = dict(self.manifest)
+            manifest["segments"] = manifest["segments"] + [name]
+            manifest["runs"] = {**manifest["runs"], **{run_key: name for run_key in run_keys}}
+            self._write_manifest(manifest)
+            self._apply_manifest(manifest)
+            self._maybe_merge()
+        return len(records)
+
+    def add_run(self, run_dir: Union[str, Path]) -> int:
+        """Indicizza (o reindicizza) chunks.json di una run dir."""
+        return self.add_runs([run_dir])
+
+    def add_runs(self, run_dirs: Sequence[Union[str, Path]]) -> int:
+        """Più run in un unico segmento (meno segmenti per i rebuild in blocco)."""
+        runs = {}
+        for run_dir in run_dirs:
+            run_dir = Path(run_dir).resolve()
+            chunks_path = run_dir / "chunks.json"
+            if not chunks_path.is_file():
+                print(f"  Skipping {run_dir}: no chunks.json")
+                continue
+            with open(chunks_path, "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+            runs[str(run_dir)] = (_run_file_name(run_dir), chunks)
+        return self.add_chunks(runs)
+
+    def remove_run(self, run_key: Union[str, Path]) -> bool:
+        with self._lock:
+            key = str(Path(run_key).resolve()) if Path(run_key).exists() else str(run_key)
+            if key not in self.manifest["runs"]:
+                return False
+            manifest = dict(self.manifest)
+            manifest["runs"] = {k: v for k, v in manifest["runs"].items() if k != key}
+            self._write_manifest(manifest)
+            self._apply_manifest(manifest)
+            return True
+
+    def _maybe_merge(self) -> None:
+        if len(self.manifest["segments"]) <= self.max_segments:
+            return
+        by_size = sorted(self._segments.values(), key=lambda s: int(s.live.sum()))
+        self.merge([s.name for s in by_size[:self.merge_factor]])
+
+    def merge(self, names: Optional[Sequence[str]] = None) -> Optional[str]:
+        """
+        Fonde i segmenti indicati (default: tutti) in uno, scartando i chunk non più vivi.
+        Le posting vengono rimappate e riordinate senza ri-tokenizzare.
+        """
+        with self._lock:
+            names = list(names) if names is not None else list(self.manifest["segments"])
+            segments = [self._segments[name] for name in names if name in self._segments]
+            if len(segments) < 2 and not any((~s.live).any() for s in segments):
+                return None
+
+            runs: List[str] = []
+            run_ordinals: Dict[str, int] = {}
+            term_parts, doc_parts, tf_parts = [], [], []
+            doclens, doc_runs, stored, offset_parts = [], [], [], []
+            base = 0
+            stored_size = 0
+            for segment in segments:
+                live = segment.live
+                n_live = int(live.sum())
+                # nuovo id per i chunk vivi, -1 per gli altri
+                remap = np.full(segment.n_docs, -1, dtype=np.int64)
+                remap[live] = np.arange(base, base + n_live)
+
+                counts = np.diff(np.asarray(segment.offsets))
+                posting_terms = np.repeat(np.asarray(segment.terms), counts)
+                new_docs = remap[np.asarray(segment.docs)]
+                keep = new_docs >= 0
+                term_parts.append(posting_terms[keep])
+                doc_parts.append(new_docs[keep])
+                tf_parts.append(np.asarray(segment.tfs)[keep])
+                doclens.append(np.asarray(segment.doclens)[live])
+
+                run_map = np.array([run_ordinals.setdefault(run, len(run_ordinals)) for run in segment.runs]
+                                   or [0], dtype=np.int32)
+                doc_runs.append(run_map[np.asarray(segment.doc_runs)[live]])
+
+                # righe di chunks.jsonl copiate a blocchi di chunk vivi consecutivi
+                chunk_offsets = np.asarray(segment.chunk_offsets)
+                for start, end in _live_ranges(live):
+                    begin, finish = int(chunk_offsets[start]), int(chunk_offsets[end])
+                    stored.append(bytes(segment._chunks[begin:finish]))
+                    offset_parts.append(chunk_offsets[start:end] - begin + stored_size)
+                    stored_size += finish - begin
+                base += n_live
+            runs = sorted(run_ordinals, key=run_ordinals.get)
+
+            terms_all = np.concatenate(term_parts)
+            docs_all = np.concatenate(doc_parts)
+            tfs_all = np.concatenate(tf_parts)
+            order = np.lexsort((docs_all, terms_all))
+            terms_sorted = terms_all[order]
+            unique_terms, starts = np.unique(terms_sorted, return_index=True)
+            postings = (unique_terms, np.append(starts, len(terms_sorted)), docs_all[order],
+                        tfs_all[order], np.concatenate(doclens))
+            chunk_offsets = np.concatenate(offset_parts + [np.array([stored_size], dtype=np.int64)])
+
+            name = _write_segment(self.index_dir, runs, postings, np.concatenate(doc_runs), stored, chunk_offsets)
+
+            manifest = dict(self.manifest)
+            merged = set(s.name for s in segments)
+            manifest["segments"] = [s for s in manifest["segments"] if s not in merged] + [name]
+            manifest["runs"] = {
+                run_key: (name if segment_name in merged else segment_name)
+                for run_key, segment_name in manifest["runs"].items()
+            }
+            self._write_manifest(manifest)
+            self._apply_manifest(manifest)
+            for old in merged:
+                # i reader che hanno ancora il segmento in mmap continuano a leggerlo (POSIX)
+                shutil.rmtree(self.index_dir / old, ignore_errors=True)
+            print(f"Merged {len(merged)} segments into {name} ({base} chunks)")
+            return name
+
+    # --- lettura ---------------------------------------------------------
+
+    def search(self, query: str, k: int = 10) -> List[SearchHit]:
+        """Top-k chunk per BM25 sul testo focus."""
+        terms = self.tokenize([query])[0]
+        # un merge concorrente chiude i segmenti fusi: la query lavora su un manifest stabile
+        with self._lock:
+            return self._search(terms, k)
+
+    def _search(self, terms: List[int], k: int) -> List[SearchHit]:
+        if not terms or self.n_docs == 0:
+            return []
+        query_tf: Dict[int, int] = {}
+        for term in terms:
+            query_tf[term] = query_tf.get(term, 0) + 1
+
+        k1, b = self.manifest["k1"], self.manifest["b"]
+        segments = list(self._segments.values())
+
+        # 1. posting vive per segmento e termine, df sui soli chunk vivi
+        postings: Dict[str, Dict[int, Tuple[np.ndarray, np.ndarray]]] = {s.name: {} for s in segments}
+        df: Dict[int, int] = dict.fromkeys(query_tf, 0)
+        for term in query_tf:
+            for segment in segments:
+                docs, tfs = segment.postings(term)
+                if len(docs) == 0:
+                    continue
+                docs = np.asarray(docs)
+                live = segment.live[docs]
+                if live.any():
+                    postings[segment.name][term] = (docs[live], np.asarray(tfs)[live])
+                    df[term] += int(live.sum())
+        idf = {
+            term: math.log(1.0 + (self.n_docs - n + 0.5) / (n + 0.5))
+            for term, n in df.items() if n
+        }
+
+        # 2. punteggi per segmento, top-k locale, poi merge globale
+        heap: List[Tuple[float, str, int]] = []
+        for segment in segments:
+            if not postings[segment.name]:
+                continue
+            scores = np.zeros(segment.n_docs, dtype=np.float32)
+            doclens = np.asarray(segment.doclens)
+            for term, (docs, tfs) in postings[segment.name].items():
+                tf = tfs.astype(np.float32)
+                norm = k1 * (1.0 - b + b * doclens[docs] / self.avgdl)
+                # docs sono univoci nelle posting di un termine: += vettoriale corretto
+                scores[docs] += query_tf[term] * idf[term] * tf * (k1 + 1.0) / (tf + norm)
+
+            top = min(k, int(np.count_nonzero(scores)))
+            if top == 0:
+                continue
+            candidates = np.argpartition(-scores, top - 1)[:top]
+            for doc in candidates:
+                item = (float(scores[doc]), segment.name, int(doc))
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+        hits = []
+        for score, segment_name, doc in sorted(heap, reverse=True):
+            stored = self._segments[segment_name].stored(doc)
+            hits.append(SearchHit(
+                score=score,
+                run=stored["run"],
+                file_name=stored["file_name"],
+                chunk_id=stored["chunk_id"],
+                prev=stored["prev"],
+                focus=stored["focus"],
+                next=stored["next"],
+                pages=stored["pages"],
+            ))
+        return hits
+
+    def stats(self) -> Dict[str, Any]:
+        size = sum(f.stat().st_size for f in self.index_dir.rglob("*") if f.is_file())
+        return {
+            "index_dir": str(self.index_dir),
+            "tokenizer": self.manifest["tokenizer"],
+            "segments": len(self.manifest["segments"]),
+            "runs": len(self.manifest["runs"]),
+            "chunks": self.n_docs,
+            "avg_chunk_tokens": round(self.avgdl, 1),
+            "size_mb": round(size / 2**20, 2),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments = {}
+
+
+def _run_file_name(run_dir: Path) -> str:
+    """Nome del documento sorgente da run.json, altrimenti il nome della run dir."""
+    metadata_path = run_dir / "run.json"
+    if metadata_path.is_file():
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("file_name") or run_dir.name
+        except (OSError, ValueError):
+            pass
+    return run_dir.name
@@ -0,0 +1,257 @@
+# isolation.py
+
+import multiprocessing as mp
+import os
+import queue
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+from docparser.pipeline import DoclingParseResult
+
+try:
+    import psutil
+except ImportError:  # psutil è opzionale: su Linux leggiamo /proc
+    psutil = None
+
+
+# =========================================================
+#  Failure model
+# =========================================================
+
+FAILURE_TIMEOUT = "timeout"
+FAILURE_MEMORY = "memory"
+FAILURE_CRASH = "crash"
+FAILURE_ERROR = "error"
+
+
+@dataclass
+class DocumentFailure:
+    """Esito strutturato di un documento che non è stato possibile processare."""
+    file_path: str
+    reason: str  # timeout | memory | crash | error
+    message: str
+    elapsed_s: float
+    worker_pid: Optional[int] = None
+    peak_rss_mb: Optional[float] = None
+    traceback: Optional[str] = None
+
+
+class DocumentProcessingError(Exception):
+    """Wrapper per chi preferisce un'eccezione al DocumentFailure."""
+
+    def __init__(self, failure: DocumentFailure):
+        super().__init__(f"{failure.reason}: {failure.message} ({failure.file_path})")
+        self.failure = failure
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """RSS del processo (MB), None se non misurabile."""
+    try:
+        if psutil is not None:
+            return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+        with open(f"/proc/{pid}/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except Exception:
+        return None
+
+
+# =========================================================
+#  Worker process
+# =========================================================
+
+def _worker_main(conn) -> None:
+    """
+    Loop del processo worker: riceve kwargs per process_document, risponde con
+    ("ok", DoclingParseResult) oppure ("error", messaggio, traceback).
+    Import pesanti qui dentro: i modelli restano caldi finché il worker vive.
+    """
+    from docparser.core import process_document
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        try:
+            result = process_document(**task)
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}", traceback.format_exc()))
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, ctx, name: str):
+        self.ctx = ctx
+        self.name = name
+        self.process = None
+        self.conn = None
+        self.tasks_done = 0
+
+    def ensure_started(self) -> None:
+        if self.process is not None and self.process.is_alive():
+            return
+        parent_conn, child_conn = self.ctx.Pipe(duplex=True)
+        self.process = self.ctx.Process(target=_worker_main, args=(child_conn,), name=self.name, daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.tasks_done = 0
+        print(f"[isolation] Started worker {self.name} (pid={self.process.pid})")
+
+    def stop(self, graceful: bool = True) -> None:
+        if self.process is None:
+            return
+        if graceful and self.process.is_alive():
+            try:
+                self.conn.send(None)
+                self.process.join(timeout=5)
+            except Exception:
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+
+class IsolatedWorkerPool:
+    """
+    Pool di processi worker riciclabili per process_document.
+
+    - timeout_s:            tempo massimo (wall clock) per documento, poi il worker viene ucciso
+    - max_rss_mb:           soglia di memoria residente del worker, oltre la quale viene ucciso
+    - max_tasks_per_worker: dopo N documenti il worker viene riavviato (contiene la crescita
+                            di memoria dei modelli)
+
+    run() è bloccante e thread-safe: chiamarlo da più thread (o con asyncio.to_thread)
+    usa fino a `workers` processi in parallelo. Un documento problematico produce
+    un DocumentFailure invece di bloccare o abbattere la run.
+    """
+
+    def __init__(
+            self,
+            workers: int = 1,
+            timeout_s: float = 600.0,
+            max_rss_mb: Optional[float] = None,
+            max_tasks_per_worker: Optional[int] = 20,
+            poll_interval_s: float = 0.5,
+            start_method: str = "spawn",
+    ):
+        self.timeout_s = timeout_s
+        self.max_rss_mb = max_rss_mb
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.poll_interval_s = poll_interval_s
+
+        ctx = mp.get_context(start_method)
+        self._workers = [_Worker(ctx, f"docparser-proc-{i}") for i in range(max(1, workers))]
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    @property
+    def size(self) -> int:
+        """Numero di processi worker (documenti convertiti in parallelo)."""
+        return len(self._workers)
+
+    def live_pids(self) -> List[int]:
+        """PID dei worker avviati e vivi (per le misure di memoria)."""
+        return [w.process.pid for w in self._workers if w.process is not None and w.process.is_alive()]
+
+    def __enter__(self) -> "IsolatedWorkerPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.stop()
+
+    def run(
+            self,
+            file_path: str,
+            timeout_s: Optional[float] = None,
+            **process_kwargs: Any,
+    ) -> Union[DoclingParseResult, DocumentFailure]:
+        worker = self._idle.get()
+        try:
+            return self._run_on(worker, file_path, timeout_s or self.timeout_s, process_kwargs)
+        finally:
+            self._idle.put(worker)
+
+    def _run_on(
+            self,
+            worker: _Worker,
+            file_path: str,
+            timeout_s: float,
+            process_kwargs: Dict[str, Any],
+    ) -> Union[DoclingParseResult, DocumentFailure]:
+        # Riciclo preventivo del worker
+        if self.max_tasks_per_worker and worker.tasks_done >= self.max_tasks_per_worker:
+            print(f"[isolation] Recycling {worker.name} after {worker.tasks_done} tasks")
+            worker.stop()
+        worker.ensure_started()
+
+        pid = worker.process.pid
+        t0 = time.monotonic()
+        peak_rss: Optional[float] = None
+
+        def failure(reason: str, message: str, tb: Optional[str] = None) -> DocumentFailure:
+            return DocumentFailure(
+                file_path=file_path,
+                reason=reason,
+                message=message,
+                elapsed_s=time.monotonic() - t0,
+                worker_pid=pid,
+                peak_rss_mb=peak_rss,
+                traceback=tb,
+            )
+
+        try:
+            worker.conn.send({"file_path": file_path, **process_kwargs})
+        except (BrokenPipeError, OSError) as e:
+            worker.stop(graceful=False)
+            return failure(FAILURE_CRASH, f"Could not send task to worker: {e}")
+
+        while True:
+            if worker.conn.poll(self.poll_interval_s):
+                try:
+                    message = worker.conn.recv()
+                except EOFError:
+                    worker.process.join(timeout=1)
+                    exitcode = worker.process.exitcode
+                    worker.stop(graceful=False)
+                    return failure(FAILURE_CRASH, f"Worker died (exitcode={exitcode})")
+
+                worker.tasks_done += 1
+                if message[0] == "ok":
+                    return message[1]
+                return failure(FAILURE_ERROR, message[1], message[2])
+
+            elapsed = time.monotonic() - t0
+
+            if not worker.process.is_alive():
+                exitcode = worker.process.exitcode
+                worker.stop(graceful=False)
+                return failure(FAILURE_CRASH, f"Worker died (exitcode={exitcode})")
+
+            rss = _rss_mb(pid)
+            if rss is not None:
+                peak_rss = max(peak_rss or 0.0, rss)
+                if self.max_rss_mb is not None and rss > self.max_rss_mb:
+                    print(f"[isolation] {worker.name} exceeded RSS ceiling ({rss:.0f}MB > {self.max_rss_mb:.0f}MB), killing")
+                    worker.stop(graceful=False)
+                    return failure(FAILURE_MEMORY, f"RSS {rss:.0f}MB exceeded ceiling {self.max_rss_mb:.0f}MB")
+
+            if elapsed > timeout_s:
+                print(f"[isolation] {worker.name} timed out after {elapsed:.0f}s on {file_path}, killing")
+                worker.stop(graceful=False)
+                return failure(FAILURE_TIMEOUT, f"Timed out after {timeout_s:.0f}s")
@@ -0,0 +1,295 @@
+# languages.py
+
+"""
+Scelta automatica delle lingue OCR per documento (o per intervallo di pagine).
+
+Il costo del riconoscimento OCR cresce con il numero di lingue caricate e l'accuratezza
+cala se il documento è in una lingua non prevista. Prima della conversione facciamo
+un pre-pass economico:
+
+1. text layer (PDF digitali): testo di qualche pagina campione via pypdfium2
+2. campione OCR a bassa risoluzione (scansioni, immagini): una pagina ridotta letta
+   da EasyOCR con tutte le lingue candidate (le lingue latine condividono lo stesso
+   modello di riconoscimento, quindi il campione costa un solo modello)
+3. altrimenti le lingue di default del profilo
+
+Il testo campione viene classificato contando le stopword esclusive di ogni lingua
+candidata: restano la lingua prevalente e quelle con una quota significativa.
+"""
+
+import re
+import time
+from dataclasses import dataclass, asdict, field
+from functools import lru_cache
+from io import BytesIO
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from docparser.profiles import DEFAULT_PROFILE, get_profile
+
+try:
+    import pypdfium2 as pdfium  # dipendenza di docling
+except ImportError:  # pragma: no cover - fallback senza pypdfium2
+    pdfium = None
+
+# Pagine campionate dal text layer (distribuite sull'intervallo) e limite di caratteri
+SAMPLE_PAGES = 6
+SAMPLE_MAX_CHARS = 20_000
+# Campione OCR: una pagina, lato lungo ridotto a questi pixel
+OCR_SAMPLE_MAX_SIDE = 1200
+OCR_SAMPLE_PDF_SCALE = 0.75
+
+# Sotto queste stopword riconosciute il campione non è conclusivo
+MIN_STOPWORD_HITS = 12
+# Una lingua secondaria viene tenuta se copre almeno questa quota delle stopword
+MIN_LANGUAGE_SHARE = 0.15
+
+STOPWORDS: Dict[str, frozenset] = {
+    "it": frozenset((
+        "il", "lo", "gli", "della", "delle", "degli", "dello", "che", "non", "per", "sono", "alla",
+        "nel", "nella", "dei", "anche", "questo", "questa", "essere", "più", "è", "ed", "dal",
+        "dalla", "sul", "sulla", "ai", "alle", "come", "ha", "hanno", "tra", "fra",
+    )),
+    "en": frozenset((
+        "the", "and", "of", "to", "is", "that", "for", "with", "are", "this", "be", "by", "from",
+        "which", "or", "have", "not", "was", "an", "on", "at", "it", "as", "will", "shall", "been",
+        "their", "these", "such", "any", "may",
+    )),
+    "fr": frozenset((
+        "le", "les", "des", "est", "et", "une", "du", "pour", "dans", "qui", "que", "sur", "pas",
+        "au", "aux", "avec", "sont", "ce", "cette", "par", "être", "été", "leur", "nous", "vous",
+        "ou", "mais", "ne", "il", "ses",
+    )),
+    "de": frozenset((
+        "der", "die", "das", "und", "ist", "nicht", "mit", "von", "den", "dem", "zu", "ein", "eine",
+        "für", "auf", "sich", "auch", "des", "im", "werden", "wird", "oder", "bei", "nach", "sind",
+        "wir", "über", "durch", "einer", "dieser",
+    )),
+    "es": frozenset((
+        "el", "los", "las", "del", "y", "que", "en", "por", "para", "una", "con", "se", "es", "al",
+        "como", "más", "pero", "sus", "este", "esta", "son", "fue", "sobre", "entre", "también",
+        "han", "hasta", "desde",
+    )),
+    "pt": frozenset((
+        "o", "os", "as", "da", "do", "das", "dos", "em", "uma", "não", "para", "com", "por", "que",
+        "é", "no", "na", "ao", "mais", "seu", "sua", "são", "também", "pelo", "pela", "foi",
+        "entre", "até",
+    )),
+}
+
+_WORD = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+PdfSource = Union[str, Path, bytes]
+
+
+@dataclass
+class LanguageSelection:
+    """Lingue OCR scelte per un documento e come sono state scelte."""
+    languages: List[str]
+    method: str  # "text-layer" | "ocr-sample" | "default" | "profile"
+    scores: Dict[str, int] = field(default_factory=dict)
+    sample_chars: int = 0
+    elapsed_s: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# =========================================================
+#  Classificazione del testo campione
+# =========================================================
+
+def _exclusive_stopwords(candidates: Sequence[str]) -> Dict[str, str]:
+    """parola -> lingua, solo per le stopword che appartengono a una sola lingua candidata."""
+    owners: Dict[str, List[str]] = {}
+    for lang in candidates:
+        for word in STOPWORDS.get(lang, ()):
+            owners.setdefault(word, []).append(lang)
+    return {word: langs[0] for word, langs in owners.items() if len(langs) == 1}
+
+
+def score_languages(text: str, candidates: Sequence[str]) -> Dict[str, int]:
+    """Numero di stopword esclusive di ogni lingua candidata presenti nel testo."""
+    exclusive = _exclusive_stopwords(candidates)
+    scores = {lang: 0 for lang in candidates}
+    for word in _WORD.findall(text.lower()):
+        lang = exclusive.get(word)
+        if lang is not None:
+            scores[lang] += 1
+    return scores
+
+
+def detect_languages(
+        text: str,
+        candidates: Sequence[str],
+        min_hits: int = MIN_STOPWORD_HITS,
+        min_share: float = MIN_LANGUAGE_SHARE,
+) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Ritorna (lingue, punteggi). Le lingue sono nell'ordine dei candidati, così lo stesso
+    insieme dà sempre la stessa chiave nella cache dei converter; lista vuota se il
+    campione non è conclusivo.
+    """
+    scores = score_languages(text, candidates)
+    total = sum(scores.values())
+    if total < min_hits:
+        return [], scores
+    top = max(scores, key=scores.get)
+    languages = [
+        lang for lang in candidates
+        if lang == top or scores[lang] / total >= min_share
+    ]
+    return languages, scores
+
+
+# =========================================================
+#  Campioni di testo
+# =========================================================
+
+def _sample_indices(first: int, last: int, max_pages: int) -> List[int]:
+    """Indici (0-based) distribuiti uniformemente in [first, last]."""
+    n = last - first + 1
+    if n <= max_pages:
+        return list(range(first, last + 1))
+    return sorted({first + round(i * (n - 1) / (max_pages - 1)) for i in range(max_pages)})
+
+
+def _page_bounds(pdf, page_range: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+    n_pages = len(pdf)
+    if page_range is None:
+        return 0, n_pages - 1
+    return max(0, page_range[0] - 1), min(n_pages, page_range[1]) - 1
+
+
+def sample_text_layer(
+        source: PdfSource,
+        page_range: Optional[Tuple[int, int]] = None,
+        max_pages: int = SAMPLE_PAGES,
+        max_chars: int = SAMPLE_MAX_CHARS,
+) -> str:
+    """Testo del text layer di alcune pagine del PDF (stringa vuota senza pypdfium2 o senza testo)."""
+    if pdfium is None:
+        return ""
+    pdf = pdfium.PdfDocument(str(source) if isinstance(source, Path) else source)
+    try:
+        first, last = _page_bounds(pdf, page_range)
+        parts: List[str] = []
+        chars = 0
+        for idx in _sample_indices(first, last, max_pages):
+            page = pdf[idx]
+            textpage = page.get_textpage()
+            text = textpage.get_text_range()
+            textpage.close()
+            page.close()
+            parts.append(text)
+            chars += len(text)
+            if chars >= max_chars:
+                break
+        return "\n".join(parts)[:max_chars]
+    finally:
+        pdf.close()
+
+
+def _sample_image(source: PdfSource, is_pdf: bool, page_range: Optional[Tuple[int, int]]) -> Optional[Image.Image]:
+    """Pagina centrale dell'intervallo (PDF) o immagine, ridotta per il campione OCR."""
+    if is_pdf:
+        if pdfium is None:
+            return None
+        pdf = pdfium.PdfDocument(str(source) if isinstance(source, Path) else source)
+        try:
+            first, last = _page_bounds(pdf, page_range)
+            page = pdf[(first + last) // 2]
+            image = page.render(scale=OCR_SAMPLE_PDF_SCALE).to_pil()
+            page.close()
+        finally:
+            pdf.close()
+    else:
+        with Image.open(BytesIO(source) if isinstance(source, bytes) else source) as img:
+            image = img.convert("RGB")
+    image.thumbnail((OCR_SAMPLE_MAX_SIDE, OCR_SAMPLE_MAX_SIDE))
+    return image
+
+
+@lru_cache(maxsize=4)
+def _sample_reader(languages: Tuple[str, ...]):
+    import easyocr
+    import torch
+
+    return easyocr.Reader(list(languages), gpu=torch.cuda.is_available(), verbose=False)
+
+
+def sample_ocr_text(
+        source: PdfSource,
+        is_pdf: bool,
+        candidates: Sequence[str],
+        page_range: Optional[Tuple[int, int]] = None,
+) -> str:
+    """Testo di una pagina a bassa risoluzione letta da EasyOCR con tutte le lingue candidate."""
+    image = _sample_image(source, is_pdf, page_range)
+    if image is None:
+        return ""
+    reader = _sample_reader(tuple(candidates))
+    return " ".join(reader.readtext(np.asarray(image), detail=0, paragraph=True))
+
+
+# =========================================================
+#  Scelta per documento
+# =========================================================
+
+def select_ocr_languages(
+        source: PdfSource,
+        file_name: str,
+        profile: str = DEFAULT_PROFILE,
+        page_range: Optional[Tuple[int, int]] = None,
+) -> LanguageSelection:
+    """
+    Sceglie l'insieme minimo di lingue OCR per il documento (o per page_range, 1-based e
+    inclusivo) secondo il profilo: ocr_auto_languages, ocr_language_candidates,
+    ocr_language_sample e, come ripiego, ocr_languages.
+    """
+    conv_profile = get_profile(profile)
+    default = list(conv_profile.ocr_languages)
+    if not conv_profile.ocr_auto_languages:
+        return LanguageSelection(languages=default, method="profile")
+
+    t_start = time.perf_counter()
+    candidates = list(conv_profile.ocr_language_candidates)
+    mime, _ = guess_type(file_name)
+    is_pdf = mime == "application/pdf"
+    scores: Dict[str, int] = {}
+
+    attempts = []
+    if is_pdf:
+        attempts.append(("text-layer", lambda: sample_text_layer(source, page_range)))
+    if conv_profile.ocr_language_sample and (is_pdf or (mime or "").startswith("image/")):
+        attempts.append(("ocr-sample", lambda: sample_ocr_text(source, is_pdf, candidates, page_range)))
+
+    for method, sample in attempts:
+        try:
+            text = sample()
+        except Exception as e:
+            print(f"OCR language detection ({method}) failed for {file_name}: {e}")
+            continue
+        languages, scores = detect_languages(text, candidates)
+        if languages:
+            selection = LanguageSelection(
+                languages=languages,
+                method=method,
+                scores=scores,
+                sample_chars=len(text),
+                elapsed_s=time.perf_counter() - t_start,
+            )
+            print(f"OCR languages for {file_name}: {', '.join(languages)} ({method})")
+            return selection
+
+    print(f"OCR languages for {file_name}: {', '.join(default)} (default, detection inconclusive)")
+    return LanguageSelection(
+        languages=default,
+        method="default",
+        scores=scores,
+        elapsed_s=time.perf_counter() - t_start,
+    )
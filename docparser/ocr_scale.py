@@ -0,0 +1,320 @@
+# ocr_scale.py
+
+"""
+Scala di rasterizzazione OCR adattiva per pagina.
+
+Docling rasterizza ogni pagina da passare all'OCR a una scala fissa (3x i 72 dpi del PDF):
+le pagine a caratteri grandi (o le foto ad alta risoluzione) costano molto più del necessario,
+quelle con note a piè di pagina minuscole perdono accuratezza.
+
+Qui stimiamo l'altezza delle righe di testo su un render a bassa risoluzione (profilo di
+proiezione orizzontale su strisce verticali, soglia di Otsu) e scegliamo per ogni pagina la
+scala minima che porta le righe più piccole a ocr_target_line_px pixel. Le pagine contigue
+con la stessa scala formano un intervallo convertito con un unico converter.
+"""
+
+import time
+from dataclasses import dataclass, asdict
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from docparser.scheduling import MIN_CHARS_PER_DIGITAL_PAGE
+
+try:
+    import pypdfium2 as pdfium  # dipendenza di docling
+except ImportError:  # pragma: no cover - fallback senza pypdfium2
+    pdfium = None
+
+try:
+    from docling.models.base_ocr_model import BaseOcrModel
+except ImportError:  # pragma: no cover - layout dei moduli diverso
+    BaseOcrModel = None
+
+# Scala usata dai modelli OCR di Docling (EasyOCR/RapidOCR: 3 x 72 dpi = 216 dpi)
+DOCLING_OCR_SCALE = 3.0
+# Scale ammesse: poche, perché ogni scala è un converter (e una pipeline) in cache
+SCALE_BUCKETS: Tuple[float, ...] = (0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0)
+
+# Render di stima: 72 dpi per i PDF (1 px = 1 pt), immagini ridotte a questo lato lungo
+LOW_RES_PDF_SCALE = 1.0
+LOW_RES_MAX_SIDE = 1600
+# Strisce verticali per il profilo di proiezione (separa le colonne di testo)
+PROFILE_STRIPS = 4
+# "Testo più piccolo da leggere": la k-esima riga più bassa (una nota a piè di pagina di
+# poche righe conta, un singolo segno no)
+SMALL_TEXT_MIN_RUNS = 4
+# Run più basse di questa frazione della mediana sono segni staccati, non righe
+MIN_RUN_OF_MEDIAN = 0.3
+# Intervalli più corti vengono fusi con il vicino (alla scala maggiore delle due)
+MIN_RANGE_PAGES = 3
+
+PdfSource = Union[str, Path, bytes]
+
+
+@dataclass
+class PageScale:
+    page: int  # 1-based
+    line_height_pt: Optional[float]  # None: pagina digitale o senza testo riconoscibile
+    scale: Optional[float]           # None: nessuna preferenza (scala del vicino o di Docling)
+
+
+@dataclass
+class ScaleRange:
+    first_page: Optional[int]  # None per le immagini (un'unica pagina)
+    last_page: Optional[int]
+    scale: float
+    line_height_pt: Optional[float] = None
+
+    @property
+    def page_range(self) -> Optional[Tuple[int, int]]:
+        if self.first_page is None:
+            return None
+        return self.first_page, self.last_page
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# =========================================================
+#  Stima dell'altezza del testo
+# =========================================================
+
+def _otsu_threshold(gray: np.ndarray) -> int:
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    w0 = np.cumsum(hist)
+    w1 = gray.size - w0
+    sum0 = np.cumsum(levels * hist)
+    m0 = sum0 / np.maximum(w0, 1)
+    m1 = (sum0[-1] - sum0) / np.maximum(w1, 1)
+    return int(np.argmax(w0 * w1 * (m0 - m1) ** 2))
+
+
+def line_heights(gray: np.ndarray, strips: int = PROFILE_STRIPS) -> np.ndarray:
+    """
+    Altezze (in pixel) delle righe di testo di una pagina in scala di grigi: righe di pixel
+    con inchiostro consecutive, per striscia verticale. Scarta puntini e blocchi alti
+    (immagini, bordi) oltre il 10% dell'altezza della pagina.
+    """
+    height, width = gray.shape
+    ink = gray <= _otsu_threshold(gray)
+    if ink.mean() > 0.5:
+        # testo chiaro su fondo scuro
+        ink = ~ink
+    ink_fraction = ink.mean()
+    if ink_fraction < 0.002 or ink_fraction > 0.5:
+        return np.empty(0, dtype=np.int64)
+
+    runs = []
+    step = max(1, width // strips)
+    for x0 in range(0, width, step):
+        strip = ink[:, x0:x0 + step]
+        rows = strip.sum(axis=1) >= max(1, strip.shape[1] // 100)
+        edges = np.diff(np.concatenate(([0], rows.astype(np.int8), [0])))
+        runs.append(np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1))
+    heights = np.concatenate(runs) if runs else np.empty(0, dtype=np.int64)
+    heights = heights[(heights >= 3) & (heights <= 0.1 * height)]
+    if heights.size == 0:
+        return heights
+    # puntini delle i, accenti e segni di punteggiatura staccati dalla riga
+    return heights[heights >= MIN_RUN_OF_MEDIAN * np.median(heights)]
+
+
+def flatten_background(gray: Image.Image) -> np.ndarray:
+    """
+    Divide per lo sfondo stimato (miniatura 1/32 sfumata): toglie ombre e illuminazione
+    non uniforme delle foto, così la soglia di Otsu separa l'inchiostro dalla carta.
+    """
+    small = gray.resize((max(1, gray.width // 32), max(1, gray.height // 32)), Image.Resampling.BILINEAR)
+    background = small.filter(ImageFilter.MaxFilter(3)).resize(gray.size, Image.Resampling.BILINEAR)
+    flat = np.asarray(gray, dtype=np.float32) / np.maximum(np.asarray(background, dtype=np.float32), 1.0)
+    return np.clip(flat * 255.0, 0, 255).astype(np.uint8)
+
+
+def small_text_height(gray: np.ndarray, pixels_per_pt: float) -> Optional[float]:
+    """Altezza in punti delle righe più piccole (SMALL_TEXT_MIN_RUNS-esima), None se non c'è testo."""
+    heights = line_heights(gray)
+    if heights.size < SMALL_TEXT_MIN_RUNS:
+        return None
+    return float(np.partition(heights, SMALL_TEXT_MIN_RUNS - 1)[SMALL_TEXT_MIN_RUNS - 1]) / pixels_per_pt
+
+
+def scale_for_line_height(line_height_pt: float, target_line_px: int) -> float:
+    """La scala minima tra SCALE_BUCKETS che porta line_height_pt ad almeno target_line_px."""
+    required = target_line_px / max(line_height_pt, 1e-6)
+    for bucket in SCALE_BUCKETS:
+        if bucket >= required:
+            return bucket
+    return SCALE_BUCKETS[-1]
+
+
+# =========================================================
+#  Piano per documento
+# =========================================================
+
+def _pdf_page_scales(
+        source: PdfSource,
+        page_range: Optional[Tuple[int, int]],
+        target_line_px: int,
+) -> List[PageScale]:
+    pdf = pdfium.PdfDocument(str(source) if isinstance(source, Path) else source)
+    try:
+        n_pages = len(pdf)
+        first, last = (1, n_pages) if page_range is None else (max(1, page_range[0]), min(n_pages, page_range[1]))
+        pages = []
+        for page_no in range(first, last + 1):
+            page = pdf[page_no - 1]
+            textpage = page.get_textpage()
+            chars = textpage.count_chars()
+            textpage.close()
+            height_pt = None
+            # pagine digitali: Docling usa il text layer, la scala OCR conta poco
+            if chars < MIN_CHARS_PER_DIGITAL_PAGE:
+                gray = page.render(scale=LOW_RES_PDF_SCALE, grayscale=True).to_pil().convert("L")
+                height_pt = small_text_height(flatten_background(gray), LOW_RES_PDF_SCALE)
+            page.close()
+            pages.append(PageScale(
+                page=page_no,
+                line_height_pt=height_pt,
+                scale=scale_for_line_height(height_pt, target_line_px) if height_pt else None,
+            ))
+        return pages
+    finally:
+        pdf.close()
+
+
+def _image_scale(source: PdfSource, target_line_px: int) -> PageScale:
+    """Immagini: Docling le tratta come una pagina con 1 px = 1 pt."""
+    with Image.open(BytesIO(source) if isinstance(source, bytes) else source) as img:
+        gray = img.convert("L")
+    factor = min(1.0, LOW_RES_MAX_SIDE / max(gray.size))
+    if factor < 1.0:
+        gray = gray.resize((max(1, round(gray.width * factor)), max(1, round(gray.height * factor))),
+                           Image.Resampling.BILINEAR)
+    height_pt = small_text_height(flatten_background(gray), factor)
+    return PageScale(
+        page=1,
+        line_height_pt=height_pt,
+        scale=scale_for_line_height(height_pt, target_line_px) if height_pt else None,
+    )
+
+
+def group_page_scales(pages: Sequence[PageScale], min_pages: int = MIN_RANGE_PAGES) -> List[ScaleRange]:
+    """
+    Intervalli contigui di pagine con la stessa scala. Le pagine senza preferenza prendono
+    la scala del vicino; gli intervalli più corti di min_pages vengono fusi con il vicino
+    alla scala maggiore (meglio pagare un po' di tempo che perdere testo).
+    """
+    known = [p.scale for p in pages if p.scale is not None]
+    if not known:
+        return []
+
+    scales: List[float] = []
+    fill = known[0]
+    for p in pages:
+        fill = p.scale if p.scale is not None else fill
+        scales.append(fill)
+
+    ranges: List[ScaleRange] = []
+    for p, scale in zip(pages, scales):
+        if ranges and ranges[-1].scale == scale:
+            ranges[-1].last_page = p.page
+        else:
+            ranges.append(ScaleRange(first_page=p.page, last_page=p.page, scale=scale))
+
+    merged = True
+    while merged and len(ranges) > 1:
+        merged = False
+        for i, r in enumerate(ranges):
+            if r.last_page - r.first_page + 1 >= min_pages:
+                continue
+            j = i - 1 if i == len(ranges) - 1 or (i > 0 and ranges[i - 1].scale >= ranges[i + 1].scale) else i + 1
+            a, b = sorted((i, j))
+            ranges[a] = ScaleRange(
+                first_page=ranges[a].first_page,
+                last_page=ranges[b].last_page,
+                scale=max(ranges[a].scale, ranges[b].scale),
+            )
+            del ranges[b]
+            merged = True
+            break
+
+    # intervalli vicini diventati della stessa scala dopo le fusioni
+    coalesced: List[ScaleRange] = []
+    for r in ranges:
+        if coalesced and coalesced[-1].scale == r.scale:
+            coalesced[-1].last_page = r.last_page
+        else:
+            coalesced.append(r)
+    ranges = coalesced
+
+    # altezza minima di riga per intervallo (per le statistiche)
+    for r in ranges:
+        heights = [p.line_height_pt for p in pages
+                   if r.first_page <= p.page <= r.last_page and p.line_height_pt is not None]
+        r.line_height_pt = round(min(heights), 2) if heights else None
+    return ranges
+
+
+def plan_ocr_scales(
+        source: PdfSource,
+        is_pdf: bool,
+        target_line_px: int,
+        page_range: Optional[Tuple[int, int]] = None,
+) -> List[ScaleRange]:
+    """
+    Piano di rasterizzazione: lista di ScaleRange (vuota = nessuna stima possibile,
+    si usa la scala fissa di Docling).
+    """
+    if is_pdf:
+        if pdfium is None:
+            return []
+        return group_page_scales(_pdf_page_scales(source, page_range, target_line_px))
+
+    page = _image_scale(source, target_line_px)
+    if page.scale is None:
+        return []
+    return [ScaleRange(first_page=None, last_page=None, scale=page.scale, line_height_pt=page.line_height_pt)]
+
+
+# =========================================================
+#  Applicazione al converter
+# =========================================================
+
+def apply_ocr_scale(converter, scale: float, formats: Sequence[Any]) -> bool:
+    """
+    Imposta la scala dei modelli OCR nelle pipeline del converter (Docling non la espone
+    nelle PdfPipelineOptions). Inizializza le pipeline: chiamarla solo su converter in cache.
+    Ritorna False se la versione di Docling non permette di trovare il modello OCR.
+    """
+    if BaseOcrModel is None or not hasattr(converter, "_get_pipeline"):
+        return False
+    applied = False
+    for input_format in formats:
+        converter.initialize_pipeline(input_format)
+        pipeline = converter._get_pipeline(input_format)
+        for model in getattr(pipeline, "build_pipe", None) or []:
+            if isinstance(model, BaseOcrModel):
+                model.scale = scale
+                applied = True
+    return applied
+
+
+def timed_plan(
+        source: PdfSource,
+        is_pdf: bool,
+        target_line_px: int,
+        page_range: Optional[Tuple[int, int]] = None,
+) -> Tuple[List[ScaleRange], float]:
+    """plan_ocr_scales con il tempo impiegato; in caso di errore piano vuoto (scala fissa)."""
+    t_start = time.perf_counter()
+    try:
+        ranges = plan_ocr_scales(source, is_pdf, target_line_px, page_range)
+    except Exception as e:
+        print(f"Adaptive OCR scale estimation failed, using fixed scale: {e}")
+        ranges = []
+    return ranges, time.perf_counter() - t_start
@@ -1,10 +1,12 @@
 # pipeline.py
 
 import json
-import uuid
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from io import BytesIO
 from pathlib import Path
-from typing import List, Tuple, Optional, Set, Union
+from typing import List, Tuple, Optional, Sequence, Set, Union, Dict, Any
 from collections import Counter
 from mimetypes import guess_type
 
@@ -12,16 +14,33 @@ import torch
 import pandas as pd
 from PIL import Image
 
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions, RapidOcrOptions, EasyOcrOptions
+from docling.datamodel.base_models import InputFormat, DocumentStream
+from docling.datamodel.pipeline_options import (
+    PdfPipelineOptions,
+    RapidOcrOptions,
+    EasyOcrOptions,
+    TableFormerMode,
+    TableStructureOptions,
+)
+
+try:
+    from docling.datamodel.accelerator_options import AcceleratorOptions
+except ImportError:  # docling < 2.40
+    from docling.datamodel.pipeline_options import AcceleratorOptions
 from docling.document_converter import (
     DocumentConverter,
     PdfFormatOption,
     ImageFormatOption,
 )
-from docling_core.types.doc import DocItemLabel
-
-from docparser.chunking import generate_markdown_chunks_from_string
+from docling_core.types.doc import DocItemLabel, DoclingDocument
+
+from docparser.chunking import CHUNK_OVERLAP_TOKENS, CHUNK_SIZE_TOKENS, build_markdown_chunks, \
+    locate_page_anchors, write_chunks
+from docparser.images import ImageDeduper, image_content_hash
+from docparser.languages import LanguageSelection, select_ocr_languages
+from docparser.ocr_scale import DOCLING_OCR_SCALE, ScaleRange, apply_ocr_scale, timed_plan
+from docparser.profiles import DEFAULT_PROFILE, get_profile
+from docparser.tables import TABLES_DIR, export_table_groups
 from docparser.utils import should_enable_ocr_for_file, merge_tables, generate_merged_markdown
 
 
@@ -43,6 +62,22 @@ class DoclingParseResult:
     # info utili per le immagini (path relativi da usare nei link)
     image_rel_paths: List[str]
 
+    # statistiche della run (tempi per stage, pagine, chunk, immagini)
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+    # profilo di conversione usato (fast / balanced / accurate)
+    profile: str = DEFAULT_PROFILE
+
+    # tabelle mergiate in formato colonnare: tables/table_<n>.csv|.parquet + tables/tables.json
+    tables_dir: Optional[Path] = None
+    table_rel_paths: List[str] = field(default_factory=list)
+
+    # lingue OCR usate (scelte per documento, vedi docparser.languages)
+    ocr_languages: List[str] = field(default_factory=list)
+
+    # quasi-duplicato di un altro input (docparser.dedup): file canonico di cui riusa la run
+    alias_of: Optional[str] = None
+
 
 # TODO test with different document formats
 # TODO test if the ocr is actually needed based on text layer presence
@@ -55,10 +90,42 @@ class DoclingParseResult:
 def build_docling_converter(
         file_path: str,
         use_rapidocr: bool,
+        profile: str = DEFAULT_PROFILE,
+        ocr_languages: Optional[Sequence[str]] = None,
 ) -> tuple[DocumentConverter, bool, str]:
     ocr_enabled = should_enable_ocr_for_file(file_path)
     print(f"Automatic OCR decision: {'ENABLED' if ocr_enabled else 'DISABLED'} for this file.")
 
+    converter, ocr_engine_name = get_docling_converter(
+        ocr_enabled=ocr_enabled,
+        use_rapidocr=use_rapidocr,
+        profile=profile,
+        ocr_languages=tuple(ocr_languages) if ocr_enabled and ocr_languages else None,
+    )
+    return converter, ocr_enabled, ocr_engine_name
+
+
+# Batch size dei modelli nelle PdfPipelineOptions (Docling >= 2.5x, pipeline threaded)
+MODEL_BATCH_OPTIONS = ("layout_batch_size", "ocr_batch_size", "table_batch_size")
+
+
+def build_pipeline_options(
+        ocr_enabled: bool,
+        use_rapidocr: bool,
+        profile: str = DEFAULT_PROFILE,
+        ocr_languages: Optional[Tuple[str, ...]] = None,
+        model_batch_size: Optional[int] = None,
+) -> tuple[PdfPipelineOptions, str]:
+    """
+    Traduce un profilo (fast/balanced/accurate, vedi docparser.profiles) nelle
+    PdfPipelineOptions di Docling. use_rapidocr forza RapidOCR qualunque sia il profilo.
+    ocr_languages (scelte per documento) sostituiscono le ocr_languages del profilo.
+    model_batch_size (conversioni batch, vedi docparser.batching) alza i batch size dei
+    modelli layout/OCR/tabelle, se la versione di Docling li espone.
+    """
+    conv_profile = get_profile(profile)
+    languages = list(ocr_languages or conv_profile.ocr_languages)
+
     ocr_options = None
     ocr_engine_name = "no-ocr"
 
@@ -66,14 +133,14 @@ def build_docling_converter(
         ocr_engine_name = "no-ocr"
     else:
         if EasyOcrOptions is not None and RapidOcrOptions is not None:
-            if use_rapidocr:
-                print("Docling OCR engine: RapidOCR (forced)")
-                ocr_options = RapidOcrOptions(lang=["it", "en"])
+            if use_rapidocr or conv_profile.ocr_engine == "rapidocr":
+                print(f"Docling OCR engine: RapidOCR ({'forced' if use_rapidocr else f'profile {profile}'})")
+                ocr_options = RapidOcrOptions(lang=languages)
                 ocr_engine_name = "rapidocr"
             else:
-                print("Docling OCR engine: EasyOCR (default)")
+                print(f"Docling OCR engine: EasyOCR (profile {profile})")
                 ocr_options = EasyOcrOptions(
-                    lang=["it", "en"],
+                    lang=languages,
                     use_gpu=torch.cuda.is_available(),
                 )
                 ocr_engine_name = "easyocr"
@@ -81,18 +148,58 @@ def build_docling_converter(
             print("Docling OCR engine: AUTO (library default)")
             ocr_engine_name = "auto"
 
-    pdf_pipeline_options = PdfPipelineOptions(
-        generate_picture_images=True,
-        generate_page_images=True,
-        use_ocr=ocr_enabled,
-        ocr_options=ocr_options if ocr_enabled else None,
+    table_mode = TableFormerMode.FAST if conv_profile.table_mode == "fast" else TableFormerMode.ACCURATE
+
+    pipeline_options = PdfPipelineOptions(
+        do_ocr=ocr_enabled,
+        do_table_structure=conv_profile.do_table_structure,
+        table_structure_options=TableStructureOptions(mode=table_mode, do_cell_matching=True),
+        images_scale=conv_profile.images_scale,
+        generate_picture_images=conv_profile.generate_picture_images,
+        generate_page_images=conv_profile.generate_page_images,
+        accelerator_options=AcceleratorOptions(num_threads=conv_profile.num_threads),
     )
+    if ocr_enabled and ocr_options is not None:
+        pipeline_options.ocr_options = ocr_options
+    if model_batch_size is not None:
+        for option in MODEL_BATCH_OPTIONS:
+            if hasattr(pipeline_options, option):
+                setattr(pipeline_options, option, model_batch_size)
+
+    return pipeline_options, ocr_engine_name
+
+
+# Converter tenuti in cache: uno per combinazione di opzioni, insieme di lingue OCR
+# e scala OCR. Ogni converter ha i suoi modelli OCR, quindi la cache è limitata
+CONVERTER_CACHE_SIZE = 16
+
 
-    image_pipeline_options = PdfPipelineOptions(
-        generate_picture_images=True,
-        generate_page_images=True,
-        use_ocr=ocr_enabled,
-        ocr_options=ocr_options if ocr_enabled else None,
+@lru_cache(maxsize=CONVERTER_CACHE_SIZE)
+def get_docling_converter(
+        ocr_enabled: bool,
+        use_rapidocr: bool,
+        profile: str = DEFAULT_PROFILE,
+        ocr_languages: Optional[Tuple[str, ...]] = None,
+        ocr_scale: Optional[float] = None,
+        model_batch_size: Optional[int] = None,
+) -> tuple[DocumentConverter, str]:
+    """
+    Ritorna un DocumentConverter già configurato, riusato tra le chiamate.
+
+    La costruzione del converter (e il caricamento dei modelli layout/OCR
+    che Docling fa al primo convert) è la parte più costosa: teniamo in cache
+    un converter per ogni combinazione di opzioni, così CLI batch e server
+    pagano il costo una volta sola per processo.
+    ocr_languages (tupla, None = lingue del profilo) fa parte della chiave: documenti
+    con lo stesso insieme di lingue riusano lo stesso converter. Lo stesso vale per
+    ocr_scale (None = scala di Docling), la scala di rasterizzazione dei modelli OCR.
+    model_batch_size (None = default di Docling) serve ai converter delle conversioni batch.
+    """
+    pdf_pipeline_options, ocr_engine_name = build_pipeline_options(
+        ocr_enabled, use_rapidocr, profile, ocr_languages, model_batch_size
+    )
+    image_pipeline_options, _ = build_pipeline_options(
+        ocr_enabled, use_rapidocr, profile, ocr_languages, model_batch_size
     )
 
     pdf_format_option = PdfFormatOption(pipeline_options=pdf_pipeline_options)
@@ -104,63 +211,266 @@ def build_docling_converter(
             InputFormat.IMAGE: image_format_option,
         }
     )
+    if ocr_enabled and ocr_scale is not None:
+        if not apply_ocr_scale(converter, ocr_scale, (InputFormat.PDF, InputFormat.IMAGE)):
+            print(f"Warning: OCR scale {ocr_scale} not supported by this Docling version, using the default")
 
-    return converter, ocr_enabled, ocr_engine_name
+    return converter, ocr_engine_name
+
+
+def warmup_docling_converters(use_rapidocr: bool = False, profile: str = DEFAULT_PROFILE) -> None:
+    """
+    Pre-carica i converter (con e senza OCR) e i relativi modelli.
+    Utile per i processi long-running, così la prima richiesta non paga il cold start.
+    """
+    for ocr_enabled in (True, False):
+        converter, _ = get_docling_converter(
+            ocr_enabled=ocr_enabled,
+            use_rapidocr=use_rapidocr,
+            profile=profile,
+        )
+        converter.initialize_pipeline(InputFormat.PDF)
+        converter.initialize_pipeline(InputFormat.IMAGE)
+
+
+# =========================================================
+#  In-memory result
+# =========================================================
+
+@dataclass
+class InMemoryParseResult:
+    """
+    Risultato della pipeline tenuto interamente in memoria (nessuna scrittura su disco).
+    La persistenza è demandata a un sink: write_parse_result() per il file system,
+    upload_in_memory_result_to_minio() per MinIO.
+    """
+    ocr_enabled: bool
+    ocr_engine_name: str
+    file_name: str
+
+    markdown: str       # markdown finale con header
+    markdown_body: str  # markdown senza header tecnico (quello passato al chunking)
+    chunks: List[Dict[str, Any]]
+
+    # path relativo ("images/<nome>.<ext>") -> bytes dell'immagine, in ordine di apparizione
+    images: Dict[str, bytes]
+
+    # DoclingDocument originale (serve al sink su disco per output.json)
+    document: Any = None
+    stats: Dict[str, Any] = field(default_factory=dict)
+    profile: str = DEFAULT_PROFILE
+
+    # path relativo ("tables/<nome>.csv|.parquet|.json") -> bytes, vedi docparser.tables
+    tables: Dict[str, bytes] = field(default_factory=dict)
+
+    # lingue OCR usate per il documento (vuota senza OCR)
+    ocr_languages: List[str] = field(default_factory=list)
+
+    @property
+    def image_rel_paths(self) -> List[str]:
+        return list(self.images.keys())
+
+    @property
+    def table_rel_paths(self) -> List[str]:
+        return list(self.tables.keys())
+
+
+@dataclass
+class ConvertedDocument:
+    """
+    Output della sola conversione Docling, prima del post-processing.
+    Permette di eseguire conversione e render_document in stage separati
+    (es. pipeline a stadi del listener Kafka).
+    """
+    document: Any
+    file_label: str
+    ocr_enabled: bool
+    ocr_engine_name: str
+    profile: str = DEFAULT_PROFILE
+    timings: Dict[str, float] = field(default_factory=dict)
+    # lingue OCR scelte e come (LanguageSelection.to_dict), vuoto senza OCR
+    ocr_languages: List[str] = field(default_factory=list)
+    language_selection: Dict[str, Any] = field(default_factory=dict)
+    # scala OCR per intervallo di pagine (ScaleRange.to_dict), vuoto con scala fissa
+    ocr_scales: List[Dict[str, Any]] = field(default_factory=list)
+    # documenti convertiti insieme con convert_all (1 = conversione singola)
+    batch_size: int = 1
+
+
+@dataclass
+class OcrPlan:
+    """Scelte OCR fatte prima della conversione: lingue e scala di rasterizzazione per pagina."""
+    languages: LanguageSelection
+    scales: List[ScaleRange] = field(default_factory=list)
+    scale_plan_s: float = 0.0
 
 
 # =========================================================
 #  MAIN PARSING FUNCTION
 # =========================================================
 
-def run_docling_parsing(
-        file_path: str,
-        run_dir: Path,
-        use_rapidocr: bool = False,
-) -> DoclingParseResult:
+def _source_payload(source: Union[str, Path, DocumentStream]) -> Tuple[Union[Path, bytes], str]:
+    """(path o bytes, nome file) di una sorgente, per i pre-pass che leggono il documento."""
+    if isinstance(source, DocumentStream):
+        stream = source.stream
+        position = stream.tell()
+        data = stream.getvalue() if hasattr(stream, "getvalue") else stream.read()
+        stream.seek(position)
+        return data, source.name
+    return Path(source), Path(source).name
+
+
+def plan_ocr(
+        source: Union[str, Path, DocumentStream],
+        profile: str = DEFAULT_PROFILE,
+        page_range: Optional[Tuple[int, int]] = None,
+        ocr_languages: Optional[Sequence[str]] = None,
+) -> OcrPlan:
     """
-    Esegue la pipeline Docling completa:
-    1. Conversione (PDF/Image -> Docling Doc)
-    2. Export JSON grezzo
-    3. Analisi Merge Tabelle
-    4. Generazione Markdown PULITO (nuova logica iterate_items) con placeholder immagini
-    5. Salvataggio immagini su disco (fix percorsi Windows)
-    6. Applicazione Merge Tabelle
-    7. Iniezione Link Immagini (fix posizionamento)
-    8. Salvataggio e Chunking
+    Pre-pass economici prima della conversione: lingue OCR (docparser.languages) e,
+    con ocr_scale_mode="adaptive", scala di rasterizzazione per pagina (docparser.ocr_scale).
+    """
+    conv_profile = get_profile(profile)
+    payload, name = _source_payload(source)
+    if ocr_languages is None:
+        languages = select_ocr_languages(payload, name, profile=profile, page_range=page_range)
+    else:
+        languages = LanguageSelection(languages=list(ocr_languages), method="explicit")
+
+    plan = OcrPlan(languages=languages)
+    if conv_profile.ocr_scale_mode == "adaptive":
+        is_pdf = guess_type(name)[0] == "application/pdf"
+        plan.scales, plan.scale_plan_s = timed_plan(payload, is_pdf, conv_profile.ocr_target_line_px, page_range)
+        if plan.scales:
+            print("Adaptive OCR scale: " + ", ".join(
+                f"{'all pages' if r.first_page is None else f'pages {r.first_page}-{r.last_page}'} x{r.scale}"
+                for r in plan.scales
+            ))
+    return plan
+
+
+def _fresh_source(source: Union[str, Path, DocumentStream]) -> Union[str, DocumentStream]:
+    """Docling consuma lo stream: ogni conversione di un intervallo ne riceve uno nuovo."""
+    if isinstance(source, DocumentStream):
+        data, name = _source_payload(source)
+        return DocumentStream(name=name, stream=BytesIO(data))
+    return str(source)
+
+
+def plan_converters(
+        plan: Optional[OcrPlan],
+        profile: str = DEFAULT_PROFILE,
+        page_range: Optional[Tuple[int, int]] = None,
+) -> Tuple[Optional[Tuple[str, ...]], List[Tuple[Optional[Tuple[int, int]], Optional[float]]]]:
     """
+    Chiave del converter per un piano OCR: (ocr_languages, [(intervallo di pagine, ocr_scale)]),
+    nei termini di get_docling_converter. Le lingue del profilo e la scala di Docling
+    restano None: stesso converter di warmup_docling_converters.
+    """
+    languages_key = None
+    if plan is not None and plan.languages.languages != list(get_profile(profile).ocr_languages):
+        languages_key = tuple(plan.languages.languages)
+
+    ranges: List[Tuple[Optional[Tuple[int, int]], Optional[float]]] = [(page_range, None)]
+    if plan is not None and plan.scales:
+        if len(plan.scales) == 1 or hasattr(DoclingDocument, "concatenate"):
+            ranges = [(r.page_range or page_range, r.scale) for r in plan.scales]
+        else:
+            # senza concatenate: un'unica conversione alla scala più alta del piano
+            ranges = [(page_range, max(r.scale for r in plan.scales))]
+    return languages_key, [
+        (range_pages, None if scale is None or scale == DOCLING_OCR_SCALE else scale)
+        for range_pages, scale in ranges
+    ]
 
-    # 0. SETUP PERCORSI ASSOLUTI
-    run_dir = run_dir.resolve()
-    print(f"\n--- PROCESSING: {file_path} ---")
-    print(f"Output Directory: {run_dir}")
 
-    run_dir.mkdir(parents=True, exist_ok=True)
+def convert_source(
+        source: Union[str, Path, DocumentStream],
+        use_rapidocr: bool = False,
+        ocr_enabled: Optional[bool] = None,
+        profile: str = DEFAULT_PROFILE,
+        page_range: Optional[Tuple[int, int]] = None,
+        ocr_languages: Optional[Sequence[str]] = None,
+):
+    """
+    Conversione Docling di un path oppure di un DocumentStream (bytes in memoria).
+    Se ocr_enabled è None la decisione viene presa dal file (solo per i path).
+    page_range (prima, ultima pagina, 1-based e inclusivo) limita la conversione a un intervallo.
+    Con OCR attivo plan_ocr sceglie le lingue (se ocr_languages è None) e, nei profili
+    adattivi, la scala OCR per intervallo di pagine: ogni intervallo viene convertito con
+    il converter in cache per (lingue, scala) e i documenti parziali vengono concatenati
+    (result.document è il documento intero).
+
+    Ritorna (ConversionResult, ocr_enabled, ocr_engine_name, OcrPlan o None senza OCR).
+    """
+    if ocr_enabled is None:
+        if isinstance(source, DocumentStream):
+            raise ValueError("ocr_enabled must be given explicitly for DocumentStream sources")
+        ocr_enabled = should_enable_ocr_for_file(str(source))
+        print(f"Automatic OCR decision: {'ENABLED' if ocr_enabled else 'DISABLED'} for this file.")
 
-    # 1. Parsing
-    print(f"Running Docling conversion on {file_path}...")
-    converter, ocr_enabled, ocr_engine_name = build_docling_converter(
-        file_path=file_path,
-        use_rapidocr=use_rapidocr,
-    )
-    result = converter.convert(file_path)
+    plan = plan_ocr(source, profile, page_range, ocr_languages) if ocr_enabled else None
+    languages_key, ranges = plan_converters(plan, profile, page_range)
 
-    # 2. Export JSON grezzo
-    json_path = run_dir / "output.json"
-    doc_data = result.document.export_to_dict()
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(doc_data, f, indent=2, ensure_ascii=False)
-    print(f"Saved JSON data to {json_path}")
+    results = []
+    ocr_engine_name = "no-ocr"
+    for range_pages, scale in ranges:
+        converter, ocr_engine_name = get_docling_converter(
+            ocr_enabled=ocr_enabled,
+            use_rapidocr=use_rapidocr,
+            profile=profile,
+            ocr_languages=languages_key,
+            ocr_scale=scale,
+        )
+        convert_kwargs = {"page_range": range_pages} if range_pages is not None else {}
+        run_source = source if len(ranges) == 1 else _fresh_source(source)
+        results.append(converter.convert(
+            run_source if isinstance(run_source, DocumentStream) else str(run_source), **convert_kwargs
+        ))
+
+    result = results[0]
+    if len(results) > 1:
+        result.document = DoclingDocument.concatenate([r.document for r in results])
+    return result, ocr_enabled, ocr_engine_name, plan
+
+
+def render_document(
+        document,
+        file_label: str,
+        ocr_enabled: bool,
+        ocr_engine_name: str,
+        timings: Optional[Dict[str, float]] = None,
+        profile: str = DEFAULT_PROFILE,
+        chunk_size_tokens: int = CHUNK_SIZE_TOKENS,
+        chunk_overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        ocr_languages: Optional[Sequence[str]] = None,
+) -> InMemoryParseResult:
+    """
+    Post-processing in memoria di un DoclingDocument:
+    1. Analisi Merge Tabelle ed export colonnare (CSV/Parquet) dei gruppi
+    2. Generazione Markdown PULITO (nuova logica iterate_items) con placeholder immagini
+    3. Encoding immagini in memoria (con filtro dimensioni)
+    4. Applicazione Merge Tabelle
+    5. Iniezione Link Immagini (fix posizionamento)
+    6. Header e Chunking
+    """
+    timings = timings if timings is not None else {}
+    t_start = time.perf_counter()
 
-    # 3. Analisi Merge Tabelle
-    merged_groups = merge_tables(result.document)
+    # 1. Analisi Merge Tabelle
+    t_stage = time.perf_counter()
+    merged_groups = merge_tables(document)
+    tables = export_table_groups(document, merged_groups)
+    timings["tables_s"] = time.perf_counter() - t_stage
 
-    # 4. Generazione Markdown Pulito
+    # 2. Generazione Markdown Pulito
+    t_stage = time.perf_counter()
     print("Generating Markdown with visual sorting...")
     md_parts: List[str] = []
 
     # Lista di tutti gli elementi
     all_items = []
-    for item, level in result.document.iterate_items():
+    for item, level in document.iterate_items():
         all_items.append((item, level))
 
     # Funzione per estrarre la posizione (Pagina, Coordinata Y in alto)
@@ -177,8 +487,16 @@ def run_docling_parsing(
     image_placeholders: List[str] = []
     image_index = 0
 
+    # Pagina di provenienza di ogni parte di md_parts (per le pagine dei chunk)
+    md_pages: List[Optional[int]] = []
+    current_page: Optional[int] = None
+
     # Generazione Markdown in ordine visivo
     for item, level in all_items:
+        # le parti aggiunte dall'elemento precedente appartengono alla sua pagina
+        md_pages.extend([current_page] * (len(md_parts) - len(md_pages)))
+        current_page = item.prov[0].page_no if getattr(item, "prov", None) else None
+
         text = (getattr(item, "text", "") or "").strip()
 
         # Filtri (header/footer pagina)
@@ -219,16 +537,21 @@ def run_docling_parsing(
             if text:
                 md_parts.append(text)
 
+    md_pages.extend([current_page] * (len(md_parts) - len(md_pages)))
     cleaned_md = "\n\n".join(md_parts)
+    timings["render_s"] = time.perf_counter() - t_stage
 
-    # 5. Salvataggio Immagini CON FILTRO DIMENSIONI
-    images_folder = run_dir / "images"
-    images_folder.mkdir(parents=True, exist_ok=True)
+    # 3. Encoding Immagini CON FILTRO DIMENSIONI
+    # Nomi = hash del contenuto: la stessa immagine ripetuta (logo, timbro) viene codificata
+    # e salvata una volta sola e tutte le occorrenze puntano allo stesso path
+    t_stage = time.perf_counter()
+    images: Dict[str, bytes] = {}
     saved_image_paths: List[Union[str, None]] = []
+    deduper = ImageDeduper(near_dup_distance=get_profile(profile).image_near_dup_distance)
 
-    if hasattr(result.document, "pictures") and result.document.pictures:
-        print(f"Analyzing {len(result.document.pictures)} pictures...")
-        for i, picture in enumerate(result.document.pictures):
+    if hasattr(document, "pictures") and document.pictures:
+        print(f"Analyzing {len(document.pictures)} pictures...")
+        for i, picture in enumerate(document.pictures):
             if (
                 hasattr(picture, "image")
                 and hasattr(picture.image, "pil_image")
@@ -249,13 +572,19 @@ def run_docling_parsing(
                     if hasattr(picture.image, "mimetype") and picture.image.mimetype:
                         image_format = picture.image.mimetype.split("/")[-1].lower()
 
-                    fname = f"{uuid.uuid4()}.{image_format}"
-                    save_path = images_folder / fname
+                    content_hash = image_content_hash(pil_image, image_format)
+                    known_path, perceptual = deduper.lookup(content_hash, pil_image)
+                    if known_path is not None:
+                        saved_image_paths.append(known_path)
+                        continue
 
-                    pil_image.save(save_path, format=image_format.upper())
+                    buffer = BytesIO()
+                    pil_image.save(buffer, format=image_format.upper())
 
                     # Path relativo con slash unix
-                    rel_path = str(save_path.relative_to(run_dir)).replace("\\", "/")
+                    rel_path = f"images/{content_hash}.{image_format}"
+                    images[rel_path] = buffer.getvalue()
+                    deduper.add(content_hash, rel_path, perceptual)
                     saved_image_paths.append(rel_path)
 
                 except Exception as e:
@@ -265,11 +594,13 @@ def run_docling_parsing(
                 saved_image_paths.append(None)
     else:
         print("No pictures found in the document.")
+    timings["images_s"] = time.perf_counter() - t_stage
 
-    # 6. Applicazione del Merge Tabelle
-    final_md = generate_merged_markdown(result.document, cleaned_md, merged_groups)
+    # 4. Applicazione del Merge Tabelle
+    t_stage = time.perf_counter()
+    final_md = generate_merged_markdown(document, cleaned_md, merged_groups)
 
-    # 7. Iniezione Link Immagini CON SPAZIATURA
+    # 5. Iniezione Link Immagini CON SPAZIATURA
     if saved_image_paths and image_placeholders:
         print("Injecting image links into Markdown...")
 
@@ -284,49 +615,282 @@ def run_docling_parsing(
                 # Se l'immagine è stata filtrata o è fallita, rimuoviamo il placeholder
                 final_md = final_md.replace(placeholder, "")
 
-    # 8. Creazione Header e Salvataggio Output
+    # 6. Creazione Header
+    ocr_languages = list(ocr_languages or []) if ocr_enabled else []
     header_info = (
         f"> Docling OCR engine: **{ocr_engine_name}** "
         f"(enabled: {ocr_enabled})\n\n"
-        f"File: `{file_path}`\n\n"
+        + (f"> OCR languages: **{', '.join(ocr_languages)}**\n\n" if ocr_languages else "")
+        + f"> Docling profile: **{profile}**\n\n"
+        f"File: `{file_label}`\n\n"
         f"---\n\n"
     )
     final_md_with_header = header_info + final_md
+    timings["merge_render_s"] = time.perf_counter() - t_stage
+
+    # 7. Chunking
+    t_stage = time.perf_counter()
+    chunks_data = build_markdown_chunks(
+        markdown_text=final_md,  # Passiamo il testo pulito (senza header tecnico)
+        source_name="docling_clean_smart",
+        chunk_size_tokens=chunk_size_tokens,
+        chunk_overlap_tokens=chunk_overlap_tokens,
+        page_anchors=locate_page_anchors(final_md, md_parts, md_pages),
+    )
+    timings["chunking_s"] = time.perf_counter() - t_stage
+    timings["postprocess_s"] = time.perf_counter() - t_start
+
+    stats: Dict[str, Any] = {
+        "profile": profile,
+        "ocr_languages": ocr_languages,
+        "timings": timings,
+        "num_pages": len(document.pages) if getattr(document, "pages", None) else 0,
+        "num_tables": len(document.tables),
+        "num_table_groups": len(merged_groups),
+        "num_pictures": len(document.pictures),
+        "num_images_saved": len(images),
+        "num_images_deduplicated": deduper.exact_hits + deduper.near_hits,
+        "num_images_near_duplicates": deduper.near_hits,
+        "num_chunks": len(chunks_data) if chunks_data is not None else 0,
+        "markdown_chars": len(final_md),
+    }
+
+    return InMemoryParseResult(
+        ocr_enabled=ocr_enabled,
+        ocr_engine_name=ocr_engine_name,
+        file_name=file_label,
+        markdown=final_md_with_header,
+        markdown_body=final_md,
+        chunks=chunks_data or [],
+        images=images,
+        document=document,
+        stats=stats,
+        profile=profile,
+        tables=tables,
+        ocr_languages=ocr_languages,
+    )
+
+
+RUN_METADATA_FILE = "run.json"
+
+
+def _write_run_metadata(run_dir: Path, run_metadata: Dict[str, Any]) -> None:
+    with open(run_dir / RUN_METADATA_FILE, "w", encoding="utf-8") as f:
+        json.dump(run_metadata, f, indent=2, ensure_ascii=False, default=str)
+
+
+def update_run_stats(result: DoclingParseResult) -> None:
+    """
+    Riscrive le stats di run.json con quelle di result, per i dati che arrivano dopo
+    write_parse_result (es. gli esiti dei report OCR di confronto, core._join_reports).
+    """
+    metadata_path = result.run_dir / RUN_METADATA_FILE
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        run_metadata = json.load(f)
+    run_metadata["stats"] = result.stats
+    _write_run_metadata(result.run_dir, run_metadata)
+
+
+def write_parse_result(parsed: InMemoryParseResult, run_dir: Path, write_json: bool = True) -> DoclingParseResult:
+    """
+    Sink su file system: scrive output.json, output.md, chunks.json, images/, tables/
+    e run.json (metadati della run, servono a docparser.rerender) dentro run_dir
+    e ritorna il DoclingParseResult con i path.
+    write_json=False lascia com'è l'output.json esistente (re-render da output.json).
+    """
+    run_dir = run_dir.resolve()
+    run_dir.mkdir(parents=True, exist_ok=True)
+    t_stage = time.perf_counter()
+
+    # Export JSON grezzo
+    json_path = run_dir / "output.json"
+    if write_json and parsed.document is not None:
+        doc_data = parsed.document.export_to_dict()
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(doc_data, f, indent=2, ensure_ascii=False)
+        print(f"Saved JSON data to {json_path}")
+
+    # Immagini (fix percorsi Windows: i rel_path usano sempre /)
+    images_folder = run_dir / "images"
+    images_folder.mkdir(parents=True, exist_ok=True)
+    for rel_path, data in parsed.images.items():
+        (run_dir / rel_path).write_bytes(data)
+
+    # Tabelle mergiate (CSV/Parquet + indice)
+    tables_dir: Optional[Path] = None
+    if parsed.tables:
+        tables_dir = run_dir / TABLES_DIR
+        tables_dir.mkdir(parents=True, exist_ok=True)
+        for rel_path, data in parsed.tables.items():
+            (run_dir / rel_path).write_bytes(data)
 
     md_output_path = run_dir / "output.md"
     with open(md_output_path, "w", encoding="utf-8") as f:
-        f.write(final_md_with_header)
+        f.write(parsed.markdown)
     print(f"Successfully saved merged markdown to {md_output_path}")
 
-    # 9. Chunking
     chunks_path = run_dir / "chunks.json"
-    generate_markdown_chunks_from_string(
-        markdown_text=final_md,  # Passiamo il testo pulito (senza header tecnico)
-        output_path=chunks_path,
-        source_name="docling_clean_smart"
-    )
+    write_chunks(parsed.chunks, chunks_path)
 
-    # images_folder ce l'hai già definita sopra
     images_dir: Optional[Path] = None
-    if hasattr(result.document, "pictures") and result.document.pictures:
-        if images_folder.exists():
-            images_dir = images_folder
-
-    # filtriamo i None da saved_image_paths, tenendo solo i path validi
-    image_rel_paths_clean = [p for p in saved_image_paths if p is not None]
-
-    # path del JSON grezzo (lo hai già)
-    json_path = run_dir / "output.json"
+    if parsed.stats.get("num_pictures"):
+        images_dir = images_folder
+
+    stats = dict(parsed.stats)
+    timings = dict(stats.get("timings", {}))
+    timings["write_s"] = time.perf_counter() - t_stage
+    stats["timings"] = timings
+
+    _write_run_metadata(run_dir, {
+        "file_name": parsed.file_name,
+        "ocr_enabled": parsed.ocr_enabled,
+        "ocr_engine_name": parsed.ocr_engine_name,
+        "ocr_languages": parsed.ocr_languages,
+        "profile": parsed.profile,
+        "stats": stats,
+    })
 
     return DoclingParseResult(
-        ocr_enabled=ocr_enabled,
-        ocr_engine_name=ocr_engine_name,
-        markdown=final_md_with_header,
+        ocr_enabled=parsed.ocr_enabled,
+        ocr_engine_name=parsed.ocr_engine_name,
+        markdown=parsed.markdown,
         run_dir=run_dir,
         json_path=json_path,
         markdown_path=md_output_path,
         chunks_path=chunks_path,
         images_dir=images_dir,
-        image_rel_paths=image_rel_paths_clean,
+        image_rel_paths=parsed.image_rel_paths,
+        stats=stats,
+        profile=parsed.profile,
+        tables_dir=tables_dir,
+        table_rel_paths=parsed.table_rel_paths,
+        ocr_languages=parsed.ocr_languages,
+    )
+
+
+def parse_source_in_memory(
+        source: Union[str, Path, DocumentStream],
+        file_label: str,
+        use_rapidocr: bool = False,
+        ocr_enabled: Optional[bool] = None,
+        profile: str = DEFAULT_PROFILE,
+) -> InMemoryParseResult:
+    """Conversione + post-processing senza toccare il disco."""
+    converted = convert_to_document(
+        source,
+        file_label=file_label,
+        use_rapidocr=use_rapidocr,
+        ocr_enabled=ocr_enabled,
+        profile=profile,
+    )
+    return render_converted(converted)
+
+
+def convert_to_document(
+        source: Union[str, Path, DocumentStream],
+        file_label: str,
+        use_rapidocr: bool = False,
+        ocr_enabled: Optional[bool] = None,
+        profile: str = DEFAULT_PROFILE,
+) -> ConvertedDocument:
+    """Solo la conversione Docling (la parte pesante su CPU/GPU), senza post-processing."""
+    t_start = time.perf_counter()
+
+    print(f"Running Docling conversion on {file_label}...")
+    result, ocr_enabled, ocr_engine_name, plan = convert_source(
+        source,
+        use_rapidocr=use_rapidocr,
+        ocr_enabled=ocr_enabled,
+        profile=profile,
+    )
+    timings = {"convert_s": time.perf_counter() - t_start}
+    return build_converted_document(
+        result.document, file_label, ocr_enabled, ocr_engine_name, profile, timings, plan
+    )
+
+
+def build_converted_document(
+        document,
+        file_label: str,
+        ocr_enabled: bool,
+        ocr_engine_name: str,
+        profile: str,
+        timings: Dict[str, float],
+        plan: Optional[OcrPlan] = None,
+        batch_size: int = 1,
+) -> ConvertedDocument:
+    """ConvertedDocument con lingue, scale OCR e tempi dei pre-pass presi dal piano."""
+    if plan is None:
+        return ConvertedDocument(
+            document=document,
+            file_label=file_label,
+            ocr_enabled=ocr_enabled,
+            ocr_engine_name=ocr_engine_name,
+            profile=profile,
+            timings=timings,
+            batch_size=batch_size,
+        )
+
+    timings["language_detect_s"] = plan.languages.elapsed_s
+    if plan.scales:
+        timings["scale_plan_s"] = plan.scale_plan_s
+    return ConvertedDocument(
+        document=document,
+        file_label=file_label,
+        ocr_enabled=ocr_enabled,
+        ocr_engine_name=ocr_engine_name,
+        profile=profile,
+        timings=timings,
+        ocr_languages=plan.languages.languages,
+        language_selection=plan.languages.to_dict(),
+        ocr_scales=[r.to_dict() for r in plan.scales],
+        batch_size=batch_size,
+    )
+
+
+def render_converted(converted: ConvertedDocument) -> InMemoryParseResult:
+    """Post-processing (render_document) di un ConvertedDocument."""
+    t_start = time.perf_counter()
+    timings = dict(converted.timings)
+
+    parsed = render_document(
+        converted.document,
+        file_label=converted.file_label,
+        ocr_enabled=converted.ocr_enabled,
+        ocr_engine_name=converted.ocr_engine_name,
+        timings=timings,
+        profile=converted.profile,
+        ocr_languages=converted.ocr_languages,
     )
+    if converted.language_selection:
+        parsed.stats["ocr_language_selection"] = converted.language_selection
+    if converted.ocr_scales:
+        parsed.stats["ocr_scales"] = converted.ocr_scales
+    if converted.batch_size > 1:
+        parsed.stats["batch_size"] = converted.batch_size
+    timings["total_s"] = timings.get("convert_s", 0.0) + (time.perf_counter() - t_start)
+    return parsed
+
+
+def run_docling_parsing(
+        file_path: str,
+        run_dir: Path,
+        use_rapidocr: bool = False,
+        profile: str = DEFAULT_PROFILE,
+) -> DoclingParseResult:
+    """
+    Esegue la pipeline Docling completa:
+    1. Conversione (PDF/Image -> Docling Doc)
+    2. Post-processing in memoria (render_document): markdown, merge tabelle, immagini, chunking
+    3. Salvataggio su disco (write_parse_result): output.json, output.md, chunks.json, images/
+    """
+    print(f"\n--- PROCESSING: {file_path} ---")
+    print(f"Output Directory: {run_dir.resolve()}")
 
+    parsed = parse_source_in_memory(
+        file_path,
+        file_label=file_path,
+        use_rapidocr=use_rapidocr,
+        profile=profile,
+    )
+    return write_parse_result(parsed, run_dir)
@@ -0,0 +1,90 @@
+# profiles.py
+
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Any
+
+
+@dataclass(frozen=True)
+class ConversionProfile:
+    """
+    Profilo velocità/accuratezza, tradotto in PdfPipelineOptions da
+    pipeline.get_docling_converter().
+    """
+    name: str
+
+    # Table structure (TableFormer)
+    do_table_structure: bool = True
+    table_mode: str = "accurate"  # "fast" | "accurate"
+
+    # Immagini. images_scale e num_threads (sotto) sono configurabili ma per ora uguali in
+    # tutti i profili: si variano quando un benchmark sul dataset ne misura l'effetto
+    images_scale: float = 1.0
+    generate_page_images: bool = True
+    generate_picture_images: bool = True
+    # Deduplica percettiva (dHash): immagini entro questa distanza di Hamming (su 64 bit)
+    # sono salvate una volta sola. 0 = solo duplicati esatti (stesso hash dei pixel)
+    image_near_dup_distance: int = 0
+
+    # OCR
+    ocr_engine: str = "easyocr"  # "easyocr" | "rapidocr"
+    ocr_languages: List[str] = field(default_factory=lambda: ["it", "en"])
+    # Scelta automatica delle lingue per documento (docparser.languages), da attivare per
+    # profilo: ocr_languages resta il ripiego quando il campione non è conclusivo
+    ocr_auto_languages: bool = False
+    ocr_language_candidates: List[str] = field(default_factory=lambda: ["it", "en", "fr", "de", "es", "pt"])
+    # Campione OCR a bassa risoluzione per scansioni e immagini (senza text layer)
+    ocr_language_sample: bool = False
+    # Scala di rasterizzazione OCR: "fixed" = scala di Docling (3x), "adaptive" = per pagina
+    # in base all'altezza del testo (docparser.ocr_scale), righe più piccole a ocr_target_line_px.
+    # "adaptive" non è attivo in nessun profilo finché benchmarks/ocr_scale_bench.py non ne
+    # misura il guadagno sul dataset
+    ocr_scale_mode: str = "fixed"  # "fixed" | "adaptive"
+    ocr_target_line_px: int = 30
+
+    # Thread per i modelli (AcceleratorOptions.num_threads, default di Docling: 4)
+    num_threads: int = 4
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+PROFILES: Dict[str, ConversionProfile] = {
+    # Niente page images, TableFormer FAST, RapidOCR (ONNX, più leggero di EasyOCR)
+    "fast": ConversionProfile(
+        name="fast",
+        table_mode="fast",
+        generate_page_images=False,
+        generate_picture_images=True,
+        ocr_engine="rapidocr",
+        # lingue dal text layer; niente campione EasyOCR, altrimenti ocr_languages
+        ocr_auto_languages=True,
+    ),
+    # Tabelle FAST ma EasyOCR; page images disattivate (non le usiamo in output)
+    "balanced": ConversionProfile(
+        name="balanced",
+        table_mode="fast",
+        generate_page_images=False,
+        generate_picture_images=True,
+        ocr_engine="easyocr",
+        ocr_auto_languages=True,
+        ocr_language_sample=True,
+    ),
+    # Configurazione storica: tutto attivo, TableFormer ACCURATE, lingue OCR fisse (ocr_languages)
+    "accurate": ConversionProfile(
+        name="accurate",
+        table_mode="accurate",
+        generate_page_images=True,
+        generate_picture_images=True,
+        ocr_engine="easyocr",
+    ),
+}
+
+DEFAULT_PROFILE = "accurate"
+
+
+def get_profile(name: str = DEFAULT_PROFILE) -> ConversionProfile:
+    """Ritorna il profilo per nome (ValueError se sconosciuto)."""
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown profile '{name}'. Available: {', '.join(PROFILES)}")
@@ -0,0 +1,168 @@
+# background.py
+
+"""
+Report OCR di confronto (EasyOCR / OpenAI) eseguiti in parallelo alla conversione Docling.
+
+I report dipendono solo dall'immagine sorgente: partono appena il file è noto, mentre
+Docling converte, e vengono raccolti (join) prima di restituire il risultato.
+- EasyOCR: in un thread dedicato (torch rilascia il GIL durante l'inferenza)
+- OpenAI: coroutine sul client async, in un event loop di background
+
+Errori e timeout restano nel report (ReportOutcome) e non interrompono il parse principale.
+Il markdown viene scritto solo al join, con l'header che riporta l'OCR usato da Docling.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Oltre questo tempo (dall'avvio) il report viene abbandonato
+REPORT_TIMEOUT_S = 300.0
+
+_easyocr_executor: Optional[ThreadPoolExecutor] = None
+_report_loop: Optional[asyncio.AbstractEventLoop] = None
+_init_lock = threading.Lock()
+
+
+def _get_easyocr_executor() -> ThreadPoolExecutor:
+    """Un solo thread: un reader EasyOCR alla volta, i modelli restano in cache tra i job."""
+    global _easyocr_executor
+    with _init_lock:
+        if _easyocr_executor is None:
+            _easyocr_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="easyocr-report")
+        return _easyocr_executor
+
+
+def _get_report_loop() -> asyncio.AbstractEventLoop:
+    """Event loop in un thread daemon per i report async (OpenAI)."""
+    global _report_loop
+    with _init_lock:
+        if _report_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="report-loop", daemon=True).start()
+            _report_loop = loop
+        return _report_loop
+
+
+@dataclass
+class ReportOutcome:
+    name: str    # "easyocr" | "openai"
+    status: str  # "ok" | "error" | "timeout" | "skipped"
+    elapsed_s: float = 0.0
+    path: Optional[str] = None
+    message: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class _PendingReport:
+    name: str
+    future: Future
+    started: float
+    # (body del task, ocr_engine_name di Docling) -> path del markdown scritto
+    write: Callable[[Any, str], Path]
+    finished: Optional[float] = None
+
+    def __post_init__(self):
+        self.future.add_done_callback(lambda _: setattr(self, "finished", time.perf_counter()))
+
+
+class ComparisonReports:
+    """
+    Report di confronto per un documento.
+
+        reports = ComparisonReports(file_path, run_dir, ocr_enabled)
+        reports.start_easyocr(languages=["it", "en"])
+        ... conversione Docling ...
+        outcomes = reports.join(parse_result.ocr_engine_name)
+
+    Se la conversione fallisce, cancel() abbandona i report senza scrivere nulla.
+    """
+
+    def __init__(self, file_path: str, run_dir: Path, ocr_enabled: bool, timeout_s: float = REPORT_TIMEOUT_S):
+        self.file_path = file_path
+        self.run_dir = Path(run_dir)
+        self.ocr_enabled = ocr_enabled
+        self.timeout_s = timeout_s
+        self._pending: List[_PendingReport] = []
+        self._outcomes: List[ReportOutcome] = []
+
+    def _eligible(self, name: str, image_exts) -> bool:
+        if Path(self.file_path).suffix.lower() in image_exts and self.ocr_enabled:
+            return True
+        print(f"{name} OCR report skipped (file not a document-like image).")
+        self._outcomes.append(ReportOutcome(name=name, status="skipped"))
+        return False
+
+    def start_easyocr(self, languages: Optional[List[str]] = None) -> None:
+        from docparser.reports.easyocr_report import IMAGE_EXTS, easyocr_text_from_image, \
+            format_easyocr_markdown, write_easyocr_report
+
+        if not self._eligible("easyocr", IMAGE_EXTS):
+            return
+        print(f"Starting EasyOCR report in background for {self.file_path}...")
+        future = _get_easyocr_executor().submit(easyocr_text_from_image, self.file_path, languages)
+        self._pending.append(_PendingReport(
+            name="easyocr",
+            future=future,
+            started=time.perf_counter(),
+            write=lambda lines, engine: write_easyocr_report(
+                self.file_path, self.ocr_enabled, engine, self.run_dir, format_easyocr_markdown(lines)
+            ),
+        ))
+
+    def start_openai(self, model: str = "gpt-4o") -> None:
+        from docparser.reports.openai_ocr_report import IMAGE_EXTS, format_openai_ocr_markdown, \
+            openai_ocr_text_from_image_async, write_openai_ocr_report
+
+        if not self._eligible("openai", IMAGE_EXTS):
+            return
+        print(f"Starting OpenAI OCR report ({model}) in background for {self.file_path}...")
+        # wait_for cancella davvero la richiesta HTTP allo scadere del timeout
+        coro = asyncio.wait_for(openai_ocr_text_from_image_async(self.file_path, model=model), self.timeout_s)
+        future = asyncio.run_coroutine_threadsafe(coro, _get_report_loop())
+        self._pending.append(_PendingReport(
+            name="openai",
+            future=future,
+            started=time.perf_counter(),
+            write=lambda result, engine: write_openai_ocr_report(
+                self.file_path, self.ocr_enabled, engine, self.run_dir,
+                format_openai_ocr_markdown(*result), model,
+            ),
+        ))
+
+    def join(self, ocr_engine_name: str) -> List[ReportOutcome]:
+        """Attende i report (entro timeout_s dal loro avvio) e scrive i markdown riusciti."""
+        for report in self._pending:
+            remaining = max(0.0, report.started + self.timeout_s - time.perf_counter())
+            try:
+                body = report.future.result(timeout=remaining)
+                path = report.write(body, ocr_engine_name)
+                outcome = ReportOutcome(name=report.name, status="ok", path=str(path))
+            except (FutureTimeoutError, asyncio.TimeoutError):
+                # la coroutine OpenAI viene cancellata; un thread EasyOCR già partito non si può
+                # interrompere: finisce da solo e il suo risultato viene scartato
+                report.future.cancel()
+                print(f"{report.name} OCR report timed out after {self.timeout_s:.0f}s, skipped")
+                outcome = ReportOutcome(name=report.name, status="timeout",
+                                        message=f"no result within {self.timeout_s:.0f}s")
+            except Exception as e:
+                print(f"{report.name} OCR report failed: {e}")
+                outcome = ReportOutcome(name=report.name, status="error", message=str(e))
+            # durata del report, non l'attesa nel join (di solito il report finisce prima di Docling)
+            outcome.elapsed_s = round((report.finished or time.perf_counter()) - report.started, 3)
+            self._outcomes.append(outcome)
+        self._pending = []
+        return self._outcomes
+
+    def cancel(self) -> None:
+        """Abbandona i report in corso (conversione fallita): nessun file viene scritto."""
+        for report in self._pending:
+            report.future.cancel()
+        self._pending = []
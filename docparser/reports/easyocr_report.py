@@ -1,10 +1,19 @@
 # easyocr_report.py
 
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import easyocr
 
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp"}
+
+
+@lru_cache(maxsize=4)
+def _get_reader(languages: Tuple[str, ...], gpu: bool) -> "easyocr.Reader":
+    # il caricamento dei modelli costa più dell'OCR di una pagina: un reader per insieme di lingue
+    return easyocr.Reader(list(languages), gpu=gpu)
+
 
 def easyocr_text_from_image(
     image_path: str,
@@ -15,7 +24,7 @@ def easyocr_text_from_image(
         languages = ["it", "en"]
 
     print(f"Running EasyOCR on {image_path}...")
-    reader = easyocr.Reader(languages, gpu=gpu)
+    reader = _get_reader(tuple(languages), gpu)
     results = reader.readtext(image_path, detail=1)
 
     lines = []
@@ -26,13 +35,16 @@ def easyocr_text_from_image(
     return lines
 
 
-def build_easyocr_markdown(image_path: str) -> str:
+def build_easyocr_markdown(image_path: str, languages: Optional[List[str]] = None) -> str:
     try:
-        easy_lines = easyocr_text_from_image(image_path)
+        easy_lines = easyocr_text_from_image(image_path, languages=languages)
     except Exception as e:
         print(f"Error in EasyOCR: {e}")
         easy_lines = [f"Error while running EasyOCR: {e}"]
+    return format_easyocr_markdown(easy_lines)
 
+
+def format_easyocr_markdown(easy_lines: List[str]) -> str:
     md_parts = []
     md_parts.append("## EasyOCR\n")
     md_parts.append("```text")
@@ -50,36 +62,45 @@ def run_easyocr_report_if_needed(
     ocr_enabled: bool,
     ocr_engine_name: str,
     run_dir: Path,
+    languages: Optional[List[str]] = None,
 ) -> None:
     """
     Crea ocr_compare.md dentro run_dir se:
       - il file è un'immagine
       - ocr_enabled è True
     In cima al markdown scrive quale OCR Docling è stato usato.
+    languages: lingue scelte per il documento (default it, en).
     """
     ext = Path(file_path).suffix.lower()
-    image_exts = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp"}
 
-    ocr_md_path = run_dir / "ocr_compare.md"
-
-    if ext in image_exts and ocr_enabled:
+    if ext in IMAGE_EXTS and ocr_enabled:
         print("Running EasyOCR on input document-like image...")
-        easy_md_body = build_easyocr_markdown(file_path)
-
-        header = (
-            f"# OCR report\n\n"
-            f"> Docling OCR engine: **{ocr_engine_name}** "
-            f"(enabled: {ocr_enabled})\n\n"
-            f"File: `{file_path}`\n\n"
-        )
-
-        full_md = header + easy_md_body
+        easy_md_body = build_easyocr_markdown(file_path, languages=languages)
+        write_easyocr_report(file_path, ocr_enabled, ocr_engine_name, run_dir, easy_md_body)
 
-        with open(ocr_md_path, "w", encoding="utf-8") as f:
-            f.write(full_md)
-        print(f"Successfully saved OCR markdown to {ocr_md_path}")
-
-    elif ext in image_exts and not ocr_enabled:
+    elif ext in IMAGE_EXTS and not ocr_enabled:
         print("Input is an image but does not look like a document: skipping OCR report.")
     else:
         print("Input is not a single image, OCR report skipped.")
+
+
+def write_easyocr_report(
+    file_path: str,
+    ocr_enabled: bool,
+    ocr_engine_name: str,
+    run_dir: Path,
+    easy_md_body: str,
+) -> Path:
+    """Scrive ocr_compare.md (header con l'OCR usato da Docling + corpo EasyOCR)."""
+    ocr_md_path = run_dir / "ocr_compare.md"
+    header = (
+        f"# OCR report\n\n"
+        f"> Docling OCR engine: **{ocr_engine_name}** "
+        f"(enabled: {ocr_enabled})\n\n"
+        f"File: `{file_path}`\n\n"
+    )
+
+    with open(ocr_md_path, "w", encoding="utf-8") as f:
+        f.write(header + easy_md_body)
+    print(f"Successfully saved OCR markdown to {ocr_md_path}")
+    return ocr_md_path
@@ -6,7 +6,25 @@ from mimetypes import guess_type
 from pathlib import Path
 from typing import List, Optional, Tuple, Any
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp"}
+
+# Prompt "Pedante" di default
+DEFAULT_INSTRUCTIONS = (
+    """
+        You are an OCR engine specializing in verbatim transcription.
+        Your goal is absolute fidelity to the visual text, not grammatical accuracy.
+        
+        Strict rules:
+        1. Transcribe the text EXACTLY as it appears in the image.
+        2. DO NOT correct typos, grammar, or syntax errors (e.g., if it says 'architectural,' do not write 'architectural').
+        3. DO NOT expand abbreviations.
+        4. Respect the structure of lines and lists.
+        5. If a word is ambiguous or cut off, write what you see, don't guess.
+        6. Do not add comments, preambles, or salutations. Return ONLY the transcribed text.
+        """
+)
 
 
 # ---------------------------------------------------------
@@ -26,65 +44,46 @@ def _image_to_data_url(image_path: str) -> str:
 # ---------------------------------------------------------
 #  OCR OpenAI — Versione Ottimizzata per Accuratezza
 # ---------------------------------------------------------
-def openai_ocr_text_from_image(
-        image_path: str,
-        model: str = "gpt-4o",  # CONSIGLIO: Usa gpt-4o per massima precisione, gpt-4o-mini per velocità
-        instructions: Optional[str] = None,
-) -> Tuple[List[str], str, str, Any]:
-    # Prompt "Pedante" di default se non fornito
+def _request_kwargs(model: str, instructions: str, data_url: str) -> dict:
+    return dict(
+        model=model,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": instructions},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": data_url,
+                            "detail": "high"  # Importante: forza alta risoluzione per leggere testi piccoli
+                        },
+                    },
+                ],
+            }
+        ],
+        temperature=0.0,  # FONDAMENTALE: Azzera la creatività per evitare allucinazioni
+        max_tokens=4096,
+    )
+
+
+def _prepare_request(image_path: str, model: str, instructions: Optional[str]) -> Tuple[str, str]:
     if instructions is None:
-        instructions = (
-            """
-                You are an OCR engine specializing in verbatim transcription.
-                Your goal is absolute fidelity to the visual text, not grammatical accuracy.
-                
-                Strict rules:
-                1. Transcribe the text EXACTLY as it appears in the image.
-                2. DO NOT correct typos, grammar, or syntax errors (e.g., if it says 'architectural,' do not write 'architectural').
-                3. DO NOT expand abbreviations.
-                4. Respect the structure of lines and lists.
-                5. If a word is ambiguous or cut off, write what you see, don't guess.
-                6. Do not add comments, preambles, or salutations. Return ONLY the transcribed text.
-                """
-        )
+        instructions = DEFAULT_INSTRUCTIONS
 
     if not os.getenv("OPENAI_API_KEY"):
         raise RuntimeError("OPENAI_API_KEY non impostata nell'ambiente.")
 
-    client = OpenAI()
     data_url = _image_to_data_url(image_path)
 
     print("\n================ OPENAI OCR REQUEST ================")
     print(f"MODEL : {model}")
     print(f"PROMPT: {instructions}")
     print("====================================================\n")
+    return instructions, data_url
 
-    try:
-        # Sintassi standard OpenAI v1.x
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": instructions},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": data_url,
-                                "detail": "high"  # Importante: forza alta risoluzione per leggere testi piccoli
-                            },
-                        },
-                    ],
-                }
-            ],
-            temperature=0.0,  # FONDAMENTALE: Azzera la creatività per evitare allucinazioni
-            max_tokens=4096,
-        )
-    except Exception as e:
-        print(f"API Error: {e}")
-        raise e
 
+def _parse_response(response, model: str) -> Tuple[List[str], Any]:
     # ----------- ESTRAZIONE TESTO OCR -----------------
     # In chat completions, il contenuto è in choices[0].message.content
     text = response.choices[0].message.content
@@ -118,7 +117,38 @@ def openai_ocr_text_from_image(
     print(f"OCR LINES    : {len(lines)}")
     print(f"TOKENS       : {token_info}")
     print("====================================================\n")
+    return lines, token_info
 
+
+def openai_ocr_text_from_image(
+        image_path: str,
+        model: str = "gpt-4o",  # CONSIGLIO: Usa gpt-4o per massima precisione, gpt-4o-mini per velocità
+        instructions: Optional[str] = None,
+) -> Tuple[List[str], str, str, Any]:
+    instructions, data_url = _prepare_request(image_path, model, instructions)
+    client = OpenAI()
+
+    try:
+        # Sintassi standard OpenAI v1.x
+        response = client.chat.completions.create(**_request_kwargs(model, instructions, data_url))
+    except Exception as e:
+        print(f"API Error: {e}")
+        raise e
+
+    lines, token_info = _parse_response(response, model)
+    return lines, instructions, model, token_info
+
+
+async def openai_ocr_text_from_image_async(
+        image_path: str,
+        model: str = "gpt-4o",
+        instructions: Optional[str] = None,
+) -> Tuple[List[str], str, str, Any]:
+    """Come openai_ocr_text_from_image, con il client async (cancellabile, per i report in background)."""
+    instructions, data_url = _prepare_request(image_path, model, instructions)
+    async with AsyncOpenAI() as client:
+        response = await client.chat.completions.create(**_request_kwargs(model, instructions, data_url))
+    lines, token_info = _parse_response(response, model)
     return lines, instructions, model, token_info
 
 
@@ -140,7 +170,10 @@ def build_openai_ocr_markdown(
             f"## OpenAI OCR ({model})\n"
             f"```text\nError: {e}\n```\n"
         )
+    return format_openai_ocr_markdown(lines, prompt, used_model, token_info)
+
 
+def format_openai_ocr_markdown(lines: List[str], prompt: str, used_model: str, token_info: Any) -> str:
     md = []
     md.append(f"## OpenAI OCR ({used_model})\n")
     md.append("### Configurazione")
@@ -181,25 +214,34 @@ def run_openai_ocr_report_if_needed(
         model: str = "gpt-4o",
 ) -> None:
     ext = Path(file_path).suffix.lower()
-    image_exts = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp"}
 
-    ocr_md_path = run_dir / "openai_ocr.md"
-
-    if ext in image_exts and ocr_enabled:
+    if ext in IMAGE_EXTS and ocr_enabled:
         print(f"Running OpenAI OCR ({model}) on {file_path}...")
         body = build_openai_ocr_markdown(file_path, model=model)
-
-        header = (
-            f"# OCR report (OpenAI)\n\n"
-            f"> Docling OCR engine: **{docling_ocr_engine_name}** (enabled: {ocr_enabled})\n\n"
-            f"> External OCR engine: **openai:{model}**\n\n"
-            f"File: `{file_path}`\n\n"
-        )
-
-        with open(ocr_md_path, "w", encoding="utf-8") as f:
-            f.write(header + body)
-
-        print(f"Saved OpenAI OCR markdown to {ocr_md_path}")
+        write_openai_ocr_report(file_path, ocr_enabled, docling_ocr_engine_name, run_dir, body, model)
 
     else:
-        print("OpenAI OCR skipped (file not an image or OCR disabled).")
\ No newline at end of file
+        print("OpenAI OCR skipped (file not an image or OCR disabled).")
+
+def write_openai_ocr_report(
+        file_path: str,
+        ocr_enabled: bool,
+        docling_ocr_engine_name: str,
+        run_dir: Path,
+        body: str,
+        model: str = "gpt-4o",
+) -> Path:
+    """Scrive openai_ocr.md (header con l'OCR usato da Docling + corpo OpenAI)."""
+    ocr_md_path = run_dir / "openai_ocr.md"
+    header = (
+        f"# OCR report (OpenAI)\n\n"
+        f"> Docling OCR engine: **{docling_ocr_engine_name}** (enabled: {ocr_enabled})\n\n"
+        f"> External OCR engine: **openai:{model}**\n\n"
+        f"File: `{file_path}`\n\n"
+    )
+
+    with open(ocr_md_path, "w", encoding="utf-8") as f:
+        f.write(header + body)
+
+    print(f"Saved OpenAI OCR markdown to {ocr_md_path}")
+    return ocr_md_path
@@ -0,0 +1,345 @@
+# rerender.py
+
+"""
+Re-render e re-chunk delle run dir esistenti a partire da output.json, senza riconvertire.
+
+Quando cambiano chunk size/overlap, le regole del markdown o l'euristica di merge delle
+tabelle basta ricaricare il DoclingDocument salvato e rieseguire solo gli stadi a valle
+(render_document: merge tabelle, markdown, immagini, chunking). Molte run dir vengono
+elaborate in parallelo su un pool di processi.
+
+    python cli.py rerender output/ --workers 4 --chunk-size 1024 --chunk-overlap 100
+    python cli.py rerender output/ --sweep 512:50,1024:100,2048:200 --report sweep.json
+"""
+
+import json
+import re
+import shutil
+import statistics
+import time
+import traceback
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from docling_core.types.doc import DoclingDocument
+
+from docparser.chunking import CHUNK_OVERLAP_TOKENS, CHUNK_SIZE_TOKENS, build_markdown_chunks, get_tokenizer
+from docparser.pipeline import RUN_METADATA_FILE, DoclingParseResult, render_document, write_parse_result
+from docparser.profiles import DEFAULT_PROFILE
+from docparser.tables import TABLES_DIR
+
+# Header scritto da render_document, usato per le run dir precedenti a run.json
+_HEADER_PATTERNS = {
+    "ocr": re.compile(r"Docling OCR engine: \*\*(.+?)\*\* \(enabled: (True|False)\)"),
+    "profile": re.compile(r"Docling profile: \*\*(.+?)\*\*"),
+    "ocr_languages": re.compile(r"OCR languages: \*\*(.+?)\*\*"),
+    "file_name": re.compile(r"^File: `(.+?)`", re.MULTILINE),
+}
+
+
+def find_run_dirs(path: Union[str, Path]) -> List[Path]:
+    """Tutte le run dir (cartelle con output.json) sotto path, o path stesso."""
+    path = Path(path)
+    if (path / "output.json").is_file():
+        return [path]
+    return sorted(p.parent for p in path.rglob("output.json"))
+
+
+def read_run_metadata(run_dir: Path) -> Dict[str, Any]:
+    """
+    file_name, ocr_enabled, ocr_engine_name, ocr_languages e profile di una run:
+    da run.json se presente, altrimenti dall'header di output.md.
+    """
+    metadata_path = run_dir / RUN_METADATA_FILE
+    if metadata_path.is_file():
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    metadata: Dict[str, Any] = {
+        "file_name": run_dir.name,
+        "ocr_enabled": False,
+        "ocr_engine_name": "no-ocr",
+        "profile": DEFAULT_PROFILE,
+    }
+    md_path = run_dir / "output.md"
+    if md_path.is_file():
+        header = md_path.read_text(encoding="utf-8")[:2000]
+        match = _HEADER_PATTERNS["ocr"].search(header)
+        if match:
+            metadata["ocr_engine_name"] = match.group(1)
+            metadata["ocr_enabled"] = match.group(2) == "True"
+        match = _HEADER_PATTERNS["profile"].search(header)
+        if match:
+            metadata["profile"] = match.group(1)
+        match = _HEADER_PATTERNS["ocr_languages"].search(header)
+        if match:
+            metadata["ocr_languages"] = [lang.strip() for lang in match.group(1).split(",")]
+        match = _HEADER_PATTERNS["file_name"].search(header)
+        if match:
+            metadata["file_name"] = match.group(1)
+    return metadata
+
+
+def load_run_document(run_dir: Path) -> DoclingDocument:
+    """Ricarica il DoclingDocument (immagini incluse, salvate come data URI) da output.json."""
+    return DoclingDocument.load_from_json(run_dir / "output.json")
+
+
+def load_parse_result(run_dir: Path) -> DoclingParseResult:
+    """DoclingParseResult di una run dir già scritta (senza ricaricare output.json)."""
+    run_dir = Path(run_dir).resolve()
+    metadata = read_run_metadata(run_dir)
+    markdown_path = run_dir / "output.md"
+    images_dir = run_dir / "images"
+    tables_dir = run_dir / TABLES_DIR
+    image_rel_paths = sorted(f"images/{p.name}" for p in images_dir.iterdir()) if images_dir.is_dir() else []
+    table_rel_paths = sorted(f"{TABLES_DIR}/{p.name}" for p in tables_dir.iterdir()) if tables_dir.is_dir() else []
+    return DoclingParseResult(
+        ocr_enabled=metadata["ocr_enabled"],
+        ocr_engine_name=metadata["ocr_engine_name"],
+        markdown=markdown_path.read_text(encoding="utf-8") if markdown_path.is_file() else "",
+        run_dir=run_dir,
+        json_path=run_dir / "output.json",
+        markdown_path=markdown_path,
+        chunks_path=run_dir / "chunks.json",
+        images_dir=images_dir if image_rel_paths else None,
+        image_rel_paths=image_rel_paths,
+        stats=metadata.get("stats", {}),
+        profile=metadata.get("profile", DEFAULT_PROFILE),
+        tables_dir=tables_dir if table_rel_paths else None,
+        table_rel_paths=table_rel_paths,
+        ocr_languages=metadata.get("ocr_languages", []),
+    )
+
+
+def _render_run(run_dir: Path, chunk_size_tokens: int, chunk_overlap_tokens: int):
+    metadata = read_run_metadata(run_dir)
+    t0 = time.perf_counter()
+    document = load_run_document(run_dir)
+    timings = {"load_json_s": time.perf_counter() - t0}
+    parsed = render_document(
+        document,
+        file_label=metadata["file_name"],
+        ocr_enabled=metadata["ocr_enabled"],
+        ocr_engine_name=metadata["ocr_engine_name"],
+        timings=timings,
+        profile=metadata.get("profile", DEFAULT_PROFILE),
+        chunk_size_tokens=chunk_size_tokens,
+        chunk_overlap_tokens=chunk_overlap_tokens,
+        ocr_languages=metadata.get("ocr_languages"),
+    )
+    parsed.stats["chunking"] = {"chunk_size_tokens": chunk_size_tokens, "chunk_overlap_tokens": chunk_overlap_tokens}
+    # gli esiti dei report OCR riguardano il sorgente, non il rendering: restano in run.json
+    reports = metadata.get("stats", {}).get("reports")
+    if reports:
+        parsed.stats["reports"] = reports
+    return parsed
+
+
+# =========================================================
+#  Re-render di una run dir
+# =========================================================
+
+def rerender_run_dir(
+        run_dir: Union[str, Path],
+        dest_dir: Optional[Union[str, Path]] = None,
+        chunk_size_tokens: int = CHUNK_SIZE_TOKENS,
+        chunk_overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Dict[str, Any]:
+    """
+    Rigenera output.md, chunks.json, images/ e tables/ di una run dall'output.json salvato.
+    Senza dest_dir la run viene aggiornata sul posto (images/ e tables/ vengono ricreate,
+    output.json non viene riscritto); con dest_dir l'output.json viene copiato nella nuova run.
+    Ritorna un riepilogo (run_dir, chunk, tempi).
+    """
+    run_dir = Path(run_dir)
+    t0 = time.perf_counter()
+    parsed = _render_run(run_dir, chunk_size_tokens, chunk_overlap_tokens)
+
+    if dest_dir is None:
+        target = run_dir
+        for folder in ("images", TABLES_DIR):
+            shutil.rmtree(target / folder, ignore_errors=True)
+    else:
+        target = Path(dest_dir)
+        target.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(run_dir / "output.json", target / "output.json")
+
+    result = write_parse_result(parsed, target, write_json=False)
+    return {
+        "run_dir": str(run_dir),
+        "output_dir": str(result.run_dir),
+        "num_chunks": result.stats.get("num_chunks", 0),
+        "num_table_groups": result.stats.get("num_table_groups", 0),
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }
+
+
+# =========================================================
+#  Sweep dei parametri di chunking
+# =========================================================
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def _token_stats(tokens: List[int]) -> Dict[str, Any]:
+    if not tokens:
+        return {"mean": 0.0, "p50": 0, "p95": 0, "max": 0}
+    return {
+        "mean": round(statistics.fmean(tokens), 1),
+        "p50": _percentile(tokens, 0.5),
+        "p95": _percentile(tokens, 0.95),
+        "max": max(tokens),
+    }
+
+
+def sweep_run_dir(run_dir: Union[str, Path], settings: Sequence[Tuple[int, int]]) -> Dict[str, Any]:
+    """
+    Render una sola volta, poi chunking con ogni (chunk_size, overlap) di settings.
+    Non scrive nulla: ritorna per ogni setting il numero di chunk e i token per chunk.
+    """
+    run_dir = Path(run_dir)
+    size, overlap = settings[0]
+    parsed = _render_run(run_dir, size, overlap)
+    body = parsed.markdown_body
+    body_tokens = len(get_tokenizer()(body, add_special_tokens=False, return_attention_mask=False,
+                                      return_token_type_ids=False)["input_ids"])
+
+    results = []
+    for index, (size, overlap) in enumerate(settings):
+        if index == 0:
+            # già calcolato da render_document
+            chunks = parsed.chunks
+            chunking_s = parsed.stats["timings"].get("chunking_s", 0.0)
+        else:
+            t0 = time.perf_counter()
+            chunks = build_markdown_chunks(body, source_name="docling_clean_smart",
+                                           chunk_size_tokens=size, chunk_overlap_tokens=overlap) or []
+            chunking_s = time.perf_counter() - t0
+        results.append({
+            "chunk_size_tokens": size,
+            "chunk_overlap_tokens": overlap,
+            "num_chunks": len(chunks),
+            "tokens": [c["metadata"].get("chunk_size_tokens", 0) for c in chunks],
+            "chunking_s": round(chunking_s, 3),
+        })
+    return {"run_dir": str(run_dir), "body_tokens": body_tokens, "settings": results}
+
+
+def summarize_sweep(per_run: List[Dict[str, Any]], settings: Sequence[Tuple[int, int]]) -> List[Dict[str, Any]]:
+    """Aggrega i risultati per setting su tutte le run."""
+    summary = []
+    body_tokens = sum(run["body_tokens"] for run in per_run)
+    for index, (size, overlap) in enumerate(settings):
+        rows = [run["settings"][index] for run in per_run]
+        tokens = [t for row in rows for t in row["tokens"]]
+        counts = [row["num_chunks"] for row in rows]
+        summary.append({
+            "chunk_size_tokens": size,
+            "chunk_overlap_tokens": overlap,
+            "documents": len(rows),
+            "chunks": sum(counts),
+            "chunks_per_doc": _token_stats(counts),
+            "tokens_per_chunk": _token_stats(tokens),
+            # token indicizzati in più rispetto al testo, dovuti all'overlap
+            "overlap_overhead": round(sum(tokens) / body_tokens - 1, 3) if body_tokens else 0.0,
+            "chunking_s": round(sum(row["chunking_s"] for row in rows), 3),
+        })
+    return summary
+
+
+def print_sweep_summary(summary: List[Dict[str, Any]]) -> None:
+    print(f"\n{'size':>6} {'overlap':>8} {'docs':>5} {'chunks':>7} {'chunks/doc':>10} "
+          f"{'tok mean':>9} {'tok p95':>8} {'tok max':>8} {'overhead':>9}")
+    for row in summary:
+        print(f"{row['chunk_size_tokens']:>6} {row['chunk_overlap_tokens']:>8} {row['documents']:>5} "
+              f"{row['chunks']:>7} {row['chunks_per_doc']['mean']:>10} {row['tokens_per_chunk']['mean']:>9} "
+              f"{row['tokens_per_chunk']['p95']:>8} {row['tokens_per_chunk']['max']:>8} "
+              f"{row['overlap_overhead']:>9.1%}")
+
+
+def parse_sweep_settings(spec: str) -> List[Tuple[int, int]]:
+    """Es. "512:50,1024:100" -> [(512, 50), (1024, 100)] (chunk size : overlap, in token)."""
+    settings = []
+    for part in spec.split(","):
+        size, _, overlap = part.strip().partition(":")
+        settings.append((int(size), int(overlap or 0)))
+    if not settings:
+        raise ValueError("Empty sweep specification")
+    for size, overlap in settings:
+        if size <= 0 or overlap < 0 or overlap >= size:
+            raise ValueError(f"Invalid chunk setting {size}:{overlap} (need 0 <= overlap < size)")
+    return settings
+
+
+# =========================================================
+#  Esecuzione parallela su più run dir
+# =========================================================
+
+def _run_parallel(fn, run_dirs: List[Path], workers: int, *args) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    results: List[Dict[str, Any]] = []
+    failures: List[Dict[str, str]] = []
+
+    if workers <= 1:
+        for run_dir in run_dirs:
+            try:
+                results.append(fn(run_dir, *args))
+            except Exception as e:
+                traceback.print_exc()
+                failures.append({"run_dir": str(run_dir), "error": f"{type(e).__name__}: {e}"})
+        return results, failures
+
+    # spawn: niente fork di un processo con tokenizer/torch già inizializzati
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as executor:
+        futures = {executor.submit(fn, run_dir, *args): run_dir for run_dir in run_dirs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            run_dir = futures[future]
+            try:
+                results.append(future.result())
+                print(f"[{done}/{len(run_dirs)}] {run_dir} OK")
+            except Exception as e:
+                print(f"[{done}/{len(run_dirs)}] {run_dir} FAILED: {e}")
+                failures.append({"run_dir": str(run_dir), "error": f"{type(e).__name__}: {e}"})
+    return results, failures
+
+
+def rerender_all(
+        path: Union[str, Path],
+        workers: int = 1,
+        chunk_size_tokens: int = CHUNK_SIZE_TOKENS,
+        chunk_overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Dict[str, Any]:
+    """Re-render sul posto di tutte le run dir sotto path."""
+    run_dirs = find_run_dirs(path)
+    print(f"Re-rendering {len(run_dirs)} run dirs with {workers} workers "
+          f"(chunk size {chunk_size_tokens}, overlap {chunk_overlap_tokens})...")
+    t0 = time.perf_counter()
+    results, failures = _run_parallel(rerender_run_dir, run_dirs, workers, None,
+                                      chunk_size_tokens, chunk_overlap_tokens)
+    return {"runs": results, "failures": failures, "elapsed_s": round(time.perf_counter() - t0, 3)}
+
+
+def sweep_all(path: Union[str, Path], settings: Sequence[Tuple[int, int]], workers: int = 1) -> Dict[str, Any]:
+    """Sweep dei parametri di chunking su tutte le run dir sotto path (nessuna scrittura nelle run)."""
+    run_dirs = find_run_dirs(path)
+    print(f"Chunking sweep over {len(run_dirs)} run dirs, {len(settings)} settings, {workers} workers...")
+    t0 = time.perf_counter()
+    per_run, failures = _run_parallel(sweep_run_dir, run_dirs, workers, list(settings))
+    summary = summarize_sweep(per_run, settings)
+    for run in per_run:
+        # i token per chunk servono solo all'aggregato
+        for row in run["settings"]:
+            row["tokens"] = _token_stats(row.pop("tokens"))
+    return {
+        "settings": summary,
+        "runs": per_run,
+        "failures": failures,
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }
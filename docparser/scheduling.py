@@ -0,0 +1,264 @@
+# scheduling.py
+
+import heapq
+import json
+import re
+from dataclasses import dataclass, asdict, field
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from PIL import Image
+
+from docparser.utils import is_document_like_image
+
+try:
+    import pypdfium2 as pdfium  # dipendenza di docling
+except ImportError:  # pragma: no cover - fallback senza pypdfium2
+    pdfium = None
+
+
+# =========================================================
+#  Cost model
+# =========================================================
+
+@dataclass
+class CostModel:
+    """
+    Coefficienti (in secondi stimati) per il costo di conversione.
+    I default sono volutamente grossolani: vanno calibrati con calibrate_cost_model().
+    """
+    digital_page_s: float = 0.6
+    scanned_page_s: float = 4.0
+    image_base_s: float = 1.0
+    image_per_megapixel_s: float = 0.8
+    photo_image_s: float = 0.5  # immagine non document-like (OCR disabilitato)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "CostModel":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+
+    def save(self, path: Union[str, Path]) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+
+@dataclass
+class CostEstimate:
+    file_path: str
+    kind: str  # "digital_pdf" | "scanned_pdf" | "document_image" | "photo_image" | "other"
+    pages: int = 1
+    megapixels: float = 0.0
+    estimated_s: float = 0.0
+
+    # compilati a fine run
+    actual_s: Optional[float] = None
+    worker: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+# Sotto questa media di caratteri per pagina consideriamo il PDF una scansione
+MIN_CHARS_PER_DIGITAL_PAGE = 50
+# Pagine campionate per decidere digitale vs scansione (la prima, l'ultima e una in mezzo)
+SCANNED_SAMPLE_PAGES = 3
+
+
+def _pdf_page_count_fallback(path: Path) -> int:
+    """Conteggio pagine senza pypdfium2: cerca gli oggetti /Type /Page nel file."""
+    data = path.read_bytes()
+    return max(1, len(re.findall(rb"/Type\s*/Page(?!s)", data)))
+
+
+def _inspect_pdf(path: Path) -> Dict[str, Any]:
+    if pdfium is None:
+        # senza text layer non possiamo sapere se è una scansione: stima pessimistica
+        return {"pages": _pdf_page_count_fallback(path), "scanned": True}
+
+    pdf = pdfium.PdfDocument(str(path))
+    try:
+        n_pages = len(pdf)
+        if n_pages == 0:
+            return {"pages": 0, "scanned": False}
+
+        sample = sorted({0, n_pages // 2, n_pages - 1})[:SCANNED_SAMPLE_PAGES]
+        chars = 0
+        for idx in sample:
+            page = pdf[idx]
+            textpage = page.get_textpage()
+            chars += textpage.count_chars()
+            textpage.close()
+            page.close()
+
+        avg_chars = chars / len(sample)
+        return {
+            "pages": n_pages,
+            "scanned": avg_chars < MIN_CHARS_PER_DIGITAL_PAGE,
+            "avg_chars_per_page": avg_chars,
+        }
+    finally:
+        pdf.close()
+
+
+def estimate_cost(file_path: Union[str, Path], model: Optional[CostModel] = None) -> CostEstimate:
+    """
+    Stima economica del costo di conversione di un file (senza aprire Docling):
+    - PDF: numero pagine + text layer presente/assente (campione di pagine)
+    - Immagini: megapixel (solo header) + euristica document-like
+    """
+    model = model or CostModel()
+    path = Path(file_path)
+    mime, _ = guess_type(path.name)
+
+    try:
+        if mime == "application/pdf":
+            info = _inspect_pdf(path)
+            per_page = model.scanned_page_s if info["scanned"] else model.digital_page_s
+            return CostEstimate(
+                file_path=str(path),
+                kind="scanned_pdf" if info["scanned"] else "digital_pdf",
+                pages=info["pages"],
+                estimated_s=info["pages"] * per_page,
+                extra={k: v for k, v in info.items() if k not in ("pages", "scanned")},
+            )
+
+        if mime and mime.startswith("image/"):
+            with Image.open(path) as img:
+                width, height = img.size
+            megapixels = width * height / 1_000_000
+            if is_document_like_image(path):
+                return CostEstimate(
+                    file_path=str(path),
+                    kind="document_image",
+                    megapixels=megapixels,
+                    estimated_s=model.image_base_s + model.image_per_megapixel_s * megapixels,
+                )
+            return CostEstimate(
+                file_path=str(path),
+                kind="photo_image",
+                megapixels=megapixels,
+                estimated_s=model.photo_image_s,
+            )
+    except Exception as e:
+        print(f"  Could not estimate cost for {path.name}: {e}")
+
+    # fallback: proporzionale alla dimensione del file (1 "pagina" digitale per MB)
+    size_mb = path.stat().st_size / (1024 * 1024) if path.exists() else 1.0
+    return CostEstimate(
+        file_path=str(path),
+        kind="other",
+        estimated_s=max(1.0, size_mb) * model.digital_page_s,
+    )
+
+
+# =========================================================
+#  Scheduling
+# =========================================================
+
+def order_by_cost(estimates: Sequence[CostEstimate], strategy: str = "lpt") -> List[CostEstimate]:
+    """
+    Ordina i lavori:
+    - "lpt":  longest processing time first (minimizza il makespan con più worker)
+    - "spt":  shortest first (minimizza la latenza media, utile in sequenziale)
+    - "name": ordine alfabetico (comportamento storico)
+    """
+    if strategy == "lpt":
+        return sorted(estimates, key=lambda e: (-e.estimated_s, e.file_path))
+    if strategy == "spt":
+        return sorted(estimates, key=lambda e: (e.estimated_s, e.file_path))
+    if strategy == "name":
+        return sorted(estimates, key=lambda e: e.file_path)
+    raise ValueError(f"Unknown scheduling strategy: {strategy}")
+
+
+def pack_lpt(estimates: Sequence[CostEstimate], workers: int) -> List[List[CostEstimate]]:
+    """
+    Bin-packing greedy LPT: ogni lavoro (dal più costoso) va al worker meno carico.
+    Ritorna una lista di code, una per worker.
+    """
+    workers = max(1, workers)
+    bins: List[List[CostEstimate]] = [[] for _ in range(workers)]
+    heap = [(0.0, w) for w in range(workers)]
+    heapq.heapify(heap)
+
+    for est in order_by_cost(estimates, "lpt"):
+        load, w = heapq.heappop(heap)
+        bins[w].append(est)
+        heapq.heappush(heap, (load + est.estimated_s, w))
+
+    return bins
+
+
+def predicted_makespan(estimates: Sequence[CostEstimate], workers: int) -> float:
+    return max((sum(e.estimated_s for e in b) for b in pack_lpt(estimates, workers)), default=0.0)
+
+
+# =========================================================
+#  Calibration & report
+# =========================================================
+
+def calibrate_cost_model(estimates: Sequence[CostEstimate], base: Optional[CostModel] = None) -> CostModel:
+    """
+    Ricalibra i coefficienti con i tempi reali: per ogni tipo di input calcola il
+    fattore di scala ai minimi quadrati (sum(actual*est) / sum(est^2)) e lo applica
+    ai coefficienti corrispondenti.
+    """
+    base = base or CostModel()
+    coeffs = asdict(base)
+    kind_to_fields = {
+        "digital_pdf": ["digital_page_s"],
+        "scanned_pdf": ["scanned_page_s"],
+        "document_image": ["image_base_s", "image_per_megapixel_s"],
+        "photo_image": ["photo_image_s"],
+    }
+
+    for kind, fields_ in kind_to_fields.items():
+        samples = [
+            e for e in estimates
+            if e.kind == kind and e.actual_s is not None and e.estimated_s > 0
+        ]
+        if not samples:
+            continue
+        num = sum(e.actual_s * e.estimated_s for e in samples)
+        den = sum(e.estimated_s ** 2 for e in samples)
+        if den <= 0:
+            continue
+        scale = num / den
+        for name in fields_:
+            coeffs[name] = coeffs[name] * scale
+
+    return CostModel(**coeffs)
+
+
+def write_schedule_report(
+        estimates: Sequence[CostEstimate],
+        report_path: Union[str, Path],
+        workers: int,
+        strategy: str,
+        wall_time_s: float,
+        model: CostModel,
+) -> Dict[str, Any]:
+    """Scrive (e stampa) il confronto stimato vs reale per ogni file."""
+    report = {
+        "workers": workers,
+        "strategy": strategy,
+        "wall_time_s": wall_time_s,
+        "predicted_makespan_s": predicted_makespan(estimates, workers),
+        "cost_model": asdict(model),
+        "calibrated_cost_model": asdict(calibrate_cost_model(estimates, model)),
+        "files": [asdict(e) for e in estimates],
+    }
+
+    report_path = Path(report_path)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print("\n--- Schedule report (estimated vs actual) ---")
+    for e in estimates:
+        actual = f"{e.actual_s:.1f}s" if e.actual_s is not None else "failed"
+        print(f"  {Path(e.file_path).name:<40} {e.kind:<15} est={e.estimated_s:6.1f}s actual={actual}")
+    print(f"Predicted makespan: {report['predicted_makespan_s']:.1f}s, wall time: {wall_time_s:.1f}s")
+    print(f"Saved schedule report to {report_path}")
+    return report
@@ -0,0 +1,555 @@
+# server.py
+
+import json
+import math
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from email.parser import BytesParser
+from email.policy import default as default_email_policy
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from docparser.chunking import get_tokenizer
+from docparser.core import process_document
+from docparser.pipeline import DoclingParseResult, warmup_docling_converters
+from docparser.profiles import DEFAULT_PROFILE, get_profile
+from docparser.utils import is_supported_file
+
+
+# =========================================================
+#  Job & Service
+# =========================================================
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_TIMEOUT = "timeout"
+
+FINAL_STATES = {JOB_DONE, JOB_FAILED, JOB_CANCELLED, JOB_TIMEOUT}
+
+
+class ServiceSaturated(Exception):
+    """Coda piena: la richiesta va rifiutata (HTTP 429)."""
+
+
+@dataclass
+class ConversionJob:
+    job_id: str
+    file_path: str
+    use_rapidocr: bool
+    profile: str
+    deadline: float  # time.monotonic() oltre il quale il job non serve più
+
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    # cartella temporanea dell'upload, rimossa a fine job
+    upload_dir: Optional[Path] = None
+    future: Optional[Future] = None
+
+    def to_dict(self, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "file": Path(self.file_path).name,
+            "profile": self.profile,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error:
+            data["error"] = self.error
+        if self.result is not None:
+            keys = include or list(self.result.keys())
+            data["result"] = {k: v for k, v in self.result.items() if k in keys}
+        return data
+
+
+def _result_payload(parse_result: DoclingParseResult) -> Dict[str, Any]:
+    """Converte un DoclingParseResult nel payload JSON restituito dal server."""
+    chunks: List[Dict[str, Any]] = []
+    if parse_result.chunks_path.exists():
+        with open(parse_result.chunks_path, "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+
+    return {
+        "run_dir": str(parse_result.run_dir),
+        "ocr_enabled": parse_result.ocr_enabled,
+        "ocr_engine": parse_result.ocr_engine_name,
+        "ocr_languages": parse_result.ocr_languages,
+        "profile": parse_result.profile,
+        "markdown": parse_result.markdown,
+        "chunks": chunks,
+        "images": parse_result.image_rel_paths,
+        "tables": parse_result.table_rel_paths,
+        "stats": parse_result.stats,
+    }
+
+
+class ConversionService:
+    """
+    Servizio di conversione long-running.
+
+    - I converter Docling e il tokenizer restano in memoria (cache di processo).
+    - Le conversioni girano su un pool di worker limitato (max_workers).
+    - Oltre ai worker attivi accettiamo al massimo max_queue richieste in attesa:
+      oltre questa soglia submit() solleva ServiceSaturated (-> HTTP 429).
+    - Ogni job ha una deadline: se scade in coda il job non parte, se scade
+      mentre gira il risultato viene scartato (il thread Docling non è interrompibile).
+    """
+
+    def __init__(
+            self,
+            output_root: str = "output",
+            max_workers: int = 1,
+            max_queue: int = 4,
+            default_timeout_s: float = 600.0,
+            use_rapidocr: bool = False,
+            job_ttl_s: float = 900.0,
+            profile: str = DEFAULT_PROFILE,
+    ):
+        self.output_root = output_root
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.default_timeout_s = default_timeout_s
+        self.use_rapidocr = use_rapidocr
+        self.profile = get_profile(profile).name
+        self.job_ttl_s = job_ttl_s
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="docparser-worker",
+        )
+        # slot = worker + posti in coda
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._jobs: Dict[str, ConversionJob] = {}
+        self._lock = threading.Lock()
+
+    # ---------------- lifecycle ----------------
+
+    def warmup(self) -> None:
+        """Carica converter e tokenizer prima di accettare richieste."""
+        print("Warming up Docling converters and tokenizer...")
+        t0 = time.perf_counter()
+        warmup_docling_converters(use_rapidocr=self.use_rapidocr, profile=self.profile)
+        get_tokenizer()
+        print(f"Warmup completed in {time.perf_counter() - t0:.1f}s")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status == JOB_QUEUED and job.future is not None:
+                    if job.future.cancel():
+                        job.status = JOB_CANCELLED
+        self._executor.shutdown(wait=True)
+
+    # ---------------- jobs ----------------
+
+    def submit(
+            self,
+            file_path: str,
+            use_rapidocr: Optional[bool] = None,
+            timeout_s: Optional[float] = None,
+            upload_dir: Optional[Path] = None,
+            profile: Optional[str] = None,
+    ) -> ConversionJob:
+        profile = get_profile(profile or self.profile).name
+        if not self._slots.acquire(blocking=False):
+            raise ServiceSaturated(
+                f"{self.max_workers} worker occupati e {self.max_queue} richieste in coda"
+            )
+
+        timeout_s = timeout_s if timeout_s is not None else self.default_timeout_s
+        job = ConversionJob(
+            job_id=uuid.uuid4().hex,
+            file_path=file_path,
+            use_rapidocr=self.use_rapidocr if use_rapidocr is None else use_rapidocr,
+            profile=profile,
+            deadline=time.monotonic() + timeout_s,
+            upload_dir=upload_dir,
+        )
+
+        with self._lock:
+            self._prune_jobs()
+            self._jobs[job.job_id] = job
+
+        try:
+            job.future = self._executor.submit(self._run_job, job)
+        except Exception:
+            self._slots.release()
+            raise
+        job.future.add_done_callback(lambda _f: self._on_job_done(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[ConversionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job: ConversionJob) -> ConversionJob:
+        """Attende il job fino alla sua deadline; allo scadere lo marca come timeout."""
+        remaining = max(0.0, job.deadline - time.monotonic())
+        try:
+            job.future.result(timeout=remaining)
+        except FutureTimeoutError:
+            self._expire(job, JOB_TIMEOUT)
+        except Exception:
+            # l'errore è già registrato nel job da _run_job
+            pass
+        return job
+
+    def cancel(self, job_id: str) -> Optional[ConversionJob]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        self._expire(job, JOB_CANCELLED)
+        return job
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            states = [j.status for j in self._jobs.values()]
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queued": states.count(JOB_QUEUED),
+            "running": states.count(JOB_RUNNING),
+            "done": states.count(JOB_DONE),
+            "failed": states.count(JOB_FAILED),
+        }
+
+    # ---------------- internals ----------------
+
+    def _expire(self, job: ConversionJob, status: str) -> None:
+        with self._lock:
+            if job.status in FINAL_STATES:
+                return
+            job.status = status
+            job.finished_at = time.time()
+        if job.future is not None:
+            # se è ancora in coda non partirà mai; se sta girando il risultato verrà scartato
+            job.future.cancel()
+
+    def _run_job(self, job: ConversionJob) -> None:
+        with self._lock:
+            if job.status in FINAL_STATES:
+                return
+            if time.monotonic() >= job.deadline:
+                job.status = JOB_TIMEOUT
+                job.finished_at = time.time()
+                return
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+
+        try:
+            parse_result = process_document(
+                file_path=job.file_path,
+                output_root=self.output_root,
+                use_rapidocr=job.use_rapidocr,
+                use_openai=False,
+                profile=job.profile,
+            )
+            payload = _result_payload(parse_result)
+            with self._lock:
+                if job.status == JOB_RUNNING:
+                    job.result = payload
+                    job.status = JOB_DONE
+                    job.finished_at = time.time()
+        except Exception as e:
+            with self._lock:
+                if job.status == JOB_RUNNING:
+                    job.error = str(e)
+                    job.status = JOB_FAILED
+                    job.finished_at = time.time()
+            raise
+
+    def _on_job_done(self, job: ConversionJob) -> None:
+        self._slots.release()
+        if job.upload_dir is not None:
+            shutil.rmtree(job.upload_dir, ignore_errors=True)
+
+    def _prune_jobs(self) -> None:
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in FINAL_STATES
+            and job.finished_at is not None
+            and now - job.finished_at > self.job_ttl_s
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# =========================================================
+#  HTTP layer
+# =========================================================
+
+def _parse_multipart(content_type: str, body: bytes) -> Dict[str, Tuple[Optional[str], bytes]]:
+    """Ritorna {nome_campo: (filename, contenuto)} da un body multipart/form-data."""
+    header = f"Content-Type: {content_type}\r\nMIME-Version: 1.0\r\n\r\n".encode("utf-8")
+    message = BytesParser(policy=default_email_policy).parsebytes(header + body)
+
+    fields: Dict[str, Tuple[Optional[str], bytes]] = {}
+    if not message.is_multipart():
+        return fields
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if not name:
+            continue
+        fields[name] = (part.get_filename(), part.get_payload(decode=True) or b"")
+    return fields
+
+
+def _parse_timeout(value: Optional[str]) -> Optional[float]:
+    """Query ?timeout= in secondi: numero finito > 0 (ValueError altrimenti)."""
+    if value is None:
+        return None
+    try:
+        timeout_s = float(value)
+    except ValueError:
+        timeout_s = math.nan
+    if not math.isfinite(timeout_s) or timeout_s <= 0:
+        raise ValueError(f"timeout must be a positive number of seconds, got {value!r}")
+    return timeout_s
+
+
+def _parse_content_length(value: Optional[str]) -> int:
+    """Header Content-Length: intero >= 0 (ValueError altrimenti); assente = 0."""
+    if not value:
+        return 0
+    try:
+        length = int(value)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise ValueError(f"invalid Content-Length {value!r}")
+    return length
+
+
+def _as_bool(value: Optional[str], default: bool) -> bool:
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+class DocParserRequestHandler(BaseHTTPRequestHandler):
+    """
+    Endpoint:
+      GET    /health              stato del servizio e della coda
+      POST   /convert             multipart (campo "file") oppure JSON {"path": "..."}
+                                  query: timeout, rapidocr, profile, wait (default true), include
+      GET    /jobs/<job_id>       stato / risultato di un job
+      DELETE /jobs/<job_id>       cancella un job (in coda o in esecuzione)
+    """
+
+    service: ConversionService = None  # impostato da build_http_server
+    max_upload_bytes: int = 100 * 1024 * 1024
+
+    server_version = "DocParser/1.0"
+
+    # ---------------- helpers ----------------
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_response(self, job: ConversionJob, include: Optional[List[str]]) -> None:
+        status_map = {
+            JOB_DONE: HTTPStatus.OK,
+            JOB_FAILED: HTTPStatus.INTERNAL_SERVER_ERROR,
+            JOB_TIMEOUT: HTTPStatus.GATEWAY_TIMEOUT,
+            JOB_CANCELLED: HTTPStatus.CONFLICT,
+            JOB_QUEUED: HTTPStatus.ACCEPTED,
+            JOB_RUNNING: HTTPStatus.ACCEPTED,
+        }
+        self._send_json(status_map[job.status], job.to_dict(include))
+
+    def log_message(self, format: str, *args: Any) -> None:
+        print(f"[server] {self.address_string()} - {format % args}")
+
+    # ---------------- routes ----------------
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send_json(HTTPStatus.OK, {"status": "ok", **self.service.snapshot()})
+            return
+
+        if url.path.startswith("/jobs/"):
+            job = self.service.get(url.path[len("/jobs/"):])
+            if job is None:
+                self._send_json(HTTPStatus.NOT_FOUND, {"error": "job not found"})
+                return
+            query = parse_qs(url.query)
+            include = query["include"][0].split(",") if "include" in query else None
+            self._job_response(job, include)
+            return
+
+        self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+
+    def do_DELETE(self) -> None:
+        url = urlparse(self.path)
+        if not url.path.startswith("/jobs/"):
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+        job = self.service.cancel(url.path[len("/jobs/"):])
+        if job is None:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "job not found"})
+            return
+        self._send_json(HTTPStatus.OK, job.to_dict(include=[]))
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path != "/convert":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+
+        query = parse_qs(url.query)
+        use_rapidocr = _as_bool(query.get("rapidocr", [None])[0], self.service.use_rapidocr)
+        wait = _as_bool(query.get("wait", [None])[0], True)
+        profile = query.get("profile", [None])[0]
+        include = query["include"][0].split(",") if "include" in query else None
+        try:
+            timeout_s = _parse_timeout(query.get("timeout", [None])[0])
+            length = _parse_content_length(self.headers.get("Content-Length"))
+        except ValueError as e:
+            # body non letto: la connessione non è più riutilizzabile
+            self.close_connection = True
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"invalid request: {e}"})
+            return
+
+        if length > self.max_upload_bytes:
+            self.close_connection = True
+            self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "payload too large"})
+            return
+        body = self.rfile.read(length) if length else b""
+        content_type = self.headers.get("Content-Type", "")
+
+        upload_dir: Optional[Path] = None
+        try:
+            if content_type.startswith("multipart/form-data"):
+                fields = _parse_multipart(content_type, body)
+                if "file" not in fields or not fields["file"][0]:
+                    self._send_json(HTTPStatus.BAD_REQUEST, {"error": "missing 'file' field"})
+                    return
+                filename, data = fields["file"]
+                filename = Path(filename).name
+                if not is_supported_file(filename):
+                    self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"unsupported file type: {filename}"})
+                    return
+                upload_dir = Path(tempfile.mkdtemp(prefix="docparser-upload-"))
+                file_path = upload_dir / filename
+                file_path.write_bytes(data)
+
+            elif content_type.startswith("application/json"):
+                request = json.loads(body or b"{}")
+                file_path = Path(request.get("path", ""))
+                if not file_path.is_file():
+                    self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"file not found: {file_path}"})
+                    return
+                if not is_supported_file(file_path):
+                    self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"unsupported file type: {file_path.name}"})
+                    return
+            else:
+                self._send_json(
+                    HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+                    {"error": "use multipart/form-data or application/json"},
+                )
+                return
+
+            job = self.service.submit(
+                file_path=str(file_path),
+                use_rapidocr=use_rapidocr,
+                timeout_s=timeout_s,
+                upload_dir=upload_dir,
+                profile=profile,
+            )
+
+        except ServiceSaturated as e:
+            if upload_dir is not None:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+            self._send_json(HTTPStatus.TOO_MANY_REQUESTS, {"error": str(e)}, headers={"Retry-After": "5"})
+            return
+        except ValueError as e:
+            if upload_dir is not None:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"invalid request: {e}"})
+            return
+
+        if not wait:
+            self._send_json(HTTPStatus.ACCEPTED, job.to_dict(include=[]))
+            return
+
+        self.service.wait(job)
+        self._job_response(job, include)
+
+
+def build_http_server(
+        service: ConversionService,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        max_upload_mb: int = 100,
+) -> ThreadingHTTPServer:
+    handler = type(
+        "BoundDocParserRequestHandler",
+        (DocParserRequestHandler,),
+        {"service": service, "max_upload_bytes": max_upload_mb * 1024 * 1024},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        output_root: str = "output",
+        max_workers: int = 1,
+        max_queue: int = 4,
+        default_timeout_s: float = 600.0,
+        use_rapidocr: bool = False,
+        max_upload_mb: int = 100,
+        warmup: bool = True,
+        profile: str = DEFAULT_PROFILE,
+) -> None:
+    """Avvia il server HTTP e blocca finché non viene interrotto (CTRL+C)."""
+    service = ConversionService(
+        output_root=output_root,
+        max_workers=max_workers,
+        max_queue=max_queue,
+        default_timeout_s=default_timeout_s,
+        use_rapidocr=use_rapidocr,
+        profile=profile,
+    )
+    if warmup:
+        service.warmup()
+
+    httpd = build_http_server(service, host=host, port=port, max_upload_mb=max_upload_mb)
+    print(f"DocParser server listening on http://{host}:{port} "
+          f"(workers={max_workers}, queue={max_queue})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down server...")
+    finally:
+        httpd.server_close()
+        service.shutdown()
@@ -0,0 +1,144 @@
+# sharding.py
+
+import re
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from docling.datamodel.base_models import DocumentStream
+from docling_core.types.doc import DoclingDocument
+
+from docparser.pipeline import InMemoryParseResult, convert_source, render_document
+from docparser.profiles import DEFAULT_PROFILE
+
+try:
+    import pypdfium2 as pdfium  # dipendenza di docling
+except ImportError:  # pragma: no cover - fallback senza pypdfium2
+    pdfium = None
+
+# Pagine per shard: abbastanza da ammortizzare download e setup della conversione,
+# abbastanza poche da distribuire un documento da 1000 pagine su 20 nodi
+DEFAULT_PAGES_PER_SHARD = 50
+# Sotto questa soglia il documento viene convertito da un solo consumer come prima
+DEFAULT_MIN_PAGES_FOR_FAN_OUT = 200
+
+
+def count_pdf_pages(data: bytes) -> int:
+    """Numero di pagine di un PDF in memoria (pypdfium2, con fallback sugli oggetti /Type /Page)."""
+    if pdfium is None:
+        return max(1, len(re.findall(rb"/Type\s*/Page(?!s)", data)))
+    pdf = pdfium.PdfDocument(data)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def plan_page_ranges(num_pages: int, pages_per_shard: int = DEFAULT_PAGES_PER_SHARD) -> List[Tuple[int, int]]:
+    """
+    Divide [1, num_pages] in intervalli contigui (1-based, inclusivi) di al più pages_per_shard pagine.
+    L'ultimo shard assorbe il resto se sarebbe più corto di metà shard (evita code minuscole).
+    """
+    if num_pages <= 0:
+        return []
+    pages_per_shard = max(1, pages_per_shard)
+
+    ranges = []
+    start = 1
+    while start <= num_pages:
+        end = min(num_pages, start + pages_per_shard - 1)
+        ranges.append((start, end))
+        start = end + 1
+
+    if len(ranges) > 1 and (ranges[-1][1] - ranges[-1][0] + 1) < pages_per_shard / 2:
+        last_start, last_end = ranges.pop()
+        prev_start, _ = ranges.pop()
+        ranges.append((prev_start, last_end))
+    return ranges
+
+
+def convert_shard(
+        data: bytes,
+        file_name: str,
+        page_range: Tuple[int, int],
+        ocr_enabled: bool,
+        use_rapidocr: bool = False,
+        profile: str = DEFAULT_PROFILE,
+) -> Dict[str, Any]:
+    """
+    Converte solo le pagine page_range del documento.
+    Ritorna {"document": <DoclingDocument come dict>, "stats": {...}}: il dict è
+    serializzabile in JSON e viene ricaricato da assemble_shards.
+    """
+    t_start = time.perf_counter()
+    source = DocumentStream(name=Path(file_name).name, stream=BytesIO(data))
+
+    print(f"Running Docling conversion on {file_name} pages {page_range[0]}-{page_range[1]}...")
+    # lingue e scala OCR scelte sulle pagine dello shard: ogni shard può avere le sue
+    result, _, ocr_engine_name, plan = convert_source(
+        source,
+        use_rapidocr=use_rapidocr,
+        ocr_enabled=ocr_enabled,
+        profile=profile,
+        page_range=page_range,
+    )
+    convert_s = time.perf_counter() - t_start
+
+    return {
+        "document": result.document.export_to_dict(),
+        "stats": {
+            "page_range": list(page_range),
+            "num_pages": len(result.document.pages),
+            "ocr_engine_name": ocr_engine_name,
+            "ocr_languages": plan.languages.languages if plan is not None else [],
+            "ocr_scales": [r.to_dict() for r in plan.scales] if plan is not None else [],
+            "convert_s": convert_s,
+        },
+    }
+
+
+def assemble_shards(
+        shard_documents: Sequence[Dict[str, Any]],
+        file_label: str,
+        ocr_enabled: bool,
+        ocr_engine_name: str,
+        profile: str = DEFAULT_PROFILE,
+        ocr_languages: Optional[Sequence[str]] = None,
+) -> InMemoryParseResult:
+    """
+    Ricompone i DoclingDocument parziali (in ordine di pagina) in un unico documento
+    e lo passa a render_document: merge tabelle (anche a cavallo di due shard),
+    markdown, immagini e chunk sono calcolati una sola volta sul documento intero.
+    ocr_languages è l'unione delle lingue scelte dai singoli shard (vedi merge_shard_languages).
+    """
+    if not hasattr(DoclingDocument, "concatenate"):
+        raise RuntimeError("docling-core with DoclingDocument.concatenate is required to assemble shards")
+
+    t_start = time.perf_counter()
+    documents = [DoclingDocument.model_validate(doc) for doc in shard_documents]
+    document = DoclingDocument.concatenate(documents)
+    timings = {"assemble_s": time.perf_counter() - t_start}
+
+    parsed = render_document(
+        document,
+        file_label=file_label,
+        ocr_enabled=ocr_enabled,
+        ocr_engine_name=ocr_engine_name,
+        timings=timings,
+        profile=profile,
+        ocr_languages=ocr_languages,
+    )
+    timings["total_s"] = time.perf_counter() - t_start
+    parsed.stats["num_shards"] = len(documents)
+    return parsed
+
+
+def merge_shard_languages(shard_stats: Sequence[Dict[str, Any]]) -> List[str]:
+    """Unione (in ordine di prima apparizione) delle lingue OCR degli shard."""
+    languages: List[str] = []
+    for stats in shard_stats:
+        for lang in stats.get("ocr_languages") or []:
+            if lang not in languages:
+                languages.append(lang)
+    return languages
@@ -0,0 +1,198 @@
+# tables.py
+
+"""
+Export colonnare delle tabelle mergiate (output di utils.merge_tables).
+
+Ogni gruppo di tabelle diventa un DataFrame con colonne di provenienza
+(_source_table, _source_page, _source_row) e dtype inferiti, scritto come:
+- tables/table_<n>.csv
+- tables/table_<n>.parquet   (se pyarrow è installato)
+- tables/tables.json         indice dei gruppi: tabelle sorgente, pagine, colonne e dtype
+
+Gli analisti leggono direttamente CSV/Parquet invece di ri-parsare le tabelle markdown.
+"""
+
+import json
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (engine di DataFrame.to_parquet)
+    HAS_PARQUET = True
+except ImportError:  # export solo CSV
+    HAS_PARQUET = False
+
+TABLES_DIR = "tables"
+TABLES_INDEX = f"{TABLES_DIR}/tables.json"
+
+PROVENANCE_COLUMNS = ["_source_table", "_source_page", "_source_row"]
+
+TABLE_CONTENT_TYPES = {
+    ".csv": "text/csv",
+    ".parquet": "application/vnd.apache.parquet",
+    ".json": "application/json",
+}
+
+# Numeri con virgola decimale ("1.234,56", "12,5"): punto = migliaia, virgola = decimali
+_DECIMAL_COMMA = r"[-+]?\d{1,3}(?:\.\d{3})+(?:,\d+)?|[-+]?\d+,\d+"
+# Punto come migliaia senza virgola ("1.234"): ambiguo, vale la convenzione della colonna
+_THOUSANDS_DOT = r"[-+]?\d{1,3}(?:\.\d{3})+"
+# Punto decimale ("1.5", "0.25"; l'ambiguo "2.125" è escluso a parte con _THOUSANDS_DOT)
+_DOT_DECIMAL = r"[-+]?\d*\.\d+"
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d.%m.%Y", "%d-%m-%Y")
+
+
+def table_content_type(rel_path: str) -> str:
+    """Content type degli artefatti sotto tables/ (mimetypes non conosce .parquet)."""
+    for suffix, content_type in TABLE_CONTENT_TYPES.items():
+        if rel_path.endswith(suffix):
+            return content_type
+    return "application/octet-stream"
+
+
+# =========================================================
+#  Inferenza dei dtype (vettoriale, colonna per colonna)
+# =========================================================
+
+def _infer_series(series: pd.Series) -> pd.Series:
+    """
+    Converte una colonna di stringhe in Int64 / Float64 / datetime quando TUTTI
+    i valori non vuoti sono compatibili; altrimenti la lascia stringa.
+    Solo operazioni .str / to_numeric / to_datetime sull'intera colonna, nessun loop per cella.
+    """
+    text = series.astype("string").str.strip()
+    text = text.mask(text == "")
+    filled = text.notna()
+    if not filled.any():
+        return text
+
+    # Numeri: via spazi (anche non separabili) e simboli di valuta/percentuale
+    cleaned = text.str.replace(r"[\s €$%]", "", regex=True)
+
+    # Una sola convenzione per colonna: virgola decimale solo se almeno una cella ha la virgola
+    # e nessuna è un punto decimale non ambiguo ("1.5"); con le due insieme resta stringa
+    def matches(pattern: str) -> pd.Series:
+        return cleaned.str.fullmatch(pattern).fillna(False).astype(bool)
+
+    has_comma = cleaned.str.contains(",", regex=False).fillna(False).astype(bool)
+    decimal_comma = matches(_DECIMAL_COMMA)
+    if (decimal_comma & has_comma).any():
+        if (matches(_DOT_DECIMAL) & ~matches(_THOUSANDS_DOT)).any():
+            return text
+        cleaned = cleaned.mask(
+            decimal_comma,
+            cleaned.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
+        )
+    numbers = pd.to_numeric(cleaned, errors="coerce")
+    if numbers[filled].notna().all():
+        if (numbers[filled] % 1 == 0).all():
+            return numbers.round().astype("Int64")
+        return numbers.astype("Float64")
+
+    for date_format in _DATE_FORMATS:
+        dates = pd.to_datetime(text, format=date_format, errors="coerce")
+        if dates[filled].notna().all():
+            return dates
+
+    return text
+
+
+def infer_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Applica _infer_series a tutte le colonne object/string del DataFrame."""
+    out = df.copy()
+    for position, dtype in enumerate(df.dtypes):
+        if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+            out.isetitem(position, _infer_series(df.iloc[:, position]))
+    return out
+
+
+def _unique_column_names(columns) -> List[str]:
+    """Parquet vuole nomi di colonna stringa e univoci: 'Totale', 'Totale' -> 'Totale', 'Totale_1'."""
+    seen: Dict[str, int] = {}
+    names = []
+    for i, column in enumerate(columns):
+        name = str(column).strip() or f"column_{i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        seen.setdefault(name, 0)
+        names.append(name)
+    return names
+
+
+# =========================================================
+#  Gruppi di tabelle -> DataFrame con provenienza
+# =========================================================
+
+def _table_page(table_item) -> Optional[int]:
+    prov = getattr(table_item, "prov", None)
+    return prov[0].page_no if prov else None
+
+
+def table_group_frame(doc, group: Dict[str, Any]) -> pd.DataFrame:
+    """
+    DataFrame di un gruppo di merge_tables con le colonne di provenienza in testa:
+    _source_table (indice in doc.tables), _source_page, _source_row (riga nella tabella sorgente).
+    """
+    df = group["df"].reset_index(drop=True)
+    df.columns = _unique_column_names(df.columns)
+    # gruppi prodotti senza 'parts' (es. da codice esterno): una tabella per indice, righe non note
+    parts = group.get("parts") or [(group["indices"][0], len(df))]
+
+    tables = [table_index for table_index, rows in parts for _ in range(rows)]
+    rows = [row for _, count in parts for row in range(count)]
+    pages = {table_index: _table_page(doc.tables[table_index]) for table_index, _ in parts}
+
+    df = infer_dtypes(df)
+    provenance = pd.DataFrame({
+        "_source_table": pd.array(tables, dtype="Int64"),
+        "_source_page": pd.array([pages[t] for t in tables], dtype="Int64"),
+        "_source_row": pd.array(rows, dtype="Int64"),
+    })
+    # nomi riservati: una colonna del documento che si chiama come una di provenienza viene rinominata
+    df.columns = _unique_column_names(PROVENANCE_COLUMNS + list(df.columns))[len(PROVENANCE_COLUMNS):]
+    return pd.concat([provenance, df], axis=1)
+
+
+def export_table_groups(doc, merged_groups: List[Dict[str, Any]]) -> Dict[str, bytes]:
+    """
+    Serializza ogni gruppo di tabelle mergiate in CSV (+ Parquet) in memoria.
+    Ritorna rel_path ("tables/<nome>") -> bytes, come InMemoryParseResult.images.
+    """
+    files: Dict[str, bytes] = {}
+    index: List[Dict[str, Any]] = []
+
+    for n, group in enumerate(merged_groups):
+        try:
+            frame = table_group_frame(doc, group)
+        except Exception as e:
+            print(f"  Could not export table group {n}: {e}")
+            continue
+
+        name = f"table_{n:03d}"
+        files[f"{TABLES_DIR}/{name}.csv"] = frame.to_csv(index=False).encode("utf-8")
+        entry: Dict[str, Any] = {
+            "name": name,
+            "csv": f"{TABLES_DIR}/{name}.csv",
+            "source_tables": list(group["indices"]),
+            "source_pages": sorted({p for p in frame["_source_page"].dropna().tolist()}),
+            "rows": len(frame),
+            "columns": {column: str(dtype) for column, dtype in frame.dtypes.items()},
+        }
+
+        if HAS_PARQUET:
+            buffer = BytesIO()
+            frame.to_parquet(buffer, index=False)
+            files[f"{TABLES_DIR}/{name}.parquet"] = buffer.getvalue()
+            entry["parquet"] = f"{TABLES_DIR}/{name}.parquet"
+
+        index.append(entry)
+
+    if index:
+        if not HAS_PARQUET:
+            print("pyarrow not installed: merged tables exported as CSV only.")
+        files[TABLES_INDEX] = json.dumps(index, ensure_ascii=False, indent=2).encode("utf-8")
+        print(f"Exported {len(index)} table groups to {TABLES_DIR}/")
+    return files
@@ -0,0 +1,145 @@
+# text.py
+
+import math
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from docparser.chunking import build_markdown_chunks
+
+# Header/footer: righe corte nelle prime/ultime BOILERPLATE_EDGE_LINES righe non vuote di una
+# pagina (separate da form feed) che tornano al bordo di almeno BOILERPLATE_MIN_REPEATS pagine e
+# di almeno BOILERPLATE_MIN_PAGE_SHARE delle pagine. Le ripetizioni nel corpo non contano, e le
+# righe con struttura markdown (tabelle, titoli, elenchi) non sono mai header/footer
+BOILERPLATE_MIN_REPEATS = 3
+BOILERPLATE_MIN_PAGE_SHARE = 0.5
+BOILERPLATE_EDGE_LINES = 3
+BOILERPLATE_MAX_LINE_CHARS = 120
+
+_ZERO_WIDTH = dict.fromkeys(map(ord, "​‌‍⁠﻿"), None)
+# separatori ("-----", "=====", "*****")
+_SEPARATOR = re.compile(r"[-=_*~.]{3,}")
+# numeri di pagina con etichetta ("Pag. 3", "Pagina 3 di 10", "Page 3 of 10", "3 di 10", "- 3 -")
+_PAGE_LABEL = re.compile(
+    r"(?i)(pag(\.|ina)?|page)\s*\d+(\s*(di|of|/)\s*\d+)?|\d+\s*(di|of)\s*\d+|[-–]\s*\d+\s*[-–]"
+)
+_BARE_NUMBER = re.compile(r"\d{1,4}")
+# righe di tabella, titoli, voci di elenco
+_MARKDOWN_STRUCTURE = re.compile(r"\||#|[-*+]\s|\d+[.)]\s")
+
+
+def _filled(page: List[str]) -> List[int]:
+    return [i for i, line in enumerate(page) if line.strip()]
+
+
+def _edge_key(stripped: str) -> str:
+    # "Pag. 3" e "Pag. 4", "Rev. 2 - 12" e "Rev. 2 - 13": stesso header a meno dei numeri
+    return re.sub(r"\d+", "#", stripped)
+
+
+def _header_footer_lines(pages: List[List[str]]) -> List[Set[int]]:
+    """Per ogni pagina, gli indici delle righe header/footer da togliere."""
+    drop: List[Set[int]] = [set() for _ in pages]
+    if len(pages) < BOILERPLATE_MIN_REPEATS:
+        return drop
+    min_pages = max(BOILERPLATE_MIN_REPEATS, math.ceil(BOILERPLATE_MIN_PAGE_SHARE * len(pages)))
+
+    # righe ripetute ai bordi: {chiave: [(pagina, riga)]}, una volta per pagina
+    occurrences: Dict[str, List[Tuple[int, int]]] = {}
+    for page_no, page in enumerate(pages):
+        filled = _filled(page)
+        # su pagine corte i bordi non devono coprire il corpo: al più un terzo delle righe per lato
+        edge = min(BOILERPLATE_EDGE_LINES, len(filled) // 3)
+        seen: Set[str] = set()
+        for i in (filled[:edge] + filled[-edge:] if edge else []):
+            stripped = page[i].strip()
+            if len(stripped) > BOILERPLATE_MAX_LINE_CHARS or _BARE_NUMBER.fullmatch(stripped) \
+                    or _MARKDOWN_STRUCTURE.match(stripped):
+                continue
+            key = _edge_key(stripped)
+            if key not in seen:
+                seen.add(key)
+                occurrences.setdefault(key, []).append((page_no, i))
+    for positions in occurrences.values():
+        if len(positions) >= min_pages:
+            for page_no, i in positions:
+                drop[page_no].add(i)
+
+    # numeri di pagina nudi: prima o ultima riga della pagina, crescenti pagina dopo pagina
+    for pick in (0, -1):
+        numbers: List[Tuple[int, int, int]] = []
+        for page_no, page in enumerate(pages):
+            filled = _filled(page)
+            if filled and _BARE_NUMBER.fullmatch(page[filled[pick]].strip()):
+                numbers.append((page_no, filled[pick], int(page[filled[pick]].strip())))
+        values = [n for _, _, n in numbers]
+        if len(numbers) >= min_pages and all(b > a for a, b in zip(values, values[1:])):
+            for page_no, i, _ in numbers:
+                drop[page_no].add(i)
+    return drop
+
+
+def clean_boilerplate(text: str) -> str:
+    """
+    Pulizia economica di testo libero prima del chunking:
+    - normalizza unicode (NFC), fine riga e spazi non stampabili
+    - rimuove header/footer: righe corte ai bordi delle pagine (form feed) ripetute sulla
+      maggior parte delle pagine, e numeri di pagina nudi in testa/coda se crescono pagina per pagina
+    - rimuove righe di soli separatori e numeri di pagina con etichetta ("Pag. 3 di 10")
+    - comprime le righe vuote multiple
+
+    Senza form feed non ci sono pagine: nessuna riga viene tolta perché ripetuta
+    e i numeri nudi restano.
+    """
+    text = unicodedata.normalize("NFC", text).translate(_ZERO_WIDTH)
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\t", "    ")
+
+    pages = [[line.rstrip() for line in page.split("\n")] for page in text.split("\f")]
+    drop = _header_footer_lines(pages)
+
+    kept: List[str] = []
+    for page, page_drop in zip(pages, drop):
+        for i, line in enumerate(page):
+            stripped = line.strip()
+            if i in page_drop or _SEPARATOR.fullmatch(stripped) or _PAGE_LABEL.fullmatch(stripped):
+                continue
+            kept.append(line)
+        # il salto pagina diventa un paragrafo
+        kept.append("")
+
+    cleaned = "\n".join(kept)
+    cleaned = re.sub(r"\n{3,}", "\n\n", cleaned)
+    return cleaned.strip()
+
+
+def chunk_direct_text(
+        text: str,
+        source_name: str = "direct_text",
+) -> Dict[str, Any]:
+    """
+    Fast path per testo già disponibile (niente Docling, niente immagini):
+    pulizia boilerplate + chunking prev/focus/next.
+
+    Ritorna {"chunks": [...], "stats": {...}}.
+    """
+    t0 = time.perf_counter()
+    cleaned = clean_boilerplate(text)
+    t_clean = time.perf_counter() - t0
+
+    chunks: Optional[List[Dict[str, Any]]] = build_markdown_chunks(cleaned, source_name=source_name)
+    if chunks is None:
+        raise RuntimeError("Tokenizer not available: cannot chunk direct text")
+
+    return {
+        "chunks": chunks,
+        "stats": {
+            "input_chars": len(text),
+            "cleaned_chars": len(cleaned),
+            "num_chunks": len(chunks),
+            "timings": {
+                "clean_s": t_clean,
+                "total_s": time.perf_counter() - t0,
+            },
+        },
+    }
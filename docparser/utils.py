@@ -1,6 +1,7 @@
 
+from io import BytesIO
 from pathlib import Path
-from typing import Union
+from typing import Optional, Tuple, Union
 from mimetypes import guess_type
 
 import pandas as pd
@@ -8,34 +9,42 @@ from PIL import Image
 
 
 
-def is_document_like_image(image_path: Union[str, Path]) -> bool:
+# Euristica document-like: lato minimo in pixel e aspect ratio tipo foglio (A4 ≈ 1.41, range largo)
+DOCUMENT_MIN_SIDE = 600
+DOCUMENT_ASPECT_RANGE = (0.7, 1.9)
+
+
+def is_document_like_size(width: int, height: int) -> bool:
     """
-    Euristica veloce per capire se un'immagine assomiglia a un documento scansionato.
+    Euristica veloce per capire se un'immagine di queste dimensioni assomiglia a un documento
+    scansionato. Unica regola per file (is_document_like_image) e bytes (should_enable_ocr_for_bytes).
 
     True  = probabile foto/pdf di documento (foglio, contratto, ecc.)
     False = probabile foto di persone/paesaggi/oggetti vari
     """
-    image_path = Path(image_path)
-
-    try:
-        with Image.open(image_path) as img:
-            width, height = img.size
-    except Exception:
-        # Se non riesco a leggerla, non rischio OCR
-        return False
-
     # Immagini troppo piccole: difficilmente un documento leggibile
-    min_side = min(width, height)
-    if min_side < 600:
+    if min(width, height) < DOCUMENT_MIN_SIDE:
         return False
 
-    # Aspect ratio tipo foglio (A4 ≈ 1.41), teniamo un range largo
+    # molto panoramica o molto stretta → più probabile foto
     aspect_ratio = max(width, height) / min(width, height)
-    if not (0.7 <= aspect_ratio <= 1.9):
-        # molto panoramica o molto stretta → più probabile foto
-        return False
+    return DOCUMENT_ASPECT_RANGE[0] <= aspect_ratio <= DOCUMENT_ASPECT_RANGE[1]
 
-    return True
+
+def _image_size(source: Union[str, Path, BytesIO]) -> Optional[Tuple[int, int]]:
+    """Dimensioni dall'header dell'immagine (None se non leggibile)."""
+    try:
+        with Image.open(source) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def is_document_like_image(image_path: Union[str, Path]) -> bool:
+    """True se l'immagine sembra un documento scansionato (vedi is_document_like_size)."""
+    size = _image_size(Path(image_path))
+    # Se non riesco a leggerla, non rischio OCR
+    return size is not None and is_document_like_size(*size)
 
 
 def should_enable_ocr_for_file(file_path: Union[str, Path]) -> bool:
@@ -61,34 +70,19 @@ def should_enable_ocr_for_file(file_path: Union[str, Path]) -> bool:
     return False
 
 
-def is_document_like_image(image_path: Union[str, Path]) -> bool:
-    image_path = Path(image_path)
-    try:
-        with Image.open(image_path) as img:
-            width, height = img.size
-    except Exception:
-        return False
-
-    min_side = min(width, height)
-    if min_side < 600:
-        return False
-
-    aspect_ratio = max(width, height) / min(width, height)
-    if not (0.7 <= aspect_ratio <= 1.9):
-        return False
-
-    return True
-
-
-def should_enable_ocr_for_file(file_path: Union[str, Path]) -> bool:
-    file_path = Path(file_path)
-    mime, _ = guess_type(file_path.name)
+def should_enable_ocr_for_bytes(file_name: str, data: bytes) -> bool:
+    """
+    Come should_enable_ocr_for_file, ma per un documento già in memoria:
+    il tipo arriva dal nome, l'euristica document-like legge solo l'header dell'immagine.
+    """
+    mime, _ = guess_type(file_name)
 
     if mime == "application/pdf":
         return True
 
     if mime and mime.startswith("image/"):
-        return is_document_like_image(file_path)
+        size = _image_size(BytesIO(data))
+        return size is not None and is_document_like_size(*size)
 
     return False
 
@@ -111,6 +105,8 @@ def merge_tables(doc):
 
     current_indices = [0]
     current_df = dfs[0]
+    # provenienza delle righe: (indice tabella, righe apportate) nell'ordine del merge
+    current_parts = [(0, len(dfs[0]))]
 
     for i in range(1, len(dfs)):
         next_df = dfs[i]
@@ -118,6 +114,7 @@ def merge_tables(doc):
         if len(current_df.columns) == len(next_df.columns):
             if list(current_df.columns) == list(next_df.columns):
                 current_df = pd.concat([current_df, next_df], ignore_index=True)
+                current_parts.append((i, len(next_df)))
                 print(f"  Merged table {i} into previous table (matching headers).")
             else:
                 is_range_index = (
@@ -131,6 +128,7 @@ def merge_tables(doc):
                 if is_range_index:
                     next_df.columns = current_df.columns
                     current_df = pd.concat([current_df, next_df], ignore_index=True)
+                    current_parts.append((i, len(next_df)))
                     print(f"  Merged table {i} into previous table (renamed integer columns).")
                 else:
                     header_row = next_df.columns.tolist()
@@ -138,15 +136,17 @@ def merge_tables(doc):
                     full_data = [header_row] + data_values
                     fixed_next_df = pd.DataFrame(full_data, columns=current_df.columns)
                     current_df = pd.concat([current_df, fixed_next_df], ignore_index=True)
+                    current_parts.append((i, len(fixed_next_df)))
                     print(f"  Merged table {i} into previous table (recovered header as data row).")
 
             current_indices.append(i)
         else:
-            merged_groups.append({'indices': current_indices, 'df': current_df})
+            merged_groups.append({'indices': current_indices, 'df': current_df, 'parts': current_parts})
             current_indices = [i]
             current_df = next_df
+            current_parts = [(i, len(next_df))]
 
-    merged_groups.append({'indices': current_indices, 'df': current_df})
+    merged_groups.append({'indices': current_indices, 'df': current_df, 'parts': current_parts})
     return merged_groups
 
 
@@ -0,0 +1,359 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import asdict
+from mimetypes import guess_type
+from typing import Any, Dict, List, Optional
+
+from minio import Minio
+from minio.error import S3Error
+
+from docparser.pipeline import InMemoryParseResult
+from docparser.sharding import DEFAULT_MIN_PAGES_FOR_FAN_OUT, DEFAULT_PAGES_PER_SHARD, assemble_shards, \
+    convert_shard, count_pdf_pages, merge_shard_languages, plan_page_ranges
+from docparser.utils import should_enable_ocr_for_bytes
+from integretion.minio.minio_service import download_document_bytes_from_minio, ensure_bucket, put_bytes, run_io
+from integretion.models import ExtractionRequested, ShardRequested
+
+logger = logging.getLogger(__name__)
+
+SHARDS_PREFIX = "_shards"
+MANIFEST_OBJECT = "manifest.json"
+ASSEMBLY_CLAIM = "assembly.json"
+# A claim older than this is considered abandoned (the assembling node died)
+ASSEMBLY_CLAIM_TTL_S = 1800
+
+
+class ShardStore:
+    """
+    Shard state next to the artifacts, in bucket-<collection_id>/<output_prefix>/_shards/:
+    - manifest.json                   parent event, run_id, page ranges, status
+    - <run_id>/<index>.json           partial DoclingDocument of one shard
+    - <run_id>/<index>.done.json      shard completion record (stats), written after the partial
+    - <run_id>/assembly.json          claim of the consumer assembling the document
+
+    Each object is written with a single PUT, so the state can be read by any node.
+    """
+
+    def __init__(self, minio_client: Minio):
+        self.minio_client = minio_client
+
+    @staticmethod
+    def _bucket(event: ExtractionRequested) -> str:
+        return f"bucket-{event.collection_id}"
+
+    @staticmethod
+    def _name(event: ExtractionRequested, name: str) -> str:
+        return f"{event.output_prefix}/{SHARDS_PREFIX}/{name}"
+
+    async def _put_json(self, event: ExtractionRequested, name: str, data: Dict[str, Any]) -> None:
+        body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+        await put_bytes(self.minio_client, self._bucket(event), self._name(event, name), body, "application/json")
+
+    async def _get_json(self, event: ExtractionRequested, name: str) -> Optional[Dict[str, Any]]:
+        def _get():
+            response = self.minio_client.get_object(self._bucket(event), self._name(event, name))
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+
+        try:
+            return json.loads(await run_io(_get))
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchBucket", "NoSuchObject"):
+                return None
+            raise
+
+    async def read_manifest(self, event: ExtractionRequested) -> Optional[Dict[str, Any]]:
+        return await self._get_json(event, MANIFEST_OBJECT)
+
+    async def write_manifest(self, event: ExtractionRequested, manifest: Dict[str, Any]) -> None:
+        await ensure_bucket(self.minio_client, self._bucket(event))
+        await self._put_json(event, MANIFEST_OBJECT, manifest)
+
+    async def put_partial(self, shard: ShardRequested, partial: Dict[str, Any]) -> None:
+        event = shard.event
+        await self._put_json(event, f"{shard.run_id}/{shard.shard_index:05d}.json", partial["document"])
+        await self._put_json(event, f"{shard.run_id}/{shard.shard_index:05d}.done.json", {
+            "shard_index": shard.shard_index,
+            "completed_at": time.time(),
+            **partial["stats"],
+        })
+
+    async def load_partials(self, event: ExtractionRequested, run_id: str, num_shards: int) -> List[Dict[str, Any]]:
+        documents = await asyncio.gather(*(
+            self._get_json(event, f"{run_id}/{index:05d}.json") for index in range(num_shards)
+        ))
+        missing = [index for index, doc in enumerate(documents) if doc is None]
+        if missing:
+            raise RuntimeError(f"Missing shard partials for job {event.job_id}: {missing}")
+        return list(documents)
+
+    async def load_shard_stats(self, event: ExtractionRequested, run_id: str, num_shards: int) -> List[Dict[str, Any]]:
+        """Per-shard stats from the done markers (page range, OCR engine and languages, timings)."""
+        stats = await asyncio.gather(*(
+            self._get_json(event, f"{run_id}/{index:05d}.done.json") for index in range(num_shards)
+        ))
+        return [s or {} for s in stats]
+
+    async def claim_assembly(self, shard: ShardRequested, owner: str) -> bool:
+        """
+        Best-effort claim (S3 has no compare-and-set here): read, then write. It turns
+        "every last shard assembles" into a millisecond window instead of the whole assembly.
+        """
+        event = shard.event
+        claim = await self._get_json(event, f"{shard.run_id}/{ASSEMBLY_CLAIM}")
+        if claim is not None and claim["owner"] != owner and time.time() - claim["claimed_at"] < ASSEMBLY_CLAIM_TTL_S:
+            return False
+        await self._put_json(event, f"{shard.run_id}/{ASSEMBLY_CLAIM}", {"owner": owner, "claimed_at": time.time()})
+        return True
+
+    async def release_assembly(self, shard: ShardRequested) -> None:
+        await run_io(self.minio_client.remove_object, self._bucket(shard.event),
+                     self._name(shard.event, f"{shard.run_id}/{ASSEMBLY_CLAIM}"))
+
+    async def completed_shards(self, event: ExtractionRequested, run_id: str) -> List[int]:
+        def _list():
+            prefix = self._name(event, f"{run_id}/")
+            return [
+                obj.object_name[len(prefix):]
+                for obj in self.minio_client.list_objects(self._bucket(event), prefix=prefix)
+            ]
+
+        names = await run_io(_list)
+        return sorted(int(name.split(".")[0]) for name in names if name.endswith(".done.json"))
+
+    async def progress(self, event: ExtractionRequested) -> Optional[Dict[str, Any]]:
+        """{status, total, done, pending, percent} for a fanned-out job; None if it was not split."""
+        manifest = await self.read_manifest(event)
+        if manifest is None:
+            return None
+        done = await self.completed_shards(event, manifest["run_id"])
+        total = manifest["num_shards"]
+        return {
+            "job_id": manifest["job_id"],
+            "run_id": manifest["run_id"],
+            "status": manifest["status"],
+            "total": total,
+            "done": len(done),
+            "pending": sorted(set(range(total)) - set(done)),
+            "percent": round(100.0 * len(done) / total, 1) if total else 100.0,
+            "created_at": manifest["created_at"],
+        }
+
+
+class FanOutCoordinator:
+    """
+    Splits large PDFs into page-range sub-jobs consumed by the whole consumer group.
+
+    1. maybe_fan_out: the consumer that receives the ExtractionRequested counts the pages;
+       above min_pages it writes the manifest ("publishing"), publishes one ShardRequested
+       per range and only then marks the manifest "running".
+    2. process_shard: any consumer converts its page range and stores the partial
+       DoclingDocument; the shard that completes the set assembles the document
+       (table merge, markdown, images, chunks) and returns the result for upload.
+
+    A parent redelivered while the manifest is still "publishing" (a send failed, or the
+    process died halfway) republishes the shards that have no done marker. Failed shards
+    go through the listener's retry topics like any other message, so a shard is retried
+    on its own; a shard that reaches the dead-letter topic fails the run (mark_failed).
+    Only the consumer holding the assembly claim assembles; the claim is best-effort, but
+    assembly is idempotent: should two consumers both assemble, they produce the same artifacts.
+    """
+
+    def __init__(self, minio_client: Minio, pages_per_shard: int = DEFAULT_PAGES_PER_SHARD,
+                 min_pages: int = DEFAULT_MIN_PAGES_FOR_FAN_OUT, use_rapidocr: bool = False):
+        self.minio_client = minio_client
+        self.store = ShardStore(minio_client)
+        self.pages_per_shard = pages_per_shard
+        self.min_pages = min_pages
+        self.use_rapidocr = use_rapidocr
+
+    async def maybe_fan_out(self, event: ExtractionRequested, profile: str, producer, topic: str,
+                            idempotency_key: Optional[str] = None) -> bool:
+        """Returns True if the event was split into shards (or already had been)."""
+        file_name = event.file_name or event.object_key or ""
+        if guess_type(file_name)[0] != "application/pdf":
+            return False
+
+        manifest = await self.store.read_manifest(event)
+        # without an idempotency key a redelivery cannot be told apart from a new request: split again
+        if manifest is not None and idempotency_key is not None \
+                and manifest.get("idempotency_key") == idempotency_key:
+            if manifest["status"] == "running":
+                # redelivered parent event: every shard was published
+                logger.info(f"Job {event.job_id} already fanned out into {manifest['num_shards']} shards")
+                return True
+            if manifest["status"] == "publishing":
+                # the previous attempt failed or died while publishing: resend what is not done
+                logger.warning(f"Job {event.job_id}: resuming fan-out of run {manifest['run_id']}")
+                await self._publish_shards(event, manifest, producer, topic, resume=True)
+                return True
+
+        data = await download_document_bytes_from_minio(event, self.minio_client)
+        num_pages = await asyncio.to_thread(count_pdf_pages, data)
+        if num_pages < self.min_pages:
+            return False
+
+        ranges = plan_page_ranges(num_pages, self.pages_per_shard)
+        manifest = {
+            "job_id": event.job_id,
+            "run_id": uuid.uuid4().hex,
+            "status": "publishing",
+            "num_pages": num_pages,
+            "num_shards": len(ranges),
+            "page_ranges": ranges,
+            "profile": profile,
+            "ocr_enabled": should_enable_ocr_for_bytes(file_name, data),
+            "idempotency_key": idempotency_key,
+            "parent": asdict(event),
+            "created_at": time.time(),
+        }
+        # written first: shards that finish early must find their run in the manifest
+        await self.store.write_manifest(event, manifest)
+        await self._publish_shards(event, manifest, producer, topic)
+        logger.info(f"Job {event.job_id}: {num_pages} pages split into {len(ranges)} shards on {topic}")
+        return True
+
+    async def _publish_shards(self, event: ExtractionRequested, manifest: Dict[str, Any], producer,
+                              topic: str, resume: bool = False) -> None:
+        """
+        Publishes the shards of the manifest's run (with resume=True only those without a done
+        marker), then marks the manifest "running". A failed send raises with the manifest
+        still "publishing", so the retried parent publishes again.
+        """
+        run_id = manifest["run_id"]
+        indices = range(manifest["num_shards"])
+        if resume:
+            done = set(await self.store.completed_shards(event, run_id))
+            indices = [index for index in indices if index not in done]
+
+        await asyncio.gather(*(
+            producer.send_and_wait(
+                topic,
+                value=json.dumps(asdict(ShardRequested(
+                    job_id=event.job_id,
+                    run_id=run_id,
+                    shard_index=index,
+                    num_shards=manifest["num_shards"],
+                    page_start=manifest["page_ranges"][index][0],
+                    page_end=manifest["page_ranges"][index][1],
+                    ocr_enabled=manifest["ocr_enabled"],
+                    profile=manifest["profile"],
+                    parent=asdict(event),
+                ))).encode("utf-8"),
+                # spread the shards of one job over all partitions
+                key=f"{event.job_id}:{index}".encode("utf-8"),
+            )
+            for index in indices
+        ))
+
+        # re-read: a fast shard may already have completed (or failed) the run meanwhile
+        current = await self.store.read_manifest(event)
+        if current is not None and current["run_id"] == run_id and current["status"] == "publishing":
+            current.update({"status": "running", "published_at": time.time()})
+            await self.store.write_manifest(event, current)
+
+    async def mark_failed(self, shard: ShardRequested, error: str) -> Optional[Dict[str, Any]]:
+        """
+        Fails the run of a shard that was dead-lettered: the document cannot be assembled.
+        Returns the manifest when this call failed the run, None if it was already failed,
+        completed or superseded (so the parent is reported once).
+        """
+        event = shard.event
+        manifest = await self.store.read_manifest(event)
+        if manifest is None or manifest["run_id"] != shard.run_id or manifest["status"] == "completed":
+            return None
+        first_failure = manifest["status"] != "failed"
+        manifest["failed_shards"] = sorted(set(manifest.get("failed_shards", [])) | {shard.shard_index})
+        if first_failure:
+            manifest.update({"status": "failed", "failed_at": time.time(), "error": error})
+        await self.store.write_manifest(event, manifest)
+        logger.error(f"Job {shard.job_id}: shard {shard.shard_index + 1}/{shard.num_shards} dead-lettered, "
+                     f"run {shard.run_id} failed")
+        return manifest if first_failure else None
+
+    async def process_shard(self, shard: ShardRequested) -> Optional[InMemoryParseResult]:
+        """
+        Converts one page range and stores the partial. Returns the assembled result when
+        this shard completed the set, None otherwise.
+        """
+        event = shard.event
+        manifest = await self.store.read_manifest(event)
+        if manifest is not None and (manifest["run_id"] != shard.run_id or manifest["status"] == "failed"):
+            # another shard of the run was dead-lettered, or the document was split again
+            logger.warning(f"Job {shard.job_id}: run {shard.run_id} is {manifest['status']} "
+                           f"or superseded, skipping shard {shard.shard_index + 1}/{shard.num_shards}")
+            return None
+
+        data = await download_document_bytes_from_minio(event, self.minio_client)
+        partial = await asyncio.to_thread(
+            convert_shard,
+            data,
+            event.file_name or event.object_key,
+            (shard.page_start, shard.page_end),
+            shard.ocr_enabled,
+            self.use_rapidocr,
+            shard.profile,
+        )
+        del data
+        await self.store.put_partial(shard, partial)
+
+        done = await self.store.completed_shards(event, shard.run_id)
+        logger.info(f"Job {shard.job_id}: shard {shard.shard_index + 1}/{shard.num_shards} done "
+                    f"(pages {shard.page_start}-{shard.page_end}, {len(done)}/{shard.num_shards} complete)")
+        if len(done) < shard.num_shards:
+            return None
+
+        manifest = await self.store.read_manifest(event)
+        if manifest is None or manifest["run_id"] != shard.run_id:
+            logger.warning(f"Job {shard.job_id}: run {shard.run_id} superseded, not assembling")
+            return None
+        if manifest["status"] in ("completed", "failed"):
+            return None
+
+        owner = f"{shard.shard_index}:{uuid.uuid4().hex}"
+        if not await self.store.claim_assembly(shard, owner):
+            logger.info(f"Job {shard.job_id}: assembly already claimed by another consumer")
+            return None
+        try:
+            return await self.assemble(shard, partial["stats"]["ocr_engine_name"])
+        except Exception:
+            # let the retry of this shard (or another consumer) assemble again
+            await self.store.release_assembly(shard)
+            raise
+
+    async def assemble(self, shard: ShardRequested, ocr_engine_name: str) -> InMemoryParseResult:
+        event = shard.event
+        documents, shard_stats = await asyncio.gather(
+            self.store.load_partials(event, shard.run_id, shard.num_shards),
+            self.store.load_shard_stats(event, shard.run_id, shard.num_shards),
+        )
+        parsed = await asyncio.to_thread(
+            assemble_shards,
+            documents,
+            event.file_name or event.object_key,
+            shard.ocr_enabled,
+            ocr_engine_name,
+            shard.profile,
+            # each shard picked the OCR languages of its own pages
+            merge_shard_languages(shard_stats),
+        )
+        parsed.stats["ocr_by_shard"] = [
+            {"page_range": s.get("page_range"), "ocr_languages": s.get("ocr_languages", []),
+             "ocr_scales": s.get("ocr_scales", [])}
+            for s in shard_stats
+        ]
+        logger.info(f"Job {shard.job_id}: assembled {shard.num_shards} shards")
+        return parsed
+
+    async def mark_completed(self, event: ExtractionRequested, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Flags the manifest as completed once the assembled artifacts are uploaded."""
+        manifest = await self.store.read_manifest(event) or {}
+        manifest.update({"status": "completed", "completed_at": time.time(), "stats": stats})
+        await self.store.write_manifest(event, manifest)
+        return manifest
@@ -2,12 +2,32 @@
 import asyncio
 import logging
 import json
-from aiokafka import AIOKafkaConsumer
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Set
 
-from docparser.core import process_batch_or_file, process_document
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, ConsumerRebalanceListener
+
+from docparser.core import process_document, parse_bytes, convert_bytes, convert_bytes_batch
+from docparser.pipeline import ConvertedDocument, InMemoryParseResult, render_converted
+from docparser.profiles import DEFAULT_PROFILE
+from docparser.text import chunk_direct_text
+from docparser.isolation import DocumentFailure, DocumentProcessingError, IsolatedWorkerPool
 from integretion.minio.minio_service import download_document_from_minio, \
-    upload_parse_result_to_minio
-from integretion.models import ExtractionRequested
+    upload_parse_result_to_minio, download_document_bytes_from_minio, upload_in_memory_result_to_minio, \
+    upload_chunks_to_minio
+from integretion.events.fanout import FanOutCoordinator
+from integretion.events.offsets import PartitionOffsetTracker
+from integretion.events.stages import StageConfig, StageJob, StagedPipeline
+from integretion.events.retry import RetryPolicy, attempt_of, dead_letter_record, is_retryable, \
+    not_before_of, origin_of, retry_headers, HEADER_ATTEMPT
+from integretion.minio.bundle import upload_bundle_to_minio
+from integretion.minio.image_store import CollectionImageStore
+from integretion.minio.idempotency import idempotency_key, pipeline_fingerprint, source_etag
+from integretion.models import ExtractionRequested, ShardRequested
+from integretion.scratch import JobScratch, ScratchSpace
 
 
 # --- MOCKS/IMPORTS ---
@@ -16,6 +36,7 @@ from integretion.models import ExtractionRequested
 class KafkaTopics:
     # Placeholder for your Enum
     EXTRACTION_REQUESTED = "extraction_requested_topic"
+    EXTRACTION_SHARDS = "extraction_shards_topic"
 
 
 logging.basicConfig(
@@ -24,22 +45,102 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Local output root when the listener runs without a ScratchSpace
+OUTPUT_ROOT = "output"
+
+
+def _input_dir(scratch: JobScratch = None):
+    return scratch.input_dir if scratch is not None else None
+
+
+def _output_root(event: ExtractionRequested, scratch: JobScratch = None) -> str:
+    """
+    Output root of one job: its scratch output dir, or output/<job_id>-<id>/ without scratch.
+    Concurrent jobs for the same file_name never share a run dir (nor upload each other's artifacts).
+    """
+    if scratch is not None:
+        return str(scratch.output_dir)
+    return str(Path(OUTPUT_ROOT) / f"{event.job_id}-{uuid.uuid4().hex[:8]}")
+
+
+class _CommitOnRevoke(ConsumerRebalanceListener):
+    """Commits finished offsets and drops tracking state for revoked partitions."""
+
+    def __init__(self, listener: "KafkaListener"):
+        self.listener = listener
+
+    async def on_partitions_revoked(self, revoked):
+        await self.listener._commit_ready()
+        self.listener.tracker.forget(revoked)
+        for tp in revoked:
+            self.listener._delayed.pop(tp, None)
+
+    async def on_partitions_assigned(self, assigned):
+        logger.info(f"Partitions assigned: {sorted(str(tp) for tp in assigned)}")
+
 
 class KafkaListener:
 
-    def __init__(self, bootstrap_servers: str, group_id: str, minio_client):
+    def __init__(self, bootstrap_servers: str, group_id: str, minio_client,
+                 worker_pool: IsolatedWorkerPool = None, in_memory: bool = False,
+                 default_profile: str = DEFAULT_PROFILE, max_in_flight: int = None,
+                 poll_timeout_ms: int = 1000, bundle_uploads: bool = False,
+                 marker_store=None, retry_policy: RetryPolicy = None,
+                 fan_out: FanOutCoordinator = None, stages: StageConfig = None,
+                 metrics_interval_s: float = 60.0, scratch: ScratchSpace = None,
+                 image_store: CollectionImageStore = None):
         self.bootstrap_servers = bootstrap_servers
         self.group_id = group_id
         self.minio_client = minio_client
+        # If set, documents are converted in isolated worker processes
+        # (timeout / memory ceiling / recycling) instead of in-process threads
+        self.worker_pool = worker_pool
+        # If True, documents go MinIO -> memory -> Docling -> MinIO without touching local disk
+        self.in_memory = in_memory
+        # Profile used when the event does not carry one
+        self.default_profile = default_profile
+        # If set, fetch / convert / post-process / publish run as separate stages with
+        # bounded queues, so the conversion of the next document overlaps the upload of this one;
+        # with stages.convert_batch_size > 1 small documents are converted together (convert_all)
+        self.stages = stages
+        self.metrics_interval_s = metrics_interval_s
+        self.pipeline: StagedPipeline = None
+        # If set, downloads and run dirs live in per-job scratch dirs: removed after the upload,
+        # kept for a while on failure, and new jobs wait while the disk quota is used up
+        self.scratch = scratch
+        # Messages processed concurrently; defaults to the worker pool size (or what the stages can hold)
+        if max_in_flight is None:
+            if stages is not None:
+                max_in_flight = stages.capacity
+            else:
+                max_in_flight = worker_pool.size if worker_pool is not None else 2
+        self.max_in_flight = max(1, max_in_flight)
+        self.poll_timeout_ms = poll_timeout_ms
+        # If True, each run is uploaded as one tar object + manifest instead of one PUT per artifact
+        self.bundle_uploads = bundle_uploads
+        # Completion markers (MinioMarkerStore / LocalMarkerStore): redelivered events whose
+        # artifacts were already uploaded are skipped instead of reconverted
+        self.marker_store = marker_store
+        # If set, failed messages are re-published to delay topics with exponential backoff
+        # and, after max_attempts, to the dead-letter topic; otherwise they are logged and dropped
+        self.retry_policy = retry_policy
+        # If set, large PDFs are split into page-range shards consumed by the whole group
+        self.fan_out = fan_out
+        # If set, images go to the collection's content-addressed store (existing ones are not
+        # re-uploaded) and markdown/chunk links point there; ignored for bundle uploads
+        self.image_store = image_store
+
         self.consumer = None
+        self.producer = None
+        # retry partitions paused until their head message is due: {tp: not_before}
+        self._delayed: Dict = {}
         self.running = False
+        self.tracker = PartitionOffsetTracker()
+        self._tasks: Set[asyncio.Task] = set()
+        self._slot_freed: asyncio.Event = None
 
-    async def start(self):
-        """
-        Initializes the consumer and starts the infinite listening loop.
-        """
-        self.consumer = AIOKafkaConsumer(
-            KafkaTopics.EXTRACTION_REQUESTED,
+    def _create_consumer(self) -> AIOKafkaConsumer:
+        return AIOKafkaConsumer(
             bootstrap_servers=self.bootstrap_servers,
             group_id=self.group_id,
             # Disable auto-commit to ensure we only commit AFTER successful processing
@@ -47,62 +148,499 @@ class KafkaListener:
             auto_offset_reset="earliest"
         )
 
-        logger.info(f"Starting Kafka consumer on topic: {KafkaTopics.EXTRACTION_REQUESTED}...")
-        await self.consumer.start()
-        self.running = True
-
-        try:
-            # The 'async for' loop is the most efficient way to consume with aiokafka
-            async for msg in self.consumer:
-                if not self.running:
-                    break
+    def _create_producer(self) -> AIOKafkaProducer:
+        return AIOKafkaProducer(
+            bootstrap_servers=self.bootstrap_servers,
+            acks="all",
+            enable_idempotence=True,
+        )
 
-                try:
-                    logger.info(f"[{msg.topic}] offset:{msg.offset} --> Message received")
+    async def start(self):
+        """
+        Initializes the consumer and starts the listening loop.
 
-                    # 1) Deserializza evento
-                    data = json.loads(msg.value)
-                    event = ExtractionRequested(**data)  # adatta al tuo modello
+        Messages are fetched in batches with getmany() and processed concurrently
+        (at most max_in_flight at a time). Offsets are committed per partition, only
+        once every earlier offset on that partition has finished. While all slots
+        are busy the assigned partitions are paused so the consumer keeps its group
+        membership without fetching more records.
+        """
+        topics = [KafkaTopics.EXTRACTION_REQUESTED]
+        if self.fan_out is not None:
+            topics.append(KafkaTopics.EXTRACTION_SHARDS)
+        if self.retry_policy is not None:
+            topics += [retry for topic in list(topics) for retry in self.retry_policy.retry_topics(topic)]
+        if self.retry_policy is not None or self.fan_out is not None:
+            self.producer = self._create_producer()
+            await self.producer.start()
 
-                    # 2) Scarica il documento da MinIO su file locale
-                    local_file = await download_document_from_minio(event, self.minio_client)
-                    logger.info(f"File fetched from Minio and saved to: {local_file}")
+        self.consumer = self._create_consumer()
+        self.consumer.subscribe(topics, listener=_CommitOnRevoke(self))
 
-                    # 3) Processa con la tua libreria (bloccante → meglio in thread)
-                    from docparser.core import process_batch_or_file
+        logger.info(f"Starting Kafka consumer on topics: {', '.join(topics)} "
+                    f"(max_in_flight={self.max_in_flight})...")
+        await self.consumer.start()
+        self.running = True
+        self._slot_freed = asyncio.Event()
 
-                    parse_result = await asyncio.to_thread(
-                        process_document,
-                        str(local_file),  # file_path
-                        "output",  # output_root (o quello che vuoi)
-                        False,  # use_rapidocr
-                        False,  # use_openai
-                    )
+        metrics_task = None
+        if self.stages is not None:
+            self.pipeline = StagedPipeline(
+                self.stages,
+                fetch=self._stage_fetch,
+                convert=self._stage_convert,
+                postprocess=self._stage_postprocess,
+                publish=self._stage_publish,
+                # isolated workers convert one document per process
+                convert_batch=self._stage_convert_batch if self.worker_pool is None else None,
+            )
+            self.pipeline.start()
+        if self.pipeline is not None or self.scratch is not None:
+            metrics_task = asyncio.create_task(self._log_metrics())
 
-                    # 4) Carica su MinIO gli output (md, chunks, immagini)
-                    await upload_parse_result_to_minio(
-                        parse_result,
-                        event,
-                        self.minio_client,
-                    )
+        try:
+            while self.running:
+                self._resume_due()
+                free_slots = self.max_in_flight - len(self._tasks)
 
-                    # 5) Commit se tutto OK
-                    await self.consumer.commit()
+                if free_slots <= 0:
+                    await self._wait_for_slot()
+                    continue
 
-                except Exception as e:
-                    logger.error(f"Error processing message at offset {msg.offset}: {e}")
+                batches = await self.consumer.getmany(
+                    timeout_ms=self.poll_timeout_ms,
+                    max_records=free_slots,
+                )
+                for tp, messages in batches.items():
+                    for msg in messages:
+                        if self._defer_if_not_due(tp, msg):
+                            break
+                        self.tracker.add(tp, msg.offset)
+                        task = asyncio.create_task(self._handle_message(tp, msg))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._on_task_done)
 
+                await self._commit_ready()
 
         except asyncio.CancelledError:
             logger.info("Task cancelled. Shutting down consumer loop...")
 
         finally:
+            # Let in-flight documents finish, then commit what is done
+            if self._tasks:
+                logger.info(f"Waiting for {len(self._tasks)} in-flight messages...")
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self._commit_ready()
+            if metrics_task is not None:
+                metrics_task.cancel()
+            if self.pipeline is not None:
+                await self.pipeline.stop()
+                self.pipeline.log_metrics()
             # Ensure resources are released
             logger.info("Stopping Kafka consumer...")
             await self.consumer.stop()
+            if self.producer is not None:
+                await self.producer.stop()
+
+    async def _wait_for_slot(self):
+        """Pauses fetching while the worker pool is saturated."""
+        # delayed retry partitions stay paused; they are resumed by _resume_due
+        to_pause = self.consumer.assignment() - self.consumer.paused()
+        if to_pause:
+            self.consumer.pause(*to_pause)
+        try:
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+            await self._commit_ready()
+        finally:
+            to_resume = to_pause & self.consumer.assignment()
+            if to_resume:
+                self.consumer.resume(*to_resume)
+
+    def _defer_if_not_due(self, tp, msg) -> bool:
+        """
+        A retry message that is not due yet is not processed: the partition is rewound
+        to it and paused until its not-before time. Retry topics have a single delay each,
+        so the following messages of the partition are not due either. Other partitions,
+        including the main topic, keep flowing.
+        """
+        if self.retry_policy is None:
+            return False
+        not_before = not_before_of(msg)
+        if not_before <= time.time():
+            return False
+        self.consumer.seek(tp, msg.offset)
+        self.consumer.pause(tp)
+        self._delayed[tp] = not_before
+        return True
+
+    def _resume_due(self):
+        now = time.time()
+        due = [tp for tp, not_before in self._delayed.items() if not_before <= now]
+        for tp in due:
+            del self._delayed[tp]
+        due = set(due) & self.consumer.assignment()
+        if due:
+            self.consumer.resume(*due)
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if self._slot_freed is not None:
+            self._slot_freed.set()
+
+    async def _commit_ready(self):
+        offsets = self.tracker.committable()
+        if not offsets:
+            return
+        try:
+            await self.consumer.commit(offsets)
+        except Exception as e:
+            # tracker state is not advanced: the same offsets are retried on the next call
+            # (every poll loop iteration), even if the partition gets no more traffic
+            logger.error(f"Offset commit failed, will retry: {e}")
+            return
+        self.tracker.mark_committed(offsets)
+        logger.info("Committed offsets: " + ", ".join(f"{tp.partition}:{off}" for tp, off in offsets.items()))
+
+    async def _handle_message(self, tp, msg):
+        t0 = time.perf_counter()
+        try:
+            logger.info(f"[{msg.topic}] partition:{msg.partition} offset:{msg.offset} --> Message received")
+
+            # 1) Deserializza evento (i retry arrivano da <topic>.retry.<n>: conta il topic di origine)
+            data = json.loads(msg.value)
+            if origin_of(msg)["topic"] == KafkaTopics.EXTRACTION_SHARDS:
+                await self.process_shard(ShardRequested(**data))
+            else:
+                event = ExtractionRequested(**data)  # adatta al tuo modello
+                await self.process_event(event)
+
+        except Exception as e:
+            logger.error(f"Error processing message at {msg.topic} partition {msg.partition} "
+                         f"offset {msg.offset} (attempt {attempt_of(msg)}): {e}")
+            if self.retry_policy is not None:
+                try:
+                    await self._reroute_failed(msg, e, time.perf_counter() - t0)
+                except Exception as publish_error:
+                    # Not marked done: commits on this partition stop before the message,
+                    # which is redelivered after a restart or rebalance
+                    logger.critical(f"Could not re-publish failed message at {msg.topic} partition "
+                                    f"{msg.partition} offset {msg.offset}, leaving it uncommitted: {publish_error}")
+                    return
+
+        # Once processed or handed over to a retry/DLQ topic the offset is done:
+        # a failing message never blocks the healthy ones behind it on its partition
+        self.tracker.mark_done(tp, msg.offset)
+
+    async def _reroute_failed(self, msg, exc: Exception, elapsed_s: float):
+        """Re-publishes a failed message to the next retry topic, or to the DLQ when attempts are exhausted."""
+        policy = self.retry_policy
+        attempt = attempt_of(msg)
+        base_topic = origin_of(msg)["topic"]
+
+        if is_retryable(exc) and attempt < policy.max_attempts:
+            delay = policy.delay_for(attempt)
+            topic = policy.retry_topic(base_topic, attempt)
+            await self.producer.send_and_wait(
+                topic,
+                value=msg.value,
+                key=msg.key,
+                headers=retry_headers(msg, attempt + 1, time.time() + delay, exc),
+            )
+            logger.warning(f"Message scheduled for attempt {attempt + 1}/{policy.max_attempts} "
+                           f"on {topic} in {delay:.0f}s")
+            return
+
+        topic = policy.dlq_topic(base_topic)
+        record = dead_letter_record(msg, attempt, exc, elapsed_s)
+        await self.producer.send_and_wait(
+            topic,
+            value=json.dumps(record, ensure_ascii=False, default=str).encode("utf-8"),
+            key=msg.key,
+            headers=[(HEADER_ATTEMPT, str(attempt).encode("utf-8"))],
+        )
+        logger.error(f"Message moved to dead-letter topic {topic} after {attempt} attempt(s)")
+
+        if base_topic == KafkaTopics.EXTRACTION_SHARDS and self.fan_out is not None:
+            await self._fail_fanned_out_parent(msg, record, attempt)
+
+    async def _fail_fanned_out_parent(self, msg, record: Dict[str, Any], attempt: int):
+        """
+        A dead-lettered shard fails its whole document: the run is marked failed (no
+        assembly) and the parent event goes to the DLQ of the requests topic, once per run.
+        """
+        try:
+            shard = ShardRequested(**record["event"])
+        except TypeError:
+            # malformed shard message: no run to fail
+            return
+        manifest = await self.fan_out.mark_failed(shard, record["error"]["message"])
+        if manifest is None:
+            return
+
+        topic = self.retry_policy.dlq_topic(KafkaTopics.EXTRACTION_REQUESTED)
+        parent_record = dict(record, event=shard.parent, fan_out={
+            "run_id": shard.run_id,
+            "num_shards": shard.num_shards,
+            "failed_shard": shard.shard_index,
+            "page_range": [shard.page_start, shard.page_end],
+        })
+        await self.producer.send_and_wait(
+            topic,
+            value=json.dumps(parent_record, ensure_ascii=False, default=str).encode("utf-8"),
+            key=shard.job_id.encode("utf-8"),
+            headers=[(HEADER_ATTEMPT, str(attempt).encode("utf-8"))],
+        )
+        logger.error(f"Job {shard.job_id} moved to dead-letter topic {topic}: "
+                     f"shard {shard.shard_index + 1}/{shard.num_shards} failed")
+
+    async def process_event(self, event: ExtractionRequested):
+        """
+        Download, conversion and upload of a single extraction request.
+
+        With a marker_store the event is idempotent: the key combines job_id, the
+        source object's ETag and the pipeline configuration; the marker is written
+        only after every artifact has been uploaded.
+        """
+        profile = event.profile or self.default_profile
+
+        key = None
+        etag = None
+        if self.marker_store is not None:
+            etag = await source_etag(event, self.minio_client)
+            config = {"profile": profile, "bundle": self.bundle_uploads}
+            if self.image_store is not None:
+                # only when set, so enabling it does not invalidate markers of existing deployments
+                config["image_store"] = True
+            fingerprint = pipeline_fingerprint(**config)
+            key = idempotency_key(event, etag, fingerprint)
+            if await self.marker_store.is_done(event, key):
+                logger.info(f"Job {event.job_id} already completed (key {key[:12]}), skipping redelivery")
+                return
+
+        if self.fan_out is not None and not event.direct_text:
+            fanned_out = await self.fan_out.maybe_fan_out(
+                event, profile, self.producer, KafkaTopics.EXTRACTION_SHARDS, idempotency_key=key,
+            )
+            if fanned_out:
+                # artifacts and marker are written by the consumer that completes the last shard
+                return
+
+        await self._convert_and_upload(event, profile)
+
+        if key is not None:
+            await self.marker_store.mark_done(event, key, {
+                "job_id": event.job_id,
+                "file_id": event.file_id,
+                "source_etag": etag,
+                "profile": profile,
+                "bundle": self.bundle_uploads,
+            })
+
+    async def process_shard(self, shard: ShardRequested):
+        """
+        Converts one page range of a fanned-out document. The consumer that completes the
+        last shard uploads the assembled artifacts and writes the parent's completion marker.
+        """
+        parsed = await self.fan_out.process_shard(shard)
+        if parsed is None:
+            return
+
+        event = shard.event
+        await self._upload(parsed, event)
+        manifest = await self.fan_out.mark_completed(event, parsed.stats)
+
+        key = manifest.get("idempotency_key")
+        if self.marker_store is not None and key is not None:
+            await self.marker_store.mark_done(event, key, {
+                "job_id": event.job_id,
+                "file_id": event.file_id,
+                "profile": shard.profile,
+                "bundle": self.bundle_uploads,
+                "num_shards": shard.num_shards,
+            })
+
+    async def _convert_and_upload(self, event: ExtractionRequested, profile: str):
+        if event.direct_text:
+            await self._process_direct_text(event)
+            return
+
+        async with self._job_scratch(event) as scratch:
+            if self.pipeline is not None:
+                job = await self.pipeline.submit(event, profile, scratch=scratch)
+                logger.info(f"Job {event.job_id} done, stage times: "
+                            + ", ".join(f"{name}={t:.2f}s" for name, t in job.stage_times.items()))
+                return
+
+            if self.in_memory and self.worker_pool is None:
+                await self._process_in_memory(event, profile)
+                return
+
+            # 2) Scarica il documento da MinIO su file locale
+            local_file = await download_document_from_minio(event, self.minio_client, _input_dir(scratch))
+            logger.info(f"File fetched from Minio and saved to: {local_file}")
+
+            # 3) Processa con la tua libreria (bloccante → meglio in thread)
+            if self.worker_pool is not None:
+                parse_result = await self._run_isolated(local_file, event, profile, _output_root(event, scratch))
+            else:
+                parse_result = await asyncio.to_thread(
+                    process_document,
+                    str(local_file),  # file_path
+                    _output_root(event, scratch),  # output_root
+                    False,  # use_rapidocr
+                    False,  # use_openai
+                    profile,  # profile
+                )
+
+            # 4) Carica su MinIO gli output (md, chunks, immagini)
+            await self._upload(parse_result, event)
+
+    @asynccontextmanager
+    async def _job_scratch(self, event: ExtractionRequested):
+        """Scratch dir for the job when it touches the disk (download to file or isolated worker)."""
+        needs_disk = self.worker_pool is not None or (not self.in_memory and self.pipeline is None)
+        if self.scratch is None or not needs_disk:
+            yield None
+            return
+        async with self.scratch.job(event.job_id) as scratch:
+            yield scratch
+
+    async def _run_isolated(self, local_file, event: ExtractionRequested, profile: str,
+                            output_root: str = "output"):
+        parse_result = await asyncio.to_thread(
+            self.worker_pool.run,
+            str(local_file),
+            output_root=output_root,
+            use_rapidocr=False,
+            use_openai=False,
+            profile=profile,
+        )
+        if isinstance(parse_result, DocumentFailure):
+            logger.error(
+                f"Document {event.file_id} failed in isolated worker: "
+                f"reason={parse_result.reason} elapsed={parse_result.elapsed_s:.1f}s "
+                f"peak_rss_mb={parse_result.peak_rss_mb} message={parse_result.message}"
+            )
+            raise DocumentProcessingError(parse_result)
+        return parse_result
+
+    # --- staged pipeline -------------------------------------------------
+
+    async def _stage_fetch(self, job: StageJob):
+        if self.worker_pool is not None:
+            # the isolated worker reads the document from disk
+            return await download_document_from_minio(job.event, self.minio_client, _input_dir(job.scratch))
+        return await download_document_bytes_from_minio(job.event, self.minio_client)
+
+    async def _stage_convert(self, job: StageJob):
+        if self.worker_pool is not None:
+            # conversion and post-processing both happen in the worker process
+            return await self._run_isolated(job.payload, job.event, job.profile, _output_root(job.event, job.scratch))
+        return await asyncio.to_thread(
+            convert_bytes,
+            job.payload,
+            job.event.file_name or job.event.object_key,
+            False,  # use_rapidocr
+            job.profile,
+        )
+
+    async def _stage_convert_batch(self, jobs: List[StageJob]) -> List[Any]:
+        """
+        Converts the small documents among jobs together (docparser.batching, one batch per
+        profile); the others, and those the batch could not convert, go through _stage_convert.
+        """
+        results: List[Any] = [None] * len(jobs)
+        by_profile: Dict[str, List[int]] = {}
+        for position, job in enumerate(jobs):
+            by_profile.setdefault(job.profile, []).append(position)
+
+        for profile, positions in by_profile.items():
+            if len(positions) < 2:
+                continue
+            documents = [(jobs[i].payload, jobs[i].event.file_name or jobs[i].event.object_key) for i in positions]
+            try:
+                converted = await asyncio.to_thread(
+                    convert_bytes_batch, documents, False, profile, self.stages.convert_batch_size,
+                )
+            except Exception as e:
+                logger.warning(f"Batch conversion of {len(positions)} documents failed, converting one by one: {e}")
+                continue
+            for position, document in zip(positions, converted):
+                results[position] = document
+
+        batched = sum(result is not None for result in results)
+        if batched:
+            logger.info(f"Converted {batched}/{len(jobs)} documents in batch")
+        for position, job in enumerate(jobs):
+            if results[position] is None:
+                try:
+                    results[position] = await self._stage_convert(job)
+                except Exception as e:
+                    results[position] = e
+        return results
+
+    async def _stage_postprocess(self, job: StageJob):
+        if isinstance(job.payload, ConvertedDocument):
+            return await asyncio.to_thread(render_converted, job.payload)
+        return job.payload
+
+    async def _stage_publish(self, job: StageJob):
+        await self._upload(job.payload, job.event)
+        return job.payload
+
+    async def _log_metrics(self):
+        while True:
+            await asyncio.sleep(self.metrics_interval_s)
+            if self.pipeline is not None:
+                self.pipeline.log_metrics()
+            if self.scratch is not None:
+                logger.info(f"Scratch space: {self.scratch.metrics()}")
+
+    async def _upload(self, result, event: ExtractionRequested):
+        if self.bundle_uploads:
+            await upload_bundle_to_minio(result, event, self.minio_client)
+        elif isinstance(result, InMemoryParseResult):
+            await upload_in_memory_result_to_minio(result, event, self.minio_client, self.image_store)
+        else:
+            await upload_parse_result_to_minio(result, event, self.minio_client, self.image_store)
+
+    async def _process_in_memory(self, event: ExtractionRequested, profile: str = DEFAULT_PROFILE):
+        """Download, conversion and upload entirely in memory (parse_bytes)."""
+        data = await download_document_bytes_from_minio(event, self.minio_client)
+        logger.info(f"File fetched from Minio into memory ({len(data)} bytes)")
+
+        parsed = await asyncio.to_thread(
+            parse_bytes,
+            data,
+            event.file_name or event.object_key,
+            False,  # use_rapidocr
+            profile,
+        )
+
+        await self._upload(parsed, event)
+
+    async def _process_direct_text(self, event: ExtractionRequested):
+        """
+        Fast path for events that already carry the text: no download, no Docling,
+        no images. Boilerplate is stripped, the text is chunked and only chunks.json
+        is uploaded.
+        """
+        result = await asyncio.to_thread(
+            chunk_direct_text,
+            event.direct_text,
+            event.file_name or "direct_text",
+        )
+        stats = result["stats"]
+        logger.info(
+            f"Direct text for job {event.job_id}: {stats['input_chars']} -> {stats['cleaned_chars']} chars, "
+            f"{stats['num_chunks']} chunks in {stats['timings']['total_s']:.3f}s"
+        )
+
+        await upload_chunks_to_minio(result["chunks"], event, self.minio_client)
 
     async def stop(self):
-        """Gracefully stops the consumer."""
+        """Gracefully stops the consumer: the loop drains in-flight messages and commits."""
         self.running = False
-        if self.consumer:
-            await self.consumer.stop()
\ No newline at end of file
+        if self._slot_freed is not None:
+            self._slot_freed.set()
@@ -0,0 +1,73 @@
+from collections import deque
+from typing import Deque, Dict, Hashable, Iterable, Optional, Set
+
+
+class PartitionOffsetTracker:
+    """
+    Tracks in-flight offsets per partition so that commits stay ordered while
+    messages complete out of order.
+
+    For every partition the committable offset is "last contiguous completed
+    offset + 1": if offsets 10, 11, 12 are in flight and 11 and 12 finish first,
+    nothing is committed until 10 is done, then 13 is committed at once.
+    """
+
+    def __init__(self):
+        # offsets in arrival order (monotonic within a partition), until committed
+        self._pending: Dict[Hashable, Deque[int]] = {}
+        self._done: Dict[Hashable, Set[int]] = {}
+        # last offset committed (confirmed by mark_committed) per partition
+        self._committed: Dict[Hashable, int] = {}
+
+    def add(self, tp: Hashable, offset: int) -> None:
+        self._pending.setdefault(tp, deque()).append(offset)
+        self._done.setdefault(tp, set())
+
+    def mark_done(self, tp: Hashable, offset: int) -> None:
+        if tp in self._done:
+            self._done[tp].add(offset)
+
+    def in_flight(self, tp: Hashable = None) -> int:
+        if tp is not None:
+            return len(self._pending.get(tp, ())) - len(self._done.get(tp, ()))
+        return sum(len(q) for q in self._pending.values()) - sum(len(d) for d in self._done.values())
+
+    def committable(self) -> Dict[Hashable, int]:
+        """
+        Returns {partition: offset_to_commit} for partitions with completed offsets
+        that are not committed yet. Does not change state: call mark_committed once the
+        commit succeeded, so a failed commit is returned again by the next call.
+        """
+        result: Dict[Hashable, int] = {}
+        for tp, pending in self._pending.items():
+            done = self._done[tp]
+            last = None
+            for offset in pending:
+                if offset not in done:
+                    break
+                last = offset
+            if last is not None:
+                result[tp] = last + 1
+        return result
+
+    def mark_committed(self, offsets: Dict[Hashable, int]) -> None:
+        """Drops the offsets below each committed position (partitions revoked meanwhile are skipped)."""
+        for tp, next_offset in offsets.items():
+            pending = self._pending.get(tp)
+            if pending is None:
+                continue
+            done = self._done[tp]
+            while pending and pending[0] < next_offset:
+                done.discard(pending.popleft())
+            self._committed[tp] = max(next_offset, self._committed.get(tp, next_offset))
+
+    def committed(self, tp: Hashable) -> Optional[int]:
+        """Last committed position of the partition (None if nothing was committed yet)."""
+        return self._committed.get(tp)
+
+    def forget(self, partitions: Iterable[Hashable]) -> None:
+        """Drops state for partitions that were revoked in a rebalance."""
+        for tp in partitions:
+            self._pending.pop(tp, None)
+            self._done.pop(tp, None)
+            self._committed.pop(tp, None)
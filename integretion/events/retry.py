@@ -0,0 +1,125 @@
+import json
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from docparser.isolation import DocumentProcessingError
+
+# Kafka headers carried by re-published messages
+HEADER_ATTEMPT = "x-attempt"
+HEADER_NOT_BEFORE = "x-not-before"
+HEADER_ORIGIN = "x-origin"
+HEADER_FIRST_FAILED_AT = "x-first-failed-at"
+HEADER_LAST_ERROR = "x-last-error"
+
+Headers = Sequence[Tuple[str, bytes]]
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Retry with exponential backoff through delay topics.
+
+    Attempt n (1-based) that fails is re-published to `<topic>.retry.<n>`, whose
+    messages become due `base_delay_s * multiplier**(n-1)` seconds (capped at
+    max_delay_s) after the failure. Every retry topic has a single delay, so
+    messages on each of its partitions are due in offset order and the consumer
+    only has to pause a partition until its head message is due. After
+    max_attempts the message goes to `<topic>.dlq`.
+    """
+    max_attempts: int = 4
+    base_delay_s: float = 30.0
+    multiplier: float = 4.0
+    max_delay_s: float = 3600.0
+
+    def delay_for(self, attempt: int) -> float:
+        return min(self.max_delay_s, self.base_delay_s * self.multiplier ** (attempt - 1))
+
+    def retry_topic(self, topic: str, attempt: int) -> str:
+        return f"{topic}.retry.{attempt}"
+
+    def retry_topics(self, topic: str) -> List[str]:
+        return [self.retry_topic(topic, n) for n in range(1, self.max_attempts)]
+
+    def dlq_topic(self, topic: str) -> str:
+        return f"{topic}.dlq"
+
+
+def header(headers: Optional[Headers], name: str) -> Optional[str]:
+    for key, value in headers or ():
+        if key == name:
+            return value.decode("utf-8") if value is not None else None
+    return None
+
+
+def attempt_of(msg) -> int:
+    return int(header(msg.headers, HEADER_ATTEMPT) or 1)
+
+
+def not_before_of(msg) -> float:
+    """Epoch seconds before which a retry message must not be processed (0 for fresh messages)."""
+    return float(header(msg.headers, HEADER_NOT_BEFORE) or 0.0)
+
+
+def origin_of(msg) -> Dict[str, Any]:
+    origin = header(msg.headers, HEADER_ORIGIN)
+    if origin:
+        return json.loads(origin)
+    return {"topic": msg.topic, "partition": msg.partition, "offset": msg.offset}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Malformed events fail the same way every time: straight to the DLQ."""
+    # JSONDecodeError/UnicodeDecodeError are ValueErrors; TypeError comes from unknown event fields,
+    # ValueError also from an unknown profile
+    return not isinstance(exc, (ValueError, TypeError))
+
+
+def retry_headers(msg, attempt: int, not_before: float, exc: BaseException) -> List[Tuple[str, bytes]]:
+    first_failed_at = header(msg.headers, HEADER_FIRST_FAILED_AT) or f"{time.time():.3f}"
+    return [
+        (HEADER_ATTEMPT, str(attempt).encode("utf-8")),
+        (HEADER_NOT_BEFORE, f"{not_before:.3f}".encode("utf-8")),
+        (HEADER_ORIGIN, json.dumps(origin_of(msg)).encode("utf-8")),
+        (HEADER_FIRST_FAILED_AT, first_failed_at.encode("utf-8")),
+        (HEADER_LAST_ERROR, f"{type(exc).__name__}: {exc}"[:1000].encode("utf-8")),
+    ]
+
+
+def dead_letter_record(msg, attempt: int, exc: BaseException, elapsed_s: float) -> Dict[str, Any]:
+    """DLQ payload: the original event plus error details and processing stats."""
+    try:
+        event = json.loads(msg.value)
+    except Exception:
+        event = None
+
+    error: Dict[str, Any] = {
+        "type": type(exc).__name__,
+        "message": str(exc),
+        "retryable": is_retryable(exc),
+        "traceback": "".join(traceback.format_exception(type(exc), exc, exc.__traceback__)),
+    }
+    if isinstance(exc, DocumentProcessingError):
+        failure = exc.failure
+        error["failure"] = {
+            "reason": failure.reason,
+            "elapsed_s": failure.elapsed_s,
+            "worker_pid": failure.worker_pid,
+            "peak_rss_mb": failure.peak_rss_mb,
+        }
+
+    first_failed_at = header(msg.headers, HEADER_FIRST_FAILED_AT)
+    return {
+        "event": event,
+        "raw_value": None if event is not None else (msg.value or b"").decode("utf-8", "replace"),
+        "origin": origin_of(msg),
+        "error": error,
+        "stats": {
+            "attempts": attempt,
+            "last_attempt_elapsed_s": elapsed_s,
+            "first_failed_at": float(first_failed_at) if first_failed_at else time.time(),
+            "dead_lettered_at": time.time(),
+            "last_topic": msg.topic,
+        },
+    }
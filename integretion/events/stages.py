@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StageConfig:
+    """
+    Concurrency of each stage and capacity of the queue in front of it.
+
+    Defaults suit one converter per process: network-bound stages get several
+    workers, conversion one, and small queues keep at most a couple of documents
+    waiting (memory) while still letting document N+1 convert during the
+    post-processing and upload of document N.
+
+    With convert_batch_size > 1 a convert worker takes up to that many queued documents
+    (waiting at most convert_batch_wait_s for more to arrive) and converts the small ones
+    together; the convert queue is enlarged so a full batch can build up.
+    """
+    fetch_workers: int = 4
+    convert_workers: int = 1
+    postprocess_workers: int = 2
+    publish_workers: int = 4
+    queue_size: int = 2
+    convert_batch_size: int = 1
+    convert_batch_wait_s: float = 0.05
+
+    @property
+    def convert_queue_size(self) -> int:
+        return max(self.queue_size, self.convert_batch_size)
+
+    @property
+    def capacity(self) -> int:
+        """Documents the pipeline can hold at once (queued + being worked on)."""
+        workers = self.fetch_workers + self.convert_workers * self.convert_batch_size \
+            + self.postprocess_workers + self.publish_workers
+        return workers + 3 * self.queue_size + self.convert_queue_size
+
+
+@dataclass
+class StageJob:
+    event: Any
+    profile: str
+    future: asyncio.Future
+    # output of the previous stage, input of the next one
+    payload: Any = None
+    # per-job scratch directory (integretion.scratch.JobScratch) for stages that need disk
+    scratch: Any = None
+    submitted_at: float = field(default_factory=time.perf_counter)
+    stage_times: Dict[str, float] = field(default_factory=dict)
+
+
+StageFn = Callable[[StageJob], Awaitable[Any]]
+# one result per job, in order: the payload for the next stage or the exception that failed the job
+BatchStageFn = Callable[[List[StageJob]], Awaitable[List[Any]]]
+
+
+class Stage:
+    """A bounded queue served by a fixed number of worker coroutines."""
+
+    def __init__(self, name: str, fn: StageFn, workers: int, queue_size: int,
+                 batch_fn: Optional[BatchStageFn] = None, batch_size: int = 1, batch_wait_s: float = 0.0):
+        self.name = name
+        self.fn = fn
+        # If set (and batch_size > 1), workers take several queued jobs at once and run batch_fn on them
+        self.batch_fn = batch_fn if batch_size > 1 else None
+        self.batch_size = max(1, batch_size)
+        self.batch_wait_s = batch_wait_s
+        self.workers = max(1, workers)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.next: Optional["Stage"] = None
+
+        self.busy = 0       # workers running fn
+        self.blocked = 0    # workers done with fn, waiting for room in the next queue
+        self.busy_s = 0.0
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self._started_at: Optional[float] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._started_at = time.perf_counter()
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"stage-{self.name}-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self) -> None:
+        if self.batch_fn is not None:
+            await self._run_batches()
+            return
+        while True:
+            job: StageJob = await self.queue.get()
+            try:
+                if job.future.done():
+                    # cancelled by the caller while queued
+                    continue
+
+                self.busy += 1
+                t0 = time.perf_counter()
+                try:
+                    job.payload = await self.fn(job)
+                except Exception as e:
+                    self.failed += 1
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                    continue
+                finally:
+                    elapsed = time.perf_counter() - t0
+                    self.busy -= 1
+                    self.busy_s += elapsed
+                    job.stage_times[self.name] = elapsed
+
+                self.processed += 1
+                await self._forward(job)
+            finally:
+                self.queue.task_done()
+
+    async def _forward(self, job: StageJob) -> None:
+        if self.next is None:
+            if not job.future.done():
+                job.future.set_result(job)
+            return
+        # backpressure: a full downstream queue holds this worker
+        self.blocked += 1
+        try:
+            await self.next.queue.put(job)
+        finally:
+            self.blocked -= 1
+
+    async def _take_batch(self) -> List[StageJob]:
+        """The next job plus whatever arrives within batch_wait_s, up to batch_size."""
+        jobs = [await self.queue.get()]
+        deadline = time.perf_counter() + self.batch_wait_s
+        while len(jobs) < self.batch_size:
+            try:
+                jobs.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return jobs
+
+    async def _run_batches(self) -> None:
+        while True:
+            jobs = await self._take_batch()
+            try:
+                # skip jobs cancelled by the caller while queued
+                live = [job for job in jobs if not job.future.done()]
+                if not live:
+                    continue
+
+                self.busy += 1
+                t0 = time.perf_counter()
+                try:
+                    outcomes = await self.batch_fn(live)
+                except Exception as e:
+                    outcomes = [e] * len(live)
+                finally:
+                    elapsed = time.perf_counter() - t0
+                    self.busy -= 1
+                    self.busy_s += elapsed
+                    self.batches += 1
+
+                outcomes = list(outcomes)
+                if len(outcomes) != len(live):
+                    # broken batch_fn contract: jobs without an outcome must not hang on their future
+                    error = RuntimeError(f"Stage {self.name}: batch returned {len(outcomes)} "
+                                         f"outcomes for {len(live)} jobs")
+                    logger.error(str(error))
+                    outcomes = (outcomes + [error] * len(live))[:len(live)]
+
+                for job, outcome in zip(live, outcomes):
+                    job.stage_times[self.name] = elapsed
+                    if isinstance(outcome, Exception):
+                        self.failed += 1
+                        if not job.future.done():
+                            job.future.set_exception(outcome)
+                        continue
+                    job.payload = outcome
+                    self.processed += 1
+                    await self._forward(job)
+            finally:
+                for _ in jobs:
+                    self.queue.task_done()
+
+    def metrics(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+        runs = self.processed + self.failed
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "workers": self.workers,
+            "busy": self.busy,
+            "blocked": self.blocked,
+            "processed": self.processed,
+            "failed": self.failed,
+            # share of worker time spent in fn since start
+            "utilisation": round(self.busy_s / (elapsed * self.workers), 3) if elapsed > 0 else 0.0,
+            "avg_service_s": round(self.busy_s / runs, 3) if runs else None,
+            **({"avg_batch_size": round(runs / self.batches, 2) if self.batches else None}
+               if self.batch_fn is not None else {}),
+        }
+
+
+class StagedPipeline:
+    """
+    fetch -> convert -> post-process -> publish, each stage with its own workers and a
+    bounded queue in front of it. While the converter works on document N+1, document N
+    can be post-processed and uploaded; a slow stage fills its queue and backpressure
+    reaches submit().
+
+        pipeline = StagedPipeline(config, fetch=..., convert=..., postprocess=..., publish=...)
+        pipeline.start()
+        job = await pipeline.submit(event, profile)   # resolves after publish
+
+    convert_batch (used when config.convert_batch_size > 1) converts a list of jobs at once.
+    """
+
+    def __init__(self, config: StageConfig, fetch: StageFn, convert: StageFn,
+                 postprocess: StageFn, publish: StageFn, convert_batch: Optional[BatchStageFn] = None):
+        self.config = config
+        self.stages = [
+            Stage("fetch", fetch, config.fetch_workers, config.queue_size),
+            Stage("convert", convert, config.convert_workers, config.convert_queue_size,
+                  batch_fn=convert_batch, batch_size=config.convert_batch_size,
+                  batch_wait_s=config.convert_batch_wait_s),
+            Stage("postprocess", postprocess, config.postprocess_workers, config.queue_size),
+            Stage("publish", publish, config.publish_workers, config.queue_size),
+        ]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next = next_stage
+
+        self.completed = 0
+        self.failed = 0
+        self._latency_s = 0.0
+
+    def start(self) -> None:
+        for stage in self.stages:
+            stage.start()
+
+    async def stop(self) -> None:
+        for stage in self.stages:
+            await stage.stop()
+
+    async def submit(self, event: Any, profile: str, scratch: Any = None) -> StageJob:
+        """Queues a document and waits until it has been published (or a stage failed)."""
+        job = StageJob(event=event, profile=profile, scratch=scratch,
+                       future=asyncio.get_running_loop().create_future())
+        await self.stages[0].queue.put(job)
+        try:
+            await job.future
+            self.completed += 1
+            return job
+        except asyncio.CancelledError:
+            # queued stages skip it, a running stage finishes and drops it
+            job.future.cancel()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._latency_s += time.perf_counter() - job.submitted_at
+
+    def metrics(self) -> Dict[str, Any]:
+        done = self.completed + self.failed
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_latency_s": round(self._latency_s / done, 3) if done else None,
+            "stages": {stage.name: stage.metrics() for stage in self.stages},
+        }
+
+    def log_metrics(self) -> None:
+        parts = [
+            f"{name}[q={m['queue_depth']}/{m['queue_capacity']} busy={m['busy']}/{m['workers']} "
+            f"util={m['utilisation']:.0%}]"
+            for name, m in self.metrics()["stages"].items()
+        ]
+        logger.info("Pipeline stages: " + " ".join(parts))
@@ -0,0 +1,252 @@
+import hashlib
+import io
+import json
+import mimetypes
+import tarfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+from minio import Minio
+
+from docparser.pipeline import DoclingParseResult, InMemoryParseResult
+from docparser.tables import table_content_type
+from integretion.minio.minio_service import ensure_bucket, part_size_for, put_bytes, run_io
+from integretion.models import ExtractionRequested
+
+BUNDLE_OBJECT = "bundle.tar"
+MANIFEST_OBJECT = "bundle.json"
+BLOCK_SIZE = tarfile.BLOCKSIZE  # 512
+
+
+@dataclass
+class BundleMember:
+    name: str
+    size: int
+    content_type: str
+    # returns the member content; called once, while the archive is streamed
+    load: Callable[[], bytes]
+
+
+def _member_from_bytes(name: str, data: bytes, content_type: str = None) -> BundleMember:
+    return BundleMember(
+        name=name,
+        size=len(data),
+        content_type=content_type or mimetypes.guess_type(name)[0] or "application/octet-stream",
+        load=lambda: data,
+    )
+
+
+def _member_from_file(name: str, path: Path, content_type: str = None) -> BundleMember:
+    return BundleMember(
+        name=name,
+        size=path.stat().st_size,
+        content_type=content_type or mimetypes.guess_type(name)[0] or "application/octet-stream",
+        load=path.read_bytes,
+    )
+
+
+def bundle_members(result: Union[DoclingParseResult, InMemoryParseResult]) -> List[BundleMember]:
+    """output.md, chunks.json, stats.json, images/* and tables/* of a run, from disk or memory."""
+    stats = json.dumps(result.stats, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+
+    if isinstance(result, InMemoryParseResult):
+        chunks = json.dumps(result.chunks, ensure_ascii=False, indent=2).encode("utf-8")
+        members = [
+            _member_from_bytes("output.md", result.markdown.encode("utf-8"), "text/markdown"),
+            _member_from_bytes("chunks.json", chunks, "application/json"),
+            _member_from_bytes("stats.json", stats, "application/json"),
+        ]
+        members += [_member_from_bytes(rel_path, data) for rel_path, data in result.images.items()]
+        members += [
+            _member_from_bytes(rel_path, data, table_content_type(rel_path))
+            for rel_path, data in result.tables.items()
+        ]
+        return members
+
+    members = [
+        _member_from_file("output.md", result.markdown_path, "text/markdown"),
+        _member_from_file("chunks.json", result.chunks_path, "application/json"),
+        _member_from_bytes("stats.json", stats, "application/json"),
+    ]
+    if result.images_dir and result.images_dir.exists():
+        members += [
+            _member_from_file(f"images/{p.name}", p)
+            for p in sorted(result.images_dir.glob("*")) if p.is_file()
+        ]
+    members += [
+        _member_from_file(rel_path, result.run_dir / rel_path, table_content_type(rel_path))
+        for rel_path in result.table_rel_paths
+    ]
+    return members
+
+
+def _tar_header(member: BundleMember, mtime: int) -> bytes:
+    info = tarfile.TarInfo(name=member.name)
+    info.size = member.size
+    info.mtime = mtime
+    info.mode = 0o644
+    return info.tobuf(format=tarfile.GNU_FORMAT)
+
+
+def _padding(size: int) -> int:
+    return (BLOCK_SIZE - size % BLOCK_SIZE) % BLOCK_SIZE
+
+
+class TarBundleStream(io.RawIOBase):
+    """
+    Uncompressed tar produced on the fly from a list of members.
+
+    The total length and each member's data offset are known before streaming
+    (tar headers have a deterministic size), so the archive can be sent with a
+    single put_object and no temporary file. sha256 digests are computed while
+    streaming and are available in `manifest` once the stream is exhausted.
+    """
+
+    def __init__(self, members: List[BundleMember]):
+        super().__init__()
+        self.members = members
+        self.mtime = int(time.time())
+        self._headers = [_tar_header(m, self.mtime) for m in members]
+
+        self.entries: Dict[str, Dict] = {}
+        offset = 0
+        for member, header in zip(members, self._headers):
+            offset += len(header)
+            self.entries[member.name] = {
+                "offset": offset,
+                "size": member.size,
+                "content_type": member.content_type,
+            }
+            offset += member.size + _padding(member.size)
+        # end-of-archive marker: two zero blocks
+        self.length = offset + 2 * BLOCK_SIZE
+
+        self._chunks = self._iter_chunks()
+        self._buffer = b""
+
+    def _iter_chunks(self) -> Iterator[bytes]:
+        for member, header in zip(self.members, self._headers):
+            data = member.load()
+            if len(data) != member.size:
+                raise ValueError(f"Bundle member {member.name} changed size while streaming")
+            self.entries[member.name]["sha256"] = hashlib.sha256(data).hexdigest()
+            yield header
+            yield data
+            yield b"\0" * _padding(member.size)
+        yield b"\0" * (2 * BLOCK_SIZE)
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                break
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def manifest(self, object_name: str) -> Dict:
+        return {
+            "format": "tar",
+            "version": 1,
+            "object": object_name,
+            "size": self.length,
+            "members": self.entries,
+        }
+
+
+async def upload_bundle_to_minio(
+    result: Union[DoclingParseResult, InMemoryParseResult],
+    event: ExtractionRequested,
+    minio_client: Minio,
+) -> Dict:
+    """
+    Uploads a run as two objects instead of one per artifact:
+    - <object_key>/bundle.tar   uncompressed tar with output.md, chunks.json, stats.json, images/*, tables/*
+    - <object_key>/bundle.json  manifest with offset/size/sha256 of each member
+
+    Returns the manifest.
+    """
+    bucket = f"bucket-{event.collection_id}"
+    await ensure_bucket(minio_client, bucket)
+
+    bundle_name = f"{event.output_prefix}/{BUNDLE_OBJECT}"
+    stream = TarBundleStream(bundle_members(result))
+
+    await run_io(
+        minio_client.put_object,
+        bucket_name=bucket,
+        object_name=bundle_name,
+        data=stream,
+        length=stream.length,
+        part_size=part_size_for(stream.length),
+        content_type="application/x-tar",
+    )
+
+    manifest = stream.manifest(bundle_name)
+    await put_bytes(
+        minio_client,
+        bucket,
+        f"{event.output_prefix}/{MANIFEST_OBJECT}",
+        json.dumps(manifest, indent=2).encode("utf-8"),
+        "application/json",
+    )
+    return manifest
+
+
+class BundleReader:
+    """
+    Reads single members of a bundle with HTTP range requests, without
+    downloading the whole archive.
+
+        reader = BundleReader(client, "bucket-1", "docs/contract.pdf")
+        md = reader.read_text("output.md")
+        png = reader.read("images/<uuid>.png")
+    """
+
+    def __init__(self, minio_client: Minio, bucket: str, object_key: str):
+        self.minio_client = minio_client
+        self.bucket = bucket
+        self.object_key = object_key
+        self._manifest: Optional[Dict] = None
+
+    @property
+    def manifest(self) -> Dict:
+        if self._manifest is None:
+            self._manifest = json.loads(self._get(f"{self.object_key}/{MANIFEST_OBJECT}"))
+        return self._manifest
+
+    def members(self) -> List[str]:
+        return list(self.manifest["members"].keys())
+
+    def read(self, name: str, verify: bool = False) -> bytes:
+        entry = self.manifest["members"].get(name)
+        if entry is None:
+            raise KeyError(f"{name} not in bundle {self.object_key}")
+        if entry["size"] == 0:
+            return b""
+        data = self._get(self.manifest["object"], offset=entry["offset"], length=entry["size"])
+        if verify and entry.get("sha256") and hashlib.sha256(data).hexdigest() != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch for {name} in bundle {self.object_key}")
+        return data
+
+    def read_text(self, name: str) -> str:
+        return self.read(name).decode("utf-8")
+
+    def read_json(self, name: str):
+        return json.loads(self.read(name))
+
+    def _get(self, object_name: str, offset: int = 0, length: int = 0) -> bytes:
+        response = self.minio_client.get_object(self.bucket, object_name, offset=offset, length=length)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
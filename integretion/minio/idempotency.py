@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from minio import Minio
+from minio.error import S3Error
+
+from integretion.minio.minio_service import put_bytes, run_io
+from integretion.models import ExtractionRequested
+
+# Bump when a change to the pipeline must invalidate previously completed jobs
+PIPELINE_VERSION = "1"
+
+MARKERS_PREFIX = "_markers"
+
+
+def pipeline_fingerprint(**config: Any) -> str:
+    """Short, stable hash of the settings that influence the produced artifacts."""
+    payload = json.dumps({"pipeline_version": PIPELINE_VERSION, **config}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def idempotency_key(event: ExtractionRequested, source_etag: Optional[str], fingerprint: str) -> str:
+    """job_id + ETag of the source object + pipeline configuration."""
+    raw = f"{event.job_id}|{source_etag or '-'}|{fingerprint}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def source_etag(event: ExtractionRequested, minio_client: Minio) -> Optional[str]:
+    """
+    ETag of the source document; for direct_text events a hash of the text,
+    None when the event has no source at all.
+    """
+    if event.direct_text:
+        return "text-" + hashlib.sha256(event.direct_text.encode("utf-8")).hexdigest()[:32]
+    if not event.bucket or not event.object_key:
+        return None
+    stat = await run_io(minio_client.stat_object, event.bucket, event.object_key)
+    return stat.etag
+
+
+class MinioMarkerStore:
+    """
+    Completion markers stored next to the artifacts:
+    bucket-<collection_id>/<object_key>/_markers/<key>.json
+
+    A single PUT is atomic on S3/MinIO, so the marker is either absent or
+    complete. It is written only after every artifact has been uploaded.
+    """
+
+    def __init__(self, minio_client: Minio):
+        self.minio_client = minio_client
+
+    @staticmethod
+    def _location(event: ExtractionRequested, key: str):
+        return f"bucket-{event.collection_id}", f"{event.output_prefix}/{MARKERS_PREFIX}/{key}.json"
+
+    async def is_done(self, event: ExtractionRequested, key: str) -> bool:
+        bucket, object_name = self._location(event, key)
+        try:
+            await run_io(self.minio_client.stat_object, bucket, object_name)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchBucket", "NoSuchObject"):
+                return False
+            raise
+
+    async def mark_done(self, event: ExtractionRequested, key: str, details: Dict[str, Any]) -> None:
+        bucket, object_name = self._location(event, key)
+        body = json.dumps({"key": key, "completed_at": time.time(), **details}, indent=2, default=str)
+        await put_bytes(self.minio_client, bucket, object_name, body.encode("utf-8"), "application/json")
+
+
+class LocalMarkerStore:
+    """
+    Completion markers on the local file system (one JSON per key), for a
+    single-node deployment or when the target bucket must stay clean.
+    Writes go through a temp file + os.replace, which is atomic.
+    """
+
+    def __init__(self, state_dir: str = "/var/lib/docparser/markers"):
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+
+    async def is_done(self, event: ExtractionRequested, key: str) -> bool:
+        return (self.state_dir / f"{key}.json").exists()
+
+    async def mark_done(self, event: ExtractionRequested, key: str, details: Dict[str, Any]) -> None:
+        final_path = self.state_dir / f"{key}.json"
+        tmp_path = final_path.with_suffix(f".tmp-{os.getpid()}")
+        body = json.dumps({"key": key, "completed_at": time.time(), **details}, indent=2, default=str)
+        tmp_path.write_text(body, encoding="utf-8")
+        os.replace(tmp_path, final_path)
@@ -0,0 +1,79 @@
+import asyncio
+import mimetypes
+import posixpath
+import threading
+from typing import Callable, Dict, Set, Tuple
+
+from minio import Minio
+from minio.error import S3Error
+
+from integretion.minio.minio_service import ensure_bucket, put_bytes, run_io
+from integretion.models import ExtractionRequested
+
+IMAGE_STORE_PREFIX = "_images"
+# link prefix written by the pipeline in output.md / chunks.json
+LOCAL_IMAGE_LINK = "](images/"
+
+
+class CollectionImageStore:
+    """
+    Images shared by every document of a collection, content-addressed:
+
+        bucket-<collection_id>/_images/<sha256>.<ext>
+
+    Image names are hashes of their pixels (docparser.images), so an object that
+    already exists is the same image and is not uploaded again. Links in output.md
+    and chunks.json are rewritten from images/<name> to the relative path of the
+    shared object (e.g. ../../_images/<name>), so they resolve from the document
+    prefix and identical images across documents share one URL for CDN caching.
+    """
+
+    def __init__(self, minio_client: Minio, prefix: str = IMAGE_STORE_PREFIX):
+        self.minio_client = minio_client
+        self.prefix = prefix
+        # objects known to exist, per process: one stat_object per image and bucket
+        self._known: Set[Tuple[str, str]] = set()
+        self._known_lock = threading.Lock()
+        self.uploaded = 0
+        self.skipped = 0
+
+    def object_name(self, rel_path: str) -> str:
+        return f"{self.prefix}/{posixpath.basename(rel_path)}"
+
+    def link_prefix(self, event: ExtractionRequested) -> str:
+        """Relative path from the document's prefix to the shared store."""
+        return posixpath.relpath(self.prefix, event.output_prefix)
+
+    def rewrite_links(self, text: str, event: ExtractionRequested) -> str:
+        return text.replace(LOCAL_IMAGE_LINK, f"]({self.link_prefix(event)}/")
+
+    async def _exists(self, bucket: str, object_name: str) -> bool:
+        with self._known_lock:
+            if (bucket, object_name) in self._known:
+                return True
+        try:
+            await run_io(self.minio_client.stat_object, bucket, object_name)
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject", "NoSuchBucket"):
+                return False
+            raise
+        with self._known_lock:
+            self._known.add((bucket, object_name))
+        return True
+
+    async def _put(self, bucket: str, rel_path: str, load: Callable[[], bytes]) -> None:
+        object_name = self.object_name(rel_path)
+        if await self._exists(bucket, object_name):
+            self.skipped += 1
+            return
+        content_type = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+        await put_bytes(self.minio_client, bucket, object_name, load(), content_type)
+        with self._known_lock:
+            self._known.add((bucket, object_name))
+        self.uploaded += 1
+
+    async def put_images(self, event: ExtractionRequested, images: Dict[str, Callable[[], bytes]]) -> None:
+        """Uploads the images (rel_path -> loader) missing from the collection store."""
+        bucket = f"bucket-{event.collection_id}"
+        await ensure_bucket(self.minio_client, bucket)
+        await asyncio.gather(*(self._put(bucket, rel_path, load) for rel_path, load in images.items()))
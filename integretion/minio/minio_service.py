@@ -1,87 +1,286 @@
+import asyncio
+import json
+import math
+import mimetypes
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
 
+import urllib3
 from minio import Minio
 
-from docparser.pipeline import DoclingParseResult
+from docparser.pipeline import DoclingParseResult, InMemoryParseResult
+from docparser.tables import table_content_type
 from integretion.models import ExtractionRequested
 
 
-def get_client():
+# Concurrent transfers (threads in the I/O pool == HTTP connections in the pool)
+MINIO_IO_WORKERS = int(os.getenv("MINIO_IO_WORKERS", "16"))
+
+# S3 multipart limits
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10_000
+# Objects up to this size go in a single PUT
+SINGLE_PUT_THRESHOLD = 64 * 1024 * 1024
+LARGE_OBJECT_PART_SIZE = 16 * 1024 * 1024
+
+# Dedicated pool: MinIO transfers never block the event loop nor the default
+# executor used by asyncio.to_thread for Docling conversions
+_io_executor = ThreadPoolExecutor(max_workers=MINIO_IO_WORKERS, thread_name_prefix="minio-io")
+
+_known_buckets: Set[str] = set()
+_known_buckets_lock = threading.Lock()
+
+
+def get_client(max_connections: int = MINIO_IO_WORKERS):
     return Minio(
         "localhost:9000",
         access_key="minioadmin",
         secret_key="minioadmin",
-        secure=False
+        secure=False,
+        # connection pool sized to the I/O concurrency
+        http_client=urllib3.PoolManager(
+            maxsize=max_connections,
+            block=True,
+            timeout=urllib3.Timeout(connect=10, read=300),
+            retries=urllib3.Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504]),
+        ),
+    )
+
+
+async def run_io(fn, *args, **kwargs):
+    """Runs a blocking MinIO call on the dedicated I/O thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, partial(fn, *args, **kwargs))
+
+
+def part_size_for(size: int) -> int:
+    """
+    Part size tuned to the object size:
+    - small objects: one PUT (part_size >= size)
+    - large objects: 16MiB parts, grown so the upload stays within 10,000 parts
+    """
+    if size <= SINGLE_PUT_THRESHOLD:
+        return max(MIN_PART_SIZE, size)
+    part = max(LARGE_OBJECT_PART_SIZE, math.ceil(size / MAX_PARTS))
+    # round up to a whole MiB
+    mib = 1024 * 1024
+    return math.ceil(part / mib) * mib
+
+
+async def ensure_bucket(minio_client: Minio, bucket: str) -> None:
+    """bucket_exists/make_bucket, cached per process: one round trip per bucket."""
+    with _known_buckets_lock:
+        if bucket in _known_buckets:
+            return
+
+    exists = await run_io(minio_client.bucket_exists, bucket)
+    if not exists:
+        try:
+            await run_io(minio_client.make_bucket, bucket)
+        except Exception:
+            # created concurrently by another worker
+            if not await run_io(minio_client.bucket_exists, bucket):
+                raise
+
+    with _known_buckets_lock:
+        _known_buckets.add(bucket)
+
+
+async def put_file(minio_client: Minio, bucket: str, object_name: str, file_path: Path,
+                   content_type: str = None) -> None:
+    size = file_path.stat().st_size
+    content_type = content_type or mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+    await run_io(
+        minio_client.fput_object,
+        bucket_name=bucket,
+        object_name=object_name,
+        file_path=str(file_path),
+        part_size=part_size_for(size),
+        content_type=content_type,
     )
 
 
+async def put_bytes(minio_client: Minio, bucket: str, object_name: str, data: bytes,
+                    content_type: str = "application/octet-stream") -> None:
+    await run_io(
+        minio_client.put_object,
+        bucket_name=bucket,
+        object_name=object_name,
+        data=BytesIO(data),
+        length=len(data),
+        part_size=part_size_for(len(data)),
+        content_type=content_type,
+    )
+
 
 async def upload_parse_result_to_minio(
     result: DoclingParseResult,
     event: ExtractionRequested,
     minio_client: Minio,
+    image_store=None,
 ) -> None:
     """
     Carica su MinIO:
     - markdown
     - chunks
     - immagini (se ci sono)
+    - tabelle mergiate (tables/*.csv, *.parquet, tables.json)
     usando collectionId/documentId per costruire i path.
+    Tutti gli oggetti vengono caricati in parallelo sul pool I/O dedicato.
+
+    Con un image_store (CollectionImageStore) le immagini vanno nello store condiviso
+    della collection, saltando quelle già presenti, e i link in markdown/chunks
+    vengono riscritti verso lo store.
     """
     bucket = f"bucket-{event.collection_id}"
-    if not minio_client.bucket_exists(bucket):
-        minio_client.make_bucket(bucket)
+    await ensure_bucket(minio_client, bucket)
 
-    # 1) Markdown
-    minio_client.fput_object(
-        bucket_name=bucket,
-        object_name=f"{event.object_key}/output.md",
-        file_path=str(result.markdown_path),
-        part_size=10 * 1024 * 1024,
-        content_type="text/markdown",
-    )
-
-    # 2) Chunks
-    minio_client.fput_object(
-        bucket_name=bucket,
-        object_name=f"{event.object_key}/chunks.json",
-        file_path=str(result.chunks_path),
-        part_size=10 * 1024 * 1024,
-        content_type="application/json",
-    )
+    if image_store is None:
+        uploads = [
+            # 1) Markdown
+            put_file(minio_client, bucket, f"{event.output_prefix}/output.md", result.markdown_path,
+                     "text/markdown"),
+            # 2) Chunks
+            put_file(minio_client, bucket, f"{event.output_prefix}/chunks.json", result.chunks_path,
+                     "application/json"),
+        ]
+    else:
+        markdown = image_store.rewrite_links(result.markdown_path.read_text(encoding="utf-8"), event)
+        chunks = image_store.rewrite_links(result.chunks_path.read_text(encoding="utf-8"), event)
+        uploads = [
+            put_bytes(minio_client, bucket, f"{event.output_prefix}/output.md", markdown.encode("utf-8"),
+                      "text/markdown"),
+            put_bytes(minio_client, bucket, f"{event.output_prefix}/chunks.json", chunks.encode("utf-8"),
+                      "application/json"),
+        ]
 
     # 3) Immagini
     if result.images_dir and result.images_dir.exists():
-        for img_path in result.images_dir.glob("*"):
-            object_name = f"{event.object_key}/images/{img_path.name}"
-            minio_client.fput_object(
-                bucket_name=bucket,
-                object_name=object_name,
-                file_path=str(img_path),
-                part_size=10 * 1024 * 1024,
-            )
+        if image_store is None:
+            for img_path in result.images_dir.glob("*"):
+                object_name = f"{event.output_prefix}/images/{img_path.name}"
+                uploads.append(put_file(minio_client, bucket, object_name, img_path))
+        else:
+            uploads.append(image_store.put_images(event, {
+                f"images/{img_path.name}": img_path.read_bytes for img_path in result.images_dir.glob("*")
+            }))
+
+    # 4) Tabelle
+    for rel_path in result.table_rel_paths:
+        uploads.append(put_file(minio_client, bucket, f"{event.output_prefix}/{rel_path}",
+                                result.run_dir / rel_path, table_content_type(rel_path)))
+
+    await asyncio.gather(*uploads)
+
+
+async def upload_in_memory_result_to_minio(
+    result: InMemoryParseResult,
+    event: ExtractionRequested,
+    minio_client: Minio,
+    image_store=None,
+) -> None:
+    """
+    Come upload_parse_result_to_minio, ma direttamente dalla memoria
+    (nessun file locale): markdown, chunks, immagini e tabelle.
+    """
+    bucket = f"bucket-{event.collection_id}"
+    await ensure_bucket(minio_client, bucket)
+
+    markdown = result.markdown
+    chunks_text = json.dumps(result.chunks, ensure_ascii=False, indent=2)
+    if image_store is not None:
+        markdown = image_store.rewrite_links(markdown, event)
+        chunks_text = image_store.rewrite_links(chunks_text, event)
+
+    uploads = [
+        # 1) Markdown
+        put_bytes(minio_client, bucket, f"{event.output_prefix}/output.md", markdown.encode("utf-8"),
+                  "text/markdown"),
+        # 2) Chunks
+        put_bytes(minio_client, bucket, f"{event.output_prefix}/chunks.json", chunks_text.encode("utf-8"),
+                  "application/json"),
+    ]
+
+    # 3) Immagini (rel_path = "images/<nome>")
+    if image_store is None:
+        for rel_path, data in result.images.items():
+            content_type = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+            uploads.append(put_bytes(minio_client, bucket, f"{event.output_prefix}/{rel_path}", data,
+                                     content_type))
+    elif result.images:
+        uploads.append(image_store.put_images(event, {
+            rel_path: (lambda data=data: data) for rel_path, data in result.images.items()
+        }))
+
+    # 4) Tabelle (rel_path = "tables/<nome>")
+    for rel_path, data in result.tables.items():
+        uploads.append(put_bytes(minio_client, bucket, f"{event.output_prefix}/{rel_path}", data,
+                                 table_content_type(rel_path)))
+
+    await asyncio.gather(*uploads)
+
+
+async def upload_chunks_to_minio(
+    chunks: List[Dict[str, Any]],
+    event: ExtractionRequested,
+    minio_client: Minio,
+) -> None:
+    """Carica solo chunks.json (fast path per direct_text)."""
+    bucket = f"bucket-{event.collection_id}"
+    await ensure_bucket(minio_client, bucket)
+    chunks_bytes = json.dumps(chunks, ensure_ascii=False, indent=2).encode("utf-8")
+    await put_bytes(minio_client, bucket, f"{event.output_prefix}/chunks.json", chunks_bytes, "application/json")
+
+
+async def download_document_bytes_from_minio(
+    event: ExtractionRequested,
+    minio_client: Minio,
+) -> bytes:
+    """
+    Scarica il documento da MinIO direttamente in memoria (nessun file in /tmp).
+    """
+    def _get() -> bytes:
+        response = minio_client.get_object(
+            bucket_name=event.bucket,
+            object_name=event.object_key,
+        )
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    return await run_io(_get)
 
 
 #TODO ritorno inputstream o file intero?
 async def download_document_from_minio(
     event: ExtractionRequested,
     minio_client: Minio,
+    dest_dir: Optional[Path] = None,
 ) -> Path:
     """
     Scarica il documento da MinIO su file system locale
     e ritorna il Path al file.
+    dest_dir: cartella di destinazione (es. la scratch dir del job);
+    di default /tmp/docparser/<collection_id>.
     """
 
-    base_dir = Path("/tmp/docparser") / str(event.collection_id)
+    base_dir = dest_dir if dest_dir is not None else Path("/tmp/docparser") / str(event.collection_id)
     base_dir.mkdir(parents=True, exist_ok=True)
 
     local_path = base_dir / event.file_name
 
-    minio_client.fget_object(
+    await run_io(
+        minio_client.fget_object,
         bucket_name=event.bucket,
         object_name=event.object_key,
         file_path=str(local_path),
     )
 
-    return local_path
\ No newline at end of file
+    return local_path
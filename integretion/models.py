@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional
+from typing import Any, Dict, Optional
 
 
 
@@ -18,7 +18,38 @@ class ExtractionRequested:
     file_name: Optional[str] = None
     model_name: Optional[str] = None
     prompt: Optional[str] = None
+    # conversion profile (fast / balanced / accurate); None -> listener default
+    profile: Optional[str] = None
+
+    @property
+    def output_prefix(self) -> str:
+        """Prefix of the produced artifacts in bucket-<collection_id> (direct text has no object_key)."""
+        return self.object_key or f"direct-text/{self.file_id}"
+
+
+@dataclass
+class ShardRequested:
+    """Page-range sub-job of a large document, published by the fan-out coordinator."""
+
+    job_id: str
+    # one fan-out of the job; a re-split (e.g. new source ETag) gets a new run_id
+    run_id: str
+    shard_index: int
+    num_shards: int
+    # 1-based, inclusive
+    page_start: int
+    page_end: int
+    # decided once for the whole document so every shard is converted the same way
+    ocr_enabled: bool
+    profile: str
+    # the originating ExtractionRequested, as a dict
+    parent: Dict[str, Any]
+
+    @property
+    def event(self) -> ExtractionRequested:
+        return ExtractionRequested(**self.parent)
 
 
 class KafkaTopics(str, Enum):
-    EXTRACTION_REQUESTED = "extraction-requested"
\ No newline at end of file
+    EXTRACTION_REQUESTED = "extraction-requested"
+    EXTRACTION_SHARDS = "extraction-shards"
\ No newline at end of file
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: owners are checked by pid only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = "jobs"
+FAILED_DIR = "failed"
+# held (flock) by the owning process for its whole life: released by the kernel when it dies
+OWNER_LOCK = ".owner.lock"
+
+
+@dataclass
+class JobScratch:
+    """Working directory of one job: input/ for the downloaded document, output/ for the run dir."""
+    job_id: str
+    path: Path
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def input_dir(self) -> Path:
+        return self.path / "input"
+
+    @property
+    def output_dir(self) -> Path:
+        return self.path / "output"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_gone(owner_dir: Path) -> bool:
+    """True if the process that owns owner_dir has exited (its lock can be taken)."""
+    lock_path = owner_dir / OWNER_LOCK
+    if fcntl is None:
+        try:
+            return not _pid_alive(int(owner_dir.name.split("-")[0]))
+        except ValueError:
+            return False
+    try:
+        fd = os.open(lock_path, os.O_RDWR)
+    except FileNotFoundError:
+        # just created by a starting process, lock not taken yet
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    finally:
+        # closing drops the lock again if we got it
+        os.close(fd)
+    return True
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class ScratchSpace:
+    """
+    Per-job scratch directories under a single root, with a disk quota.
+
+        <root>/jobs/<pid>-<id>/<job_id>-<id>/{input,output}   active jobs of one process
+        <root>/failed/<job_id>-<id>/                          kept after a failure, removed after failed_ttl_s
+
+    allocate() waits while the quota is exhausted: every active job counts for at least
+    reserve_mb, failed directories are evicted oldest-first before waiting. The waiting
+    message keeps its in-flight slot, so a full disk pauses the consumer instead of
+    filling up. Several processes (consumers) can share the root: each owns its own
+    jobs/<pid>-<id>/ dir, locked for its lifetime, and at startup only the job dirs of
+    owners that have exited are moved to failed.
+    """
+
+    def __init__(self, root: str = "/tmp/docparser", quota_mb: float = 10 * 1024,
+                 reserve_mb: float = 256, failed_ttl_s: float = 24 * 3600,
+                 poll_interval_s: float = 1.0, sweep_interval_s: float = 60.0):
+        self.root = Path(root)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.jobs_root = self.root / JOBS_DIR / self.owner
+        self.failed_root = self.root / FAILED_DIR
+        self.jobs_root.mkdir(parents=True)
+        self.failed_root.mkdir(parents=True, exist_ok=True)
+        self._owner_lock = self._lock_owner()
+
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+        self.reserve_bytes = int(reserve_mb * 1024 * 1024)
+        self.failed_ttl_s = failed_ttl_s
+        self.poll_interval_s = poll_interval_s
+        self.sweep_interval_s = sweep_interval_s
+
+        self._active: Dict[str, JobScratch] = {}
+        self._lock = asyncio.Lock()
+        self._last_sweep = 0.0
+        self._counters = {
+            "allocated": 0,
+            "cleaned": 0,
+            # cumulative since start; failed_dirs_present in metrics() is the current count
+            "failed_dirs_kept_total": 0,
+            "expired": 0,
+            "evicted": 0,
+            "waits": 0,
+            "wait_s": 0.0,
+        }
+
+        self._adopt_orphans()
+
+    # --- lifecycle -------------------------------------------------------
+
+    def _lock_owner(self):
+        if fcntl is None:
+            return None
+        lock = open(self.jobs_root / OWNER_LOCK, "w")
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock
+
+    def _adopt_orphans(self) -> None:
+        """Job dirs left by exited processes (crash, OOM kill) are kept as failed; live owners are left alone."""
+        for owner_dir in (self.root / JOBS_DIR).iterdir():
+            if not owner_dir.is_dir() or owner_dir == self.jobs_root:
+                continue
+            if (owner_dir / "input").is_dir() or (owner_dir / "output").is_dir():
+                # job dir of a version without owner dirs
+                self._keep_orphan(owner_dir)
+                continue
+            if not _owner_gone(owner_dir):
+                continue
+            try:
+                orphans = [path for path in owner_dir.iterdir() if path.is_dir()]
+            except FileNotFoundError:
+                # adopted by another process starting at the same time
+                continue
+            for path in orphans:
+                self._keep_orphan(path)
+            shutil.rmtree(owner_dir, ignore_errors=True)
+
+    def _keep_orphan(self, path: Path) -> None:
+        target = self.failed_root / path.name
+        if target.exists():
+            shutil.rmtree(target, ignore_errors=True)
+        try:
+            path.rename(target)
+        except FileNotFoundError:
+            return
+        self._counters["failed_dirs_kept_total"] += 1
+        logger.warning(f"Scratch dir {path.name} left by a previous process, kept as failed")
+
+    async def allocate(self, job_id: str) -> JobScratch:
+        async with self._lock:
+            await self._maybe_sweep()
+            t0 = time.monotonic()
+            waited = False
+            while not await self._fits():
+                if not waited:
+                    waited = True
+                    self._counters["waits"] += 1
+                    logger.warning(f"Scratch quota reached ({self.metrics()['committed_mb']:.0f}MB of "
+                                   f"{self.quota_bytes / 2**20:.0f}MB), job {job_id} waits for disk space")
+                await asyncio.sleep(self.poll_interval_s)
+            if waited:
+                self._counters["wait_s"] += time.monotonic() - t0
+
+            path = self.jobs_root / f"{job_id}-{uuid.uuid4().hex[:8]}"
+            scratch = JobScratch(job_id=job_id, path=path)
+            scratch.input_dir.mkdir(parents=True)
+            scratch.output_dir.mkdir(parents=True)
+            self._active[path.name] = scratch
+            self._counters["allocated"] += 1
+            return scratch
+
+    async def release(self, scratch: JobScratch, success: bool) -> None:
+        self._active.pop(scratch.path.name, None)
+        if success:
+            await asyncio.to_thread(shutil.rmtree, scratch.path, True)
+            self._counters["cleaned"] += 1
+            return
+        target = self.failed_root / scratch.path.name
+        await asyncio.to_thread(scratch.path.rename, target)
+        # the TTL runs from the failure
+        os.utime(target)
+        self._counters["failed_dirs_kept_total"] += 1
+        logger.info(f"Job {scratch.job_id} failed: scratch kept in {target} for {self.failed_ttl_s:.0f}s")
+
+    @asynccontextmanager
+    async def job(self, job_id: str):
+        """Allocates a scratch dir; removed if the block succeeds, kept (with TTL) if it raises."""
+        scratch = await self.allocate(job_id)
+        try:
+            yield scratch
+        except BaseException:
+            await self.release(scratch, success=False)
+            raise
+        await self.release(scratch, success=True)
+
+    # --- quota -----------------------------------------------------------
+
+    def _failed_dirs(self) -> List[Tuple[float, Path]]:
+        dirs = []
+        for path in self.failed_root.iterdir():
+            try:
+                dirs.append((path.stat().st_mtime, path))
+            except OSError:
+                pass
+        return sorted(dirs)
+
+    def _usage(self) -> Dict[str, int]:
+        active = sum(max(_dir_size(s.path), self.reserve_bytes) for s in self._active.values())
+        failed = sum(_dir_size(path) for _, path in self._failed_dirs())
+        return {"active": active, "failed": failed}
+
+    async def _fits(self) -> bool:
+        usage = await asyncio.to_thread(self._usage)
+        if usage["active"] + usage["failed"] + self.reserve_bytes <= self.quota_bytes:
+            return True
+
+        # debugging leftovers go first, oldest first
+        for _, path in await asyncio.to_thread(self._failed_dirs):
+            size = await asyncio.to_thread(_dir_size, path)
+            await asyncio.to_thread(shutil.rmtree, path, True)
+            self._counters["evicted"] += 1
+            usage["failed"] -= size
+            logger.warning(f"Scratch quota: evicted failed job dir {path.name} ({size / 2**20:.1f}MB)")
+            if usage["active"] + usage["failed"] + self.reserve_bytes <= self.quota_bytes:
+                return True
+
+        # nothing left to free: admit a job anyway if none is running, or it would wait forever
+        return not self._active
+
+    async def _maybe_sweep(self) -> None:
+        if time.monotonic() - self._last_sweep >= self.sweep_interval_s:
+            await asyncio.to_thread(self.sweep)
+
+    def sweep(self) -> int:
+        """Removes failed job dirs older than failed_ttl_s. Returns how many were removed."""
+        self._last_sweep = time.monotonic()
+        cutoff = time.time() - self.failed_ttl_s
+        removed = 0
+        for mtime, path in self._failed_dirs():
+            if mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        self._counters["expired"] += removed
+        return removed
+
+    # --- metrics ---------------------------------------------------------
+
+    def metrics(self) -> Dict[str, Any]:
+        usage = self._usage()
+        try:
+            disk = shutil.disk_usage(self.root)
+            disk_free_mb = round(disk.free / 2**20, 1)
+        except OSError:
+            disk_free_mb = None
+        return {
+            "root": str(self.root),
+            "quota_mb": round(self.quota_bytes / 2**20, 1),
+            "committed_mb": round((usage["active"] + usage["failed"]) / 2**20, 1),
+            "active_jobs": len(self._active),
+            "active_mb": round(usage["active"] / 2**20, 1),
+            "failed_dirs_present": len(self._failed_dirs()),
+            "failed_mb": round(usage["failed"] / 2**20, 1),
+            "disk_free_mb": disk_free_mb,
+            **self._counters,
+        }
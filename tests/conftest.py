@@ -0,0 +1,121 @@
+"""
+Opzioni e report della suite golden (tests/test_golden.py).
+
+    python -m pytest tests                          # confronto con golden e budget
+    python -m pytest tests --budget-margin 1.0      # budget + 100% (macchina più lenta)
+    python -m pytest tests --no-budgets             # solo output, niente tempi
+    python -m pytest tests --update-goldens         # riscrive golden e budget (cambio voluto)
+    python -m pytest tests --update-budgets         # riscrive solo i budget (nuova macchina)
+    python -m pytest tests --update-budgets --budget-runs 9   # mediana su più run
+
+I budget registrati in tests/golden/budgets.json sono la mediana di --budget-runs run per
+stage, sulla macchina descritta in "recorded" (container Linux x86_64 a 1 CPU): su runner
+più lenti si alza --budget-margin invece di riregistrarli.
+"""
+
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+GOLDEN_DIR = ROOT / "tests" / "golden"
+BUDGETS_FILE = GOLDEN_DIR / "budgets.json"
+
+# Chunking dei test con il tokenizer offline committato (tests/golden/make_fixtures.py), non
+# all-MiniLM-L6-v2 dall'HuggingFace Hub: chunks.json golden riproducibili anche senza rete.
+# Va impostato prima che docparser.chunking venga importato.
+os.environ["DOCPARSER_TOKENIZER"] = str(GOLDEN_DIR / "tokenizer")
+
+# Margine di default sui budget (0.5 = +50%), sovrascrivibile con GOLDEN_BUDGET_MARGIN
+DEFAULT_BUDGET_MARGIN = 0.5
+# Run misurate per caso quando si registrano i budget: il budget è la mediana
+DEFAULT_BUDGET_RUNS = 5
+# Stage più brevi di così non hanno budget: da millisecondi il rumore supera il margine
+BUDGET_MIN_STAGE_S = 0.05
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("golden", "golden outputs and performance budgets")
+    group.addoption("--update-goldens", action="store_true",
+                    help="Rewrite golden outputs (output.md, chunks.json, stats.json) and stage budgets")
+    group.addoption("--update-budgets", action="store_true",
+                    help="Rewrite only the stage budgets from this run")
+    group.addoption("--budget-margin", type=float,
+                    default=float(os.environ.get("GOLDEN_BUDGET_MARGIN", DEFAULT_BUDGET_MARGIN)),
+                    help="Allowed slowdown over a stage budget, as a fraction (default: 0.5 = +50%%)")
+    group.addoption("--budget-runs", type=int, default=DEFAULT_BUDGET_RUNS,
+                    help="Measured runs per case when recording budgets; the budget is their median "
+                         "(default: %(default)s)")
+    group.addoption("--no-budgets", action="store_true",
+                    help="Compare outputs only, skip the stage budgets (and the warm-up run)")
+
+
+def pytest_configure(config):
+    # tempi misurati per caso: {case: {stage: secondi}}
+    config._golden_timings = {}
+
+
+def load_budgets() -> Dict:
+    if not BUDGETS_FILE.exists():
+        return {"recorded": {}, "cases": {}}
+    return json.loads(BUDGETS_FILE.read_text(encoding="utf-8"))
+
+
+@pytest.fixture(scope="session")
+def stage_budgets() -> Dict[str, Dict[str, float]]:
+    """Budget registrati per caso: {case: {stage: secondi}}."""
+    return load_budgets()["cases"]
+
+
+@pytest.fixture(scope="session")
+def golden_timings(request) -> Dict[str, Dict[str, float]]:
+    """Raccoglie i tempi misurati: li usano il report finale e --update-budgets."""
+    return request.config._golden_timings
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    measured = config._golden_timings
+    if not measured or not (config.getoption("update_goldens") or config.getoption("update_budgets")):
+        return
+
+    # i casi non eseguiti (es. -k) mantengono il budget precedente
+    budgets = load_budgets()
+    budgets["cases"].update({case: {k: round(v, 3) for k, v in timings.items() if v >= BUDGET_MIN_STAGE_S}
+                             for case, timings in measured.items()})
+    budgets["recorded"] = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "runs": config.getoption("budget_runs"),
+        "min_stage_s": BUDGET_MIN_STAGE_S,
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+    }
+    BUDGETS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(BUDGETS_FILE, "w", encoding="utf-8") as f:
+        json.dump(budgets, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nSaved stage budgets for {len(measured)} case(s) to {BUDGETS_FILE}")
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    measured = config._golden_timings
+    if not measured:
+        return
+    budgets = load_budgets()["cases"]
+    terminalreporter.section("golden stage timings (actual / budget, seconds)")
+    for case, timings in measured.items():
+        budget = budgets.get(case, {})
+        parts = [
+            f"{stage}={actual:.2f}" + (f"/{budget[stage]:.2f}" if stage in budget else "")
+            for stage, actual in sorted(timings.items())
+        ]
+        terminalreporter.write_line(f"{case:<20} " + " ".join(parts))
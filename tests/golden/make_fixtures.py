@@ -0,0 +1,129 @@
+"""
+Genera i fixture offline della suite golden (non serve rilanciarlo, i file sono committati):
+
+- tests/golden/tokenizer/: tokenizer byte-level deterministico (256 token, nessun merge),
+  usato dal chunking dei test al posto di all-MiniLM-L6-v2 (DOCPARSER_TOKENIZER, vedi
+  conftest.py): i chunks.json golden non dipendono dall'HuggingFace Hub
+- tests/golden/runs/tabelle-multipagina/: run dir (output.json + run.json) di un documento
+  sintetico di 3 pagine con una tabella spezzata su tutte e tre (intestazione ripetuta,
+  poi senza intestazione) e un riepilogo con colonne diverse, per merge_tables e tables/
+
+    python tests/golden/make_fixtures.py
+"""
+
+import json
+from pathlib import Path
+
+from docling_core.types.doc import BoundingBox, CoordOrigin, DocItemLabel, DoclingDocument, ProvenanceItem, Size, \
+    TableCell, TableData
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+
+GOLDEN_DIR = Path(__file__).resolve().parent
+TOKENIZER_DIR = GOLDEN_DIR / "tokenizer"
+RUNS_DIR = GOLDEN_DIR / "runs"
+
+PAGE = Size(width=595.0, height=842.0)
+MOVEMENT_HEADER = ["Data", "Articolo", "Quantità", "Importo €"]
+ITEMS = ["Bulloni M8", "Dadi M8", "Rondelle", "Viti 4x40", "Tasselli 6", "Staffe"]
+
+
+def build_tokenizer() -> None:
+    alphabet = sorted(pre_tokenizers.ByteLevel.alphabet())
+    tokenizer = Tokenizer(models.BPE(vocab={c: i for i, c in enumerate(alphabet)}, merges=[]))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, model_max_length=1_000_000).save_pretrained(TOKENIZER_DIR)
+
+
+def _prov(page_no: int, top: float, bottom: float, length: int) -> ProvenanceItem:
+    return ProvenanceItem(
+        page_no=page_no,
+        bbox=BoundingBox(l=50.0, t=top, r=545.0, b=bottom, coord_origin=CoordOrigin.TOPLEFT),
+        charspan=(0, length),
+    )
+
+
+def _table(rows, header: bool) -> TableData:
+    cells = [
+        TableCell(
+            text=text,
+            start_row_offset_idx=r, end_row_offset_idx=r + 1,
+            start_col_offset_idx=c, end_col_offset_idx=c + 1,
+            column_header=header and r == 0,
+        )
+        for r, row in enumerate(rows)
+        for c, text in enumerate(row)
+    ]
+    return TableData(table_cells=cells, num_rows=len(rows), num_cols=len(rows[0]))
+
+
+def _movements(start: int, count: int):
+    rows = []
+    for n in range(start, start + count):
+        quantity = (n * 37) % 500 + 10
+        rows.append([
+            f"{n % 28 + 1:02d}/0{n % 3 + 1}/2024",
+            ITEMS[n % len(ITEMS)],
+            str(quantity),
+            # importo all'italiana: punto per le migliaia, virgola decimale
+            f"{quantity * 31:,},{n * 7 % 100:02d}".replace(",", ".", 1) if quantity * 31 >= 1000
+            else f"{quantity * 31},{n * 7 % 100:02d}",
+        ])
+    return rows
+
+
+def _paragraphs(page_no: int):
+    return [
+        f"Pagina {page_no}: i movimenti del trimestre sono registrati in ordine di data. "
+        f"Ogni riga riporta articolo, quantità movimentata e importo in euro con la virgola decimale; "
+        f"le giacenze sono verificate a fine mese con l'inventario fisico del magazzino {n}."
+        for n in range(1, 7)
+    ]
+
+
+def build_tables_run() -> None:
+    doc = DoclingDocument(name="tabelle-multipagina")
+    for page_no in (1, 2, 3):
+        doc.add_page(page_no=page_no, size=PAGE)
+
+    title = "Relazione trimestrale del magazzino"
+    doc.add_title(title, prov=_prov(1, 40, 60, len(title)))
+    for n, text in enumerate(_paragraphs(1)):
+        doc.add_text(DocItemLabel.TEXT, text, prov=_prov(1, 70 + 30 * n, 95 + 30 * n, len(text)))
+    heading = "Movimenti di magazzino"
+    doc.add_heading(heading, level=2, prov=_prov(1, 260, 275, len(heading)))
+    # pagina 1: intestazione + righe; pagina 2: stessa intestazione; pagina 3: senza intestazione
+    doc.add_table(_table([MOVEMENT_HEADER] + _movements(0, 14), header=True), prov=_prov(1, 280, 800, 0))
+    doc.add_table(_table([MOVEMENT_HEADER] + _movements(14, 16), header=True), prov=_prov(2, 40, 600, 0))
+    for n, text in enumerate(_paragraphs(2)[:3]):
+        doc.add_text(DocItemLabel.TEXT, text, prov=_prov(2, 620 + 40 * n, 650 + 40 * n, len(text)))
+    doc.add_table(_table(_movements(30, 8), header=False), prov=_prov(3, 40, 300, 0))
+
+    heading = "Riepilogo per articolo"
+    doc.add_heading(heading, level=2, prov=_prov(3, 320, 335, len(heading)))
+    summary = [["Articolo", "Movimenti", "Quota %"]] + [
+        [item, str(7 + n), f"{(7 + n) * 100 / 57:.1f}".replace(".", ",")] for n, item in enumerate(ITEMS)
+    ]
+    doc.add_table(_table(summary, header=True), prov=_prov(3, 340, 520, 0))
+    for n, text in enumerate(_paragraphs(3)[:4]):
+        doc.add_text(DocItemLabel.TEXT, text, prov=_prov(3, 540 + 40 * n, 570 + 40 * n, len(text)))
+
+    run_dir = RUNS_DIR / "tabelle-multipagina"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    doc.save_as_json(run_dir / "output.json")
+    with open(run_dir / "run.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "file_name": "tabelle-multipagina.pdf",
+            "ocr_enabled": False,
+            "ocr_engine_name": "no-ocr",
+            "ocr_languages": [],
+            "profile": "accurate",
+        }, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    build_tokenizer()
+    build_tables_run()
+    print(f"Fixtures written to {TOKENIZER_DIR} and {RUNS_DIR}")
@@ -0,0 +1,135 @@
+"""FanOutCoordinator: shard publishing, redelivered parents and dead-lettered shards, on FakeKafka/FakeMinio."""
+
+import asyncio
+import json
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("docling", reason="the coordinator imports the sharded Docling pipeline")
+pytest.importorskip("aiokafka")
+pytest.importorskip("minio")
+
+from benchmarks.fakes import FakeKafka, FakeMinio, FakeProducer  # noqa: E402
+from integretion.events.fanout import FanOutCoordinator  # noqa: E402
+from integretion.events.kafka_listener import KafkaListener, KafkaTopics  # noqa: E402
+from integretion.events.retry import RetryPolicy  # noqa: E402
+from integretion.models import ExtractionRequested, ShardRequested  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]
+# 9 pagine: con 3 pagine per shard sono 3 shard
+PDF = ROOT / "dataset" / "file.pdf"
+SHARDS_TOPIC = KafkaTopics.EXTRACTION_SHARDS
+
+
+class FailingProducer(FakeProducer):
+    """Fails the n-th send (1-based), like a broker timeout halfway through the fan-out."""
+
+    def __init__(self, broker: FakeKafka, fail_on: int):
+        super().__init__(broker)
+        self.fail_on = fail_on
+        self.sends = 0
+
+    async def send_and_wait(self, topic, value=None, key=None, headers=None):
+        self.sends += 1
+        if self.sends == self.fail_on:
+            raise ConnectionError("broker unavailable")
+        return await super().send_and_wait(topic, value=value, key=key, headers=headers)
+
+
+def _setup():
+    minio = FakeMinio()
+    minio.make_bucket("uploads")
+    # ensure_bucket caches the buckets per process: the output bucket must exist in every fake
+    minio.make_bucket("bucket-7")
+    data = PDF.read_bytes()
+    minio.put_object("uploads", "docs/file.pdf", BytesIO(data), len(data), "application/pdf")
+    event = ExtractionRequested(job_id="job-1", collection_id=7, file_id="f-1", bucket="uploads",
+                                object_key="docs/file.pdf", file_name="file.pdf")
+    return FakeKafka(partitions=3), minio, event, FanOutCoordinator(minio, pages_per_shard=3, min_pages=2)
+
+
+def _shards(broker: FakeKafka):
+    records = [r for tp, log in broker.logs.items() if tp.topic == SHARDS_TOPIC for r in log]
+    return [ShardRequested(**json.loads(r.value)) for r in records]
+
+
+def test_manifest_is_running_only_after_every_shard_is_published():
+    broker, minio, event, coordinator = _setup()
+
+    async def scenario():
+        producer = FailingProducer(broker, fail_on=2)
+        with pytest.raises(ConnectionError):
+            await coordinator.maybe_fan_out(event, "fast", producer, SHARDS_TOPIC, idempotency_key="k1")
+        manifest = await coordinator.store.read_manifest(event)
+        assert manifest["status"] == "publishing"
+
+        # one shard finishes before the parent is redelivered: it is not published again
+        done = next(s for s in _shards(broker))
+        await coordinator.store.put_partial(done, {"document": {}, "stats": {}})
+        published_before = {s.shard_index for s in _shards(broker)}
+
+        assert await coordinator.maybe_fan_out(event, "fast", FakeProducer(broker), SHARDS_TOPIC,
+                                               idempotency_key="k1")
+        manifest = await coordinator.store.read_manifest(event)
+        assert manifest["status"] == "running"
+        shards = _shards(broker)
+        assert {s.run_id for s in shards} == {manifest["run_id"]}
+        assert {s.shard_index for s in shards} == set(range(manifest["num_shards"]))
+        assert sum(s.shard_index == done.shard_index for s in shards) == 1
+        assert len(shards) == len(published_before) + manifest["num_shards"] - 1
+
+        # a further redelivery publishes nothing
+        assert await coordinator.maybe_fan_out(event, "fast", FakeProducer(broker), SHARDS_TOPIC,
+                                               idempotency_key="k1")
+        assert len(_shards(broker)) == len(shards)
+
+    asyncio.run(scenario())
+
+
+def test_without_idempotency_key_a_redelivery_starts_a_new_run():
+    broker, minio, event, coordinator = _setup()
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            await coordinator.maybe_fan_out(event, "fast", FailingProducer(broker, fail_on=3), SHARDS_TOPIC)
+        first = await coordinator.store.read_manifest(event)
+
+        assert await coordinator.maybe_fan_out(event, "fast", FakeProducer(broker), SHARDS_TOPIC)
+        second = await coordinator.store.read_manifest(event)
+        assert second["run_id"] != first["run_id"]
+        assert second["status"] == "running"
+        assert sorted(s.shard_index for s in _shards(broker) if s.run_id == second["run_id"]) == [0, 1, 2]
+
+    asyncio.run(scenario())
+
+
+def test_dead_lettered_shard_fails_the_parent_once():
+    broker, minio, event, coordinator = _setup()
+    listener = KafkaListener("fake:9092", "group", minio, retry_policy=RetryPolicy(max_attempts=1),
+                             fan_out=coordinator)
+    listener.producer = FakeProducer(broker)
+
+    async def scenario():
+        await coordinator.maybe_fan_out(event, "fast", listener.producer, SHARDS_TOPIC, idempotency_key="k1")
+        shard_records = [r for tp, log in broker.logs.items() if tp.topic == SHARDS_TOPIC for r in log]
+        for record in shard_records[:2]:
+            await listener._reroute_failed(record, RuntimeError("worker killed"), 1.0)
+
+        manifest = await coordinator.store.read_manifest(event)
+        assert manifest["status"] == "failed"
+        assert len(manifest["failed_shards"]) == 2
+
+        parent_dlq = [r for tp, log in broker.logs.items()
+                      if tp.topic == listener.retry_policy.dlq_topic(KafkaTopics.EXTRACTION_REQUESTED) for r in log]
+        assert len(parent_dlq) == 1
+        record = json.loads(parent_dlq[0].value)
+        assert record["event"]["job_id"] == "job-1"
+        assert record["fan_out"]["run_id"] == manifest["run_id"]
+
+        # the remaining shard is not assembled into a failed run
+        last = ShardRequested(**json.loads(shard_records[2].value))
+        assert await coordinator.mark_failed(last, "late") is None
+
+    asyncio.run(scenario())
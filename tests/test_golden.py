@@ -0,0 +1,292 @@
+"""
+Regressione golden della pipeline su un piccolo corpus.
+
+I casi sono in tests/golden/corpus.json, con sha256 del sorgente:
+- "pipeline" (default): pipeline completa (run_docling_parsing) su un file di dataset/ con
+  il suo profilo; servono i modelli Docling
+- "rerender": solo gli stadi a valle (docparser.rerender) da una run dir salvata (in output/
+  o tra i fixture di tests/golden/runs/), senza modelli: merge tabelle, markdown, immagini,
+  export tables/, chunking
+
+Per ogni caso la run gira una volta (più un warm-up non misurato, per non contare il
+caricamento dei modelli; --budget-runs volte quando si registrano i budget, che sono la
+mediana) e si confronta con tests/golden/<caso>/:
+- output.md: markdown finale (merge_tables, immagini, header)
+- chunks.json: output del chunker, con il tokenizer offline di tests/golden/tokenizer/
+  (DOCPARSER_TOKENIZER, impostato in conftest.py)
+- stats.json: conteggi (pagine, tabelle, gruppi di tabelle, immagini, lingue OCR) e indice
+  dei gruppi esportati in tables/ (tabelle e pagine sorgente, righe, dtype delle colonne)
+
+I tempi di ogni stage (stats["timings"] più run_s, la chiamata intera) devono restare entro
+il budget di tests/golden/budgets.json più il margine (--budget-margin). Golden e budget
+si rigenerano di proposito con --update-goldens (o solo i budget con --update-budgets)
+e le differenze si rivedono nel diff prima del commit.
+"""
+
+import difflib
+import hashlib
+import json
+import os
+import statistics
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+pytest.importorskip("docling", reason="the golden suite runs the real Docling pipeline")
+
+from docparser.chunking import get_tokenizer  # noqa: E402
+from docparser.pipeline import run_docling_parsing  # noqa: E402
+from docparser.rerender import load_parse_result, rerender_run_dir  # noqa: E402
+from docparser.tables import TABLES_INDEX  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]
+GOLDEN_DIR = ROOT / "tests" / "golden"
+CORPUS_FILE = GOLDEN_DIR / "corpus.json"
+
+# Chiavi di stats confrontate con stats.json (i tempi hanno i loro budget)
+GOLDEN_STATS_KEYS = (
+    "num_pages",
+    "num_tables",
+    "num_table_groups",
+    "num_pictures",
+    "num_images_saved",
+    "ocr_languages",
+)
+# Chiavi di tables/tables.json confrontate (i path dei file dipendono da pyarrow)
+GOLDEN_TABLE_KEYS = ("source_tables", "source_pages", "rows", "columns")
+# Stage che includono il chunking: senza tokenizer misurano solo il ripiego, niente budget
+CHUNKING_STAGES = ("chunking_s", "postprocess_s", "total_s", "run_s")
+# Sforamento sempre ammesso in secondi, oltre al margine (scheduler, GC, cache del disco)
+BUDGET_MIN_SLACK_S = 0.1
+# Righe di diff mostrate in caso di differenza
+DIFF_MAX_LINES = 60
+
+
+def _load_cases() -> List[Dict[str, Any]]:
+    return json.loads(CORPUS_FILE.read_text(encoding="utf-8"))["cases"]
+
+
+CASES = _load_cases()
+
+
+def _tokenizer_available() -> bool:
+    try:
+        get_tokenizer()
+    except Exception:
+        return False
+    return True
+
+
+TOKENIZER_AVAILABLE = _tokenizer_available()
+
+
+@dataclass
+class GoldenRun:
+    case: Dict[str, Any]
+    markdown: str
+    chunks: List[Dict[str, Any]]
+    stats: Dict[str, Any]
+    timings: Dict[str, float]
+
+    @property
+    def golden_dir(self) -> Path:
+        return GOLDEN_DIR / self.case["name"]
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _is_rerender(case: Dict[str, Any]) -> bool:
+    return case.get("kind", "pipeline") == "rerender"
+
+
+def _source(case: Dict[str, Any]) -> Path:
+    if _is_rerender(case):
+        return ROOT / case["run_dir"] / "output.json"
+    return ROOT / case["file"]
+
+
+def _tables_index(result) -> List[Dict[str, Any]]:
+    index = result.run_dir / TABLES_INDEX
+    if not index.exists():
+        return []
+    return json.loads(index.read_text(encoding="utf-8"))
+
+
+def _table_group(group: Dict[str, Any]) -> Dict[str, Any]:
+    summary = {key: group[key] for key in GOLDEN_TABLE_KEYS}
+    # "datetime64[ns]" o "[us]" a seconda della versione di pandas: conta solo il tipo
+    summary["columns"] = {column: dtype.split("[")[0] for column, dtype in group["columns"].items()}
+    return summary
+
+
+def _run_case(case: Dict[str, Any], run_dir: Path) -> GoldenRun:
+    # path relativo alla root: l'header di output.md ("File: ...") non dipende dalla macchina
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        t_start = time.perf_counter()
+        if _is_rerender(case):
+            rerender_run_dir(case["run_dir"], dest_dir=run_dir)
+            result = load_parse_result(run_dir)
+        else:
+            result = run_docling_parsing(file_path=case["file"], run_dir=run_dir, profile=case["profile"])
+        run_s = time.perf_counter() - t_start
+    finally:
+        os.chdir(cwd)
+
+    stats = {key: result.stats.get(key) for key in GOLDEN_STATS_KEYS}
+    stats["image_rel_paths"] = sorted(p for p in result.image_rel_paths if p)
+    stats["table_groups"] = [_table_group(group) for group in _tables_index(result)]
+    timings = {k: v for k, v in result.stats.get("timings", {}).items() if isinstance(v, (int, float))}
+    timings["run_s"] = run_s
+    if not TOKENIZER_AVAILABLE:
+        timings = {k: v for k, v in timings.items() if k not in CHUNKING_STAGES}
+    return GoldenRun(
+        case=case,
+        markdown=result.markdown_path.read_text(encoding="utf-8"),
+        chunks=json.loads(result.chunks_path.read_text(encoding="utf-8")),
+        stats=stats,
+        timings=timings,
+    )
+
+
+def _write_golden(run: GoldenRun) -> None:
+    run.golden_dir.mkdir(parents=True, exist_ok=True)
+    (run.golden_dir / "output.md").write_text(run.markdown, encoding="utf-8")
+    goldens = [("stats.json", run.stats)]
+    if TOKENIZER_AVAILABLE:
+        # senza tokenizer chunks.json è vuoto: il golden esistente resta com'è
+        goldens.append(("chunks.json", run.chunks))
+    for name, data in goldens:
+        with open(run.golden_dir / name, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    print(f"Updated golden outputs in {run.golden_dir}")
+
+
+def _update_corpus_hash(case: Dict[str, Any], sha256: str) -> None:
+    corpus = json.loads(CORPUS_FILE.read_text(encoding="utf-8"))
+    for entry in corpus["cases"]:
+        if entry["name"] == case["name"]:
+            entry["sha256"] = sha256
+    with open(CORPUS_FILE, "w", encoding="utf-8") as f:
+        json.dump(corpus, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+@pytest.fixture(scope="module", params=CASES, ids=[case["name"] for case in CASES])
+def golden_run(request, tmp_path_factory, golden_timings, stage_budgets) -> GoldenRun:
+    case = request.param
+    config = request.config
+    update_goldens = config.getoption("update_goldens")
+
+    source = _source(case)
+    label = source.relative_to(ROOT)
+    if not source.exists():
+        pytest.fail(f"Corpus file {label} is missing")
+    sha256 = _sha256(source)
+    if sha256 != case.get("sha256"):
+        if not update_goldens:
+            pytest.fail(f"{label} changed since its goldens were recorded: "
+                        f"review it and refresh with --update-goldens")
+        _update_corpus_hash(case, sha256)
+
+    recorded = case["name"] in stage_budgets or any(
+        (GOLDEN_DIR / case["name"] / name).exists() for name in ("output.md", "chunks.json", "stats.json"))
+    if not (recorded or update_goldens or config.getoption("update_budgets")):
+        # niente da confrontare: non si paga la run (né servono i modelli)
+        pytest.skip(f"No goldens or budgets for {case['name']}: record them with --update-goldens")
+
+    run_root = tmp_path_factory.mktemp(case["name"])
+    record_budgets = update_goldens or config.getoption("update_budgets")
+    measure = not config.getoption("no_budgets") or record_budgets
+    if measure:
+        # warm-up: modelli e converter (lingue/scala del caso) in cache fuori dalle misure
+        _run_case(case, run_root / "warmup")
+    run = _run_case(case, run_root / "run")
+
+    if measure:
+        runs = [run]
+        if record_budgets:
+            runs += [_run_case(case, run_root / f"run-{n}") for n in range(1, config.getoption("budget_runs"))]
+        golden_timings[case["name"]] = _median_timings(runs)
+    if update_goldens:
+        _write_golden(run)
+    return run
+
+
+def _median_timings(runs: List[GoldenRun]) -> Dict[str, float]:
+    stages = {stage for run in runs for stage in run.timings}
+    return {
+        stage: statistics.median(run.timings[stage] for run in runs if stage in run.timings)
+        for stage in sorted(stages)
+    }
+
+
+def _diff(expected: str, actual: str, label: str) -> str:
+    lines = list(difflib.unified_diff(
+        expected.splitlines(), actual.splitlines(),
+        fromfile=f"golden/{label}", tofile=f"actual/{label}", lineterm="",
+    ))
+    if len(lines) > DIFF_MAX_LINES:
+        lines = lines[:DIFF_MAX_LINES] + [f"... ({len(lines) - DIFF_MAX_LINES} more diff lines)"]
+    return "\n".join(lines)
+
+
+def _golden_file(run: GoldenRun, name: str) -> Path:
+    path = run.golden_dir / name
+    if not path.exists():
+        pytest.skip(f"No golden {name} for {run.case['name']}: record it with --update-goldens")
+    return path
+
+
+def _as_json_text(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def test_markdown_matches_golden(golden_run: GoldenRun):
+    expected = _golden_file(golden_run, "output.md").read_text(encoding="utf-8")
+    assert golden_run.markdown == expected, \
+        "output.md differs from golden:\n" + _diff(expected, golden_run.markdown, "output.md")
+
+
+def test_chunks_match_golden(golden_run: GoldenRun):
+    if not TOKENIZER_AVAILABLE:
+        pytest.skip("the tokenizer of the chunker is not available")
+    expected = json.loads(_golden_file(golden_run, "chunks.json").read_text(encoding="utf-8"))
+    assert golden_run.chunks == expected, "chunks.json differs from golden:\n" + _diff(
+        _as_json_text(expected), _as_json_text(golden_run.chunks), "chunks.json")
+
+
+def test_stats_match_golden(golden_run: GoldenRun):
+    expected = json.loads(_golden_file(golden_run, "stats.json").read_text(encoding="utf-8"))
+    assert golden_run.stats == expected, "stats differ from golden:\n" + _diff(
+        _as_json_text(expected), _as_json_text(golden_run.stats), "stats.json")
+
+
+def test_stage_budgets(golden_run: GoldenRun, stage_budgets, request):
+    config = request.config
+    if config.getoption("no_budgets"):
+        pytest.skip("--no-budgets")
+    if config.getoption("update_goldens") or config.getoption("update_budgets"):
+        pytest.skip("budgets are being refreshed by this run")
+    budget = stage_budgets.get(golden_run.case["name"])
+    if not budget:
+        pytest.skip(f"No budgets for {golden_run.case['name']}: record them with --update-budgets")
+
+    margin = config.getoption("budget_margin")
+    over = []
+    for stage, budget_s in sorted(budget.items()):
+        actual = golden_run.timings.get(stage)
+        if actual is None:
+            # stage non eseguito in questa run (es. nessun pre-pass OCR)
+            continue
+        limit = max(budget_s * (1 + margin), budget_s + BUDGET_MIN_SLACK_S)
+        if actual > limit:
+            over.append(f"{stage}: {actual:.3f}s > {limit:.3f}s (budget {budget_s:.3f}s, margin {margin:.0%})")
+    assert not over, "stages over budget:\n" + "\n".join(over)
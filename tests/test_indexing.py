@@ -0,0 +1,150 @@
+"""ChunkIndex: reindicizzazione, merge, rimozione di run e refresh tra istanze, con il tokenizer regex."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("docling", reason="docparser imports the Docling pipeline")
+
+from docparser.indexing import ChunkIndex  # noqa: E402
+
+QUERIES = ("penale consegna", "magazzino inventario", "fattura", "contratto fornitura")
+
+
+def _write_run(root: Path, name: str, focus_texts, file_name: str = None) -> Path:
+    run_dir = root / name
+    run_dir.mkdir(parents=True, exist_ok=True)
+    chunks = [
+        {"id": i, "prev": "", "focus": text, "next": "", "metadata": {"page_numbers": [i + 1]}}
+        for i, text in enumerate(focus_texts)
+    ]
+    (run_dir / "chunks.json").write_text(json.dumps(chunks, ensure_ascii=False), encoding="utf-8")
+    (run_dir / "run.json").write_text(json.dumps({"file_name": file_name or f"{name}.pdf"}), encoding="utf-8")
+    return run_dir
+
+
+def _runs(root: Path):
+    return [
+        _write_run(root, "contratto", ["Contratto di fornitura con penale per ritardata consegna",
+                                       "La consegna avviene entro trenta giorni dalla firma"]),
+        _write_run(root, "magazzino", ["Inventario fisico del magazzino a fine mese",
+                                       "Movimenti di magazzino e fattura del fornitore"]),
+        _write_run(root, "fatture", ["Fattura numero 12 del contratto di fornitura",
+                                     "Pagamento della fattura a sessanta giorni",
+                                     "Nota di credito per la penale"]),
+    ]
+
+
+def _results(index: ChunkIndex):
+    # a parità di punteggio l'ordine dipende dai segmenti: si ordina per run e chunk
+    return {
+        query: sorted(((round(hit.score, 4), Path(hit.run).name, hit.chunk_id, hit.pages, hit.focus)
+                       for hit in index.search(query, k=10)), key=lambda r: (-r[0], r[1], r[2]))
+        for query in QUERIES
+    }
+
+
+def _index(tmp_path: Path, **kwargs) -> ChunkIndex:
+    return ChunkIndex(tmp_path / "index", tokenizer="regex", **kwargs)
+
+
+def test_reindexing_a_run_hides_its_old_chunks(tmp_path):
+    index = _index(tmp_path)
+    runs = _runs(tmp_path)
+    for run in runs:
+        index.add_run(run)
+    assert index.stats()["chunks"] == 7
+
+    _write_run(tmp_path, "contratto", ["Contratto rinnovato senza clausole"])
+    assert index.add_run(runs[0]) == 1
+
+    assert not [hit for hit in index.search("penale consegna") if Path(hit.run).name == "contratto"]
+    hits = index.search("clausole")
+    assert [(Path(hit.run).name, hit.chunk_id, hit.file_name) for hit in hits] == [("contratto", 0, "contratto.pdf")]
+    assert index.stats()["chunks"] == 6
+    index.close()
+
+
+def test_merge_preserves_search_results(tmp_path):
+    index = _index(tmp_path)
+    runs = _runs(tmp_path)
+    for run in runs:
+        index.add_run(run)
+    # un chunk morto nel primo segmento: il merge lo deve scartare
+    _write_run(tmp_path, "contratto", ["Contratto di fornitura con penale", "Consegna entro trenta giorni"])
+    index.add_run(runs[0])
+    before = _results(index)
+    assert any(before.values())
+    old_segments = list(index.manifest["segments"])
+
+    assert index.merge() is not None
+    assert len(index.manifest["segments"]) == 1
+    assert _results(index) == before
+    assert not any((tmp_path / "index" / name).exists() for name in old_segments)
+
+    # un'altra istanza legge lo stesso indice fuso
+    reopened = _index(tmp_path)
+    assert _results(reopened) == before
+    reopened.close()
+    index.close()
+
+
+def test_automatic_merge_over_max_segments_preserves_results(tmp_path):
+    reference = ChunkIndex(tmp_path / "reference", tokenizer="regex")
+    reference.add_runs(_runs(tmp_path))
+    index = _index(tmp_path, max_segments=2, merge_factor=2)
+    for run in _runs(tmp_path):
+        index.add_run(run)
+
+    assert len(index.manifest["segments"]) <= 2
+    assert _results(index) == _results(reference)
+    reference.close()
+    index.close()
+
+
+def test_remove_run_hides_its_hits(tmp_path):
+    index = _index(tmp_path)
+    runs = _runs(tmp_path)
+    index.add_runs(runs)
+    assert any(Path(hit.run).name == "fatture" for hit in index.search("fattura"))
+
+    assert index.remove_run(runs[2])
+    assert not [hit for hit in index.search("fattura") if Path(hit.run).name == "fatture"]
+    assert index.search("sessanta") == []
+    assert index.stats()["chunks"] == 4
+    assert not index.remove_run(runs[2])
+
+    # anche dopo il merge e per un'istanza nuova
+    index.merge()
+    assert index.search("sessanta") == []
+    reopened = _index(tmp_path)
+    assert reopened.search("sessanta") == []
+    reopened.close()
+    index.close()
+
+
+def test_refresh_sees_another_instance_commit(tmp_path):
+    reader = _index(tmp_path)
+    writer = ChunkIndex(tmp_path / "index")  # tokenizer letto dal manifest
+    assert writer.manifest["tokenizer"] == "regex"
+
+    writer.add_run(_runs(tmp_path)[1])
+    assert reader.search("inventario") == []
+
+    reader.refresh()
+    assert [Path(hit.run).name for hit in reader.search("inventario")] == ["magazzino"]
+    assert _results(reader) == _results(writer)
+
+    writer.remove_run(tmp_path / "magazzino")
+    reader.refresh()
+    assert reader.search("inventario") == []
+    writer.close()
+    reader.close()
+
+
+def test_tokenizer_mismatch_is_rejected(tmp_path):
+    _index(tmp_path).close()
+    with pytest.raises(ValueError, match="tokenizer"):
+        ChunkIndex(tmp_path / "index", tokenizer="chunker")
@@ -0,0 +1,104 @@
+"""PartitionOffsetTracker: ordered commits with out-of-order completion, without a broker."""
+
+from integretion.events.offsets import PartitionOffsetTracker
+
+TP0 = ("extraction", 0)
+TP1 = ("extraction", 1)
+
+
+def _tracker(*offsets, tp=TP0) -> PartitionOffsetTracker:
+    tracker = PartitionOffsetTracker()
+    for offset in offsets:
+        tracker.add(tp, offset)
+    return tracker
+
+
+def test_out_of_order_completion_waits_for_the_head():
+    tracker = _tracker(10, 11, 12)
+    tracker.mark_done(TP0, 11)
+    tracker.mark_done(TP0, 12)
+    assert tracker.committable() == {}
+    assert tracker.in_flight(TP0) == 1
+
+    tracker.mark_done(TP0, 10)
+    assert tracker.committable() == {TP0: 13}
+
+
+def test_committable_stops_at_the_first_unfinished_offset():
+    tracker = _tracker(10, 11, 12, 13)
+    for offset in (10, 11, 13):
+        tracker.mark_done(TP0, offset)
+    assert tracker.committable() == {TP0: 12}
+
+
+def test_gaps_in_offsets_are_allowed():
+    # compacted topics / transaction markers: offsets are increasing but not contiguous
+    tracker = _tracker(5, 9, 20)
+    tracker.mark_done(TP0, 5)
+    tracker.mark_done(TP0, 9)
+    assert tracker.committable() == {TP0: 10}
+
+
+def test_failed_commit_is_returned_again():
+    tracker = _tracker(1, 2)
+    tracker.mark_done(TP0, 1)
+    assert tracker.committable() == {TP0: 2}
+    # commit failed: mark_committed not called, nothing is lost
+    assert tracker.committable() == {TP0: 2}
+
+    tracker.mark_done(TP0, 2)
+    offsets = tracker.committable()
+    assert offsets == {TP0: 3}
+    tracker.mark_committed(offsets)
+    assert tracker.committable() == {}
+    assert tracker.committed(TP0) == 3
+    assert tracker.in_flight() == 0
+
+
+def test_mark_committed_keeps_later_offsets():
+    tracker = _tracker(1, 2, 3)
+    tracker.mark_done(TP0, 1)
+    offsets = tracker.committable()
+    # offset 2 completes while the commit of 1 is in progress
+    tracker.mark_done(TP0, 2)
+    tracker.mark_committed(offsets)
+    assert tracker.committed(TP0) == 2
+    assert tracker.committable() == {TP0: 3}
+    assert tracker.in_flight(TP0) == 1
+
+
+def test_stale_commit_does_not_move_backwards():
+    tracker = _tracker(1, 2)
+    tracker.mark_done(TP0, 1)
+    tracker.mark_done(TP0, 2)
+    tracker.mark_committed({TP0: 3})
+    tracker.mark_committed({TP0: 2})
+    assert tracker.committed(TP0) == 3
+
+
+def test_partitions_are_independent():
+    tracker = _tracker(1, 2)
+    tracker.add(TP1, 7)
+    tracker.mark_done(TP1, 7)
+    tracker.mark_done(TP0, 2)
+    assert tracker.committable() == {TP1: 8}
+    assert tracker.in_flight(TP0) == 1
+    assert tracker.in_flight(TP1) == 0
+
+
+def test_forget_drops_revoked_partitions():
+    tracker = _tracker(1, 2)
+    tracker.add(TP1, 4)
+    tracker.mark_done(TP0, 1)
+    offsets = tracker.committable()
+
+    tracker.forget([TP0])
+    # a commit that completes after the revoke does not resurrect the partition
+    tracker.mark_committed(offsets)
+    assert tracker.committed(TP0) is None
+    assert tracker.committable() == {}
+    assert tracker.in_flight() == 1
+
+    # late completions of revoked offsets are ignored
+    tracker.mark_done(TP0, 2)
+    assert tracker.in_flight() == 1
@@ -0,0 +1,65 @@
+"""run.json: gli esiti dei report OCR uniti dopo la scrittura della run arrivano su disco e sopravvivono al rerender."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("docling", reason="docparser imports the Docling pipeline")
+
+from docparser.core import _join_reports  # noqa: E402
+from docparser.pipeline import RUN_METADATA_FILE  # noqa: E402
+from docparser.reports.background import ReportOutcome  # noqa: E402
+from docparser.rerender import load_parse_result, rerender_run_dir  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]
+# run dir sintetica della suite golden (tests/golden/make_fixtures.py): niente modelli
+STORED_RUN = ROOT / "tests" / "golden" / "runs" / "tabelle-multipagina"
+
+
+class FinishedReports:
+    """ComparisonReports già conclusi: join() ritorna gli esiti dati."""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+
+    def join(self, ocr_engine_name):
+        return self.outcomes
+
+
+def _run(tmp_path: Path):
+    run_dir = tmp_path / "run"
+    rerender_run_dir(STORED_RUN, dest_dir=run_dir)
+    return load_parse_result(run_dir)
+
+
+def test_joined_report_outcomes_are_written_to_run_json(tmp_path):
+    result = _run(tmp_path)
+    assert "reports" not in result.stats
+    _join_reports(FinishedReports([
+        ReportOutcome(name="easyocr", status="timeout", elapsed_s=30.0, message="still running"),
+        ReportOutcome(name="openai", status="skipped"),
+    ]), result)
+
+    expected = [{"name": "easyocr", "status": "timeout", "elapsed_s": 30.0, "path": None,
+                 "message": "still running"}]
+    assert result.stats["reports"] == expected
+    metadata = json.loads((result.run_dir / RUN_METADATA_FILE).read_text(encoding="utf-8"))
+    assert metadata["stats"]["reports"] == expected
+    # il resto di run.json non cambia
+    assert metadata["file_name"] == "tabelle-multipagina.pdf"
+    assert metadata["stats"]["num_table_groups"] == 2
+    assert load_parse_result(result.run_dir).stats["reports"] == expected
+
+    # un rerender sul posto rigenera le stats ma conserva gli esiti dei report
+    rerender_run_dir(result.run_dir)
+    assert load_parse_result(result.run_dir).stats["reports"] == expected
+
+
+def test_only_skipped_reports_leave_run_json_unchanged(tmp_path):
+    result = _run(tmp_path)
+    before = (result.run_dir / RUN_METADATA_FILE).read_text(encoding="utf-8")
+    _join_reports(FinishedReports([ReportOutcome(name="easyocr", status="skipped")]), result)
+
+    assert "reports" not in result.stats
+    assert (result.run_dir / RUN_METADATA_FILE).read_text(encoding="utf-8") == before
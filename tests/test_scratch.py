@@ -0,0 +1,63 @@
+"""ScratchSpace: processes sharing a root only adopt the job dirs of owners that have exited."""
+
+import asyncio
+
+from integretion.scratch import JOBS_DIR, ScratchSpace
+
+
+def _allocate(space: ScratchSpace, job_id: str):
+    return asyncio.run(space.allocate(job_id))
+
+
+def test_live_owner_dirs_are_not_adopted(tmp_path):
+    first = ScratchSpace(root=str(tmp_path))
+    scratch = _allocate(first, "job-a")
+
+    second = ScratchSpace(root=str(tmp_path))
+    assert scratch.path.is_dir()
+    assert second.metrics()["failed_dirs_kept_total"] == 0
+    assert second.metrics()["failed_dirs_present"] == 0
+
+
+def test_dirs_of_exited_owners_are_kept_as_failed(tmp_path):
+    first = ScratchSpace(root=str(tmp_path))
+    scratch = _allocate(first, "job-a")
+    # process exit: the kernel drops the owner lock
+    first._owner_lock.close()
+
+    second = ScratchSpace(root=str(tmp_path))
+    assert not scratch.path.exists()
+    assert (tmp_path / "failed" / scratch.path.name / "input").is_dir()
+    assert second.metrics()["failed_dirs_kept_total"] == 1
+    assert sorted(p.name for p in (tmp_path / JOBS_DIR).iterdir()) == [second.owner]
+
+
+def test_job_dirs_without_owner_are_adopted(tmp_path):
+    legacy = tmp_path / JOBS_DIR / "job-old-1234abcd"
+    (legacy / "output").mkdir(parents=True)
+
+    space = ScratchSpace(root=str(tmp_path))
+    assert (tmp_path / "failed" / legacy.name / "output").is_dir()
+    assert space.metrics()["failed_dirs_kept_total"] == 1
+
+
+def test_failed_dirs_total_is_cumulative_and_present_is_current(tmp_path):
+    space = ScratchSpace(root=str(tmp_path), failed_ttl_s=0)
+
+    async def fail(job_id):
+        try:
+            async with space.job(job_id):
+                raise RuntimeError("conversion failed")
+        except RuntimeError:
+            pass
+
+    asyncio.run(fail("job-a"))
+    asyncio.run(fail("job-b"))
+    assert space.metrics()["failed_dirs_kept_total"] == 2
+    assert space.metrics()["failed_dirs_present"] == 2
+
+    assert space.sweep() == 2
+    metrics = space.metrics()
+    assert metrics["failed_dirs_kept_total"] == 2
+    assert metrics["failed_dirs_present"] == 0
+    assert metrics["expired"] == 2
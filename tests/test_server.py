@@ -0,0 +1,115 @@
+"""ConversionService e handler HTTP: richieste non valide (400), upload troppo grandi (413), coda piena (429)."""
+
+import http.client
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("docling", reason="docparser imports the Docling pipeline")
+
+from docparser import server  # noqa: E402
+from docparser.server import ConversionService, ServiceSaturated, build_http_server  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]
+PDF = str(ROOT / "dataset" / "file.pdf")
+
+
+@pytest.fixture
+def blocked_service(monkeypatch, tmp_path):
+    """Servizio con 1 worker e nessun posto in coda; le conversioni restano ferme fino a release.set()."""
+    release = threading.Event()
+
+    def fake_process_document(**kwargs):
+        release.wait(5)
+        raise RuntimeError("conversion not available in tests")
+
+    monkeypatch.setattr(server, "process_document", fake_process_document)
+    service = ConversionService(output_root=str(tmp_path), max_workers=1, max_queue=0)
+    yield service, release
+    release.set()
+    service.shutdown()
+
+
+@pytest.fixture
+def http_server(blocked_service):
+    service, release = blocked_service
+    httpd = build_http_server(service, port=0, max_upload_mb=1)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, service, release
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _post(httpd, path: str, body: bytes = b"", headers=None):
+    conn = http.client.HTTPConnection(*httpd.server_address, timeout=5)
+    try:
+        conn.putrequest("POST", path)
+        headers = {"Content-Type": "application/json", "Content-Length": str(len(body)), **(headers or {})}
+        for key, value in headers.items():
+            conn.putheader(key, value)
+        conn.endheaders()
+        if body:
+            conn.send(body)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+
+
+def test_service_rejects_when_saturated(blocked_service):
+    service, release = blocked_service
+    job = service.submit(PDF)
+    with pytest.raises(ServiceSaturated):
+        service.submit(PDF)
+
+    release.set()
+    service.wait(job)
+    assert job.status == server.JOB_FAILED
+    # lo slot torna libero a fine job
+    service.submit(PDF)
+
+
+def test_service_rejects_unknown_profile(blocked_service):
+    service, _ = blocked_service
+    with pytest.raises(ValueError):
+        service.submit(PDF, profile="nope")
+    assert service.snapshot()["queued"] == 0
+
+
+@pytest.mark.parametrize("query", ["timeout=abc", "timeout=-1", "timeout=0", "timeout=nan", "timeout=inf"])
+def test_invalid_timeout_is_400(http_server, query):
+    httpd, _, _ = http_server
+    status, payload = _post(httpd, f"/convert?{query}", json.dumps({"path": PDF}).encode())
+    assert status == 400
+    assert "timeout" in payload["error"]
+
+
+@pytest.mark.parametrize("length", ["-1", "abc"])
+def test_invalid_content_length_is_400(http_server, length):
+    httpd, _, _ = http_server
+    status, payload = _post(httpd, "/convert", headers={"Content-Length": length})
+    assert status == 400
+    assert "Content-Length" in payload["error"]
+
+
+def test_too_large_upload_is_413(http_server):
+    httpd, _, _ = http_server
+    status, _ = _post(httpd, "/convert", headers={"Content-Length": str(2 * 1024 * 1024)})
+    assert status == 413
+
+
+def test_saturated_service_is_429(http_server):
+    httpd, service, _ = http_server
+    service.submit(PDF)
+    status, payload = _post(httpd, "/convert?wait=false", json.dumps({"path": PDF}).encode())
+    assert status == 429
+    assert "error" in payload
+
+
+def test_unknown_profile_is_400(http_server):
+    httpd, _, _ = http_server
+    status, _ = _post(httpd, "/convert?profile=nope", json.dumps({"path": PDF}).encode())
+    assert status == 400
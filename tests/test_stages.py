@@ -0,0 +1,49 @@
+"""Stage batch workers: every queued job gets an outcome, even from a misbehaving batch_fn."""
+
+import asyncio
+
+from integretion.events.stages import Stage, StageJob
+
+
+def _run_batch(batch_fn, count: int):
+    async def scenario():
+        stage = Stage("convert", fn=None, workers=1, queue_size=count,
+                      batch_fn=batch_fn, batch_size=count, batch_wait_s=0.05)
+        loop = asyncio.get_running_loop()
+        jobs = [StageJob(event=i, profile="fast", future=loop.create_future()) for i in range(count)]
+        for job in jobs:
+            stage.queue.put_nowait(job)
+        stage.start()
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(*(job.future for job in jobs), return_exceptions=True), timeout=2)
+        finally:
+            await stage.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_short_batch_fails_the_jobs_without_outcome():
+    async def batch_fn(jobs):
+        return [job.event * 10 for job in jobs[:2]]
+
+    results = _run_batch(batch_fn, 3)
+    assert [r.payload for r in results[:2]] == [0, 10]
+    assert isinstance(results[2], RuntimeError)
+
+
+def test_long_batch_keeps_one_outcome_per_job():
+    async def batch_fn(jobs):
+        return [job.event for job in jobs] + ["extra"]
+
+    results = _run_batch(batch_fn, 2)
+    # extra outcomes are dropped (and logged), the jobs keep theirs
+    assert [r.payload for r in results] == [0, 1]
+
+
+def test_batch_exception_fails_every_job():
+    async def batch_fn(jobs):
+        raise ValueError("converter crashed")
+
+    results = _run_batch(batch_fn, 2)
+    assert all(isinstance(r, ValueError) for r in results)
@@ -0,0 +1,70 @@
+"""Export delle tabelle: inferenza dei dtype (una convenzione per colonna), nomi di colonna e provenienza."""
+
+from types import SimpleNamespace
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("docling", reason="docparser imports the Docling pipeline")
+
+from docparser.tables import PROVENANCE_COLUMNS, _infer_series, _unique_column_names, \
+    table_group_frame  # noqa: E402
+
+
+def _infer(values):
+    result = _infer_series(pd.Series(values))
+    return str(result.dtype), [None if pd.isna(v) else v for v in result.tolist()]
+
+
+def test_dot_decimals_are_not_read_as_thousands():
+    assert _infer(["1.5", "2.125", "3.0"]) == ("Float64", [1.5, 2.125, 3.0])
+    assert _infer(["0.250", "1.5"]) == ("Float64", [0.25, 1.5])
+    assert _infer(["1.234", "5.678"]) == ("Float64", [1.234, 5.678])
+
+
+def test_decimal_comma_column():
+    # "2.000" è ambiguo: nella colonna con virgola decimale vale duemila
+    assert _infer(["1.234,56", "2.000", "12,5"]) == ("Float64", [1234.56, 2000.0, 12.5])
+    assert _infer(["€ 1.234,50", "12,00 €", ""]) == ("Float64", [1234.5, 12.0, None])
+
+
+def test_mixed_conventions_stay_strings():
+    dtype, values = _infer(["1.234,5", "1.5"])
+    assert dtype == "string"
+    assert values == ["1.234,5", "1.5"]
+
+
+def test_integers_and_dates():
+    assert _infer(["12", " 13 ", None]) == ("Int64", [12, 13, None])
+    dtype, values = _infer(["2024-01-02", "2024-02-03"])
+    assert dtype.startswith("datetime64")
+    assert _infer(["12", "abc"])[0] == "string"
+
+
+def test_unique_column_names():
+    assert _unique_column_names(["Totale", "Totale", "", 3, "Totale_1"]) == \
+        ["Totale", "Totale_1", "column_2", "3", "Totale_1_1"]
+
+
+def _doc(*pages):
+    return SimpleNamespace(tables=[SimpleNamespace(prov=[SimpleNamespace(page_no=page)]) for page in pages])
+
+
+def test_table_group_frame_provenance():
+    df = pd.DataFrame([["a", "1,5"], ["b", "2,5"], ["c", "3"]], columns=["Voce", "_source_row"])
+    group = {"df": df, "indices": [0, 2], "parts": [(0, 2), (2, 1)]}
+
+    frame = table_group_frame(_doc(1, 1, 4), group)
+    assert list(frame.columns) == PROVENANCE_COLUMNS + ["Voce", "_source_row_1"]
+    assert frame["_source_table"].tolist() == [0, 0, 2]
+    assert frame["_source_page"].tolist() == [1, 1, 4]
+    assert frame["_source_row"].tolist() == [0, 1, 0]
+    assert frame["_source_row_1"].tolist() == [1.5, 2.5, 3.0]
+
+
+def test_table_group_frame_without_parts():
+    group = {"df": pd.DataFrame({"A": ["1", "2"]}), "indices": [1]}
+    frame = table_group_frame(_doc(2, 7), group)
+    assert frame["_source_table"].tolist() == [1, 1]
+    assert frame["_source_page"].tolist() == [7, 7]
+    assert frame["_source_row"].tolist() == [0, 1]
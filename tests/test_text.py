@@ -0,0 +1,65 @@
+"""clean_boilerplate: toglie header/footer e numeri di pagina, non il contenuto ripetuto."""
+
+import pytest
+
+pytest.importorskip("docling", reason="docparser imports the Docling pipeline")
+
+from docparser.text import clean_boilerplate  # noqa: E402
+
+BODY = (
+    "| Voce | Q.tà |\n"
+    "|---|---|\n"
+    "| Bullone | 12 |\n"
+    "| Bullone | 12 |\n"
+    "| Bullone | 12 |\n"
+    "\n"
+    "- Sì\n"
+    "- Sì\n"
+    "- N/A\n"
+    "\n"
+    "## Note\n"
+    "12\n"
+    "2024\n"
+)
+
+
+def _pages(count: int = 4) -> str:
+    return "\f".join(
+        f"ACME S.p.A. - Documento riservato\n{BODY}\nPag. {n} di {count}\n{n}"
+        for n in range(1, count + 1)
+    )
+
+
+def test_header_footer_and_page_numbers_are_removed():
+    cleaned = clean_boilerplate(_pages())
+    lines = cleaned.split("\n")
+    assert "ACME S.p.A. - Documento riservato" not in lines
+    assert not any(line.startswith("Pag.") for line in lines)
+    assert not any(line in ("1", "2", "3", "4") for line in lines)
+
+
+def test_repeated_content_is_kept():
+    lines = clean_boilerplate(_pages()).split("\n")
+    assert lines.count("|---|---|") == 4
+    assert lines.count("| Voce | Q.tà |") == 4
+    assert lines.count("| Bullone | 12 |") == 12
+    assert lines.count("- Sì") == 8
+    assert lines.count("## Note") == 4
+    # numeri nel corpo: quantità, anni
+    assert lines.count("12") == 4
+    assert lines.count("2024") == 4
+
+
+def test_without_page_breaks_nothing_is_removed_for_repeating():
+    text = "Grazie\nGrazie\nGrazie\n12\n13\n14"
+    assert clean_boilerplate(text) == text
+
+
+def test_bare_numbers_at_page_edges_need_increasing_values():
+    text = "\f".join(f"5\ncorpo della pagina {n}\naltro testo\nfine" for n in range(4))
+    assert clean_boilerplate(text).split("\n").count("5") == 4
+
+
+def test_separators_and_labelled_page_numbers():
+    cleaned = clean_boilerplate("Testo\n-----\nPagina 2 di 9\n- 3 -\nPage 4\nAltro")
+    assert cleaned == "Testo\nAltro"